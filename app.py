@@ -43,9 +43,17 @@ def initialize_agent():
     if st.session_state.agent:
         st.session_state.agent.close()
     
-    st.session_state.agent = PromptAgent(use_llm=st.session_state.use_llm)
+    # A sessão fica na URL: ao recarregar a página, a conversa é retomada
+    st.session_state.agent = PromptAgent(
+        use_llm=st.session_state.use_llm,
+        session_id=st.query_params.get("sessao")
+    )
+    st.query_params["sessao"] = st.session_state.agent.session_id
     st.session_state.conversation_started = True
-    st.session_state.messages = []
+    st.session_state.messages = [
+        {"role": "user" if msg["role"] == "user" else "assistant", "content": msg["content"]}
+        for msg in st.session_state.agent.get_conversation_history()
+    ]
 
 # Sidebar com configurações
 with st.sidebar:
@@ -63,6 +71,7 @@ with st.sidebar:
     if st.button("Limpar Conversa"):
         if st.session_state.agent:
             st.session_state.agent.clear_conversation()
+            st.query_params["sessao"] = st.session_state.agent.session_id
         st.session_state.messages = []
     
     if st.button("Executar Testes"):
@@ -88,7 +97,16 @@ with st.sidebar:
     # Exibe o status do LLM
     st.write("---")
     if st.session_state.use_llm:
-        st.success("📡 Modo LLM ativo")
+        health = st.session_state.agent.get_health() if st.session_state.agent else {}
+        if health.get("state") == "open":
+            st.warning(f"⚠️ API do LLM indisponível: usando a base local (nova tentativa em {health['retry_in']:.0f}s)")
+        else:
+            st.success("📡 Modo LLM ativo")
+        if health.get("last_latency") is not None:
+            st.caption(
+                f"Última chamada: {health['last_latency']:.2f}s · "
+                f"falhas: {health['failures']} · novas tentativas: {health['retries']}"
+            )
     else:
         st.info("📚 Usando base de conhecimento local")
     
@@ -110,13 +128,23 @@ for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.write(message["content"])
         
+        # Insights extraídos em segundo plano: atualiza quando estiverem prontos
+        if message["role"] == "assistant" and message.get("insights_pending") and st.session_state.agent:
+            insights, ready = st.session_state.agent.get_interaction_insights(message["interaction_id"])
+            if ready:
+                message["insights"] = insights
+                message["insights_pending"] = False
+        
         # Se for uma mensagem do agente e tiver insights, mostra-os
         if message.get("insights") and message["role"] == "assistant":
             with st.expander("Ver insights"):
                 st.json(message["insights"])
+        elif message.get("insights_pending") and message["role"] == "assistant":
+            with st.expander("Ver insights"):
+                st.write("Insights em processamento...")
 
 # Input para nova mensagem
-if prompt := st.chat_input("Digite sua pergunta ou 'histórico' para ver conversas anteriores"):
+if prompt := st.chat_input("Digite sua pergunta, 'histórico' para ver conversas anteriores ou 'buscar <termos>'"):
     # Adiciona a mensagem do usuário ao chat
     with st.chat_message("user"):
         st.write(prompt)
@@ -138,33 +166,62 @@ if prompt := st.chat_input("Digite sua pergunta ou 'histórico' para ver convers
             "role": "assistant", 
             "content": "Histórico de conversas exibido acima."
         })
-    else:
-        # Processa a pergunta normal
-        with st.spinner("Pensando..."):
-            response, found = st.session_state.agent.get_response(prompt)
-            
-            # Obtém insights da última interação
-            last_interaction = st.session_state.agent.get_structured_output()
-            insights = {}
-            if last_interaction.get("recent_interactions"):
-                insights = last_interaction["recent_interactions"][0].get("insights", {})
+    elif prompt.lower().startswith('buscar '):
+        # Busca textual nas interações armazenadas
+        results = st.session_state.agent.search_interactions(prompt[len('buscar '):])
         
-        # Exibe a resposta
         with st.chat_message("assistant"):
-            st.write(response)
+            st.write(f"### Resultados da Busca ({len(results)})")
+            for result in results:
+                st.write(f"**{result['question']}** ({result['timestamp']})")
+                st.write(result["snippet"])
+        
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": f"Busca por '{prompt[len('buscar '):]}': {len(results)} resultados exibidos acima."
+        })
+    else:
+        # Processa a pergunta normal, exibindo a resposta à medida que é gerada
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            placeholder.markdown("Pensando...")
+            
+            response = ""
+            for delta in st.session_state.agent.stream_response(prompt):
+                response += delta
+                placeholder.markdown(response + "▌")
+            placeholder.markdown(response)
+            found = st.session_state.agent.last_found
+            
+            # Exibe os tempos medidos do streaming
+            metrics = st.session_state.agent.last_stream_metrics
+            if metrics.get("time_to_first_token") is not None:
+                st.caption(
+                    f"Primeiro token em {metrics['time_to_first_token']:.2f}s · "
+                    f"resposta completa em {metrics['total_time']:.2f}s"
+                )
             
             # Exibe informações adicionais conforme disponível
             if not st.session_state.use_llm and found:
                 st.info("Informação encontrada na base de conhecimento local")
+            elif metrics.get("fallback"):
+                st.info("API do LLM indisponível: resposta da base de conhecimento local")
+        
+        # Obtém insights da última interação (podem ainda estar em processamento)
+        interaction_id = st.session_state.agent.last_interaction_id
+        insights, ready = st.session_state.agent.get_interaction_insights(interaction_id)
             
         # Adiciona a resposta do assistente ao histórico da sessão
         st.session_state.messages.append({
             "role": "assistant", 
             "content": response,
-            "insights": insights
+            "insights": insights,
+            "insights_pending": not ready,
+            "interaction_id": interaction_id
         })
 
 # Rodapé
 st.write("---")
 st.write("Digite suas perguntas sobre Engenharia de Prompt no campo acima.")
-st.write("Use 'histórico' para ver conversas anteriores armazenadas no banco de dados.") 
\ No newline at end of file
+st.write("Use 'histórico' para ver conversas anteriores armazenadas no banco de dados.")
+st.write("Use 'buscar <termos>' para pesquisar nas interações armazenadas.") 
\ No newline at end of file
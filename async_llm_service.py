@@ -0,0 +1,421 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Coroutine, Dict, List, Optional, Tuple
+
+import openai
+
+from llm_service import LLMService, ERROR_RESPONSE_PREFIX
+from resilience import INTERRUPTIONS, CircuitOpenError
+
+# Event loop em segundo plano, compartilhado, para chamadas assíncronas feitas a partir de código síncrono
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_lock = threading.Lock()
+
+
+class AsyncLLMService(LLMService):
+    """
+    Versão assíncrona do serviço LLM, baseada em `openai.AsyncOpenAI`.
+    
+    Permite atender muitas requisições concorrentes em um único event loop.
+    Um semáforo limita o número de requisições simultâneas ao provedor e cada
+    chamada tem um tempo limite próprio. As novas tentativas e o circuit
+    breaker são os mesmos do serviço síncrono. Os métodos síncronos herdados
+    de LLMService continuam disponíveis.
+    """
+    
+    def __init__(self,
+                 config_path: str = "config.yaml",
+                 max_concurrency: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        """
+        Inicializa o serviço com configurações do arquivo YAML.
+        
+        Args:
+            config_path (str): Caminho para o arquivo de configuração YAML
+            max_concurrency (int, optional): Número máximo de requisições simultâneas
+                (padrão: `async_llm.max_concurrency` da configuração)
+            timeout (float, optional): Tempo limite, em segundos, de cada chamada
+                (padrão: `async_llm.timeout` da configuração)
+        """
+        super().__init__(config_path)
+        async_config = self.config.get('async_llm', {})
+        self.max_concurrency = max_concurrency or async_config.get('max_concurrency', 8)
+        self.timeout = timeout or async_config.get('timeout', 60)
+        # Semáforo e cliente de cada event loop: (event loop, semáforo, cliente)
+        self._loop_resources: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore, openai.AsyncOpenAI]] = {}
+    
+    def _get_async_client(self) -> openai.AsyncOpenAI:
+        """
+        Retorna o cliente assíncrono do event loop em execução: as conexões de
+        um cliente ficam presas ao event loop em que foram abertas, então cada
+        event loop (cada `asyncio.run` e o event loop de `run_in_background`)
+        usa um cliente próprio.
+        
+        Returns:
+            openai.AsyncOpenAI: Cliente assíncrono
+        """
+        return self._get_loop_resources()[1]
+    
+    def run_in_background(self, coroutine: Coroutine[Any, Any, Any]) -> concurrent.futures.Future:
+        """
+        Executa uma corrotina do serviço no event loop em segundo plano (criado
+        na primeira chamada), a partir de código síncrono. Ao contrário de uma
+        thread, a chamada pode ser interrompida a qualquer momento com
+        `future.cancel()`: a conexão é fechada e as novas tentativas e esperas
+        pendentes são descartadas.
+        
+        Args:
+            coroutine (Coroutine): Corrotina a executar
+        
+        Returns:
+            concurrent.futures.Future: Resultado da corrotina
+        """
+        global _background_loop
+        with _background_lock:
+            if _background_loop is None:
+                _background_loop = asyncio.new_event_loop()
+                threading.Thread(target=_background_loop.run_forever, name="llm-background-loop", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coroutine, _background_loop)
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """
+        Retorna o semáforo de concorrência do event loop em execução.
+        
+        Returns:
+            asyncio.Semaphore: Semáforo que limita as requisições simultâneas
+        """
+        return self._get_loop_resources()[0]
+    
+    def _get_loop_resources(self) -> Tuple[asyncio.Semaphore, openai.AsyncOpenAI]:
+        """
+        Retorna o semáforo e o cliente do event loop em execução, criando-os no
+        primeiro uso. Um semáforo ou cliente criado em um event loop não pode
+        ser usado em outro.
+        
+        Returns:
+            Tuple[asyncio.Semaphore, openai.AsyncOpenAI]: (semáforo, cliente)
+        """
+        loop = asyncio.get_running_loop()
+        resources = self._loop_resources.get(id(loop))
+        # O event loop é comparado também pela identidade: o id de um event loop encerrado pode ser reutilizado
+        if resources is None or resources[0] is not loop:
+            resources = (loop, asyncio.Semaphore(self.max_concurrency), openai.AsyncOpenAI(**self._client_options))
+            # Descarta os recursos dos event loops já encerrados
+            self._loop_resources = {
+                key: value for key, value in self._loop_resources.items() if not value[0].is_closed()
+            }
+            self._loop_resources[id(loop)] = resources
+        return resources[1], resources[2]
+    
+    async def _acall_with_retry(self,
+                                request: Callable[[], Awaitable[Any]],
+                                timeout: Optional[float] = None) -> Any:
+        """
+        Versão assíncrona de `_call_with_retry`: cada tentativa é limitada por
+        `asyncio.wait_for` e as esperas entre tentativas não bloqueiam o event loop.
+        
+        Args:
+            request (Callable[[], Awaitable[Any]]): Função que cria a chamada ao provedor
+            timeout (float, optional): Tempo limite total, em segundos (padrão: `timeout` do serviço)
+        
+        Returns:
+            Any: Resultado da chamada
+        
+        Raises:
+            CircuitOpenError: Se o circuito estiver aberto (a chamada não é feita)
+            asyncio.TimeoutError: Se o tempo limite for excedido em todas as tentativas
+        """
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError("serviço de LLM temporariamente indisponível")
+        
+        total_timeout = timeout or self.timeout
+        start = time.perf_counter()
+        delays = self.retry_policy.delays()
+        try:
+            while True:
+                remaining = total_timeout - (time.perf_counter() - start)
+                try:
+                    async with self._get_semaphore():
+                        result = await asyncio.wait_for(request(), min(self.attempt_timeout, max(remaining, 0.1)))
+                except Exception as e:
+                    retryable = isinstance(e, asyncio.TimeoutError) or self.retry_policy.is_retryable(e)
+                    delay = next(delays, None) if retryable else None
+                    elapsed = time.perf_counter() - start
+                    if delay is None or elapsed + delay >= total_timeout:
+                        self.circuit_breaker.record_failure(e, elapsed)
+                        raise
+                    self.circuit_breaker.record_retry()
+                    await asyncio.sleep(delay)
+                    continue
+                self.circuit_breaker.record_success(time.perf_counter() - start)
+                return result
+        except INTERRUPTIONS:
+            # Tarefa cancelada (por exemplo, pela consulta especulativa): libera a
+            # chamada de teste do circuito sem registrar uma falha
+            self.circuit_breaker.record_cancelled()
+            raise
+    
+    async def aget_completion(self,
+                              prompt: str,
+                              system_prompt: Optional[str] = None,
+                              temperature: Optional[float] = None,
+                              max_tokens: Optional[int] = None,
+                              use_cache: bool = True,
+                              timeout: Optional[float] = None,
+                              history: Optional[List[Dict[str, str]]] = None,
+                              summary: Optional[str] = None) -> Tuple[str, bool]:
+        """
+        Envia uma solicitação ao modelo LLM e obtém uma resposta, sem bloquear o event loop.
+        
+        Args:
+            prompt (str): Pergunta ou prompt do usuário
+            system_prompt (str, optional): Prompt de sistema para orientar o modelo
+            temperature (float, optional): Temperatura para controlar a aleatoriedade
+            max_tokens (int, optional): Número máximo de tokens na resposta
+            use_cache (bool): Se False, ignora o cache de respostas
+            timeout (float, optional): Tempo limite desta chamada (todas as tentativas), em segundos
+            history (List[Dict[str, str]], optional): Mensagens anteriores da conversa
+            summary (str, optional): Resumo das mensagens que já saíram do contexto
+        
+        Returns:
+            Tuple[str, bool]: (Resposta do modelo, indicador de sucesso)
+        """
+        self.last_usage = {}
+        try:
+            model_name, messages, _temperature, _max_tokens = self._prepare_request(
+                prompt, system_prompt, temperature, max_tokens, history, summary
+            )
+            
+            # Consultar o cache de respostas antes de chamar o modelo
+            cache_key, cached = self._lookup_cache(model_name, messages, _temperature, _max_tokens, use_cache)
+            if cached is not None:
+                return cached, True
+            
+            start = time.perf_counter()
+            response = await self._acall_with_retry(
+                lambda: self._get_async_client().chat.completions.create(
+                    model=model_name,
+                    messages=messages,
+                    temperature=_temperature,
+                    max_tokens=_max_tokens
+                ),
+                timeout
+            )
+            self._record_usage(getattr(response, "usage", None), time.perf_counter() - start)
+            
+            # Extrair a resposta do modelo
+            answer = response.choices[0].message.content.strip()
+            
+            if cache_key:
+                self.response_cache.set(cache_key, answer)
+            
+            return answer, True
+        
+        except asyncio.TimeoutError:
+            return f"{ERROR_RESPONSE_PREFIX}: tempo limite excedido", False
+        except Exception as e:
+            return f"{ERROR_RESPONSE_PREFIX}: {str(e)}", False
+    
+    async def astream_completion(self,
+                                 prompt: str,
+                                 system_prompt: Optional[str] = None,
+                                 temperature: Optional[float] = None,
+                                 max_tokens: Optional[int] = None,
+                                 use_cache: bool = True,
+                                 timeout: Optional[float] = None,
+                                 yield_errors: bool = True,
+                                 history: Optional[List[Dict[str, str]]] = None,
+                                 summary: Optional[str] = None,
+                                 metrics: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Versão assíncrona de `stream_completion`: devolve a resposta em partes.
+        
+        O tempo limite vale para a resposta completa. Ao final da iteração,
+        `last_stream_metrics` contém os tempos medidos e o indicador de sucesso.
+        Se a iteração for cancelada, a conexão é fechada.
+        
+        Args:
+            prompt (str): Pergunta ou prompt do usuário
+            system_prompt (str, optional): Prompt de sistema para orientar o modelo
+            temperature (float, optional): Temperatura para controlar a aleatoriedade
+            max_tokens (int, optional): Número máximo de tokens na resposta
+            use_cache (bool): Se False, ignora o cache de respostas
+            timeout (float, optional): Tempo limite desta chamada, em segundos
+            yield_errors (bool): Se False, a mensagem de erro não é devolvida no stream
+            history (List[Dict[str, str]], optional): Mensagens anteriores da conversa
+            summary (str, optional): Resumo das mensagens que já saíram do contexto
+            metrics (Dict[str, Any], optional): Dicionário que recebe as métricas e,
+                em "usage", o uso desta chamada, no lugar de `last_stream_metrics` e
+                `last_usage` (para chamadas concorrentes no mesmo serviço)
+        
+        Yields:
+            str: Trechos (deltas) da resposta do modelo
+        """
+        start = time.perf_counter()
+        deadline = start + (timeout or self.timeout)
+        shared = metrics is None
+        metrics = metrics if metrics is not None else {}
+        metrics.update({
+            "time_to_first_token": None,
+            "total_time": None,
+            "chunks": 0,
+            "success": False,
+            "cached": False
+        })
+        if shared:
+            self.last_stream_metrics = metrics
+            self.last_usage = {}
+        
+        try:
+            model_name, messages, _temperature, _max_tokens = self._prepare_request(
+                prompt, system_prompt, temperature, max_tokens, history, summary
+            )
+            
+            # Uma resposta em cache é devolvida de uma só vez
+            cache_key, cached = self._lookup_cache(model_name, messages, _temperature, _max_tokens, use_cache)
+            if cached is not None:
+                metrics["time_to_first_token"] = time.perf_counter() - start
+                metrics["chunks"] = 1
+                metrics["success"] = True
+                metrics["cached"] = True
+                yield cached
+                return
+            
+            # Só a abertura do stream é repetida: trechos já entregues não podem ser refeitos
+            chunks = []
+            stream = await self._acall_with_retry(
+                lambda: self._get_async_client().chat.completions.create(
+                    model=model_name,
+                    messages=messages,
+                    temperature=_temperature,
+                    max_tokens=_max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                ),
+                timeout
+            )
+            
+            usage = None
+            try:
+                async with self._get_semaphore():
+                    iterator = stream.__aiter__()
+                    while True:
+                        # Um stream parado também respeita o tempo limite por tentativa
+                        wait = min(self.attempt_timeout, deadline - time.perf_counter())
+                        try:
+                            chunk = await asyncio.wait_for(iterator.__anext__(), wait)
+                        except StopAsyncIteration:
+                            break
+                        if getattr(chunk, "usage", None) is not None:
+                            usage = chunk.usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if not delta:
+                            continue
+                        if metrics["time_to_first_token"] is None:
+                            metrics["time_to_first_token"] = time.perf_counter() - start
+                        metrics["chunks"] += 1
+                        chunks.append(delta)
+                        yield delta
+            finally:
+                # Fecha a conexão também quando a iteração é cancelada ou interrompida
+                await stream.close()
+            
+            metrics["success"] = True
+            usage_info = self._usage_info(usage, time.perf_counter() - start)
+            if shared:
+                self.last_usage = usage_info
+            else:
+                metrics["usage"] = usage_info
+            if cache_key:
+                self.response_cache.set(cache_key, "".join(chunks).strip())
+        
+        except asyncio.TimeoutError:
+            if yield_errors:
+                yield f"{ERROR_RESPONSE_PREFIX}: tempo limite excedido"
+        except Exception as e:
+            if yield_errors:
+                yield f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
+        finally:
+            metrics["total_time"] = time.perf_counter() - start
+    
+    async def agather_completions(self,
+                                  prompts: List[str],
+                                  system_prompt: Optional[str] = None,
+                                  **kwargs: Any) -> List[Tuple[str, bool]]:
+        """
+        Envia vários prompts concorrentemente (respeitando o limite de concorrência).
+        
+        Args:
+            prompts (List[str]): Prompts a enviar
+            system_prompt (str, optional): Prompt de sistema comum a todos
+            **kwargs: Demais argumentos de `aget_completion`
+        
+        Returns:
+            List[Tuple[str, bool]]: Respostas na mesma ordem dos prompts
+        """
+        return await asyncio.gather(*[
+            self.aget_completion(prompt, system_prompt=system_prompt, **kwargs)
+            for prompt in prompts
+        ])
+    
+    async def aextract_insights_batch(self, interactions: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Versão assíncrona de `extract_insights_batch`: os lotes são enviados concorrentemente.
+        
+        Args:
+            interactions (List[Tuple[str, str]]): Pares (pergunta do usuário, resposta do agente)
+        
+        Returns:
+            List[Dict[str, Any]]: Insights extraídos, na mesma ordem das interações
+        """
+        token_budget = self.config.get('insights', {}).get('batch_token_budget', 3000)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(interactions)
+        
+        await asyncio.gather(*[
+            self._aextract_insights_split(interactions, batch, results)
+            for batch in self._plan_insight_batches(interactions, token_budget)
+        ])
+        return results
+    
+    async def _aextract_insights_split(self,
+                                       interactions: List[Tuple[str, str]],
+                                       batch: List[int],
+                                       results: List[Optional[Dict[str, Any]]]):
+        """
+        Extrai os insights de um lote, dividindo-o e tentando novamente as
+        interações cujo resultado não pôde ser validado.
+        
+        Args:
+            interactions (List[Tuple[str, str]]): Pares (pergunta, resposta)
+            batch (List[int]): Índices das interações do lote
+            results (List[Optional[Dict[str, Any]]]): Lista de resultados, preenchida no lugar
+        """
+        prompt = self._build_insights_prompt([interactions[i] for i in batch])
+        try:
+            response = await self._acall_with_retry(
+                lambda: self._get_async_client().chat.completions.create(
+                    model=self.config.get('model', {}).get('name', 'gpt-4o'),
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.3,  # Baixa temperatura para respostas mais consistentes
+                    max_tokens=self._insights_max_tokens(len(batch))
+                )
+            )
+            self.insight_stats["calls"] += 1
+            self.insight_stats["interactions"] += len(batch)
+            parsed = self._parse_insights_reply(response.choices[0].message.content.strip(), len(batch))
+            error = None
+        except CircuitOpenError:
+            # Provedor indisponível: as interações continuam pendentes para depois
+            raise
+        except Exception as e:
+            parsed = {}
+            error = e
+        
+        await asyncio.gather(*[
+            self._aextract_insights_split(interactions, retry, results)
+            for retry in self._apply_insights_batch(batch, parsed, error, results)
+        ])
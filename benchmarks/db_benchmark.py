@@ -0,0 +1,125 @@
+"""
+Benchmark do acesso ao SQLite: conexão nova por operação (comportamento
+anterior) versus conexões persistentes por thread com WAL (ConnectionManager).
+
+Simula várias sessões concorrentes, cada uma armazenando interações e lendo
+o histórico, e mostra a vazão e as latências de escrita e leitura.
+
+Uso:
+    python benchmarks/db_benchmark.py --sessions 8 --operations 300
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, register_functions
+
+
+class PerOperationConnections:
+    """
+    Reproduz o comportamento anterior: uma conexão nova (journal padrão) por operação.
+    """
+    
+    def __init__(self, db_path):
+        self.db_path = db_path
+    
+    def cursor(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        register_functions(conn)
+        return conn, conn.cursor()
+    
+    def release(self, conn, cursor):
+        conn.close()
+    
+    def close(self):
+        pass
+
+
+class PerOperationDatabase(Database):
+    """
+    Database com uma conexão nova por operação.
+    """
+    
+    def __init__(self, db_name):
+        super().__init__(db_name)
+        self._connections.close()
+        # O modo WAL fica gravado no arquivo: volta ao journal padrão
+        conn = sqlite3.connect(db_name)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+        self._connections = PerOperationConnections(db_name)
+
+
+def run_session(db, operations, write_times, read_times, errors):
+    """
+    Executa uma sessão: alterna uma escrita e duas leituras por operação.
+    """
+    try:
+        for i in range(operations):
+            start = time.perf_counter()
+            interaction_id = db.store_interaction(f"Pergunta {i} sobre prompts?", "Resposta " * 40, "{}")
+            write_times.append(time.perf_counter() - start)
+            
+            start = time.perf_counter()
+            db.get_interaction_by_id(interaction_id)
+            db.get_interactions_page(max(0, interaction_id - 20), 20)
+            read_times.append(time.perf_counter() - start)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        db.close()
+
+
+def benchmark(label, factory, sessions, operations):
+    """
+    Executa as sessões concorrentes e imprime os resultados.
+    """
+    write_times, read_times, errors = [], [], []
+    threads = [
+        threading.Thread(target=run_session, args=(factory(), operations, write_times, read_times, errors))
+        for _ in range(sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    def percentile(values, q):
+        return statistics.quantiles(values, n=100)[q - 1] * 1000 if len(values) > 1 else 0.0
+    
+    print(f"{label}:")
+    print(f"  tempo total: {elapsed:.2f}s  ({len(write_times) / elapsed:.0f} escritas/s, "
+          f"{2 * len(read_times) / elapsed:.0f} leituras/s)")
+    print(f"  escrita: p50 {percentile(write_times, 50):.2f} ms, p95 {percentile(write_times, 95):.2f} ms")
+    print(f"  leitura: p50 {percentile(read_times, 50):.2f} ms, p95 {percentile(read_times, 95):.2f} ms")
+    if errors:
+        print(f"  erros: {len(errors)} ({errors[0]})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara conexões por operação com conexões persistentes em WAL.")
+    parser.add_argument("--sessions", type=int, default=8, help="Sessões (threads) concorrentes")
+    parser.add_argument("--operations", type=int, default=300, help="Escritas por sessão")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_path = os.path.join(directory, "legacy.db")
+        pooled_path = os.path.join(directory, "pooled.db")
+        
+        benchmark("Conexão por operação (journal padrão)",
+                  lambda: PerOperationDatabase(legacy_path), args.sessions, args.operations)
+        benchmark("Conexões persistentes por thread (WAL)",
+                  lambda: Database(pooled_path), args.sessions, args.operations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Benchmark da busca na base de conhecimento: varredura de todas as FAQs
+(comportamento anterior) versus o índice invertido do KnowledgeBase.
+
+Gera bases sintéticas de tamanhos crescentes (as 13 FAQs originais mais
+perguntas geradas), mede a latência de perguntas com correspondência exata,
+por palavras-chave, com erros de digitação (busca aproximada) e sem
+correspondência, e confere que as duas buscas retornam as mesmas respostas. Mede também a busca ranqueada (BM25), com uma
+pergunta por vez (`query`) e em lote (`query_many`), e o tempo para abrir a
+base a partir do snapshot do índice (as FAQs ficam em um arquivo JSONL
+temporário; a primeira abertura constrói e grava o snapshot) e a recarga
+de uma alteração pequena no arquivo (`reload`).
+
+Uso:
+    python benchmarks/kb_benchmark.py --sizes 13 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge_base import FALLBACK_RESPONSE, KnowledgeBase, normalize_question
+
+STARTS = ["o que é", "como usar", "quando aplicar", "por que usar", "qual a diferença entre", "como avaliar"]
+
+
+class LinearKnowledgeBase(KnowledgeBase):
+    """
+    Reproduz a busca anterior: duas varreduras de todas as FAQs (em um
+    dicionário) por pergunta, seguidas da mesma busca aproximada do KnowledgeBase.
+    """
+    
+    @classmethod
+    def from_faqs(cls, faqs):
+        kb = super().from_faqs(faqs)
+        kb.table = dict(kb.faqs)
+        return kb
+    
+    def add_faq(self, question, answer):
+        super().add_faq(question, answer)
+        self.table[normalize_question(question)] = answer
+    
+    def get_response(self, question):
+        normalized_question = question.lower().strip('?!.,;:')
+        for key, value in self.table.items():
+            if key in normalized_question or normalized_question in key:
+                return value, True
+        for key, value in self.table.items():
+            key_words = set(key.split())
+            question_words = set(normalized_question.split())
+            if len(key_words.intersection(question_words)) >= 0.7 * len(key_words):
+                return value, True
+        key_id = self._index.find_similar(normalized_question)
+        if key_id is not None:
+            return self._index.answer(key_id), True
+        return FALLBACK_RESPONSE, False
+
+
+def make_vocabulary(rng, size):
+    syllables = ["pro", "mpt", "ca", "de", "ia", "lin", "gua", "mo", "te", "xto", "ra", "zo", "ci", "na", "men", "to"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_faqs(rng, vocabulary, count):
+    faqs = {}
+    while len(faqs) < count:
+        terms = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 4)))
+        faqs[f"{rng.choice(STARTS)} {terms}"] = f"Resposta sobre {terms}."
+    return faqs
+
+
+def make_queries(rng, keys, vocabulary, count):
+    """
+    Gera perguntas dos tipos medidos: exatas, por palavras-chave, com um erro
+    de digitação e desconhecidas.
+    """
+    queries = {"exata": [], "palavras-chave": [], "digitação": [], "desconhecida": []}
+    for _ in range(count):
+        key = rng.choice(keys)
+        queries["exata"].append(f"Você sabe {key}?")
+        words = key.split()
+        rng.shuffle(words)
+        queries["palavras-chave"].append(" ".join(words + [rng.choice(vocabulary)]))
+        position = rng.randrange(len(key))
+        queries["digitação"].append(f"{key[:position]}{key[position + 1:]}".replace("é", "e"))
+        queries["desconhecida"].append(" ".join(rng.choice(vocabulary) + "s" for _ in range(4)))
+    return queries
+
+
+def make_edge_queries(rng, keys, vocabulary, count):
+    """
+    Gera perguntas para a conferência de equivalência, incluindo trechos
+    cortados no meio de palavras, pontuação e perguntas vazias.
+    """
+    queries = ["", "?", " ", "o", "de", "que é", "prompt", "é um"]
+    for _ in range(count):
+        key = rng.choice(keys)
+        start = rng.randrange(len(key))
+        queries.append(key[start:start + rng.randint(1, 20)])
+        queries.append(" ".join(rng.sample(key.split(), max(1, len(key.split()) - 1))))
+        queries.append(f"{rng.choice(vocabulary)} {key} {rng.choice(vocabulary)}")
+        queries.append(" ".join(rng.choice(vocabulary)[:rng.randint(1, 6)] for _ in range(rng.randint(1, 3))))
+    return queries
+
+
+def latency(lookup, questions):
+    times = []
+    for question in questions:
+        start = time.perf_counter()
+        lookup(question)
+        times.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(times)
+
+
+def write_faqs(path, faqs):
+    """
+    Grava as FAQs em um arquivo JSONL.
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        for question, answer in faqs.items():
+            file.write(json.dumps({"question": question, "answer": answer}, ensure_ascii=False) + "\n")
+
+
+def run(args, rng, vocabulary, faqs, directory):
+    """
+    Mede e confere uma base de FAQs gravada em um JSONL em `directory`.
+    """
+    source = os.path.join(directory, "faqs.jsonl")
+    write_faqs(source, faqs)
+    snapshot = os.path.join(directory, "faqs.snapshot")
+    
+    build_time = KnowledgeBase([source], snapshot, added_path=None).load_stats["seconds"]
+    indexed = KnowledgeBase([source], snapshot, added_path=None)
+    linear = LinearKnowledgeBase.from_faqs(faqs)
+    
+    keys = list(indexed.faqs)
+    queries = make_queries(rng, keys, vocabulary, args.queries)
+    print(f"{len(keys)} FAQs (índice construído em {build_time:.2f}s; snapshot de "
+          f"{indexed.load_stats['snapshot_bytes'] / 2**20:.1f} MiB aberto em {indexed.load_stats['seconds'] * 1000:.1f} ms):")
+    for kind, questions in queries.items():
+        print(f"  {kind:>15}: varredura {latency(linear.get_response, questions):9.1f} µs · "
+              f"índice {latency(indexed.get_response, questions):6.1f} µs (mediana)")
+    
+    # Busca ranqueada: pergunta a pergunta e todas em um único lote
+    questions = [question for questions in queries.values() for question in questions]
+    single = latency(lambda question: indexed.query(question, k=5), questions)
+    start = time.perf_counter()
+    indexed.query_many(questions, k=5)
+    batched = (time.perf_counter() - start) * 1e6 / len(questions)
+    print(f"  {'BM25 top-5':>15}: query {single:.1f} µs (mediana) · query_many {batched:.1f} µs por pergunta")
+    
+    # Recarga: uma resposta alterada, uma FAQ removida e uma nova no arquivo de origem
+    indexed.reload()
+    edited = dict(faqs)
+    edited[keys[0]] += " (revisada)"
+    edited.pop(keys[len(keys) // 2])
+    edited.update(make_faqs(rng, vocabulary, 1))
+    write_faqs(source, edited)
+    stats = indexed.reload()
+    print(f"  {'recarga':>15}: leitura {stats['read_seconds'] * 1000:.1f} ms · aplicação "
+          f"{stats['apply_seconds'] * 1e6:.0f} µs ({stats['added']} nova, {stats['changed']} alterada, "
+          f"{stats['removed']} removida; {stats['faqs']} FAQs)")
+    linear = LinearKnowledgeBase.from_faqs(indexed.get_all_faqs())
+    
+    # Conferência: mesmas respostas, inclusive para FAQs adicionadas depois da construção
+    added = make_faqs(rng, vocabulary, 20)
+    for question, answer in added.items():
+        indexed.add_faq(question, answer)
+        linear.add_faq(question, answer)
+    check = make_edge_queries(rng, list(indexed.faqs), vocabulary, args.check)
+    check += [question for questions in queries.values() for question in questions]
+    mismatches = [question for question in check if indexed.get_response(question) != linear.get_response(question)]
+    print(f"  conferência: {len(check) - len(mismatches)}/{len(check)} respostas iguais")
+    if mismatches:
+        print(f"  divergências (primeiras): {mismatches[:5]}")
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a varredura das FAQs com o índice invertido.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[13, 1000, 10000, 100000], help="Tamanhos da base")
+    parser.add_argument("--queries", type=int, default=200, help="Perguntas medidas por tipo")
+    parser.add_argument("--check", type=int, default=100, help="Perguntas extras na conferência de equivalência")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng, 20000)
+    
+    default_faqs = KnowledgeBase(snapshot_path=None, added_path=None).get_all_faqs()
+    for size in args.sizes:
+        faqs = dict(default_faqs)
+        faqs.update(make_faqs(rng, vocabulary, max(0, size - len(faqs))))
+        with tempfile.TemporaryDirectory() as directory:
+            run(args, rng, vocabulary, faqs, directory)
+
+if __name__ == "__main__":
+    main()
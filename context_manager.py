@@ -0,0 +1,292 @@
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# tiktoken é opcional: sem ele, os tokens são estimados localmente
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Papéis das mensagens da conversa na API de chat
+CHAT_ROLES = {"user": "user", "agent": "assistant"}
+
+Summarizer = Callable[[str, List[Dict[str, Any]], int], str]
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: Optional[str]):
+    """
+    Retorna o tokenizador do tiktoken para o modelo (ou None se indisponível).
+    
+    Args:
+        model (str, optional): Nome do modelo
+    
+    Returns:
+        Encoding do tiktoken ou None
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("o200k_base")
+    except Exception:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Conta os tokens de um texto localmente, com o tiktoken se estiver
+    instalado ou com uma estimativa (aproximadamente 4 caracteres por token).
+    
+    Args:
+        text (str): Texto a contar
+        model (str, optional): Nome do modelo, para escolher o tokenizador
+    
+    Returns:
+        int: Número de tokens
+    """
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """
+    Corta um texto para caber em um número máximo de tokens, mantendo o final
+    (a parte mais recente).
+    
+    Args:
+        text (str): Texto a cortar
+        max_tokens (int): Número máximo de tokens
+        model (str, optional): Nome do modelo, para escolher o tokenizador
+    
+    Returns:
+        str: Texto cortado
+    """
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[-max_tokens:])
+    return text[-max_tokens * 4:]
+
+
+def local_summary(previous_summary: str, turns: List[Dict[str, Any]], max_tokens: int) -> str:
+    """
+    Resumo extrativo local: acrescenta ao resumo anterior uma linha por pergunta
+    removida do contexto e descarta as linhas mais antigas que não couberem.
+    
+    Args:
+        previous_summary (str): Resumo acumulado até agora
+        turns (List[Dict[str, Any]]): Mensagens removidas do contexto
+        max_tokens (int): Tamanho máximo do resumo, em tokens
+    
+    Returns:
+        str: Novo resumo
+    """
+    lines = previous_summary.splitlines() if previous_summary else []
+    for turn in turns:
+        if turn["role"] == "user":
+            lines.append(f"- O usuário perguntou: {turn['content'][:200]}")
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return truncate_to_tokens("\n".join(lines), max_tokens)
+
+
+class ConversationMemory:
+    """
+    Contexto da conversa enviado ao modelo, limitado por um orçamento de tokens.
+    
+    As mensagens mais recentes são mantidas na íntegra enquanto, somadas ao
+    resumo, couberem em `token_budget`. As mais antigas são removidas e
+    incorporadas a um resumo acumulado, calculado uma única vez a cada remoção
+    e reutilizado nos turnos seguintes. Assim, os tokens de contexto de cada
+    requisição ficam limitados independentemente do tamanho da conversa.
+    
+    Cada remoção reduz o histórico a uma fração do orçamento (`evict_to`), de
+    modo que entre remoções as mensagens só são acrescentadas e o início da
+    requisição se mantém igual, aproveitando o cache de prefixo do provedor.
+    
+    Com um `summarizer` externo (por exemplo, o LLM), o resumo é atualizado em
+    uma thread em segundo plano, fora do caminho da resposta: a remoção é
+    imediata e o resumo extrativo local cobre as mensagens removidas até que
+    o resumo do `summarizer` fique pronto.
+    """
+    
+    def __init__(self,
+                 token_budget: int = 2000,
+                 summary_max_tokens: int = 300,
+                 summarizer: Optional[Summarizer] = None,
+                 model: Optional[str] = None,
+                 evict_to: float = 0.5):
+        """
+        Args:
+            token_budget (int): Tokens máximos de contexto (resumo + mensagens) por requisição
+            summary_max_tokens (int): Tamanho máximo do resumo, em tokens
+            summarizer (Callable, optional): Função (resumo anterior, mensagens removidas,
+                max_tokens) -> novo resumo (padrão: `local_summary`)
+            model (str, optional): Nome do modelo, para escolher o tokenizador
+            evict_to (float): Fração do espaço das mensagens mantida após uma remoção
+        """
+        self.token_budget = token_budget
+        self.evict_to = evict_to
+        self.summary_max_tokens = min(summary_max_tokens, token_budget)
+        self.summarizer = summarizer or local_summary
+        self.model = model
+        self.turns: List[Dict[str, Any]] = []
+        self.summary = ""
+        self.summary_tokens = 0
+        self.history_tokens = 0
+        self.stats = {"evicted_messages": 0, "summaries": 0}
+        # Resumos pendentes do `summarizer`, processados em ordem por uma thread
+        self._pending: Deque[Tuple[int, List[Dict[str, Any]]]] = deque()
+        # Último resumo do `summarizer` (base dos resumos seguintes)
+        self._summarized = ""
+        self._generation = 0
+        self._cleared_generation = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+    
+    def add_turn(self, user_query: str, response: str):
+        """
+        Acrescenta uma pergunta e sua resposta ao contexto e remove as mensagens
+        antigas que excederem o orçamento.
+        
+        Args:
+            user_query (str): Pergunta do usuário
+            response (str): Resposta do agente
+        """
+        self.add_turns([(user_query, response)])
+    
+    def add_turns(self, turns: List[Tuple[str, str]]):
+        """
+        Acrescenta vários turnos ao contexto (por exemplo, ao retomar uma
+        sessão) e atualiza o resumo no máximo uma vez.
+        
+        Args:
+            turns (List[Tuple[str, str]]): Pares (pergunta, resposta), dos mais antigos aos mais recentes
+        """
+        for user_query, response in turns:
+            for role, content in (("user", user_query), ("agent", response)):
+                tokens = count_tokens(content, self.model)
+                self.turns.append({"role": role, "content": content, "tokens": tokens})
+                self.history_tokens += tokens
+        self._compact()
+    
+    def _compact(self):
+        """
+        Se o orçamento foi excedido, remove as mensagens mais antigas até que o
+        histórico ocupe no máximo a fração `evict_to` do seu espaço e atualiza o
+        resumo uma única vez com tudo o que foi removido.
+        """
+        history_budget = self.token_budget - self.summary_max_tokens
+        if self.history_tokens <= history_budget:
+            return
+        
+        evicted = []
+        while self.turns and self.history_tokens > history_budget * self.evict_to:
+            evicted.append(self.turns.pop(0))
+            # Uma resposta não fica no contexto sem a pergunta correspondente
+            if self.turns and self.turns[0]["role"] == "agent":
+                evicted.append(self.turns.pop(0))
+            self.history_tokens = sum(turn["tokens"] for turn in self.turns)
+        
+        self.stats["evicted_messages"] += len(evicted)
+        self.stats["summaries"] += 1
+        with self._lock:
+            self._set_summary(local_summary(self.summary, evicted, self.summary_max_tokens))
+            if self.summarizer is local_summary:
+                return
+            
+            # O resumo do `summarizer` substitui o local quando ficar pronto
+            self._generation += 1
+            self._pending.append((self._generation, evicted))
+            if self._idle.is_set():
+                self._idle.clear()
+                threading.Thread(target=self._summarize_pending, name="context-summarizer", daemon=True).start()
+    
+    def _summarize_pending(self):
+        """
+        Thread em segundo plano: atualiza o resumo com o `summarizer` para cada
+        remoção pendente, em ordem. O resumo só é substituído se não houve
+        outra remoção (ou `clear`) depois da que está sendo resumida.
+        """
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._idle.set()
+                    return
+                generation, evicted = self._pending.popleft()
+                previous = self._summarized
+            
+            try:
+                summary = self.summarizer(previous, evicted, self.summary_max_tokens)
+            except Exception:
+                summary = local_summary(previous, evicted, self.summary_max_tokens)
+            
+            with self._lock:
+                if generation <= self._cleared_generation:
+                    continue
+                self._summarized = summary
+                if generation == self._generation:
+                    self._set_summary(summary)
+    
+    def _set_summary(self, summary: str):
+        """
+        Substitui o resumo, limitado a `summary_max_tokens` (o lock deve estar adquirido).
+        
+        Args:
+            summary (str): Novo resumo
+        """
+        self.summary = truncate_to_tokens(summary.strip(), self.summary_max_tokens, self.model)
+        self.summary_tokens = count_tokens(self.summary, self.model) if self.summary else 0
+    
+    def wait_for_summary(self, timeout: Optional[float] = None) -> bool:
+        """
+        Aguarda a conclusão dos resumos pendentes.
+        
+        Args:
+            timeout (float, optional): Tempo máximo de espera, em segundos
+        
+        Returns:
+            bool: True se não há resumos pendentes
+        """
+        return self._idle.wait(timeout)
+    
+    def messages(self) -> List[Dict[str, str]]:
+        """
+        Retorna as mensagens recentes no formato da API de chat.
+        
+        Returns:
+            List[Dict[str, str]]: Mensagens ("role" user/assistant e "content"), das mais antigas às mais recentes
+        """
+        return [{"role": CHAT_ROLES[turn["role"]], "content": turn["content"]} for turn in self.turns]
+    
+    def context_tokens(self) -> int:
+        """
+        Retorna o número de tokens de contexto (resumo + mensagens) enviados por requisição.
+        
+        Returns:
+            int: Número de tokens
+        """
+        return self.summary_tokens + self.history_tokens
+    
+    def clear(self):
+        """
+        Remove todas as mensagens e o resumo.
+        """
+        with self._lock:
+            self.turns = []
+            self.summary = ""
+            self.summary_tokens = 0
+            self.history_tokens = 0
+            # Resumos pendentes ou em andamento são descartados
+            self._pending.clear()
+            self._summarized = ""
+            self._cleared_generation = self._generation
@@ -1,30 +1,205 @@
+import hashlib
+import re
 import sqlite3
-from datetime import datetime
+import threading
+import zlib
+from datetime import datetime, timedelta
 import os
 
+# Estados possíveis da extração de insights de uma interação
+INSIGHTS_PENDING = "pending"
+INSIGHTS_READY = "ready"
+
+# Colunas retornadas nas consultas de interações completas, na ordem das tuplas
+INTERACTION_FIELDS = (
+    "id", "user_question", "agent_response", "timestamp", "patterns_insights", "insights_status",
+    "prompt_tokens", "completion_tokens", "cached_tokens", "latency_ms", "session_id", "user_id"
+)
+INTERACTION_COLUMNS = ", ".join(INTERACTION_FIELDS)
+
+# Visão das interações com o texto da resposta resolvido a partir de `responses`
+INTERACTIONS_VIEW = "interactions_full"
+
+# Padrão registrado nos insights das perguntas que a base local não soube responder
+UNANSWERED_PATTERN = "pergunta_sem_resposta"
+
+# Registro dos insights extraídos: os campos gravados com a interação pendente
+# (por exemplo, o roteamento da pergunta) são mantidos, mesclados aos extraídos
+_UPDATE_INSIGHTS_SQL = (
+    "UPDATE interactions SET patterns_insights = CASE "
+    "WHEN insights_status = ? AND json_valid(patterns_insights) THEN json_patch(patterns_insights, ?) "
+    "ELSE ? END, insights_status = ? WHERE id = ?"
+)
+
+# Opções do ConnectionManager configuráveis na seção `database` do config.yaml
+CONNECTION_OPTIONS = ("busy_timeout_ms", "synchronous", "cache_size_kb", "mmap_size_mb")
+
+# Tokenizador da busca textual: remove acentos, para que "funcao" encontre "função"
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+# Pesos do bm25 por coluna (pergunta, resposta)
+FTS_WEIGHTS = (2.0, 1.0)
+
+
+class ConnectionManager:
+    """
+    Mantém conexões SQLite de longa duração, uma por thread.
+    
+    Cada thread reutiliza a sua conexão em todas as operações, evitando abrir o
+    arquivo e ler o esquema a cada chamada. As conexões usam o modo WAL (leitores
+    não são bloqueados por escritas de outras sessões), `synchronous=NORMAL`,
+    cache e mmap ampliados e um busy timeout para esperar pelo lock de escrita.
+    Conexões de threads já encerradas são fechadas quando uma nova é aberta.
+    """
+    
+    def __init__(self, db_path, busy_timeout_ms=5000, synchronous="NORMAL",
+                 cache_size_kb=16384, mmap_size_mb=128):
+        """
+        Args:
+            db_path (str): Caminho para o banco de dados SQLite
+            busy_timeout_ms (int): Tempo máximo de espera pelo lock do banco, em milissegundos
+            synchronous (str): Valor do PRAGMA synchronous (OFF, NORMAL, FULL)
+            cache_size_kb (int): Tamanho do cache de páginas de cada conexão, em KiB
+            mmap_size_mb (int): Tamanho máximo do arquivo mapeado em memória, em MiB
+        """
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size_mb = mmap_size_mb
+        self._local = threading.local()
+        self._connections = {}
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        """
+        Abre e configura uma nova conexão para a thread atual.
+        
+        Returns:
+            sqlite3.Connection: Conexão configurada
+        """
+        # A conexão pode ser fechada por outra thread em close(); cada thread só a usa sozinha
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size_mb) * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        register_functions(conn)
+        
+        with self._lock:
+            # Fecha as conexões de threads que já terminaram
+            for thread, old_conn in list(self._connections.values()):
+                if not thread.is_alive():
+                    del self._connections[id(old_conn)]
+                    old_conn.close()
+            self._connections[id(conn)] = (threading.current_thread(), conn)
+        
+        self._local.conn = conn
+        return conn
+    
+    def connection(self):
+        """
+        Retorna a conexão da thread atual, abrindo-a na primeira chamada.
+        
+        Returns:
+            sqlite3.Connection: Conexão da thread atual
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or id(conn) not in self._connections:
+            conn = self._connect()
+        return conn
+    
+    def cursor(self):
+        """
+        Retorna a conexão da thread atual e um novo cursor.
+        
+        Returns:
+            tuple: (conexão, cursor)
+        """
+        conn = self.connection()
+        return conn, conn.cursor()
+    
+    def release(self, conn, cursor):
+        """
+        Encerra uma operação: desfaz a transação se ela não foi confirmada
+        (por exemplo, após um erro) e fecha o cursor. A conexão continua aberta.
+        
+        Args:
+            conn (sqlite3.Connection): Conexão usada na operação
+            cursor (sqlite3.Cursor): Cursor usado na operação
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        finally:
+            cursor.close()
+    
+    def close(self):
+        """
+        Fecha todas as conexões abertas. Novas operações reabrem as conexões.
+        """
+        with self._lock:
+            connections = [conn for _, conn in self._connections.values()]
+            self._connections.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+def connection_options(db_config):
+    """
+    Extrai da seção `database` da configuração as opções do ConnectionManager,
+    para que todos os componentes que abrem o mesmo arquivo usem os mesmos PRAGMAs.
+    
+    Args:
+        db_config (dict): Seção `database` do config.yaml
+    
+    Returns:
+        dict: Opções informadas (busy_timeout_ms, synchronous, cache_size_kb, mmap_size_mb)
+    """
+    return {name: db_config[name] for name in CONNECTION_OPTIONS if name in db_config}
+
+
 class Database:
-    def __init__(self, db_name="prompt_agent.db"):
+    def __init__(self, db_name="prompt_agent.db", compress_min_bytes=512, **connection_options):
         """
         Inicializa a estrutura do banco de dados.
         
         Args:
             db_name (str): Nome do arquivo de banco de dados
+            compress_min_bytes (int, optional): Respostas a partir deste tamanho (em bytes)
+                são armazenadas comprimidas com zlib (None para não comprimir)
+            **connection_options: Opções do ConnectionManager (busy_timeout_ms,
+                synchronous, cache_size_kb, mmap_size_mb)
         """
         self.db_path = db_name
+        self.compress_min_bytes = compress_min_bytes
+        self._connections = ConnectionManager(db_name, **connection_options)
+        # Funções chamadas após cada interação armazenada
+        self._listeners = []
+        # Se a busca textual (FTS5) está disponível nesta versão do SQLite
+        self.fts_enabled = False
+        # Se os insights estruturados (colunas geradas e agregados) estão disponíveis
+        self.insights_rollups_enabled = False
         # Garantir que as tabelas existam
         self._create_tables()
+        self._create_search_index()
+        self._migrate_responses()
+        self._create_insights_tables()
     
     def _get_connection(self):
         """
-        Cria e retorna uma nova conexão com o banco de dados.
-        Esta abordagem garante thread-safety no Streamlit.
+        Retorna a conexão persistente da thread atual e um novo cursor.
+        Cada thread usa a sua própria conexão, o que garante thread-safety no Streamlit.
         
         Returns:
             tuple: (conexão, cursor)
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        return conn, cursor
+        return self._connections.cursor()
     
     def _create_tables(self):
         """
@@ -39,14 +214,268 @@ class Database:
                 user_question TEXT NOT NULL,
                 agent_response TEXT NOT NULL,
                 timestamp DATETIME NOT NULL,
-                patterns_insights TEXT
+                patterns_insights TEXT,
+                insights_status TEXT,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                cached_tokens INTEGER,
+                latency_ms REAL
             )
             ''')
+            self._add_missing_columns(cursor, "interactions", {
+                "insights_status": "TEXT",
+                "prompt_tokens": "INTEGER",
+                "completion_tokens": "INTEGER",
+                "cached_tokens": "INTEGER",
+                "latency_ms": "REAL",
+                "response_id": "INTEGER",
+                "session_id": "TEXT",
+                "user_id": "TEXT"
+            })
+            
+            # Textos das respostas, armazenados uma única vez e referenciados pelo hash
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                id INTEGER PRIMARY KEY,
+                hash BLOB NOT NULL UNIQUE,
+                compressed INTEGER NOT NULL,
+                body BLOB NOT NULL
+            )
+            ''')
+            # Recriada a cada inicialização para acompanhar as colunas da tabela
+            cursor.execute(f"DROP VIEW IF EXISTS {INTERACTIONS_VIEW}")
+            cursor.execute(f"""
+            CREATE VIEW {INTERACTIONS_VIEW} AS
+            SELECT i.id, i.user_question, {_response_sql("i")} AS agent_response, i.timestamp,
+                   i.patterns_insights, i.insights_status, i.prompt_tokens, i.completion_tokens,
+                   i.cached_tokens, i.latency_ms, i.session_id, i.user_id, i.response_id
+            FROM interactions i
+            """)
+            
+            # Índices das consultas por data e das interações com insights pendentes
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions (timestamp, id)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_interactions_pending ON interactions (id) "
+                f"WHERE insights_status = '{INSIGHTS_PENDING}'"
+            )
+            # Referências às respostas (limpeza das órfãs) e interações ainda não migradas
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_interactions_response ON interactions (response_id)")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_interactions_unmigrated ON interactions (id) WHERE response_id IS NULL"
+            )
+            # Turnos de uma sessão e sessões de um usuário, em ordem
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_interactions_session ON interactions (session_id, id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_interactions_user ON interactions (user_id, id)")
+            conn.commit()
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def _create_search_index(self):
+        """
+        Cria o índice de busca textual (FTS5) das interações e os triggers que o
+        mantêm sincronizado com a tabela. Na criação, indexa as interações já
+        existentes. Sem suporte a FTS5, a busca usa LIKE.
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'interactions_fts'")
+            row = cursor.fetchone()
+            exists = row is not None
+            if exists and f"content='{INTERACTIONS_VIEW}'" not in row[0]:
+                # Índice de versões anteriores, sobre a tabela: é recriado sobre a visão
+                for trigger in ("interactions_fts_insert", "interactions_fts_delete", "interactions_fts_update"):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+                cursor.execute("DROP TABLE interactions_fts")
+                exists = False
+            
+            # Tabela de conteúdo externo: o texto é lido da visão das interações
+            cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS interactions_fts USING fts5(
+                user_question,
+                agent_response,
+                content='{INTERACTIONS_VIEW}',
+                content_rowid='id',
+                tokenize='{FTS_TOKENIZER}'
+            )
+            ''')
+            new_response, old_response = _response_sql("new"), _response_sql("old")
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS interactions_fts_insert AFTER INSERT ON interactions BEGIN
+                INSERT INTO interactions_fts (rowid, user_question, agent_response)
+                VALUES (new.id, new.user_question, {new_response});
+            END
+            ''')
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS interactions_fts_delete AFTER DELETE ON interactions BEGIN
+                INSERT INTO interactions_fts (interactions_fts, rowid, user_question, agent_response)
+                VALUES ('delete', old.id, old.user_question, {old_response});
+            END
+            ''')
+            # A migração para `responses` altera agent_response sem mudar o texto: nada a reindexar
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS interactions_fts_update
+            AFTER UPDATE OF user_question, agent_response, response_id ON interactions
+            WHEN new.user_question IS NOT old.user_question OR {new_response} IS NOT {old_response} BEGIN
+                INSERT INTO interactions_fts (interactions_fts, rowid, user_question, agent_response)
+                VALUES ('delete', old.id, old.user_question, {old_response});
+                INSERT INTO interactions_fts (rowid, user_question, agent_response)
+                VALUES (new.id, new.user_question, {new_response});
+            END
+            ''')
+            
+            if not exists:
+                # Migração: indexa as interações armazenadas antes da busca textual
+                cursor.execute("INSERT INTO interactions_fts (interactions_fts) VALUES ('rebuild')")
+                cursor.execute(
+                    "INSERT INTO interactions_fts (interactions_fts, rank) VALUES ('rank', ?)",
+                    (f"bm25({FTS_WEIGHTS[0]}, {FTS_WEIGHTS[1]})",)
+                )
+            conn.commit()
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            print(f"Busca textual (FTS5) indisponível, usando LIKE: {e}")
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def _migrate_responses(self, batch_size=1000):
+        """
+        Migração: move para a tabela `responses` o texto das respostas das
+        interações armazenadas por versões anteriores, em lotes por ID.
+        
+        Args:
+            batch_size (int): Número de interações migradas por transação
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute("SELECT 1 FROM interactions WHERE response_id IS NULL LIMIT 1")
+            if cursor.fetchone() is None:
+                return
+            
+            migrated, after_id = 0, 0
+            while True:
+                cursor.execute(
+                    """SELECT id, agent_response FROM interactions
+                       WHERE id > ? AND response_id IS NULL ORDER BY id LIMIT ?""",
+                    (after_id, batch_size)
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                updates = [(self._store_response(cursor, text), interaction_id) for interaction_id, text in rows]
+                cursor.executemany("UPDATE interactions SET response_id = ?, agent_response = '' WHERE id = ?", updates)
+                conn.commit()
+                migrated += len(rows)
+                after_id = rows[-1][0]
+            print(f"{migrated} respostas migradas para a tabela responses (execute VACUUM para liberar o espaço)")
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def _store_response(self, cursor, text):
+        """
+        Armazena o texto de uma resposta, se ainda não existir, e retorna o seu ID.
+        Deve ser chamada dentro da transação que grava a interação.
+        
+        Args:
+            cursor: Cursor da conexão ativa
+            text (str): Texto da resposta
+        
+        Returns:
+            int: ID da resposta na tabela `responses`
+        """
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).digest()
+        cursor.execute("SELECT id FROM responses WHERE hash = ?", (digest,))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        
+        body, compressed = text, 0
+        if self.compress_min_bytes is not None and len(data) >= self.compress_min_bytes:
+            packed = zlib.compress(data)
+            if len(packed) < len(data):
+                body, compressed = packed, 1
+        cursor.execute(
+            "INSERT OR IGNORE INTO responses (hash, compressed, body) VALUES (?, ?, ?)",
+            (digest, compressed, body)
+        )
+        if cursor.rowcount == 1:
+            return cursor.lastrowid
+        # Inserida por outra conexão entre a consulta e a inserção
+        cursor.execute("SELECT id FROM responses WHERE hash = ?", (digest,))
+        return cursor.fetchone()[0]
+    
+    def _create_insights_tables(self):
+        """
+        Expõe os insights (JSON em `patterns_insights`) em estruturas indexadas:
+        a coluna gerada `category`, a tabela `insight_items` com um registro por
+        padrão ou sugestão de melhoria e os agregados diários por categoria
+        (`insight_category_daily`) e por item (`insight_item_daily`). Tudo é
+        mantido por triggers a cada interação inserida, atualizada ou removida;
+        na criação, as interações existentes são processadas. Enquanto houver
+        uma linha em `insight_rollup_hold` (durante o arquivamento), as remoções
+        não são descontadas dos agregados.
+        """
+        conn, cursor = self._get_connection()
+        try:
+            # Os triggers são criados na mesma transação da migração: sem eles, ela ainda não foi feita
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'interactions_insights_insert'"
+            )
+            exists = cursor.fetchone() is not None
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'insight_rollup_hold'")
+            if exists and cursor.fetchone() is None:
+                # Triggers de versões anteriores, que descontavam dos agregados as interações arquivadas
+                cursor.execute("DROP TRIGGER IF EXISTS interactions_insights_delete")
+                cursor.execute("DROP TRIGGER IF EXISTS insight_items_delete")
+            
+            self._add_missing_columns(cursor, "interactions", {
+                "category": "TEXT GENERATED ALWAYS AS (CASE WHEN json_valid(patterns_insights) "
+                            "THEN json_extract(patterns_insights, '$.category') END) VIRTUAL"
+            })
+            for statement in _INSIGHTS_SCHEMA:
+                cursor.execute(statement)
+            
+            if not exists:
+                # Migração: processa os insights das interações já armazenadas
+                cursor.execute(_insight_items_sql("i", "interactions i, "))
+                cursor.execute(
+                    "INSERT INTO insight_category_daily (day, category, count, unanswered) "
+                    f"SELECT date(i.timestamp), i.category, COUNT(*), SUM({_unanswered_sql('i')}) "
+                    "FROM interactions i WHERE i.category IS NOT NULL GROUP BY 1, 2"
+                )
+            
+            for statement in _insights_triggers():
+                cursor.execute(statement)
             conn.commit()
+            self.insights_rollups_enabled = True
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            print(f"Insights estruturados indisponíveis nesta versão do SQLite: {e}")
         finally:
-            conn.close()
+            self._connections.release(conn, cursor)
+    
+    def _add_missing_columns(self, cursor, table, columns, schema="main"):
+        """
+        Adiciona a uma tabela existente as colunas que ainda não existem,
+        permitindo migrar bancos criados por versões anteriores.
+        
+        Args:
+            cursor: Cursor da conexão ativa
+            table (str): Nome da tabela
+            columns (dict): Mapeamento nome da coluna -> definição SQL
+            schema (str): Banco de dados da tabela (main ou o nome de um banco anexado)
+        """
+        # table_xinfo também lista as colunas geradas
+        cursor.execute(f"PRAGMA {schema}.table_xinfo({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {name} {definition}")
     
-    def store_interaction(self, user_question, agent_response, patterns_insights=None):
+    def store_interaction(self, user_question, agent_response, patterns_insights=None,
+                          insights_status=INSIGHTS_READY, usage=None, session_id=None, user_id=None):
         """
         Armazena uma interação no banco de dados.
         
@@ -54,23 +483,100 @@ class Database:
             user_question (str): Pergunta do usuário
             agent_response (str): Resposta fornecida pelo agente
             patterns_insights (str, optional): Padrões ou insights identificados
+            insights_status (str, optional): Estado da extração de insights
+                (INSIGHTS_READY ou INSIGHTS_PENDING)
+            usage (dict, optional): Uso da chamada ao LLM (prompt_tokens,
+                completion_tokens, cached_tokens e latency_ms)
+            session_id (str, optional): Sessão de conversa da interação
+            user_id (str, optional): Usuário da sessão
         
         Returns:
             int: ID da interação inserida
         """
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return self.store_interactions_many([{
+            "user_question": user_question,
+            "agent_response": agent_response,
+            "patterns_insights": patterns_insights,
+            "insights_status": insights_status,
+            "usage": usage,
+            "session_id": session_id,
+            "user_id": user_id
+        }])[0]
+    
+    def store_interactions_many(self, interactions):
+        """
+        Armazena várias interações em uma única transação.
+        
+        Args:
+            interactions (list): Dicionários com as chaves user_question, agent_response
+                e, opcionalmente, patterns_insights, insights_status, usage, timestamp,
+                session_id e user_id
         
+        Returns:
+            list: IDs das interações inseridas, na mesma ordem
+        """
+        if not interactions:
+            return []
+        
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         conn, cursor = self._get_connection()
         try:
-            cursor.execute(
-                "INSERT INTO interactions (user_question, agent_response, timestamp, patterns_insights) VALUES (?, ?, ?, ?)",
-                (user_question, agent_response, timestamp, patterns_insights)
+            # O texto da resposta fica em `responses`; a interação guarda apenas a referência
+            rows = []
+            for interaction in interactions:
+                usage = interaction.get("usage") or {}
+                rows.append((
+                    interaction["user_question"], self._store_response(cursor, interaction["agent_response"]),
+                    interaction.get("timestamp") or now, interaction.get("patterns_insights"),
+                    interaction.get("insights_status", INSIGHTS_READY),
+                    usage.get("prompt_tokens"), usage.get("completion_tokens"),
+                    usage.get("cached_tokens"), usage.get("latency_ms"),
+                    interaction.get("session_id"), interaction.get("user_id")
+                ))
+            
+            cursor.executemany(
+                """INSERT INTO interactions (user_question, agent_response, response_id, timestamp, patterns_insights,
+                                             insights_status, prompt_tokens, completion_tokens, cached_tokens, latency_ms,
+                                             session_id, user_id)
+                   VALUES (?, '', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows
             )
+            # Na mesma transação, o AUTOINCREMENT atribui IDs consecutivos
+            cursor.execute("SELECT last_insert_rowid()")
+            last_id = cursor.fetchone()[0]
             conn.commit()
-            last_id = cursor.lastrowid
-            return last_id
         finally:
-            conn.close()
+            self._connections.release(conn, cursor)
+        
+        ids = list(range(last_id - len(rows) + 1, last_id + 1))
+        for interaction_id, interaction in zip(ids, interactions):
+            self._notify_listeners(interaction_id, interaction["user_question"], interaction["agent_response"])
+        return ids
+    
+    def add_listener(self, callback):
+        """
+        Registra uma função a ser chamada após cada interação armazenada.
+        
+        Args:
+            callback (callable): Função (id, pergunta, resposta)
+        """
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+    
+    def _notify_listeners(self, interaction_id, user_question, agent_response):
+        """
+        Notifica os listeners registrados sobre uma nova interação.
+        
+        Args:
+            interaction_id (int): ID da interação armazenada
+            user_question (str): Pergunta do usuário
+            agent_response (str): Resposta fornecida pelo agente
+        """
+        for callback in self._listeners:
+            try:
+                callback(interaction_id, user_question, agent_response)
+            except Exception as e:
+                print(f"Erro ao notificar listener da interação {interaction_id}: {e}")
     
     def get_all_interactions(self):
         """
@@ -81,10 +587,135 @@ class Database:
         """
         conn, cursor = self._get_connection()
         try:
-            cursor.execute("SELECT * FROM interactions ORDER BY timestamp DESC")
+            cursor.execute(f"SELECT {INTERACTION_COLUMNS} FROM {INTERACTIONS_VIEW} ORDER BY timestamp DESC, id DESC")
             return cursor.fetchall()
         finally:
-            conn.close()
+            self._connections.release(conn, cursor)
+    
+    def get_recent_interactions(self, limit=5, before_id=None):
+        """
+        Recupera as interações mais recentes, das mais novas às mais antigas,
+        com paginação por chave: para a página seguinte, passe em `before_id` o
+        ID da última interação recebida. O custo depende apenas de `limit`, não
+        do tamanho da tabela.
+        
+        Args:
+            limit (int): Número máximo de interações retornadas
+            before_id (int, optional): Retorna apenas interações com ID menor que este
+        
+        Returns:
+            list: Lista de tuplas contendo as interações
+        """
+        conn, cursor = self._get_connection()
+        try:
+            if before_id is None:
+                cursor.execute(
+                    f"SELECT {INTERACTION_COLUMNS} FROM {INTERACTIONS_VIEW} ORDER BY id DESC LIMIT ?",
+                    (limit,)
+                )
+            else:
+                cursor.execute(
+                    f"SELECT {INTERACTION_COLUMNS} FROM {INTERACTIONS_VIEW} WHERE id < ? ORDER BY id DESC LIMIT ?",
+                    (before_id, limit)
+                )
+            return cursor.fetchall()
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def get_interactions_page(self, after_id=0, limit=1000):
+        """
+        Recupera, em ordem de ID, uma página de interações (paginação por chave).
+        
+        Args:
+            after_id (int): Retorna apenas interações com ID maior que este
+            limit (int): Número máximo de interações retornadas
+        
+        Returns:
+            list: Lista de tuplas (id, pergunta, resposta)
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute(
+                f"SELECT id, user_question, agent_response FROM {INTERACTIONS_VIEW} WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)
+            )
+            return cursor.fetchall()
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def iter_interactions(self, after_id=0, until_id=None, batch_size=1000):
+        """
+        Percorre as interações em ordem de ID, lendo `batch_size` linhas por vez
+        do cursor (memória constante, independentemente do tamanho da tabela).
+        
+        Args:
+            after_id (int): Retorna apenas interações com ID maior que este
+            until_id (int, optional): Retorna apenas interações com ID menor que este
+            batch_size (int): Número de linhas lidas por vez
+        
+        Yields:
+            list: Lotes de tuplas contendo as interações
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute(
+                f"SELECT {INTERACTION_COLUMNS} FROM {INTERACTIONS_VIEW} WHERE id > ? AND id < ? ORDER BY id",
+                (after_id, until_id if until_id is not None else 2 ** 63 - 1)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def get_session_turns(self, session_id, limit=20, before_id=None):
+        """
+        Recupera os turnos mais recentes de uma sessão, com paginação por chave:
+        para a página anterior, passe em `before_id` o menor ID recebido. Lê
+        apenas `limit` linhas pelo índice (session_id, id), qualquer que seja o
+        tamanho da sessão.
+        
+        Args:
+            session_id (str): Sessão de conversa
+            limit (int): Número máximo de turnos retornados
+            before_id (int, optional): Retorna apenas turnos com ID menor que este
+        
+        Returns:
+            list: Tuplas (id, pergunta, resposta, data/hora), dos turnos mais antigos aos mais recentes
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute(
+                f"""SELECT id, user_question, agent_response, timestamp FROM {INTERACTIONS_VIEW}
+                   WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?""",
+                (session_id, before_id if before_id is not None else 2 ** 63 - 1, limit)
+            )
+            return cursor.fetchall()[::-1]
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def get_last_session(self, user_id):
+        """
+        Retorna a sessão da interação mais recente de um usuário.
+        
+        Args:
+            user_id (str): Usuário
+        
+        Returns:
+            str: ID da sessão ou None se o usuário não tiver interações
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute(
+                "SELECT session_id FROM interactions WHERE user_id = ? ORDER BY id DESC LIMIT 1",
+                (user_id,)
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+        finally:
+            self._connections.release(conn, cursor)
     
     def get_interaction_by_id(self, interaction_id):
         """
@@ -98,14 +729,213 @@ class Database:
         """
         conn, cursor = self._get_connection()
         try:
-            cursor.execute("SELECT * FROM interactions WHERE id = ?", (interaction_id,))
+            cursor.execute(f"SELECT {INTERACTION_COLUMNS} FROM {INTERACTIONS_VIEW} WHERE id = ?", (interaction_id,))
             return cursor.fetchone()
         finally:
-            conn.close()
+            self._connections.release(conn, cursor)
+    
+    def update_insights(self, interaction_id, patterns_insights):
+        """
+        Registra os insights de uma interação e a marca como processada (os
+        campos gravados enquanto ela estava pendente são mantidos).
+        
+        Args:
+            interaction_id (int): ID da interação
+            patterns_insights (str): Padrões ou insights identificados (JSON)
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute(
+                _UPDATE_INSIGHTS_SQL,
+                (INSIGHTS_PENDING, patterns_insights, patterns_insights, INSIGHTS_READY, interaction_id)
+            )
+            conn.commit()
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def update_insights_many(self, updates):
+        """
+        Registra os insights de várias interações em uma única transação (os
+        campos gravados enquanto elas estavam pendentes são mantidos).
+        
+        Args:
+            updates (list): Lista de tuplas (id da interação, insights em JSON)
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.executemany(
+                _UPDATE_INSIGHTS_SQL,
+                [
+                    (INSIGHTS_PENDING, patterns_insights, patterns_insights, INSIGHTS_READY, interaction_id)
+                    for interaction_id, patterns_insights in updates
+                ]
+            )
+            conn.commit()
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def get_pending_insights(self, limit=100):
+        """
+        Recupera as interações cujos insights ainda não foram extraídos.
+        
+        Args:
+            limit (int): Número máximo de interações retornadas
+        
+        Returns:
+            list: Lista de tuplas (id, pergunta, resposta), das mais antigas às mais recentes
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute(
+                f"SELECT id, user_question, agent_response FROM {INTERACTIONS_VIEW} WHERE insights_status = ? ORDER BY id LIMIT ?",
+                (INSIGHTS_PENDING, limit)
+            )
+            return cursor.fetchall()
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def get_interactions_missing_insights(self, limit=100, after_id=0):
+        """
+        Recupera, em ordem de ID, as interações pendentes ou sem insights registrados.
+        
+        Args:
+            limit (int): Número máximo de interações retornadas
+            after_id (int): Retorna apenas interações com ID maior que este
+        
+        Returns:
+            list: Lista de tuplas (id, pergunta, resposta)
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute(
+                f"""SELECT id, user_question, agent_response FROM {INTERACTIONS_VIEW}
+                   WHERE id > ? AND (insights_status = ? OR patterns_insights IS NULL)
+                   ORDER BY id LIMIT ?""",
+                (after_id, INSIGHTS_PENDING, limit)
+            )
+            return cursor.fetchall()
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def get_usage_stats(self, since_id=0):
+        """
+        Agrega o uso de tokens e a latência das chamadas ao LLM registradas.
+        
+        Args:
+            since_id (int): Considera apenas interações com ID maior que este
+        
+        Returns:
+            dict: Número de chamadas, tokens de entrada (total e atendidos pelo
+                  cache de prefixo), tokens de saída, fração em cache e latência média
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute(
+                """SELECT COUNT(*), COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(cached_tokens), 0),
+                          COALESCE(SUM(completion_tokens), 0), AVG(latency_ms)
+                   FROM interactions WHERE id > ? AND prompt_tokens IS NOT NULL""",
+                (since_id,)
+            )
+            calls, prompt_tokens, cached_tokens, completion_tokens, avg_latency = cursor.fetchone()
+        finally:
+            self._connections.release(conn, cursor)
+        
+        return {
+            "calls": calls,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_ratio": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+            "avg_latency_ms": avg_latency
+        }
+    
+    def get_top_categories(self, days=7, limit=10):
+        """
+        Retorna as categorias de pergunta mais frequentes no período, a partir
+        dos agregados diários (sem ler o JSON das interações).
+        
+        Args:
+            days (int, optional): Número de dias, incluindo hoje (None para todo o histórico)
+            limit (int): Número máximo de categorias
+        
+        Returns:
+            list: Dicionários com category, count e unanswered, das mais frequentes às menos
+        """
+        if not self.insights_rollups_enabled:
+            return []
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute(
+                """SELECT category, SUM(count), SUM(unanswered) FROM insight_category_daily
+                   WHERE day >= ? GROUP BY category ORDER BY 2 DESC, 1 LIMIT ?""",
+                (_first_day(days), limit)
+            )
+            return [{"category": row[0], "count": row[1], "unanswered": row[2]} for row in cursor.fetchall()]
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def get_top_insight_items(self, kind="pattern", days=7, limit=10, unanswered_only=False):
+        """
+        Retorna os padrões ou sugestões de melhoria mais frequentes no período, a
+        partir dos agregados diários.
+        
+        Args:
+            kind (str): "pattern" para padrões ou "improvement" para sugestões de melhoria
+            days (int, optional): Número de dias, incluindo hoje (None para todo o histórico)
+            limit (int): Número máximo de itens
+            unanswered_only (bool): Se True, conta apenas as perguntas sem resposta
+        
+        Returns:
+            list: Dicionários com value, count e unanswered, dos mais frequentes aos menos
+        """
+        if not self.insights_rollups_enabled:
+            return []
+        conn, cursor = self._get_connection()
+        try:
+            order = 3 if unanswered_only else 2
+            cursor.execute(
+                f"""SELECT value, SUM(count), SUM(unanswered) FROM insight_item_daily
+                   WHERE kind = ? AND day >= ? AND value != ?
+                   GROUP BY value HAVING SUM({'unanswered' if unanswered_only else 'count'}) > 0
+                   ORDER BY {order} DESC, 1 LIMIT ?""",
+                (kind, _first_day(days), UNANSWERED_PATTERN if unanswered_only else "", limit)
+            )
+            return [{"value": row[0], "count": row[1], "unanswered": row[2]} for row in cursor.fetchall()]
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def get_interactions_by_category(self, category, limit=20, before_id=None):
+        """
+        Recupera as interações mais recentes de uma categoria (pelo índice da
+        coluna gerada), com paginação por chave como `get_recent_interactions`.
+        
+        Args:
+            category (str): Categoria da pergunta
+            limit (int): Número máximo de interações retornadas
+            before_id (int, optional): Retorna apenas interações com ID menor que este
+        
+        Returns:
+            list: Lista de tuplas contendo as interações
+        """
+        if not self.insights_rollups_enabled:
+            return []
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute(
+                f"""SELECT {INTERACTION_COLUMNS} FROM {INTERACTIONS_VIEW} WHERE id IN (
+                       SELECT id FROM interactions WHERE category = ? AND id < ? ORDER BY id DESC LIMIT ?
+                   ) ORDER BY id DESC""",
+                (category, before_id if before_id is not None else 2 ** 63 - 1, limit)
+            )
+            return cursor.fetchall()
+        finally:
+            self._connections.release(conn, cursor)
     
     def get_interactions_by_pattern(self, pattern):
         """
-        Busca interações que contenham um padrão específico.
+        Busca interações que contenham um padrão específico. Com a busca textual
+        disponível, o padrão é procurado como expressão (palavras consecutivas,
+        sem diferenciar acentos) e as interações são ordenadas por relevância.
         
         Args:
             pattern (str): Padrão para busca
@@ -114,18 +944,420 @@ class Database:
             list: Lista de interações que contêm o padrão
         """
         conn, cursor = self._get_connection()
+        try:
+            if self.fts_enabled:
+                match = _fts_phrase(pattern)
+                if not match:
+                    return []
+                columns = ", ".join(f"i.{field}" for field in INTERACTION_FIELDS)
+                cursor.execute(
+                    f"""SELECT {columns} FROM interactions_fts f
+                       JOIN {INTERACTIONS_VIEW} i ON i.id = f.rowid
+                       WHERE interactions_fts MATCH ? ORDER BY f.rank""",
+                    (match,)
+                )
+            else:
+                cursor.execute(
+                    f"SELECT {INTERACTION_COLUMNS} FROM {INTERACTIONS_VIEW} WHERE user_question LIKE ? OR agent_response LIKE ?",
+                    (f'%{pattern}%', f'%{pattern}%')
+                )
+            return cursor.fetchall()
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def search_interactions(self, query, limit=20, offset=0, highlight=("**", "**"), snippet_tokens=16):
+        """
+        Busca textual nas perguntas e respostas, ordenada por relevância (bm25,
+        com mais peso para a pergunta). Todas as palavras da consulta devem
+        aparecer; acentos e maiúsculas são ignorados e a última palavra também
+        encontra prefixos ("embed" encontra "embeddings").
+        
+        Args:
+            query (str): Palavras a buscar
+            limit (int): Número máximo de resultados
+            offset (int): Número de resultados a pular (paginação)
+            highlight (tuple): Marcadores de início e fim dos termos encontrados no trecho
+            snippet_tokens (int): Tamanho aproximado do trecho, em tokens
+        
+        Returns:
+            list: Lista de dicionários com id, question, response, timestamp, snippet e score
+                (quanto menor o score, mais relevante)
+        """
+        conn, cursor = self._get_connection()
+        try:
+            if self.fts_enabled:
+                match = _fts_query(query)
+                if not match:
+                    return []
+                cursor.execute(
+                    f"""SELECT i.id, i.user_question, i.agent_response, i.timestamp,
+                              snippet(interactions_fts, -1, ?, ?, '…', ?), f.rank
+                       FROM interactions_fts f
+                       JOIN {INTERACTIONS_VIEW} i ON i.id = f.rowid
+                       WHERE interactions_fts MATCH ?
+                       ORDER BY f.rank LIMIT ? OFFSET ?""",
+                    (highlight[0], highlight[1], snippet_tokens, match, limit, offset)
+                )
+            else:
+                words = _fts_words(query)
+                if not words:
+                    return []
+                conditions = " AND ".join("(user_question LIKE ? OR agent_response LIKE ?)" for _ in words)
+                params = [value for word in words for value in (f"%{word}%", f"%{word}%")]
+                cursor.execute(
+                    f"""SELECT id, user_question, agent_response, timestamp, substr(agent_response, 1, 200), 0
+                       FROM {INTERACTIONS_VIEW} WHERE {conditions}
+                       ORDER BY id DESC LIMIT ? OFFSET ?""",
+                    (*params, limit, offset)
+                )
+            return [
+                {
+                    "id": row[0],
+                    "question": row[1],
+                    "response": row[2],
+                    "timestamp": row[3],
+                    "snippet": row[4],
+                    "score": row[5]
+                }
+                for row in cursor.fetchall()
+            ]
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def archive_interactions(self, before, archive_dir):
+        """
+        Move as interações anteriores a uma data para bancos de arquivo mensais
+        (`interactions_AAAA-MM.db` em `archive_dir`). Cada mês é copiado e
+        confirmado no arquivo antes de ser removido do banco principal, de modo
+        que uma execução interrompida pode ser repetida sem perda nem duplicação.
+        Os agregados diários de insights continuam contando as interações
+        arquivadas, para que os relatórios do período não percam os meses movidos.
+        
+        Args:
+            before (str): Data de corte (AAAA-MM-DD); interações anteriores são arquivadas
+            archive_dir (str): Diretório dos bancos de arquivo
+        
+        Returns:
+            dict: Número de interações arquivadas por mês
+        """
+        os.makedirs(archive_dir, exist_ok=True)
+        conn, cursor = self._get_connection()
+        archived = {}
         try:
             cursor.execute(
-                "SELECT * FROM interactions WHERE user_question LIKE ? OR agent_response LIKE ?",
-                (f'%{pattern}%', f'%{pattern}%')
+                "SELECT DISTINCT strftime('%Y-%m', timestamp) FROM interactions WHERE timestamp < ? ORDER BY 1",
+                (before,)
             )
-            return cursor.fetchall()
+            months = [row[0] for row in cursor.fetchall()]
+            for month in months:
+                condition = "timestamp < ? AND strftime('%Y-%m', timestamp) = ?"
+                cursor.execute("ATTACH DATABASE ? AS archive",
+                               (os.path.join(archive_dir, f"interactions_{month}.db"),))
+                try:
+                    cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS archive.interactions (
+                        id INTEGER PRIMARY KEY,
+                        user_question TEXT NOT NULL,
+                        agent_response TEXT NOT NULL,
+                        timestamp DATETIME NOT NULL,
+                        patterns_insights TEXT,
+                        insights_status TEXT,
+                        prompt_tokens INTEGER,
+                        completion_tokens INTEGER,
+                        cached_tokens INTEGER,
+                        latency_ms REAL,
+                        session_id TEXT,
+                        user_id TEXT
+                    )
+                    ''')
+                    # Arquivos criados por versões anteriores
+                    self._add_missing_columns(cursor, "interactions", {
+                        "session_id": "TEXT",
+                        "user_id": "TEXT"
+                    }, schema="archive")
+                    cursor.execute(
+                        f"""INSERT OR IGNORE INTO archive.interactions ({INTERACTION_COLUMNS})
+                           SELECT {INTERACTION_COLUMNS} FROM main.{INTERACTIONS_VIEW} WHERE {condition}""",
+                        (before, month)
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    cursor.execute("DETACH DATABASE archive")
+                
+                if self.insights_rollups_enabled:
+                    cursor.execute("INSERT INTO insight_rollup_hold (reason) VALUES ('archive')")
+                cursor.execute(f"DELETE FROM interactions WHERE {condition}", (before, month))
+                archived[month] = cursor.rowcount
+                if self.insights_rollups_enabled:
+                    cursor.execute("DELETE FROM insight_rollup_hold")
+                conn.commit()
+            
+            if archived:
+                # Remove as respostas que não são mais referenciadas por nenhuma interação
+                cursor.execute(
+                    """DELETE FROM responses WHERE NOT EXISTS (
+                           SELECT 1 FROM interactions WHERE interactions.response_id = responses.id
+                       )"""
+                )
+                conn.commit()
         finally:
-            conn.close()
+            self._connections.release(conn, cursor)
+        return archived
+    
+    def vacuum(self):
+        """
+        Reconstrói o arquivo do banco de dados, devolvendo ao sistema o espaço
+        das linhas removidas, e esvazia o arquivo WAL.
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute("VACUUM")
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            self._connections.release(conn, cursor)
     
     def close(self):
         """
-        Método mantido para compatibilidade com o código existente.
-        Não faz nada, pois cada operação gerencia sua própria conexão.
+        Fecha as conexões abertas com o banco de dados.
         """
-        pass 
\ No newline at end of file
+        self._connections.close() 
+
+
+def register_functions(conn):
+    """
+    Registra em uma conexão as funções SQL usadas pelo esquema (a visão das
+    interações e os triggers da busca textual leem as respostas comprimidas
+    com `zlib_decompress`). Conexões abertas fora do ConnectionManager
+    precisam chamá-la antes de ler ou gravar interações.
+    
+    Args:
+        conn (sqlite3.Connection): Conexão a configurar
+    """
+    conn.create_function("zlib_decompress", 1, _zlib_decompress, deterministic=True)
+
+
+def _zlib_decompress(body):
+    """
+    Função SQL `zlib_decompress`: descomprime o texto de uma resposta.
+    
+    Args:
+        body (bytes): Texto comprimido com zlib
+    
+    Returns:
+        str: Texto da resposta
+    """
+    return zlib.decompress(body).decode("utf-8") if body is not None else None
+
+
+def _response_sql(row):
+    """
+    Expressão SQL com o texto da resposta da interação `row`, lido de
+    `responses` (ou da própria linha, se ainda não migrada).
+    
+    Args:
+        row (str): Nome ou apelido da linha de `interactions` (new, old, i...)
+    
+    Returns:
+        str: Expressão SQL
+    """
+    return (
+        "COALESCE((SELECT CASE WHEN r.compressed THEN zlib_decompress(r.body) ELSE r.body END "
+        f"FROM responses r WHERE r.id = {row}.response_id), {row}.agent_response)"
+    )
+
+
+def _first_day(days):
+    """
+    Retorna o primeiro dia de um período que termina hoje, no formato dos agregados.
+    
+    Args:
+        days (int, optional): Número de dias, incluindo hoje (None para todo o histórico)
+    
+    Returns:
+        str: Data no formato AAAA-MM-DD
+    """
+    if days is None:
+        return ""
+    return (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+
+
+def _fts_words(text):
+    """
+    Separa o texto em palavras, descartando a pontuação e os operadores da
+    sintaxe de consulta do FTS5.
+    
+    Args:
+        text (str): Texto digitado pelo usuário
+    
+    Returns:
+        list: Palavras do texto
+    """
+    return re.findall(r"\w+", text or "")
+
+
+def _fts_query(text):
+    """
+    Monta uma consulta FTS5 segura em que todas as palavras devem aparecer e a
+    última também corresponde a prefixos.
+    
+    Args:
+        text (str): Texto digitado pelo usuário
+    
+    Returns:
+        str: Consulta FTS5 (vazia se o texto não tiver palavras)
+    """
+    words = [f'"{word}"' for word in _fts_words(text)]
+    if words:
+        words[-1] += "*"
+    return " ".join(words)
+
+
+def _fts_phrase(text):
+    """
+    Monta uma consulta FTS5 segura que procura as palavras do texto em sequência.
+    
+    Args:
+        text (str): Texto digitado pelo usuário
+    
+    Returns:
+        str: Consulta FTS5 (vazia se o texto não tiver palavras)
+    """
+    words = _fts_words(text)
+    return '"' + " ".join(words) + '"' if words else ""
+
+
+# Tabelas e triggers dos insights estruturados (ver Database._create_insights_tables)
+_INSIGHTS_SCHEMA = (
+    "CREATE INDEX IF NOT EXISTS idx_interactions_category ON interactions (category, id)",
+    '''
+    CREATE TABLE IF NOT EXISTS insight_items (
+        interaction_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        value TEXT NOT NULL,
+        day TEXT NOT NULL,
+        unanswered INTEGER NOT NULL,
+        PRIMARY KEY (interaction_id, kind, value)
+    ) WITHOUT ROWID
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_insight_items_value ON insight_items (kind, value)",
+    # Linha presente apenas dentro da transação do arquivamento
+    "CREATE TABLE IF NOT EXISTS insight_rollup_hold (reason TEXT NOT NULL)",
+    '''
+    CREATE TABLE IF NOT EXISTS insight_category_daily (
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        unanswered INTEGER NOT NULL,
+        PRIMARY KEY (day, category)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS insight_item_daily (
+        day TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        value TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        unanswered INTEGER NOT NULL,
+        PRIMARY KEY (day, kind, value)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS insight_items_insert AFTER INSERT ON insight_items BEGIN
+        INSERT INTO insight_item_daily (day, kind, value, count, unanswered)
+        VALUES (new.day, new.kind, new.value, 1, new.unanswered)
+        ON CONFLICT (day, kind, value) DO UPDATE
+        SET count = count + 1, unanswered = unanswered + excluded.unanswered;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS insight_items_delete AFTER DELETE ON insight_items
+    WHEN NOT EXISTS (SELECT 1 FROM insight_rollup_hold) BEGIN
+        UPDATE insight_item_daily SET count = count - 1, unanswered = unanswered - old.unanswered
+        WHERE day = old.day AND kind = old.kind AND value = old.value;
+        DELETE FROM insight_item_daily
+        WHERE day = old.day AND kind = old.kind AND value = old.value AND count <= 0;
+    END
+    '''
+)
+
+
+def _unanswered_sql(row):
+    """
+    Expressão SQL que indica se a interação `row` é uma pergunta sem resposta.
+    
+    Args:
+        row (str): Nome ou apelido da linha de `interactions` (new, old, i...)
+    
+    Returns:
+        str: Expressão SQL (1 ou 0)
+    """
+    return (
+        f"EXISTS (SELECT 1 FROM json_each({row}.patterns_insights, '$.patterns') "
+        f"WHERE value = '{UNANSWERED_PATTERN}')"
+    )
+
+
+def _insight_items_sql(row, source=""):
+    """
+    Comando que insere em `insight_items` os padrões e sugestões de melhoria
+    dos insights da interação `row`.
+    
+    Args:
+        row (str): Nome ou apelido da linha de `interactions`
+        source (str): Tabelas adicionais do FROM (para processar várias interações)
+    
+    Returns:
+        str: Comando SQL
+    """
+    return (
+        "INSERT OR IGNORE INTO insight_items (interaction_id, kind, value, day, unanswered) "
+        f"SELECT {row}.id, k.kind, CAST(j.value AS TEXT), date({row}.timestamp), {_unanswered_sql(row)} "
+        f"FROM {source}(SELECT 'pattern' AS kind, '$.patterns' AS path "
+        "UNION ALL SELECT 'improvement', '$.possible_improvements') k, "
+        f"json_each({row}.patterns_insights, k.path) j "
+        f"WHERE json_valid({row}.patterns_insights) AND j.type = 'text'"
+    )
+
+
+def _insights_triggers():
+    """
+    Triggers que mantêm os insights estruturados a cada interação inserida,
+    atualizada ou removida.
+    
+    Returns:
+        list: Comandos CREATE TRIGGER
+    """
+    add_category = (
+        "INSERT INTO insight_category_daily (day, category, count, unanswered) "
+        f"SELECT date(new.timestamp), new.category, 1, {_unanswered_sql('new')} "
+        "WHERE new.category IS NOT NULL "
+        "ON CONFLICT (day, category) DO UPDATE "
+        "SET count = count + 1, unanswered = unanswered + excluded.unanswered"
+    )
+    remove_category = (
+        f"UPDATE insight_category_daily SET count = count - 1, unanswered = unanswered - {_unanswered_sql('old')} "
+        "WHERE day = date(old.timestamp) AND category = old.category "
+        "AND NOT EXISTS (SELECT 1 FROM insight_rollup_hold); "
+        "DELETE FROM insight_category_daily "
+        "WHERE day = date(old.timestamp) AND category = old.category AND count <= 0"
+    )
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS interactions_insights_insert AFTER INSERT ON interactions BEGIN
+            {_insight_items_sql("new")};
+            {add_category};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS interactions_insights_update
+        AFTER UPDATE OF patterns_insights, timestamp ON interactions BEGIN
+            DELETE FROM insight_items WHERE interaction_id = old.id;
+            {remove_category};
+            {_insight_items_sql("new")};
+            {add_category};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS interactions_insights_delete AFTER DELETE ON interactions BEGIN
+            DELETE FROM insight_items WHERE interaction_id = old.id;
+            {remove_category};
+        END"""
+    ]
@@ -0,0 +1,560 @@
+import bisect
+import heapq
+import math
+from collections import defaultdict
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from index_store import Postings, StringTable, Vocabulary
+from retrieval import BM25Index, TrigramIndex, search_fields
+
+# Versão da indexação: incrementada quando muda o conteúdo dos índices, para invalidar snapshots antigos
+INDEX_VERSION = 3
+
+# Fração mínima das palavras de uma FAQ que precisam aparecer na pergunta
+MIN_WORD_OVERLAP = 0.7
+
+# Tamanho dos n-gramas de caracteres usados para achar trechos de palavras no vocabulário
+GRAM_SIZE = 3
+
+# Similaridade mínima (trigramas dos radicais, sem acentos) para aceitar uma
+# FAQ quando a pergunta não tem correspondência exata nem por palavras-chave
+FUZZY_MIN_SIMILARITY = 0.75
+
+# Número mínimo de palavras da pergunta para a busca por similaridade
+# (perguntas curtas demais casam por acaso com qualquer FAQ parecida)
+FUZZY_MIN_WORDS = 3
+
+# Peso da pontuação das respostas em relação à das perguntas na busca ranqueada
+ANSWER_WEIGHT = 0.3
+
+
+class FaqIndex:
+    """
+    Índice das FAQs da base de conhecimento. Cada pergunta (normalizada)
+    recebe um ID na ordem de inserção, que é a ordem de desempate da busca:
+    
+    - `_keys`: pergunta <-> ID; `_answers`: resposta de cada ID
+    - `_key_words`: IDs das palavras de cada pergunta, calculados uma única vez
+    - `_starts` / `_start_lengths`: trigrama inicial -> tamanhos distintos das
+      perguntas que começam por ele, em ordem crescente (`_short_key_lengths`
+      para as perguntas com menos de GRAM_SIZE caracteres)
+    - `_words` / `_postings`: palavra <-> ID e palavra -> IDs das perguntas que
+      a contêm, em ordem crescente
+    - `_overlap_postings`: palavra -> IDs das perguntas indexadas por ela na busca
+      por palavras-chave (apenas as palavras mais raras de cada pergunta)
+    - `_grams` / `_gram_words`: trigrama -> palavras do vocabulário que o contêm
+    - `_question_index` / `_answer_index`: índices BM25 das perguntas e das
+      respostas (sem acentos, sem stopwords e reduzidas aos radicais), para
+      a busca ranqueada
+    - `_fuzzy_index`: trigramas dos radicais das perguntas, para a busca
+      tolerante a acentos e erros de digitação
+    - `_removed`: IDs das perguntas removidas; elas continuam nas estruturas
+      acima e são descartadas na busca (uma pergunta incluída de novo volta
+      com o mesmo ID)
+    
+    Todas as estruturas são arrays (tabelas de textos e listas em formato
+    CSR) exportáveis com `arrays` e recriadas sem reprocessar os textos com
+    `from_arrays`, inclusive sobre um snapshot mapeado em memória; as FAQs
+    adicionadas depois ficam em estruturas em memória consultadas junto com as da base.
+    """
+    
+    def __init__(self):
+        """
+        Inicializa um índice vazio.
+        """
+        self._keys = Vocabulary()
+        self._answers_base = StringTable.build([], hashed=False)
+        self._answers: Dict[int, str] = {}
+        self._key_words = Postings(np.int32)
+        self._starts = Vocabulary()
+        self._start_lengths = Postings(np.int32)
+        self._short_key_lengths: List[int] = []
+        self._words = Vocabulary()
+        self._postings = Postings(np.int32)
+        self._overlap_postings = Postings(np.int32)
+        self._wordless_ids: List[int] = []
+        self._grams = Vocabulary()
+        self._gram_words = Postings(np.int32)
+        self._question_index = BM25Index()
+        self._answer_index = BM25Index()
+        self._fuzzy_index = TrigramIndex()
+        self._removed: Set[int] = set()
+    
+    @classmethod
+    def build(cls, faqs: Mapping[str, str]) -> "FaqIndex":
+        """
+        Constrói o índice de uma coleção de FAQs de uma vez.
+        
+        Args:
+            faqs (Mapping[str, str]): Perguntas normalizadas e respostas, na ordem de inserção
+        
+        Returns:
+            FaqIndex: Índice com todas as FAQs na base (em arrays)
+        """
+        index = cls()
+        
+        # Frequência de cada palavra em toda a base, para escolher as mais raras de cada pergunta
+        document_frequency = defaultdict(int)
+        for key in faqs:
+            for word in set(key.split()):
+                document_frequency[word] += 1
+        
+        for key, answer in faqs.items():
+            index._index_key(key, answer, document_frequency, merge=False)
+        return cls.from_arrays(index.arrays())
+    
+    def __len__(self) -> int:
+        return len(self._keys) - len(self._removed)
+    
+    @property
+    def removed(self) -> int:
+        """
+        Número de perguntas removidas que ainda ocupam espaço no índice.
+        """
+        return len(self._removed)
+    
+    def key(self, key_id: int) -> str:
+        """
+        Retorna a pergunta normalizada de um ID.
+        """
+        return self._keys[key_id]
+    
+    def answer(self, key_id: int) -> str:
+        """
+        Retorna a resposta atual de um ID.
+        """
+        answer = self._answers.get(key_id)
+        return answer if answer is not None else self._answers_base[key_id]
+    
+    def get(self, key: str) -> Optional[int]:
+        """
+        Retorna o ID de uma pergunta normalizada, ou None se ela não estiver no índice.
+        """
+        key_id = self._keys.get(key)
+        return key_id if key_id not in self._removed else None
+    
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """
+        Percorre as FAQs (pergunta, resposta) na ordem de inserção.
+        """
+        for key_id in range(len(self._keys)):
+            if key_id not in self._removed:
+                yield self._keys[key_id], self.answer(key_id)
+    
+    def add(self, key: str, answer: str):
+        """
+        Adiciona uma FAQ ao índice. Uma pergunta já existente mantém o seu ID
+        (e a sua posição no desempate) e tem apenas a resposta substituída; uma
+        pergunta removida volta com o ID que tinha.
+        
+        Args:
+            key (str): Pergunta normalizada
+            answer (str): Resposta
+        """
+        key_id = self._keys.get(key)
+        if key_id is None:
+            self._index_key(key, answer)
+            return
+        if key_id in self._removed:
+            self._removed.discard(key_id)
+            self._question_index.add(key_id, key)
+            self._fuzzy_index.restore(key_id)
+        self._answers[key_id] = answer
+        self._answer_index.add(key_id, answer)
+    
+    def remove(self, key: str) -> bool:
+        """
+        Remove uma FAQ do índice, sem reconstruí-lo: o ID fica marcado como
+        removido e sai dos índices BM25 e de similaridade.
+        
+        Args:
+            key (str): Pergunta normalizada
+        
+        Returns:
+            bool: True se a pergunta estava no índice
+        """
+        key_id = self.get(key)
+        if key_id is None:
+            return False
+        self._removed.add(key_id)
+        self._question_index.remove(key_id)
+        self._answer_index.remove(key_id)
+        self._fuzzy_index.remove(key_id)
+        return True
+    
+    def _index_key(self, key: str, answer: str,
+                   document_frequency: Optional[Mapping[str, int]] = None, merge: bool = True):
+        """
+        Adiciona uma pergunta nova ao índice com o próximo ID.
+        
+        Args:
+            key (str): Pergunta normalizada
+            answer (str): Resposta
+            document_frequency (Mapping[str, int], optional): Número de perguntas
+                em que cada palavra aparece (padrão: as frequências atuais do índice)
+            merge (bool): Se False, adia a reconstrução dos índices BM25 (carga em lote)
+        """
+        key_id = self._keys.add(key)
+        self._answers[key_id] = answer
+        words = frozenset(key.split())
+        self._question_index.add(key_id, key, merge)
+        self._answer_index.add(key_id, answer, merge)
+        self._fuzzy_index.add(key_id, key)
+        if len(key) >= GRAM_SIZE:
+            self._start_lengths.insert_sorted(self._starts.add(key[:GRAM_SIZE]), len(key))
+        elif key:
+            _insert_sorted(self._short_key_lengths, len(key))
+        
+        word_ids = {}
+        for word in words:
+            word_id = self._words.get(word)
+            if word_id is None:
+                word_id = self._words.add(word)
+                for gram in _grams(word):
+                    self._gram_words.append(self._grams.add(gram), word_id)
+            self._postings.append(word_id, key_id)
+            word_ids[word] = word_id
+        self._key_words.extend(key_id, sorted(word_ids.values()))
+        
+        # Sem palavras, a pergunta atende a qualquer busca por palavras-chave
+        if not words:
+            self._wordless_ids.append(key_id)
+            return
+        
+        # A pergunta precisa de `required` palavras em comum com a busca; qualquer
+        # conjunto de len(words) - required + 1 palavras dela contém pelo menos uma
+        # dessas, então basta indexá-la pelas mais raras
+        if document_frequency is None:
+            document_frequency = {word: self._postings.size(word_ids[word]) for word in words}
+        required = math.ceil(MIN_WORD_OVERLAP * len(words))
+        rarest = sorted(words, key=lambda word: (document_frequency[word], word))
+        for word in rarest[:len(words) - required + 1]:
+            self._overlap_postings.append(word_ids[word], key_id)
+    
+    def find(self, question: str) -> Optional[int]:
+        """
+        Busca a FAQ que responde à pergunta: a primeira, na ordem de inserção,
+        que contém a pergunta ou está contida nela; senão, a primeira com
+        palavras-chave suficientes em comum; senão, a mais parecida.
+        
+        Args:
+            question (str): Pergunta normalizada
+        
+        Returns:
+            int: ID da FAQ encontrada ou None
+        """
+        key_id = self.find_direct(question)
+        if key_id is None:
+            key_id = self.find_similar(question)
+        return key_id
+    
+    def find_direct(self, question: str) -> Optional[int]:
+        """
+        Busca a FAQ que responde à pergunta sem a busca por similaridade: a
+        primeira que contém a pergunta ou está contida nela; senão, a primeira
+        com palavras-chave suficientes em comum.
+        
+        Args:
+            question (str): Pergunta normalizada
+        
+        Returns:
+            int: ID da FAQ encontrada ou None
+        """
+        if not len(self):
+            return None
+        matches = [
+            key_id
+            for key_id in (self._find_key_in_question(question), self._find_question_in_key(question))
+            if key_id is not None
+        ]
+        return min(matches) if matches else self._find_by_keywords(question)
+    
+    def find_similar(self, question: str) -> Optional[int]:
+        """
+        Busca a FAQ mais parecida com a pergunta, sem acentos e tolerando
+        flexões e erros de digitação (similaridade mínima FUZZY_MIN_SIMILARITY,
+        apenas para perguntas com pelo menos FUZZY_MIN_WORDS palavras).
+        
+        Args:
+            question (str): Pergunta normalizada
+        
+        Returns:
+            int: ID da FAQ encontrada ou None
+        """
+        if len(question.split()) < FUZZY_MIN_WORDS:
+            return None
+        similar = self._fuzzy_index.search(question, FUZZY_MIN_SIMILARITY)
+        return similar[0][0] if similar else None
+    
+    def similarity(self, question: str, key_id: int) -> float:
+        """
+        Calcula a similaridade de trigramas (a mesma da busca por similaridade)
+        entre a pergunta e uma FAQ.
+        
+        Args:
+            question (str): Pergunta normalizada
+            key_id (int): ID da FAQ
+        
+        Returns:
+            float: Similaridade (0 a 1; 0 se a FAQ foi removida)
+        """
+        if key_id in self._removed:
+            return 0.0
+        return self._fuzzy_index.similarity(question, key_id)
+    
+    def _find_key_in_question(self, question: str) -> Optional[int]:
+        """
+        Busca a primeira FAQ cuja pergunta é um trecho da pergunta do usuário.
+        Em cada posição, só são consultados no índice os trechos com o tamanho
+        de alguma FAQ que começa pelo trigrama daquela posição.
+        
+        Args:
+            question (str): Pergunta normalizada
+        
+        Returns:
+            int: ID da FAQ encontrada ou None
+        """
+        # Trechos da pergunta com o tamanho de alguma FAQ que começa na mesma posição
+        short = self._short_key_lengths
+        start_ids = self._starts.find_many([question[start:start + GRAM_SIZE]
+                                            for start in range(len(question) - GRAM_SIZE + 1)]).tolist()
+        fragments = [""]
+        for start in range(len(question)):
+            start_id = start_ids[start] if start < len(start_ids) else -1
+            if start_id < 0 and not short:
+                continue
+            groups = (short,) + (self._start_lengths.parts(start_id) if start_id >= 0 else ())
+            for lengths in groups:
+                for length in lengths:
+                    if start + length > len(question):
+                        break
+                    fragments.append(question[start:start + length])
+        
+        # A pergunta vazia está contida em qualquer pergunta
+        key_ids = self._keys.find_many(fragments)
+        key_ids = key_ids[key_ids >= 0]
+        if self._removed:
+            key_ids = [key_id for key_id in key_ids.tolist() if key_id not in self._removed]
+        return int(min(key_ids)) if len(key_ids) else None
+    
+    def _find_question_in_key(self, question: str) -> Optional[int]:
+        """
+        Busca a primeira FAQ que contém a pergunta do usuário. As palavras
+        internas da pergunta aparecem inteiras na FAQ e a primeira e a última
+        aparecem como trecho de alguma palavra (podem estar cortadas nas bordas):
+        só são verificadas as FAQs do filtro mais seletivo entre esses.
+        
+        Args:
+            question (str): Pergunta normalizada
+        
+        Returns:
+            int: ID da FAQ encontrada ou None
+        """
+        removed = self._removed
+        if not question:
+            return next((key_id for key_id in range(len(self._keys)) if key_id not in removed), None)
+        
+        words = question.split()
+        interior = (self._word_postings(word) for word in words[1:-1])
+        candidates = [min(interior, key=len, default=range(len(self._keys)))]
+        cost = len(candidates[0])
+        for word in set(words[:1] + words[-1:]):
+            if not cost:
+                break
+            vocabulary = self._words_containing(word, cost)
+            if vocabulary is None:
+                continue
+            postings = [self._postings.get(word_id) for word_id in vocabulary]
+            if sum(map(len, postings)) < cost:
+                candidates, cost = postings, sum(map(len, postings))
+        candidates = [postings.tolist() if isinstance(postings, np.ndarray) else postings for postings in candidates]
+        return next((key_id for key_id in heapq.merge(*candidates)
+                     if key_id not in removed and question in self._keys[key_id]), None)
+    
+    def _word_postings(self, word: str) -> np.ndarray:
+        """
+        Retorna os IDs das perguntas que contêm a palavra, em ordem crescente.
+        """
+        word_id = self._words.get(word)
+        return self._postings.get(word_id) if word_id is not None else np.zeros(0, dtype=np.int32)
+    
+    def _words_containing(self, fragment: str, limit: int) -> Optional[List[int]]:
+        """
+        Retorna as palavras do vocabulário que contêm o trecho, a partir do
+        trigrama do trecho com menos palavras.
+        
+        Args:
+            fragment (str): Trecho de palavra
+            limit (int): Número máximo de palavras a verificar
+        
+        Returns:
+            list: IDs das palavras que contêm o trecho, ou None se o trecho for
+                curto demais para o índice ou pouco seletivo (mais de `limit` palavras)
+        """
+        grams = _grams(fragment)
+        if not grams:
+            return None
+        gram_ids = [self._grams.get(gram) for gram in grams]
+        if None in gram_ids:
+            return []
+        words = min((self._gram_words.get(gram_id) for gram_id in gram_ids), key=len)
+        if len(words) > limit:
+            return None
+        return [word_id for word_id in words.tolist() if fragment in self._words[word_id]]
+    
+    def _find_by_keywords(self, question: str) -> Optional[int]:
+        """
+        Busca a primeira FAQ com pelo menos MIN_WORD_OVERLAP das suas palavras
+        na pergunta do usuário. Só são verificadas as FAQs indexadas por alguma
+        palavra da pergunta, em ordem crescente de ID.
+        
+        Args:
+            question (str): Pergunta normalizada
+        
+        Returns:
+            int: ID da FAQ encontrada ou None
+        """
+        question_words = {word_id for word_id in map(self._words.get, set(question.split())) if word_id is not None}
+        removed = self._removed
+        best = next((key_id for key_id in self._wordless_ids if key_id not in removed), None)
+        
+        candidates = heapq.merge(*(self._overlap_postings.get(word_id).tolist() for word_id in question_words))
+        for key_id in candidates:
+            if best is not None and key_id >= best:
+                break
+            if key_id in removed:
+                continue
+            key_words = self._key_words.get(key_id).tolist()
+            if len(question_words.intersection(key_words)) >= MIN_WORD_OVERLAP * len(key_words):
+                return key_id
+        return best
+    
+    def query_many(self, questions: Sequence[str], k: int = 5) -> List[List[Tuple[int, float, float]]]:
+        """
+        Busca as FAQs mais relevantes para várias perguntas, ranqueadas por
+        BM25 (a pontuação das respostas entra com peso ANSWER_WEIGHT) e
+        pontuadas de uma só vez (uma passada vetorizada por índice).
+        
+        Args:
+            questions (Sequence[str]): Perguntas dos usuários
+            k (int): Número máximo de resultados por pergunta
+        
+        Returns:
+            list: Para cada pergunta, triplas (ID, pontuação BM25, confiança de 0 a 1),
+                  da mais à menos relevante
+        """
+        fields = [(self._question_index, 1.0), (self._answer_index, ANSWER_WEIGHT)]
+        results = []
+        for question, matches in zip(questions, search_fields(fields, questions, len(self._keys), k)):
+            confidences = self._question_index.similarities(question, [key_id for key_id, _ in matches])
+            results.append([(key_id, score, confidence) for (key_id, score), confidence in zip(matches, confidences)])
+        return results
+    
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Exporta o índice inteiro (base, FAQs adicionadas e removidas) em
+        arrays, para gravação em snapshot.
+        
+        Returns:
+            Dict[str, np.ndarray]: Arrays do índice por nome
+        """
+        answers = self._answers_base
+        if self._answers:
+            answers = StringTable.build([self.answer(key_id) for key_id in range(len(self._keys))], hashed=False)
+        
+        # Tamanhos da base e adicionados depois, reunidos em uma única lista ordenada
+        start_lengths = Postings(np.int32)
+        for start_id in range(len(self._starts)):
+            base, extra = self._start_lengths.parts(start_id)
+            start_lengths.extend(start_id, sorted(set(base).union(extra)))
+        
+        arrays = {
+            "short_key_lengths": np.asarray(self._short_key_lengths, dtype=np.int32),
+            "wordless_ids": np.asarray(self._wordless_ids, dtype=np.int32),
+            "removed_ids": np.asarray(sorted(self._removed), dtype=np.int32)
+        }
+        arrays.update(self._keys.arrays("keys"))
+        arrays.update(answers.arrays("answers"))
+        arrays.update(self._key_words.arrays("key_words"))
+        arrays.update(self._starts.arrays("starts"))
+        arrays.update(start_lengths.arrays("start_lengths"))
+        arrays.update(self._words.arrays("words"))
+        arrays.update(self._postings.arrays("postings"))
+        arrays.update(self._overlap_postings.arrays("overlap_postings"))
+        arrays.update(self._grams.arrays("grams"))
+        arrays.update(self._gram_words.arrays("gram_words"))
+        arrays.update(self._question_index.arrays("question_index"))
+        arrays.update(self._answer_index.arrays("answer_index"))
+        arrays.update(self._fuzzy_index.arrays("fuzzy_index"))
+        return arrays
+    
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray]) -> "FaqIndex":
+        """
+        Recria um índice exportado por `arrays`, sem reprocessar os textos (os
+        arrays são usados diretamente, sem cópia, exceto os pequenos ou
+        alterados por FAQs adicionadas).
+        
+        Args:
+            arrays (Mapping[str, np.ndarray]): Arrays do índice por nome
+        
+        Returns:
+            FaqIndex: Índice recriado
+        """
+        index = cls()
+        index._keys = Vocabulary.from_arrays(arrays, "keys")
+        index._answers_base = StringTable.from_arrays(arrays, "answers", hashed=False)
+        index._key_words = Postings.from_arrays(arrays, "key_words")
+        index._starts = Vocabulary.from_arrays(arrays, "starts")
+        index._start_lengths = Postings.from_arrays(arrays, "start_lengths")
+        index._short_key_lengths = arrays["short_key_lengths"].tolist()
+        index._words = Vocabulary.from_arrays(arrays, "words")
+        index._postings = Postings.from_arrays(arrays, "postings")
+        index._overlap_postings = Postings.from_arrays(arrays, "overlap_postings")
+        index._wordless_ids = arrays["wordless_ids"].tolist()
+        index._removed = set(arrays["removed_ids"].tolist())
+        index._grams = Vocabulary.from_arrays(arrays, "grams")
+        index._gram_words = Postings.from_arrays(arrays, "gram_words")
+        index._question_index = BM25Index.from_arrays(arrays, "question_index")
+        index._answer_index = BM25Index.from_arrays(arrays, "answer_index")
+        index._fuzzy_index = TrigramIndex.from_arrays(arrays, "fuzzy_index")
+        return index
+
+
+def index_parameters() -> Dict[str, object]:
+    """
+    Retorna os parâmetros que determinam o conteúdo do índice; um snapshot
+    gravado com parâmetros diferentes precisa ser reconstruído.
+    
+    Returns:
+        dict: Parâmetros da indexação
+    """
+    return {"version": INDEX_VERSION, "gram_size": GRAM_SIZE, "min_word_overlap": MIN_WORD_OVERLAP}
+
+
+def _grams(word: str) -> set:
+    """
+    Retorna os n-gramas de caracteres (de tamanho GRAM_SIZE) de uma palavra.
+    
+    Args:
+        word (str): Palavra
+    
+    Returns:
+        set: N-gramas da palavra
+    """
+    return {word[i:i + GRAM_SIZE] for i in range(len(word) - GRAM_SIZE + 1)}
+
+
+def _insert_sorted(values: list, value):
+    """
+    Insere um valor em uma lista ordenada, se ainda não estiver nela.
+    
+    Args:
+        values (list): Lista em ordem crescente
+        value: Valor a inserir
+    """
+    position = bisect.bisect_left(values, value)
+    if position == len(values) or values[position] != value:
+        values.insert(position, value)
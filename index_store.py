@@ -0,0 +1,502 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+import zlib
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Identificação e versão do formato dos arquivos de snapshot
+SNAPSHOT_MAGIC = b"PAIDX001"
+
+# Alinhamento (bytes) de cada array dentro do snapshot
+SNAPSHOT_ALIGNMENT = 64
+
+
+class StringTable:
+    """
+    Tabela imutável de textos: os textos em UTF-8 concatenados em um único
+    array de bytes, com o deslocamento de cada um, e (opcionalmente) uma
+    tabela hash de endereçamento aberto (CRC32, sondagem linear) para achar o
+    ID de um texto. Por ser formada só por arrays, pode ser mapeada em memória
+    a partir de um snapshot e compartilhada entre processos. `find_many`
+    busca vários textos com poucas operações vetorizadas, para quem consulta
+    muitos textos de uma vez.
+    """
+    
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray,
+                 slots: Optional[np.ndarray] = None, hashes: Optional[np.ndarray] = None):
+        """
+        Inicializa a tabela a partir dos seus arrays.
+        
+        Args:
+            blob (np.ndarray): Bytes (uint8) dos textos concatenados
+            offsets (np.ndarray): Início de cada texto em `blob`, mais o fim do último (int64)
+            slots (np.ndarray, optional): Tabela hash (int32, tamanho potência de 2)
+                com ID + 1 de cada texto, ou 0 nas posições vazias
+            hashes (np.ndarray, optional): CRC32 (uint32) de todos os textos, em ordem crescente
+        """
+        self._blob = blob
+        self._offsets = offsets
+        self._slots = slots
+        self._hashes = hashes
+        self._data = memoryview(blob)
+        self._bounds = memoryview(offsets)
+        self._table = memoryview(slots) if slots is not None else None
+        self._mask = len(slots) - 1 if slots is not None else 0
+    
+    @classmethod
+    def build(cls, texts: Sequence[str], hashed: bool = True) -> "StringTable":
+        """
+        Monta uma tabela com os textos informados (distintos, se `hashed`).
+        
+        Args:
+            texts (Sequence[str]): Textos, na ordem dos IDs
+            hashed (bool): Se True, monta também a tabela hash usada por `find`
+        
+        Returns:
+            StringTable: Tabela montada
+        """
+        encoded = [text.encode("utf-8") for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        if not hashed:
+            return cls(blob, offsets)
+        
+        size = 1 << max(3, (2 * len(encoded)).bit_length())
+        mask = size - 1
+        slots = [0] * size
+        hashes = np.fromiter(map(zlib.crc32, encoded), dtype=np.uint32, count=len(encoded))
+        for text_id, text_hash in enumerate(hashes.tolist()):
+            slot = text_hash & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = text_id + 1
+        return cls(blob, offsets, np.asarray(slots, dtype=np.int32), np.sort(hashes))
+    
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+    
+    def __getitem__(self, text_id: int) -> str:
+        return str(self._data[self._bounds[text_id]:self._bounds[text_id + 1]], "utf-8")
+    
+    def find(self, text: str) -> Optional[int]:
+        """
+        Busca o ID de um texto na tabela hash.
+        
+        Args:
+            text (str): Texto procurado
+        
+        Returns:
+            int: ID do texto ou None se não estiver na tabela
+        """
+        if self._table is None:
+            raise TypeError("Tabela montada sem hash")
+        encoded = text.encode("utf-8")
+        slot = zlib.crc32(encoded) & self._mask
+        while True:
+            value = self._table[slot]
+            if not value:
+                return None
+            if self._data[self._bounds[value - 1]:self._bounds[value]] == encoded:
+                return value - 1
+            slot = (slot + 1) & self._mask
+    
+    def find_many(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Busca os IDs de vários textos: o CRC32 de todos é procurado de uma vez
+        entre os CRC32 dos textos da tabela (em ordem crescente), e só os que
+        aparecem lá são buscados na tabela hash.
+        
+        Args:
+            texts (Sequence[str]): Textos procurados
+        
+        Returns:
+            np.ndarray: ID de cada texto (int64), ou -1 para os que não estão na tabela
+        """
+        if self._table is None:
+            raise TypeError("Tabela montada sem hash")
+        ids = np.full(len(texts), -1, dtype=np.int64)
+        if not len(self._hashes) or not len(texts):
+            return ids
+        hashes = np.asarray([zlib.crc32(text.encode("utf-8")) for text in texts], dtype=np.uint32)
+        positions = np.minimum(np.searchsorted(self._hashes, hashes), len(self._hashes) - 1)
+        for i in np.flatnonzero(self._hashes[positions] == hashes).tolist():
+            text_id = self.find(texts[i])
+            if text_id is not None:
+                ids[i] = text_id
+        return ids
+    
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """
+        Retorna os arrays da tabela, com nomes prefixados, para gravação em snapshot.
+        """
+        arrays = {f"{prefix}.blob": self._blob, f"{prefix}.offsets": self._offsets}
+        if self._slots is not None:
+            arrays[f"{prefix}.slots"] = self._slots
+            arrays[f"{prefix}.hashes"] = self._hashes
+        return arrays
+    
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], prefix: str, hashed: bool = True) -> "StringTable":
+        """
+        Recria uma tabela a partir dos arrays de um snapshot (vazia se não estiverem lá).
+        """
+        if f"{prefix}.offsets" not in arrays:
+            return cls.build([], hashed)
+        return cls(arrays[f"{prefix}.blob"], arrays[f"{prefix}.offsets"],
+                   arrays.get(f"{prefix}.slots"), arrays.get(f"{prefix}.hashes"))
+
+
+class Vocabulary:
+    """
+    Mapeamento texto <-> ID sequencial: os textos da base ficam em uma
+    StringTable imutável (possivelmente mapeada de um snapshot) e os
+    adicionados depois, em um dicionário em memória, com os IDs seguintes.
+    """
+    
+    def __init__(self, table: Optional[StringTable] = None):
+        """
+        Inicializa o vocabulário sobre uma tabela base (vazia por padrão).
+        
+        Args:
+            table (StringTable, optional): Textos da base, com tabela hash
+        """
+        self._table = table if table is not None else StringTable.build([])
+        self._base = len(self._table)
+        self._ids: Dict[str, int] = {}
+        self._texts: List[str] = []
+    
+    def __len__(self) -> int:
+        return self._base + len(self._texts)
+    
+    def __contains__(self, text: str) -> bool:
+        return self.get(text) is not None
+    
+    def __getitem__(self, text_id: int) -> str:
+        if text_id < self._base:
+            return self._table[text_id]
+        return self._texts[text_id - self._base]
+    
+    def __iter__(self):
+        for text_id in range(len(self)):
+            yield self[text_id]
+    
+    def get(self, text: str) -> Optional[int]:
+        """
+        Retorna o ID de um texto, ou None se ele não estiver no vocabulário.
+        """
+        if self._ids:
+            text_id = self._ids.get(text)
+            if text_id is not None:
+                return text_id
+        return self._table.find(text) if self._base else None
+    
+    def find_many(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Retorna os IDs de vários textos de uma vez (-1 para os que não estão no vocabulário).
+        """
+        ids = self._table.find_many(texts)
+        if self._ids:
+            for i in np.flatnonzero(ids < 0).tolist():
+                ids[i] = self._ids.get(texts[i], -1)
+        return ids
+    
+    def add(self, text: str) -> int:
+        """
+        Retorna o ID de um texto, adicionando-o com o próximo ID se for novo.
+        """
+        text_id = self.get(text)
+        if text_id is None:
+            text_id = len(self)
+            self._ids[text] = text_id
+            self._texts.append(text)
+        return text_id
+    
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """
+        Retorna os arrays de todo o vocabulário (base e textos novos), para gravação em snapshot.
+        """
+        table = self._table if not self._texts else StringTable.build(list(self))
+        return table.arrays(prefix)
+    
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], prefix: str) -> "Vocabulary":
+        """
+        Recria um vocabulário a partir dos arrays de um snapshot.
+        """
+        return cls(StringTable.from_arrays(arrays, prefix))
+
+
+class Postings:
+    """
+    Listas de inteiros indexadas por ID (termo -> documentos, documento ->
+    termos, ...). As listas da base ficam em formato CSR (início de cada lista
+    e valores concatenados), possivelmente mapeadas de um snapshot; os valores
+    adicionados depois ficam em listas em memória, consultadas em seguida às da base.
+    """
+    
+    def __init__(self, dtype=np.int32, ptr: Optional[np.ndarray] = None, values: Optional[np.ndarray] = None):
+        """
+        Inicializa as listas sobre uma base CSR (vazia por padrão).
+        
+        Args:
+            dtype: Tipo dos valores
+            ptr (np.ndarray, optional): Início da lista de cada ID, mais o fim da última (int64)
+            values (np.ndarray, optional): Valores de todas as listas, concatenados
+        """
+        self.dtype = np.dtype(dtype)
+        self._ptr = ptr if ptr is not None else np.zeros(1, dtype=np.int64)
+        self._values = values if values is not None else np.zeros(0, dtype=self.dtype)
+        self._bounds = memoryview(self._ptr)
+        self._base = len(self._ptr) - 1
+        self._lists: Dict[int, list] = {}
+        self._size = self._base
+        self._base_extended = False
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def parts(self, list_id: int) -> Tuple[list, list]:
+        """
+        Retorna a lista de um ID em duas partes, cada uma na ordem de inserção:
+        os valores da base e os adicionados depois.
+        """
+        base = []
+        if list_id < self._base:
+            base = self._values[self._bounds[list_id]:self._bounds[list_id + 1]].tolist()
+        return base, self._lists.get(list_id, [])
+    
+    def get(self, list_id: int) -> np.ndarray:
+        """
+        Retorna a lista de um ID como array (vazio se o ID não tiver valores).
+        """
+        if list_id < self._base:
+            base = self._values[self._bounds[list_id]:self._bounds[list_id + 1]]
+        else:
+            base = self._values[:0]
+        extra = self._lists.get(list_id)
+        if not extra:
+            return base
+        return np.concatenate([base, np.asarray(extra, dtype=self.dtype)])
+    
+    def size(self, list_id: int) -> int:
+        """
+        Retorna o número de valores da lista de um ID.
+        """
+        size = len(self._lists.get(list_id, ()))
+        if list_id < self._base:
+            size += self._bounds[list_id + 1] - self._bounds[list_id]
+        return size
+    
+    def append(self, list_id: int, value):
+        """
+        Acrescenta um valor ao fim da lista de um ID.
+        """
+        self._lists.setdefault(list_id, []).append(value)
+        self._touch(list_id)
+    
+    def extend(self, list_id: int, values):
+        """
+        Acrescenta vários valores ao fim da lista de um ID.
+        """
+        self._lists.setdefault(list_id, []).extend(values)
+        self._touch(list_id)
+    
+    def insert_sorted(self, list_id: int, value):
+        """
+        Insere um valor na parte em memória da lista de um ID, mantendo-a em
+        ordem crescente, se ainda não estiver na lista.
+        """
+        base, extra = self.parts(list_id)
+        if value in base:
+            return
+        position = bisect.bisect_left(extra, value)
+        if position == len(extra) or extra[position] != value:
+            extra.insert(position, value)
+            self._lists[list_id] = extra
+            self._touch(list_id)
+    
+    def _touch(self, list_id: int):
+        """
+        Registra que a lista de um ID recebeu valores em memória.
+        """
+        self._size = max(self._size, list_id + 1)
+        if list_id < self._base:
+            self._base_extended = True
+    
+    def concat(self, first: int, last: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Concatena as listas dos IDs [first, last).
+        
+        Returns:
+            tuple: (valores concatenados, tamanho de cada lista)
+        """
+        chunks, sizes = [], []
+        base_last = min(last, self._base)
+        if first < base_last and self._base_extended:
+            # Valores acrescentados depois a listas da base: monta lista a lista
+            chunks.extend(self.get(list_id) for list_id in range(first, base_last))
+            sizes.append(np.asarray([len(chunk) for chunk in chunks], dtype=np.int64))
+        elif first < base_last:
+            ptr = self._ptr[first:base_last + 1]
+            chunks.append(self._values[ptr[0]:ptr[-1]])
+            sizes.append(np.diff(ptr))
+        extra = [self._lists.get(list_id, ()) for list_id in range(max(first, self._base), last)]
+        if extra:
+            chunks.append(np.fromiter((value for values in extra for value in values), dtype=self.dtype))
+            sizes.append(np.asarray([len(values) for values in extra], dtype=np.int64))
+        if not chunks:
+            return np.zeros(0, dtype=self.dtype), np.zeros(0, dtype=np.int64)
+        return np.concatenate(chunks).astype(self.dtype, copy=False), np.concatenate(sizes)
+    
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """
+        Retorna todas as listas (base e valores novos) em formato CSR, para gravação em snapshot.
+        """
+        if self._lists:
+            values, sizes = self.concat(0, len(self))
+            ptr = np.zeros(len(self) + 1, dtype=np.int64)
+            np.cumsum(sizes, out=ptr[1:])
+        else:
+            ptr, values = self._ptr, self._values
+        return {f"{prefix}.ptr": ptr, f"{prefix}.values": values}
+    
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], prefix: str, dtype=np.int32) -> "Postings":
+        """
+        Recria as listas a partir dos arrays de um snapshot (vazias se não estiverem lá).
+        """
+        if f"{prefix}.ptr" not in arrays:
+            return cls(dtype)
+        return cls(dtype, arrays[f"{prefix}.ptr"], arrays[f"{prefix}.values"])
+
+
+def write_snapshot(path: str, arrays: Mapping[str, np.ndarray], metadata: Dict[str, Any]):
+    """
+    Grava arrays NumPy em um arquivo de snapshot: identificação, tamanho do
+    cabeçalho, cabeçalho JSON (metadados e posição, tipo e formato de cada
+    array) e os dados de cada array, alinhados. O arquivo é gravado com outro
+    nome e renomeado no final, então quem já mapeou a versão anterior continua
+    lendo-a intacta.
+    
+    Args:
+        path (str): Caminho do arquivo
+        arrays (Mapping[str, np.ndarray]): Arrays por nome
+        metadata (dict): Metadados serializáveis em JSON
+    """
+    layout = {}
+    offset = 0
+    contiguous = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        offset = _align(offset)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        contiguous[name] = array
+        offset += array.nbytes
+    header = json.dumps({"metadata": metadata, "arrays": layout}, ensure_ascii=False).encode("utf-8")
+    data_start = _align(len(SNAPSHOT_MAGIC) + 8 + len(header))
+    
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as file:
+            file.write(SNAPSHOT_MAGIC)
+            file.write(struct.pack("<Q", len(header)))
+            file.write(header)
+            for name, array in contiguous.items():
+                file.seek(data_start + layout[name]["offset"])
+                file.write(memoryview(array).cast("B"))
+            file.truncate(data_start + offset)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def read_snapshot_metadata(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Lê apenas os metadados de um snapshot, sem mapear os arrays.
+    
+    Args:
+        path (str): Caminho do arquivo
+    
+    Returns:
+        dict: Metadados gravados, ou None se o arquivo não existir ou não for um snapshot válido
+    """
+    try:
+        with open(path, "rb") as file:
+            header = _read_header(file)
+    except (OSError, ValueError):
+        return None
+    return header["metadata"]
+
+
+class Snapshot:
+    """
+    Snapshot aberto: os arrays são visões somente leitura sobre o arquivo
+    mapeado em memória (sem cópia), carregadas do disco sob demanda e
+    compartilhadas pelo cache de páginas do sistema entre os processos que
+    abrem o mesmo arquivo.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Abre e mapeia um snapshot.
+        
+        Args:
+            path (str): Caminho do arquivo
+        
+        Raises:
+            ValueError: Se o arquivo não for um snapshot válido
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            header = _read_header(file)
+            data_start = file.tell()
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        data_start = _align(data_start)
+        
+        self.metadata: Dict[str, Any] = header["metadata"]
+        self.arrays: Dict[str, np.ndarray] = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            if not count:
+                self.arrays[name] = np.zeros(spec["shape"], dtype=dtype)
+                continue
+            start = data_start + spec["offset"]
+            if start + count * dtype.itemsize > len(self._mmap):
+                raise ValueError(f"Snapshot truncado: {path}")
+            self.arrays[name] = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=start).reshape(spec["shape"])
+    
+    @property
+    def nbytes(self) -> int:
+        return len(self._mmap)
+
+
+def _read_header(file) -> Dict[str, Any]:
+    """
+    Lê o cabeçalho de um snapshot aberto, deixando o arquivo logo após ele.
+    """
+    if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        raise ValueError("Arquivo não é um snapshot do índice")
+    size = file.read(8)
+    if len(size) != 8:
+        raise ValueError("Snapshot truncado")
+    header = file.read(struct.unpack("<Q", size)[0])
+    try:
+        return json.loads(header.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        raise ValueError("Cabeçalho do snapshot inválido")
+
+
+def _align(offset: int) -> int:
+    return -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
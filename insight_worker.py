@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from database import Database
+
+# Workers compartilhados por banco de dados (várias sessões do Streamlit no mesmo processo)
+_workers: Dict[str, "InsightWorker"] = {}
+_workers_lock = threading.Lock()
+
+
+class InsightWorker:
+    """
+    Worker em segundo plano que extrai os insights das interações fora do
+    caminho da requisição.
+    
+    As interações são armazenadas com estado pendente e enfileiradas em uma
+    fila limitada. O worker agrupa as interações da fila em lotes, extrai os
+    insights de cada lote de uma vez e preenche `patterns_insights`.
+    Interações pendentes que não couberam na fila ou que ficaram para trás
+    após um reinício são recuperadas do SQLite periodicamente.
+    """
+    
+    def __init__(self,
+                 db: Database,
+                 extractor: Callable[[List[Tuple[str, str]]], List[Dict[str, Any]]],
+                 max_queue_size: int = 100,
+                 poll_interval: float = 30.0,
+                 max_batch_size: int = 20,
+                 batch_wait: float = 0.5):
+        """
+        Inicializa o worker (sem iniciar a thread).
+        
+        Args:
+            db (Database): Banco de dados onde as interações estão armazenadas
+            extractor (Callable): Função [(pergunta, resposta), ...] -> [insights, ...]
+            max_queue_size (int): Tamanho máximo da fila em memória
+            poll_interval (float): Intervalo, em segundos, entre buscas por interações pendentes
+            max_batch_size (int): Número máximo de interações processadas por lote
+            batch_wait (float): Tempo, em segundos, aguardando mais interações para completar um lote
+        """
+        self.queue: "queue.Queue[Tuple[int, str, str]]" = queue.Queue(maxsize=max_queue_size)
+        self.configure(db, extractor, max_queue_size, poll_interval, max_batch_size)
+        self.batch_wait = batch_wait
+        self._queued_ids: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def configure(self,
+                  db: Database,
+                  extractor: Callable[[List[Tuple[str, str]]], List[Dict[str, Any]]],
+                  max_queue_size: int = 100,
+                  poll_interval: float = 30.0,
+                  max_batch_size: int = 20):
+        """
+        Substitui o banco, o extrator e as configurações do worker. Os lotes
+        seguintes usam os novos valores; as interações já na fila são mantidas.
+        
+        Args:
+            db (Database): Banco de dados onde as interações estão armazenadas
+            extractor (Callable): Função [(pergunta, resposta), ...] -> [insights, ...]
+            max_queue_size (int): Tamanho máximo da fila em memória
+            poll_interval (float): Intervalo, em segundos, entre buscas por interações pendentes
+            max_batch_size (int): Número máximo de interações processadas por lote
+        """
+        self.db = db
+        self.extractor = extractor
+        self.poll_interval = poll_interval
+        self.max_batch_size = max_batch_size
+        with self.queue.mutex:
+            self.queue.maxsize = max_queue_size
+    
+    def start(self):
+        """
+        Inicia a thread do worker e recupera as interações pendentes do banco.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._recover_pending()
+        self._thread = threading.Thread(target=self._run, name="insight-worker", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Sinaliza a parada do worker e aguarda o término da thread.
+        
+        Args:
+            timeout (float, optional): Tempo máximo de espera, em segundos
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+    
+    def submit(self, interaction_id: int, query: str, response: str) -> bool:
+        """
+        Enfileira uma interação para extração de insights sem bloquear.
+        
+        Args:
+            interaction_id (int): ID da interação armazenada
+            query (str): Pergunta do usuário
+            response (str): Resposta fornecida
+        
+        Returns:
+            bool: True se a interação foi enfileirada; False se a fila estava
+                  cheia (ela continua pendente no banco e será recuperada depois)
+        """
+        with self._lock:
+            if interaction_id in self._queued_ids:
+                return True
+            try:
+                self.queue.put_nowait((interaction_id, query, response))
+            except queue.Full:
+                return False
+            self._queued_ids.add(interaction_id)
+            return True
+    
+    def _recover_pending(self):
+        """
+        Enfileira as interações pendentes armazenadas no banco de dados.
+        """
+        free_slots = self.queue.maxsize - self.queue.qsize() if self.queue.maxsize > 0 else 100
+        if free_slots <= 0:
+            return
+        for interaction_id, query, response in self.db.get_pending_insights(free_slots):
+            if not self.submit(interaction_id, query, response):
+                break
+    
+    def _run(self):
+        """
+        Laço principal do worker.
+        """
+        while not self._stop_event.is_set():
+            try:
+                first = self.queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                self._recover_pending()
+                continue
+            
+            batch = [first] + self._collect_batch()
+            try:
+                insights = self.extractor([(query, response) for _, query, response in batch])
+                self.db.update_insights_many([
+                    (interaction_id, json.dumps(item))
+                    for (interaction_id, _, _), item in zip(batch, insights)
+                ])
+            except Exception as e:
+                print(f"Erro ao extrair insights de {len(batch)} interações: {e}")
+            finally:
+                with self._lock:
+                    for interaction_id, _, _ in batch:
+                        self._queued_ids.discard(interaction_id)
+                for _ in batch:
+                    self.queue.task_done()
+    
+    def _collect_batch(self) -> List[Tuple[int, str, str]]:
+        """
+        Retira da fila mais interações para completar o lote atual, aguardando
+        no máximo `batch_wait` segundos.
+        
+        Returns:
+            List[Tuple[int, str, str]]: Interações adicionais do lote
+        """
+        items = []
+        deadline = time.monotonic() + self.batch_wait
+        while len(items) + 1 < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    items.append(self.queue.get(timeout=remaining))
+                else:
+                    items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+
+def get_insight_worker(db: Database,
+                       extractor: Callable[[List[Tuple[str, str]]], List[Dict[str, Any]]],
+                       max_queue_size: int = 100,
+                       poll_interval: float = 30.0,
+                       max_batch_size: int = 20) -> InsightWorker:
+    """
+    Retorna o worker de insights compartilhado para o banco de dados,
+    criando-o e iniciando-o na primeira chamada. Nas chamadas seguintes, o
+    worker passa a usar o banco, o extrator e as configurações informados
+    (os do agente criado por último).
+    
+    Args:
+        db (Database): Banco de dados onde as interações estão armazenadas
+        extractor (Callable): Função [(pergunta, resposta), ...] -> [insights, ...]
+        max_queue_size (int): Tamanho máximo da fila em memória
+        poll_interval (float): Intervalo, em segundos, entre buscas por interações pendentes
+        max_batch_size (int): Número máximo de interações processadas por lote
+    
+    Returns:
+        InsightWorker: Worker em execução
+    """
+    key = os.path.abspath(db.db_path)
+    with _workers_lock:
+        worker = _workers.get(key)
+        if worker is None:
+            worker = InsightWorker(db, extractor, max_queue_size, poll_interval, max_batch_size)
+            _workers[key] = worker
+        else:
+            worker.configure(db, extractor, max_queue_size, poll_interval, max_batch_size)
+        worker.start()
+        return worker
+
+
+def backfill_insights(db: Database,
+                      extractor: Callable[[List[Tuple[str, str]]], List[Dict[str, Any]]],
+                      batch_size: int = 50,
+                      limit: Optional[int] = None) -> int:
+    """
+    Extrai, em lotes, os insights das interações já armazenadas que estão
+    pendentes ou que nunca tiveram insights registrados.
+    
+    Args:
+        db (Database): Banco de dados com as interações
+        extractor (Callable): Função [(pergunta, resposta), ...] -> [insights, ...]
+        batch_size (int): Número de interações lidas e enviadas ao extrator por vez
+        limit (int, optional): Número máximo de interações processadas
+    
+    Returns:
+        int: Número de interações atualizadas
+    """
+    processed = 0
+    after_id = 0
+    while limit is None or processed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - processed)
+        rows = db.get_interactions_missing_insights(size, after_id)
+        if not rows:
+            break
+        
+        insights = extractor([(query, response) for _, query, response in rows])
+        db.update_insights_many([
+            (interaction_id, json.dumps(item))
+            for (interaction_id, _, _), item in zip(rows, insights)
+        ])
+        
+        processed += len(rows)
+        after_id = rows[-1][0]
+        print(f"{processed} interações processadas (até o ID {after_id})")
+    return processed
+
+
+def main():
+    """
+    Executa o backfill de insights pela linha de comando.
+    """
+    from llm_service import LLMService
+    
+    parser = argparse.ArgumentParser(description="Extrai insights das interações armazenadas sem insights.")
+    parser.add_argument("--config", default="config.yaml", help="Caminho para o arquivo de configuração")
+    parser.add_argument("--batch-size", type=int, default=50, help="Interações lidas por vez")
+    parser.add_argument("--limit", type=int, default=None, help="Número máximo de interações processadas")
+    args = parser.parse_args()
+    
+    llm_service = LLMService(args.config)
+    db = Database(llm_service.config.get('database', {}).get('path', 'prompt_agent.db'))
+    
+    processed = backfill_insights(db, llm_service.extract_insights_batch, args.batch_size, args.limit)
+    stats = llm_service.insight_stats
+    print(f"Backfill concluído: {processed} interações em {stats['calls']} chamadas ao modelo.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+from database import Database, INTERACTION_FIELDS
+
+# pyarrow é opcional: sem ele, apenas a exportação em JSONL está disponível
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_FORMATS = ("jsonl", "parquet")
+EXPORT_EXTENSIONS = {"jsonl": ".jsonl.gz", "parquet": ".parquet"}
+
+
+def _write_jsonl(batches: Iterable[List[tuple]], path: str) -> Tuple[int, Optional[int], Optional[int]]:
+    """
+    Grava os lotes de interações em JSONL comprimido com gzip, uma interação por linha.
+    
+    Args:
+        batches (Iterable[List[tuple]]): Lotes de tuplas na ordem de INTERACTION_FIELDS
+        path (str): Arquivo de saída
+    
+    Returns:
+        tuple: (número de interações, primeiro ID, último ID)
+    """
+    rows, first_id, last_id = 0, None, None
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        for batch in batches:
+            for row in batch:
+                file.write(json.dumps(dict(zip(INTERACTION_FIELDS, row)), ensure_ascii=False))
+                file.write("\n")
+            rows += len(batch)
+            first_id = batch[0][0] if first_id is None else first_id
+            last_id = batch[-1][0]
+    return rows, first_id, last_id
+
+
+def _write_parquet(batches: Iterable[List[tuple]], path: str) -> Tuple[int, Optional[int], Optional[int]]:
+    """
+    Grava os lotes de interações em Parquet, um row group por lote.
+    
+    Args:
+        batches (Iterable[List[tuple]]): Lotes de tuplas na ordem de INTERACTION_FIELDS
+        path (str): Arquivo de saída
+    
+    Returns:
+        tuple: (número de interações, primeiro ID, último ID)
+    """
+    if pyarrow is None:
+        raise RuntimeError("A exportação em Parquet requer o pacote pyarrow (pip install pyarrow)")
+    
+    types = {
+        "id": pyarrow.int64(),
+        "prompt_tokens": pyarrow.int64(),
+        "completion_tokens": pyarrow.int64(),
+        "cached_tokens": pyarrow.int64(),
+        "latency_ms": pyarrow.float64()
+    }
+    schema = pyarrow.schema([(field, types.get(field, pyarrow.string())) for field in INTERACTION_FIELDS])
+    
+    rows, first_id, last_id = 0, None, None
+    with pyarrow.parquet.ParquetWriter(path, schema, compression="zstd") as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(column, type=schema.field(i).type) for i, column in enumerate(columns)],
+                schema=schema
+            ))
+            rows += len(batch)
+            first_id = batch[0][0] if first_id is None else first_id
+            last_id = batch[-1][0]
+    return rows, first_id, last_id
+
+
+def export_interactions(db: Database,
+                        path: str,
+                        fmt: str = "jsonl",
+                        after_id: int = 0,
+                        until_id: Optional[int] = None,
+                        batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    Exporta as interações em streaming (memória constante). O arquivo é
+    gravado com um nome temporário e renomeado apenas quando completo.
+    
+    Args:
+        db (Database): Banco de dados de origem
+        path (str): Arquivo de saída
+        fmt (str): Formato ("jsonl" comprimido com gzip ou "parquet")
+        after_id (int): Exporta apenas interações com ID maior que este
+        until_id (int, optional): Exporta apenas interações com ID menor que este
+        batch_size (int): Número de linhas lidas e gravadas por vez
+    
+    Returns:
+        Dict[str, Any]: Arquivo gravado, número de interações e primeiro e último ID
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportação desconhecido: {fmt} (use {', '.join(EXPORT_FORMATS)})")
+    writer = _write_parquet if fmt == "parquet" else _write_jsonl
+    
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = path + ".tmp"
+    try:
+        rows, first_id, last_id = writer(db.iter_interactions(after_id, until_id, batch_size), temporary_path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    os.replace(temporary_path, path)
+    return {"path": path, "rows": rows, "first_id": first_id, "last_id": last_id}
+
+
+def _load_state(state_path: str) -> Dict[str, Any]:
+    """
+    Carrega o estado da exportação incremental (vazio se ainda não houver).
+    
+    Args:
+        state_path (str): Arquivo de estado
+    
+    Returns:
+        Dict[str, Any]: Estado salvo
+    """
+    try:
+        with open(state_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state_path: str, state: Dict[str, Any]):
+    """
+    Salva o estado da exportação incremental de forma atômica.
+    
+    Args:
+        state_path (str): Arquivo de estado
+        state (Dict[str, Any]): Estado a salvar
+    """
+    temporary_path = state_path + ".tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        json.dump(state, file, indent=2)
+    os.replace(temporary_path, state_path)
+
+
+def export_incremental(db: Database,
+                       output_dir: str,
+                       fmt: str = "jsonl",
+                       state_path: Optional[str] = None,
+                       batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    Exporta para um novo arquivo as interações gravadas desde a última
+    exportação, registrando o último ID exportado em um arquivo de estado.
+    Interações com insights ainda pendentes (e as seguintes) ficam para a
+    próxima exportação, para que cada interação seja exportada já completa.
+    
+    Args:
+        db (Database): Banco de dados de origem
+        output_dir (str): Diretório dos arquivos exportados
+        fmt (str): Formato ("jsonl" comprimido com gzip ou "parquet")
+        state_path (str, optional): Arquivo de estado (padrão: export_state.json em output_dir)
+        batch_size (int): Número de linhas lidas e gravadas por vez
+    
+    Returns:
+        Dict[str, Any]: Arquivo gravado (None se não houver interações novas),
+            número de interações e primeiro e último ID
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = state_path or os.path.join(output_dir, "export_state.json")
+    state = _load_state(state_path)
+    after_id = state.get("last_id", 0)
+    
+    pending = db.get_pending_insights(limit=1)
+    until_id = pending[0][0] if pending else None
+    
+    extension = EXPORT_EXTENSIONS[fmt]
+    path = os.path.join(output_dir, f"interactions_from_{after_id + 1:09d}{extension}")
+    result = export_interactions(db, path, fmt, after_id, until_id, batch_size)
+    if not result["rows"]:
+        os.remove(path)
+        result["path"] = None
+        return result
+    
+    # O nome do arquivo indica o intervalo de IDs exportado
+    result["path"] = os.path.join(output_dir, f"interactions_{result['first_id']:09d}-{result['last_id']:09d}{extension}")
+    os.replace(path, result["path"])
+    _save_state(state_path, {"last_id": result["last_id"], "exported_at": datetime.now().isoformat(timespec="seconds")})
+    return result
+
+
+def archive_interactions(db: Database, before: str, archive_dir: str, vacuum: bool = True) -> Dict[str, int]:
+    """
+    Move as interações anteriores à data de corte para bancos de arquivo
+    mensais e, se houver remoções, compacta o banco principal com VACUUM.
+    
+    Args:
+        db (Database): Banco de dados principal
+        before (str): Data de corte (AAAA-MM-DD)
+        archive_dir (str): Diretório dos bancos de arquivo
+        vacuum (bool): Se True, executa VACUUM após arquivar
+    
+    Returns:
+        Dict[str, int]: Número de interações arquivadas por mês
+    """
+    archived = db.archive_interactions(before, archive_dir)
+    if vacuum and archived:
+        db.vacuum()
+    return archived
+
+
+def _open_database(config_path: str, db_path: Optional[str]) -> Database:
+    """
+    Abre o banco de dados indicado ou o da seção `database` do arquivo de configuração.
+    
+    Args:
+        config_path (str): Caminho para o arquivo de configuração YAML
+        db_path (str, optional): Caminho do banco de dados (tem precedência sobre a configuração)
+    
+    Returns:
+        Database: Banco de dados aberto
+    """
+    try:
+        with open(config_path, 'r', encoding='utf-8') as file:
+            config = yaml.safe_load(file) or {}
+    except OSError:
+        config = {}
+    return Database(db_path or config.get('database', {}).get('path', 'prompt_agent.db'))
+
+
+def main():
+    """
+    Exporta ou arquiva as interações pela linha de comando.
+    """
+    parser = argparse.ArgumentParser(description="Exportação e arquivamento das interações armazenadas.")
+    parser.add_argument("--config", default="config.yaml", help="Arquivo de configuração (seção database)")
+    parser.add_argument("--db", default=None, help="Banco de dados (padrão: database.path da configuração)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    export_parser = commands.add_parser("export", help="Exporta as interações em JSONL (gzip) ou Parquet")
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, default="jsonl")
+    export_parser.add_argument("--output", default=None, help="Arquivo de saída (exportação completa)")
+    export_parser.add_argument("--output-dir", default="exports", help="Diretório dos arquivos da exportação incremental")
+    export_parser.add_argument("--incremental", action="store_true", help="Exporta apenas o que é novo desde a última exportação")
+    export_parser.add_argument("--state", default=None, help="Arquivo de estado da exportação incremental")
+    export_parser.add_argument("--batch-size", type=int, default=1000)
+    
+    archive_parser = commands.add_parser("archive", help="Move interações antigas para bancos de arquivo mensais")
+    cutoff = archive_parser.add_mutually_exclusive_group(required=True)
+    cutoff.add_argument("--before", help="Data de corte (AAAA-MM-DD)")
+    cutoff.add_argument("--older-than-days", type=int, help="Arquiva interações com mais de N dias")
+    archive_parser.add_argument("--archive-dir", default="archive")
+    archive_parser.add_argument("--no-vacuum", action="store_true", help="Não executa VACUUM após arquivar")
+    args = parser.parse_args()
+    
+    db = _open_database(args.config, args.db)
+    try:
+        if args.command == "export":
+            if args.incremental:
+                result = export_incremental(db, args.output_dir, args.format, args.state, args.batch_size)
+            else:
+                output = args.output or os.path.join(args.output_dir, f"interactions{EXPORT_EXTENSIONS[args.format]}")
+                result = export_interactions(db, output, args.format, batch_size=args.batch_size)
+            if result["rows"]:
+                print(f"{result['rows']} interações exportadas (IDs {result['first_id']} a {result['last_id']}) em {result['path']}")
+            else:
+                print("Nenhuma interação para exportar.")
+        else:
+            before = args.before or (datetime.now() - timedelta(days=args.older_than_days)).strftime("%Y-%m-%d")
+            archived = archive_interactions(db, before, args.archive_dir, vacuum=not args.no_vacuum)
+            for month, count in archived.items():
+                print(f"{month}: {count} interações arquivadas")
+            print(f"Total: {sum(archived.values())} interações anteriores a {before} arquivadas em {args.archive_dir}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import Database, INSIGHTS_READY
+
+# Loggers compartilhados por banco de dados (várias sessões do Streamlit no mesmo processo)
+_loggers: Dict[str, "InteractionLogger"] = {}
+_loggers_lock = threading.Lock()
+
+
+class InteractionLogger:
+    """
+    Gravação das interações em segundo plano (write-behind).
+    
+    As interações são colocadas em uma fila limitada em memória e gravadas por
+    uma thread em lotes, com `executemany` em uma única transação, a cada
+    `batch_size` interações ou `flush_interval_ms` milissegundos (o que vier
+    primeiro). Quem registra uma interação recebe um Future com o seu ID. Se a
+    fila estiver cheia, o registro espera por espaço (backpressure) e, após
+    `block_timeout` segundos, grava a interação diretamente.
+    """
+    
+    def __init__(self,
+                 db: Database,
+                 max_queue_size: int = 1000,
+                 batch_size: int = 50,
+                 flush_interval_ms: float = 200,
+                 block_timeout: float = 5.0):
+        """
+        Inicializa o logger (sem iniciar a thread).
+        
+        Args:
+            db (Database): Banco de dados onde as interações são gravadas
+            max_queue_size (int): Tamanho máximo da fila em memória
+            batch_size (int): Número máximo de interações gravadas por transação
+            flush_interval_ms (float): Espera máxima, em milissegundos, antes de gravar um lote incompleto
+            block_timeout (float): Espera máxima, em segundos, por espaço na fila
+        """
+        self.queue: "queue.Queue[Optional[Tuple[Dict[str, Any], Future]]]" = queue.Queue(maxsize=max_queue_size)
+        self.configure(db, max_queue_size, batch_size, flush_interval_ms)
+        self.block_timeout = block_timeout
+        self.stats = {"queued": 0, "batches": 0, "written": 0, "blocked": 0, "direct_writes": 0, "errors": 0}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    def configure(self,
+                  db: Database,
+                  max_queue_size: int = 1000,
+                  batch_size: int = 50,
+                  flush_interval_ms: float = 200):
+        """
+        Substitui o banco e as configurações do logger. Os lotes seguintes usam
+        os novos valores; as interações já na fila são mantidas.
+        
+        Args:
+            db (Database): Banco de dados onde as interações são gravadas
+            max_queue_size (int): Tamanho máximo da fila em memória
+            batch_size (int): Número máximo de interações gravadas por transação
+            flush_interval_ms (float): Espera máxima, em milissegundos, antes de gravar um lote incompleto
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        with self.queue.mutex:
+            self.queue.maxsize = max_queue_size
+    
+    def start(self):
+        """
+        Inicia a thread de gravação e registra a gravação pendente no encerramento do processo.
+        """
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="interaction-logger", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+    
+    def submit(self,
+               user_question: str,
+               agent_response: str,
+               patterns_insights: Optional[str] = None,
+               insights_status: str = INSIGHTS_READY,
+               usage: Optional[Dict[str, Any]] = None,
+               session_id: Optional[str] = None,
+               user_id: Optional[str] = None) -> "Future[int]":
+        """
+        Registra uma interação para gravação em segundo plano.
+        
+        Args:
+            user_question (str): Pergunta do usuário
+            agent_response (str): Resposta fornecida pelo agente
+            patterns_insights (str, optional): Padrões ou insights identificados
+            insights_status (str, optional): Estado da extração de insights
+            usage (dict, optional): Uso da chamada ao LLM
+            session_id (str, optional): Sessão de conversa da interação
+            user_id (str, optional): Usuário da sessão
+        
+        Returns:
+            Future[int]: Future resolvido com o ID da interação após a gravação
+        """
+        interaction = {
+            "user_question": user_question,
+            "agent_response": agent_response,
+            "patterns_insights": patterns_insights,
+            "insights_status": insights_status,
+            "usage": usage,
+            "session_id": session_id,
+            "user_id": user_id,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        future: "Future[int]" = Future()
+        
+        # O lock impede que close() coloque o sinal de encerramento na fila entre
+        # a verificação da thread e a inclusão da interação
+        with self._lock:
+            queued = self._thread is not None and self._enqueue((interaction, future))
+        
+        # Sem a thread em execução (por exemplo, após close()) ou com a fila cheia, grava diretamente
+        if not queued:
+            self.stats["direct_writes"] += 1
+            self._write([(interaction, future)])
+        return future
+    
+    def _enqueue(self, item: Tuple[Dict[str, Any], Future]) -> bool:
+        """
+        Coloca uma interação na fila, esperando por espaço (backpressure) no
+        máximo `block_timeout` segundos.
+        
+        Args:
+            item (tuple): Par (interação, Future)
+        
+        Returns:
+            bool: True se a interação foi enfileirada; False se a fila continuou cheia
+        """
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.stats["blocked"] += 1
+            try:
+                self.queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                return False
+        self.stats["queued"] += 1
+        return True
+    
+    def flush(self):
+        """
+        Aguarda até que todas as interações registradas tenham sido gravadas.
+        """
+        if self._thread and self._thread.is_alive():
+            self.queue.join()
+    
+    def close(self):
+        """
+        Grava as interações pendentes e encerra a thread.
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread and thread.is_alive():
+            self.queue.put(None)
+            thread.join()
+        
+        # Interações que ficaram na fila depois do sinal de encerramento não serão gravadas
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("logger de interações encerrado antes da gravação"))
+            self.queue.task_done()
+    
+    def _run(self):
+        """
+        Laço principal da thread de gravação.
+        """
+        while True:
+            first = self.queue.get()
+            if first is None:
+                self.queue.task_done()
+                return
+            
+            batch, stop = self._collect_batch(first)
+            try:
+                self._write(batch)
+            finally:
+                for _ in range(len(batch) + stop):
+                    self.queue.task_done()
+            if stop:
+                return
+    
+    def _collect_batch(self, first: Tuple[Dict[str, Any], Future]) -> Tuple[List[Tuple[Dict[str, Any], Future]], bool]:
+        """
+        Retira da fila mais interações para completar o lote atual, aguardando
+        no máximo `flush_interval` segundos desde a primeira.
+        
+        Args:
+            first (tuple): Primeira interação do lote
+        
+        Returns:
+            tuple: (lote, se o encerramento foi solicitado)
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+    
+    def _write(self, batch: List[Tuple[Dict[str, Any], Future]]):
+        """
+        Grava um lote de interações em uma transação e resolve os Futures.
+        
+        Args:
+            batch (list): Pares (interação, Future)
+        """
+        try:
+            ids = self.db.store_interactions_many([interaction for interaction, _ in batch])
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Erro ao gravar {len(batch)} interações: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        self.stats["batches"] += 1
+        self.stats["written"] += len(batch)
+        for interaction_id, (_, future) in zip(ids, batch):
+            future.set_result(interaction_id)
+
+
+def get_interaction_logger(db: Database,
+                           max_queue_size: int = 1000,
+                           batch_size: int = 50,
+                           flush_interval_ms: float = 200) -> InteractionLogger:
+    """
+    Retorna o logger de interações compartilhado para o banco de dados,
+    criando-o e iniciando-o na primeira chamada. Nas chamadas seguintes, o
+    logger passa a usar o banco e as configurações informados (os do agente
+    criado por último).
+    
+    Args:
+        db (Database): Banco de dados onde as interações são gravadas
+        max_queue_size (int): Tamanho máximo da fila em memória
+        batch_size (int): Número máximo de interações gravadas por transação
+        flush_interval_ms (float): Espera máxima, em milissegundos, antes de gravar um lote incompleto
+    
+    Returns:
+        InteractionLogger: Logger em execução
+    """
+    key = os.path.abspath(db.db_path)
+    with _loggers_lock:
+        logger = _loggers.get(key)
+        if logger is None:
+            logger = InteractionLogger(db, max_queue_size, batch_size, flush_interval_ms)
+            _loggers[key] = logger
+        else:
+            logger.configure(db, max_queue_size, batch_size, flush_interval_ms)
+        logger.start()
+        return logger
@@ -1,41 +1,198 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections.abc import Mapping
+
+import yaml
+
+from faq_index import FaqIndex, index_parameters
+from index_store import Snapshot, read_snapshot_metadata, write_snapshot
+
+# Resposta padrão quando a pergunta não está na base de conhecimento
+FALLBACK_RESPONSE = "Desculpe, não sei responder isso. Posso ajudar com outra dúvida?"
+
+# Diretório dos arquivos da base de conhecimento distribuídos com o projeto
+KNOWLEDGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge")
+
+# Arquivos de FAQs (YAML ou JSONL) carregados por padrão, em ordem
+DEFAULT_SOURCES = (os.path.join(KNOWLEDGE_DIR, "faqs.yaml"),)
+
+# FAQs incluídas por `add_faq` (JSONL), reaplicadas sobre o índice na inicialização
+DEFAULT_ADDED_PATH = os.path.join(KNOWLEDGE_DIR, "faqs_adicionadas.jsonl")
+
+# Índice compilado das fontes, mapeado em memória na inicialização
+DEFAULT_SNAPSHOT_PATH = os.path.join(KNOWLEDGE_DIR, "faqs.snapshot")
+
+# Versão do formato dos metadados do snapshot
+SNAPSHOT_FORMAT = 1
+
+# Bases de conhecimento compartilhadas por arquivos (várias sessões do Streamlit no mesmo processo)
+_knowledge_bases = {}
+_knowledge_bases_lock = threading.Lock()
+
+
 class KnowledgeBase:
     """
     Classe que representa a base de conhecimento do agente com FAQs sobre
     Engenharia de Prompt e boas práticas.
+    
+    As FAQs vêm de arquivos YAML ou JSONL (`sources`). O índice de busca das
+    fontes é compilado em um snapshot binário (`snapshot_path`), mapeado em
+    memória nas inicializações seguintes: a base abre sem reprocessar os
+    textos e as páginas do arquivo são compartilhadas, somente leitura, entre
+    os processos. O snapshot é reconstruído quando o tamanho e a data de
+    modificação de alguma fonte mudam e o conteúdo (SHA-256) também. As FAQs
+    incluídas com `add_faq` são gravadas em `added_path` e reaplicadas sobre
+    o índice na inicialização.
+    
+    Com `reload` (ou `start_watching`, que a chama periodicamente), as fontes
+    alteradas são relidas e apenas as diferenças (FAQs novas, alteradas e
+    removidas) são aplicadas ao índice em uso, sob o mesmo lock das consultas.
     """
     
-    def __init__(self):
+    def __init__(self, sources=None, snapshot_path=DEFAULT_SNAPSHOT_PATH, added_path=DEFAULT_ADDED_PATH):
         """
-        Inicializa a base de conhecimento com perguntas e respostas predefinidas.
+        Inicializa a base de conhecimento a partir dos arquivos de FAQs.
+        
+        Args:
+            sources (list, optional): Arquivos de FAQs (YAML ou JSONL), em ordem
+                (padrão: DEFAULT_SOURCES)
+            snapshot_path (str, optional): Arquivo do snapshot do índice (None desativa o snapshot)
+            added_path (str, optional): Arquivo JSONL das FAQs incluídas com `add_faq`
+                (None mantém as inclusões apenas em memória)
         """
-        # Dicionário de perguntas frequentes (FAQs) e suas respostas
-        self.faqs = {
-            "o que é um prompt": "Um prompt é uma instrução dada a uma IA para obter uma resposta específica. É a entrada textual que orienta o modelo de linguagem sobre o que deve ser feito ou respondido.",
-            
-            "como criar um bom prompt": "Para criar um bom prompt, você deve: 1) Ser claro e específico; 2) Fornecer contexto suficiente; 3) Definir o tom e formato desejados; 4) Incluir exemplos quando necessário; 5) Considerar o uso de delimitadores para separar instruções de contexto.",
-            
-            "o que é engenharia de prompt": "Engenharia de Prompt é a prática de criar prompts eficazes para otimizar as respostas de modelos de IA. Envolve técnicas específicas para formular instruções que levam a respostas mais precisas, relevantes e úteis.",
-            
-            "quais são as técnicas de engenharia de prompt": "Algumas técnicas de Engenharia de Prompt incluem: 1) Zero-shot prompting; 2) Few-shot prompting com exemplos; 3) Chain-of-Thought (cadeia de pensamento); 4) Role prompting (definição de papéis); 5) Uso de delimitadores e estruturação; 6) Instruções passo a passo.",
-            
-            "o que é zero-shot prompting": "Zero-shot prompting é uma técnica onde você pede ao modelo para realizar uma tarefa sem fornecer exemplos específicos. O modelo usa seu conhecimento geral para responder com base apenas na instrução dada.",
-            
-            "o que é few-shot prompting": "Few-shot prompting é uma técnica onde você fornece alguns exemplos (geralmente de 1 a 5) do tipo de resposta que deseja antes de fazer sua pergunta principal. Isso ajuda a calibrar o modelo para o formato e estilo desejados.",
-            
-            "o que é chain-of-thought": "Chain-of-Thought (Cadeia de Pensamento) é uma técnica que incentiva o modelo a mostrar seu raciocínio passo a passo antes de chegar à resposta final. Isso geralmente melhora a precisão em tarefas complexas de raciocínio.",
-            
-            "como estruturar um prompt eficaz": "Um prompt eficaz geralmente segue esta estrutura: 1) Contexto claro; 2) Papel ou persona definida; 3) Tarefa específica; 4) Formato desejado para a resposta; 5) Restrições ou limitações; 6) Informações adicionais relevantes; 7) Exemplos quando necessário.",
-            
-            "quais são as boas práticas em engenharia de prompt": "Boas práticas incluem: 1) Ser específico e direto; 2) Usar delimitadores para separar seções; 3) Especificar o formato de saída desejado; 4) Testar e iterar prompts; 5) Definir personas ou papéis; 6) Incluir verificações de raciocínio; 7) Considerar limitações do modelo.",
-            
-            "o que são delimitadores em prompts": "Delimitadores são caracteres ou sequências específicas usadas para separar diferentes partes de um prompt, como contexto, instruções e exemplos. Exemplos comuns incluem: ```, ''', ###, <texto>, [texto], etc. Eles ajudam o modelo a distinguir claramente as diferentes seções do prompt.",
-            
-            "como avaliar a qualidade de um prompt": "A qualidade de um prompt pode ser avaliada por: 1) Precisão das respostas geradas; 2) Consistência dos resultados; 3) Capacidade de seguir instruções específicas; 4) Relevância do conteúdo para o objetivo; 5) Taxa de rejeição ou respostas inadequadas; 6) Feedback dos usuários finais.",
-            
-            "o que é role prompting": "Role prompting (ou prompting de papel) é uma técnica onde você atribui um papel específico ao modelo de IA, como 'Você é um especialista em marketing' ou 'Atue como um professor de matemática'. Isso ajuda a orientar o tom, estilo e tipo de conhecimento que o modelo deve utilizar na resposta.",
-            
-            "como lidar com prompts ambíguos": "Para lidar com prompts ambíguos: 1) Peça clarificações específicas; 2) Ofereça interpretações alternativas da pergunta; 3) Estruture a resposta considerando diferentes possibilidades; 4) Mencione explicitamente as ambiguidades identificadas; 5) Revise e refine o prompt original para reduzir ambiguidades."
-        }
+        self.sources = [os.path.abspath(path) for path in (DEFAULT_SOURCES if sources is None else sources)]
+        self.snapshot_path = snapshot_path
+        self.added_path = added_path
+        self.load_stats = {}
+        self.reload_stats = {"reloads": 0, "errors": 0}
+        self._snapshot = None
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        
+        # Tamanho e data de modificação das fontes indexadas; FAQs de cada
+        # fonte (lidas na primeira recarga) e das incluídas em `added_path`
+        self._source_stats = {}
+        self._source_faqs = None
+        self._added_faqs = {}
+        self._added_offset = 0
+        
+        start = time.perf_counter()
+        self._index = self._load_index()
+        if added_path:
+            added, self._added_offset = read_appended_faqs(added_path)
+            for question, answer in added:
+                key = normalize_question(question)
+                self._added_faqs[key] = answer
+                self._index.add(key, answer)
+        self.load_stats["faqs"] = len(self._index)
+        self.load_stats["seconds"] = time.perf_counter() - start
+    
+    @classmethod
+    def from_faqs(cls, faqs):
+        """
+        Cria uma base de conhecimento apenas em memória, sem arquivos.
+        
+        Args:
+            faqs (dict): Perguntas e respostas, na ordem de inserção
+        
+        Returns:
+            KnowledgeBase: Base com as FAQs informadas
+        """
+        kb = cls(sources=[], snapshot_path=None, added_path=None)
+        kb._index = FaqIndex.build({normalize_question(question): answer for question, answer in faqs.items()})
+        kb.load_stats["faqs"] = len(kb._index)
+        return kb
+    
+    @property
+    def faqs(self):
+        """
+        Perguntas (normalizadas) e respostas da base, como mapeamento somente leitura.
+        """
+        return FaqMapping(self._index)
+    
+    def _load_index(self):
+        """
+        Abre o snapshot do índice, se estiver atualizado em relação às fontes,
+        ou constrói o índice a partir das fontes e grava um novo snapshot.
+        
+        Returns:
+            FaqIndex: Índice das FAQs das fontes
+        """
+        metadata = read_snapshot_metadata(self.snapshot_path) if self.snapshot_path else None
+        if self._snapshot_is_current(metadata):
+            try:
+                index = self._open_snapshot()
+                self._source_stats = {
+                    signature["path"]: (signature["size"], signature["mtime_ns"])
+                    for signature in metadata["sources"]
+                }
+                return index
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Snapshot da base de conhecimento inválido, reconstruindo o índice: {e}")
+        
+        # As assinaturas são calculadas antes da leitura: uma fonte alterada
+        # durante a construção invalida o snapshot na próxima inicialização
+        signatures = [_file_signature(path) for path in self.sources]
+        self._source_stats = {signature["path"]: (signature["size"], signature["mtime_ns"]) for signature in signatures}
+        index = FaqIndex.build(load_faqs(self.sources))
+        self.load_stats["source"] = "build"
+        if not self.snapshot_path:
+            return index
+        
+        metadata = {"format": SNAPSHOT_FORMAT, "index": index_parameters(), "sources": signatures, "faqs": len(index)}
+        try:
+            write_snapshot(self.snapshot_path, index.arrays(), metadata)
+            return self._open_snapshot()
+        except (OSError, ValueError) as e:
+            print(f"Não foi possível gravar o snapshot da base de conhecimento: {e}")
+            return index
+    
+    def _open_snapshot(self):
+        """
+        Mapeia o snapshot em memória e recria o índice sobre os seus arrays.
+        
+        Returns:
+            FaqIndex: Índice das FAQs das fontes
+        """
+        snapshot = Snapshot(self.snapshot_path)
+        index = FaqIndex.from_arrays(snapshot.arrays)
+        self._snapshot = snapshot
+        self.load_stats.setdefault("source", "snapshot")
+        self.load_stats["snapshot_bytes"] = snapshot.nbytes
+        return index
+    
+    def _snapshot_is_current(self, metadata):
+        """
+        Verifica se um snapshot foi gravado com os parâmetros atuais a partir
+        das fontes atuais: fontes com o mesmo tamanho e data de modificação são
+        aceitas sem leitura; as demais, se o conteúdo (SHA-256) não mudou.
+        
+        Args:
+            metadata (dict): Metadados do snapshot (ou None)
+        
+        Returns:
+            bool: True se o snapshot pode ser usado
+        """
+        if not metadata or metadata.get("format") != SNAPSHOT_FORMAT or metadata.get("index") != index_parameters():
+            return False
+        recorded = metadata.get("sources", [])
+        if [signature["path"] for signature in recorded] != self.sources:
+            return False
+        for signature in recorded:
+            try:
+                stat = os.stat(signature["path"])
+            except OSError:
+                return False
+            if stat.st_size == signature["size"] and stat.st_mtime_ns == signature["mtime_ns"]:
+                continue
+            if _file_sha256(signature["path"]) != signature["sha256"]:
+                return False
+        return True
     
     def get_response(self, question):
         """
@@ -48,37 +205,88 @@ class KnowledgeBase:
             tuple: (resposta, encontrada) onde resposta é a string com a resposta
                   e encontrada é um booleano indicando se a resposta foi encontrada
         """
-        # Normaliza a pergunta para comparação (minúsculas e sem pontuação)
-        normalized_question = question.lower().strip('?!.,;:')
+        # Normaliza a pergunta para comparação (minúsculas e sem pontuação) e
+        # busca, em ordem: correspondência exata, palavras-chave e similaridade
+        with self._lock:
+            key_id = self._index.find(normalize_question(question))
+            
+            # Se não encontrar nenhuma correspondência
+            if key_id is None:
+                return FALLBACK_RESPONSE, False
+            return self._index.answer(key_id), True
+    
+    def query(self, question, k=5):
+        """
+        Busca as FAQs mais relevantes para a pergunta, ranqueadas por BM25
+        (a pontuação das respostas entra com peso ANSWER_WEIGHT).
         
-        # Verifica se a pergunta normalizada está na base de conhecimento
-        for key, value in self.faqs.items():
-            if key in normalized_question or normalized_question in key:
-                return value, True
+        Args:
+            question (str): Pergunta do usuário
+            k (int): Número máximo de resultados
         
-        # Se não encontrar correspondência exata, tenta encontrar palavras-chave
-        for key, value in self.faqs.items():
-            key_words = set(key.split())
-            question_words = set(normalized_question.split())
-            
-            # Se pelo menos 70% das palavras-chave estiverem presentes
-            if len(key_words.intersection(question_words)) >= 0.7 * len(key_words):
-                return value, True
+        Returns:
+            list: Dicionários com `question`, `answer`, `score` (BM25) e
+                  `confidence` (0 a 1, sobreposição ponderada pelo IDF entre
+                  os termos da pergunta do usuário e os da FAQ, multiplicada
+                  pela similaridade de trigramas se a FAQ não corresponder à
+                  pergunta exatamente ou por palavras-chave), do mais ao
+                  menos relevante
+        """
+        return self.query_many([question], k)[0]
+    
+    def query_many(self, questions, k=5):
+        """
+        Busca as FAQs mais relevantes para várias perguntas, pontuadas de uma
+        só vez (uma passada vetorizada por índice).
+        
+        Args:
+            questions (list): Perguntas dos usuários
+            k (int): Número máximo de resultados por pergunta
         
-        # Se não encontrar nenhuma correspondência
-        return "Desculpe, não sei responder isso. Posso ajudar com outra dúvida?", False
+        Returns:
+            list: Para cada pergunta, a lista de resultados de `query`
+        """
+        with self._lock:
+            index = self._index
+            results = []
+            for question, matches in zip(questions, index.query_many(questions, k)):
+                # Só a FAQ encontrada por correspondência exata ou por palavras-chave
+                # mantém a confiança integral; as demais são ponderadas pela
+                # similaridade do texto inteiro (com as stopwords)
+                normalized = normalize_question(question)
+                direct = index.find_direct(normalized)
+                results.append([
+                    {
+                        "question": index.key(key_id),
+                        "answer": index.answer(key_id),
+                        "score": score,
+                        "confidence": confidence if key_id == direct else confidence * index.similarity(normalized, key_id)
+                    }
+                    for key_id, score, confidence in matches
+                ])
+            return results
     
     def add_faq(self, question, answer):
         """
-        Adiciona uma nova pergunta e resposta à base de conhecimento.
+        Adiciona uma nova pergunta e resposta à base de conhecimento (ou
+        substitui a resposta de uma pergunta existente), gravando-a em
+        `added_path` para as próximas inicializações.
         
         Args:
             question (str): Nova pergunta
             answer (str): Resposta correspondente
         """
-        normalized_question = question.lower().strip('?!.,;:')
-        self.faqs[normalized_question] = answer
+        if self.added_path:
+            directory = os.path.dirname(os.path.abspath(self.added_path))
+            os.makedirs(directory, exist_ok=True)
+            with open(self.added_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps({"question": question, "answer": answer}, ensure_ascii=False) + "\n")
         
+        key = normalize_question(question)
+        with self._lock:
+            self._added_faqs[key] = answer
+            self._index.add(key, answer)
+    
     def get_all_faqs(self):
         """
         Retorna todas as perguntas e respostas na base de conhecimento.
@@ -86,4 +294,387 @@ class KnowledgeBase:
         Returns:
             dict: Dicionário com as perguntas e respostas
         """
-        return self.faqs 
\ No newline at end of file
+        with self._lock:
+            return dict(self._index.items())
+    
+    def reload(self):
+        """
+        Relê as fontes alteradas (tamanho ou data de modificação) e as FAQs
+        acrescentadas a `added_path` (por exemplo, por outro processo) e aplica
+        ao índice em uso apenas as diferenças. A leitura acontece fora do lock;
+        a aplicação, sob o lock das consultas, que veem o índice inteiro antes
+        ou depois da recarga. Perguntas novas entram no fim da ordem de
+        desempate até a próxima reconstrução do snapshot.
+        
+        A primeira recarga também lê as fontes inalteradas, como base para as
+        comparações seguintes (se alguma fonte mudou desde a inicialização,
+        todas as FAQs do índice são comparadas).
+        
+        Returns:
+            dict: FAQs novas (`added`), alteradas (`changed`) e removidas
+                  (`removed`), tempos de leitura e de aplicação (s), FAQs no
+                  índice, removidas ainda ocupando o índice (`tombstones`) e
+                  tamanho do snapshot; None se nenhum arquivo mudou
+        
+        Raises:
+            OSError, ValueError: Se alguma fonte alterada não puder ser lida
+                (o índice não é alterado)
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            first = self._source_faqs is None
+            source_faqs = list(self._source_faqs or [{} for _ in self.sources])
+            source_stats = dict(self._source_stats)
+            changed = {}
+            compare_all = False
+            for position, path in enumerate(self.sources):
+                stat = _file_stat(path)
+                if stat == self._source_stats.get(path) and not first:
+                    continue
+                faqs = load_faqs([path])
+                if first:
+                    compare_all = compare_all or stat != self._source_stats.get(path)
+                else:
+                    changed.update(dict.fromkeys(_changed_keys(source_faqs[position], faqs)))
+                source_faqs[position] = faqs
+                source_stats[path] = stat
+            
+            added, added_offset, rewritten = [], self._added_offset, False
+            if self.added_path:
+                # Um arquivo menor que o trecho já lido foi reescrito: é relido do início
+                rewritten = (_file_stat(self.added_path) or (0, 0))[0] < added_offset
+                added, added_offset = read_appended_faqs(self.added_path, 0 if rewritten else added_offset)
+            
+            if not first and not changed and not added and not rewritten and source_stats == self._source_stats:
+                return None
+            read_seconds = time.perf_counter() - start
+            
+            with self._lock:
+                index = self._index
+                self._source_faqs = source_faqs
+                self._source_stats = source_stats
+                if rewritten:
+                    changed.update(dict.fromkeys(self._added_faqs))
+                    self._added_faqs = {}
+                for question, answer in added:
+                    key = normalize_question(question)
+                    self._added_faqs[key] = answer
+                    changed[key] = None
+                self._added_offset = added_offset
+                if compare_all:
+                    for faqs in source_faqs:
+                        changed.update(dict.fromkeys(faqs))
+                    changed.update((key, None) for key, _ in index.items())
+                
+                counts = {"added": 0, "changed": 0, "removed": 0}
+                for key in changed:
+                    answer = self._current_answer(key)
+                    key_id = index.get(key)
+                    if answer is None:
+                        if index.remove(key):
+                            counts["removed"] += 1
+                    elif key_id is None:
+                        index.add(key, answer)
+                        counts["added"] += 1
+                    elif index.answer(key_id) != answer:
+                        index.add(key, answer)
+                        counts["changed"] += 1
+                
+                stats = dict(counts)
+                stats["read_seconds"] = read_seconds
+                stats["apply_seconds"] = time.perf_counter() - start - read_seconds
+                stats["faqs"] = len(index)
+                stats["tombstones"] = index.removed
+                stats["snapshot_bytes"] = self._snapshot.nbytes if self._snapshot else 0
+            
+            self.reload_stats["reloads"] += 1
+            self.reload_stats.update(stats)
+            return stats
+    
+    def _current_answer(self, key):
+        """
+        Retorna a resposta vigente de uma pergunta nos arquivos: a incluída por
+        `add_faq`, senão a da última fonte que a contém (None se nenhuma).
+        """
+        answer = self._added_faqs.get(key)
+        if answer is None:
+            for faqs in reversed(self._source_faqs):
+                answer = faqs.get(key)
+                if answer is not None:
+                    break
+        return answer
+    
+    def start_watching(self, interval=5.0):
+        """
+        Inicia a thread que verifica as fontes a cada `interval` segundos e
+        recarrega as alteradas (`reload`).
+        
+        Args:
+            interval (float): Intervalo, em segundos, entre as verificações
+        """
+        with self._reload_lock:
+            if self._watcher and self._watcher.is_alive():
+                return
+            self._stop_watching.clear()
+            self._watcher = threading.Thread(
+                target=self._watch, args=(interval,), name="knowledge-base-watcher", daemon=True
+            )
+            self._watcher.start()
+    
+    def stop_watching(self):
+        """
+        Encerra a thread de verificação das fontes.
+        """
+        self._stop_watching.set()
+        watcher = self._watcher
+        if watcher and watcher.is_alive():
+            watcher.join()
+        self._watcher = None
+    
+    def _watch(self, interval):
+        """
+        Laço da thread de verificação: recarrega as fontes alteradas e informa
+        as recargas com alterações e os erros de leitura (uma vez por erro).
+        """
+        last_error = None
+        while not self._stop_watching.wait(interval):
+            try:
+                stats = self.reload()
+            except (OSError, ValueError) as e:
+                self.reload_stats["errors"] += 1
+                if str(e) != last_error:
+                    print(f"Não foi possível recarregar a base de conhecimento (mantida a versão atual): {e}")
+                last_error = str(e)
+                continue
+            last_error = None
+            if stats and stats["added"] + stats["changed"] + stats["removed"]:
+                print(
+                    f"Base de conhecimento recarregada em {(stats['read_seconds'] + stats['apply_seconds']) * 1000:.1f} ms "
+                    f"(aplicação: {stats['apply_seconds'] * 1e6:.0f} µs): {stats['added']} novas, "
+                    f"{stats['changed']} alteradas, {stats['removed']} removidas; {stats['faqs']} FAQs, "
+                    f"{stats['tombstones']} removidas no índice, snapshot de {stats['snapshot_bytes'] / 2**20:.1f} MiB"
+                )
+
+
+class FaqMapping(Mapping):
+    """
+    Visão somente leitura das FAQs de um índice (pergunta normalizada -> resposta),
+    na ordem de inserção, sem copiar as perguntas e respostas.
+    """
+    
+    def __init__(self, index):
+        self._index = index
+    
+    def __getitem__(self, question):
+        key_id = self._index.get(question)
+        if key_id is None:
+            raise KeyError(question)
+        return self._index.answer(key_id)
+    
+    def __iter__(self):
+        for key, _ in self._index.items():
+            yield key
+    
+    def __len__(self):
+        return len(self._index)
+    
+    def __contains__(self, question):
+        return self._index.get(question) is not None
+
+
+def normalize_question(question):
+    """
+    Normaliza uma pergunta para comparação: minúsculas e sem pontuação nas bordas.
+    
+    Args:
+        question (str): Pergunta original
+    
+    Returns:
+        str: Pergunta normalizada
+    """
+    return question.lower().strip('?!.,;:')
+
+
+def load_faqs(paths):
+    """
+    Carrega as FAQs de vários arquivos, em ordem. Perguntas repetidas ficam na
+    posição da primeira ocorrência, com a resposta da última.
+    
+    Args:
+        paths (list): Arquivos de FAQs (YAML ou JSONL)
+    
+    Returns:
+        dict: Perguntas normalizadas e respostas, na ordem de inserção
+    """
+    faqs = {}
+    for path in paths:
+        for question, answer in read_faq_file(path):
+            faqs[normalize_question(question)] = answer
+    return faqs
+
+
+def get_knowledge_base(sources=None, snapshot_path=DEFAULT_SNAPSHOT_PATH, added_path=DEFAULT_ADDED_PATH,
+                       reload_interval=0):
+    """
+    Retorna a base de conhecimento compartilhada para os arquivos informados,
+    criando-a na primeira chamada (as sessões do mesmo processo usam o mesmo
+    índice e veem as mesmas recargas).
+    
+    Args:
+        sources (list, optional): Arquivos de FAQs (YAML ou JSONL), em ordem
+            (padrão: DEFAULT_SOURCES)
+        snapshot_path (str, optional): Arquivo do snapshot do índice (None desativa o snapshot)
+        added_path (str, optional): Arquivo JSONL das FAQs incluídas com `add_faq`
+        reload_interval (float): Intervalo, em segundos, entre as verificações
+            das fontes para recarga (0 desativa)
+    
+    Returns:
+        KnowledgeBase: Base de conhecimento compartilhada
+    """
+    key = (
+        tuple(os.path.abspath(path) for path in (DEFAULT_SOURCES if sources is None else sources)),
+        os.path.abspath(snapshot_path) if snapshot_path else None,
+        os.path.abspath(added_path) if added_path else None
+    )
+    with _knowledge_bases_lock:
+        kb = _knowledge_bases.get(key)
+        if kb is None:
+            kb = KnowledgeBase(sources, snapshot_path, added_path)
+            _knowledge_bases[key] = kb
+        if reload_interval > 0:
+            kb.start_watching(reload_interval)
+        return kb
+
+
+def read_faq_file(path):
+    """
+    Lê as FAQs de um arquivo. Em YAML, uma lista de itens com `question` e
+    `answer` ou um mapeamento pergunta -> resposta; em JSONL (`.jsonl`), um
+    objeto com `question` e `answer` por linha.
+    
+    Args:
+        path (str): Caminho do arquivo
+    
+    Returns:
+        list: Pares (pergunta, resposta), na ordem do arquivo
+    
+    Raises:
+        ValueError: Se o formato do arquivo ou de algum item for inválido
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, 'r', encoding='utf-8') as file:
+        if extension == '.jsonl':
+            items = []
+            for line_number, line in enumerate(file, 1):
+                if line.strip():
+                    try:
+                        items.append((f"{path}:{line_number}", json.loads(line)))
+                    except ValueError as e:
+                        raise ValueError(f"{path}:{line_number}: JSON inválido ({e})")
+        elif extension in ('.yaml', '.yml'):
+            data = yaml.safe_load(file) or []
+            if isinstance(data, dict):
+                data = [{"question": question, "answer": answer} for question, answer in data.items()]
+            if not isinstance(data, list):
+                raise ValueError(f"{path}: esperada uma lista de FAQs ou um mapeamento pergunta -> resposta")
+            items = [(f"{path}[{position}]", item) for position, item in enumerate(data)]
+        else:
+            raise ValueError(f"{path}: formato de arquivo de FAQs não suportado (use .yaml, .yml ou .jsonl)")
+    
+    return [_faq_item(location, item) for location, item in items]
+
+
+def read_appended_faqs(path, offset=0):
+    """
+    Lê as FAQs de um arquivo JSONL a partir de uma posição, até a última linha
+    completa (uma linha sendo gravada fica para a próxima leitura).
+    
+    Args:
+        path (str): Caminho do arquivo (inexistente equivale a vazio)
+        offset (int): Posição, em bytes, onde a leitura começa
+    
+    Returns:
+        tuple: (pares (pergunta, resposta) na ordem do arquivo, posição após a última linha lida)
+    
+    Raises:
+        ValueError: Se alguma linha não for uma FAQ válida
+    """
+    try:
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            data = file.read()
+    except FileNotFoundError:
+        return [], 0
+    
+    end = data.rfind(b"\n") + 1
+    faqs = []
+    position = offset
+    for line in data[:end].splitlines(keepends=True):
+        location = f"{path} (byte {position})"
+        position += len(line)
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"{location}: JSON inválido ({e})")
+        faqs.append(_faq_item(location, item))
+    return faqs, offset + end
+
+
+def _faq_item(location, item):
+    """
+    Valida um item de arquivo de FAQs e retorna o par (pergunta, resposta).
+    
+    Raises:
+        ValueError: Se o item não tiver `question` e `answer` (textos)
+    """
+    if not isinstance(item, dict) or not isinstance(item.get("question"), str) or not isinstance(item.get("answer"), str):
+        raise ValueError(f"{location}: cada FAQ precisa de 'question' e 'answer' (textos)")
+    return item["question"], item["answer"]
+
+
+def _changed_keys(old, new):
+    """
+    Retorna as perguntas incluídas, alteradas ou removidas entre duas versões
+    das FAQs de uma fonte, na ordem da nova versão (as removidas no fim).
+    """
+    changed = [key for key, answer in new.items() if old.get(key) != answer]
+    changed.extend(key for key in old if key not in new)
+    return changed
+
+
+def _file_stat(path):
+    """
+    Retorna o tamanho e a data de modificação (ns) de um arquivo, ou None se ele não existir.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _file_signature(path):
+    """
+    Retorna a assinatura de um arquivo de FAQs gravada no snapshot.
+    
+    Args:
+        path (str): Caminho absoluto do arquivo
+    
+    Returns:
+        dict: Caminho, tamanho, data de modificação (ns) e SHA-256 do conteúdo
+    """
+    stat = os.stat(path)
+    return {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": _file_sha256(path)}
+
+
+def _file_sha256(path):
+    """
+    Calcula o SHA-256 do conteúdo de um arquivo.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -1,7 +1,28 @@
 import yaml
 import openai
 import json
-from typing import Dict, Any, Optional, List, Tuple
+import time
+import hashlib
+from typing import Dict, Any, Optional, List, Tuple, Iterator, Callable
+from context_manager import count_tokens
+from database import connection_options
+from response_cache import ResponseCache
+from resilience import INTERRUPTIONS, RetryPolicy, CircuitOpenError, get_circuit_breaker
+
+# Início das mensagens de erro devolvidas quando a chamada ao modelo falha
+ERROR_RESPONSE_PREFIX = "Desculpe, ocorreu um erro ao processar sua solicitação"
+
+# Instruções enviadas uma única vez por lote na extração de insights
+INSIGHTS_BATCH_PREAMBLE = """Analise as interações abaixo entre usuários e um agente de IA sobre Engenharia de Prompt.
+
+Para cada interação, extraia os seguintes insights:
+1. category: Categoria da pergunta (definição, procedimento, comparação, exemplificação, ou outro)
+2. patterns: Lista de padrões identificados na pergunta
+3. possible_improvements: Sugestões para melhorar a base de conhecimento
+
+Retorne apenas um array JSON, sem explicações adicionais, com um objeto por interação
+contendo os campos "index" (número da interação), "category", "patterns" e "possible_improvements"."""
+
 
 class LLMService:
     """
@@ -16,7 +37,11 @@ class LLMService:
             config_path (str): Caminho para o arquivo de configuração YAML
         """
         self.config = self._load_config(config_path)
+        self.last_stream_metrics: Dict[str, Any] = {}
+        self.last_usage: Dict[str, Any] = {}
+        self.insight_stats = {"calls": 0, "interactions": 0}
         self._setup_client()
+        self.response_cache = self._setup_cache()
     
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """
@@ -24,7 +49,7 @@ class LLMService:
         
         Args:
             config_path (str): Caminho para o arquivo de configuração
-            
+        
         Returns:
             Dict[str, Any]: Configurações carregadas
         """
@@ -43,60 +68,422 @@ class LLMService:
         if not api_key:
             raise ValueError("API key não encontrada na configuração.")
         
+        # As novas tentativas são feitas por `_call_with_retry`, não pelo cliente
+        resilience_config = self.config.get('resilience', {})
+        self.retry_policy = RetryPolicy(
+            max_attempts=resilience_config.get('max_attempts', 3),
+            base_delay=resilience_config.get('base_delay', 0.5),
+            max_delay=resilience_config.get('max_delay', 4.0)
+        )
+        self.attempt_timeout = resilience_config.get('attempt_timeout', 20)
+        self.total_timeout = resilience_config.get('total_timeout', 45)
+        base_url = self.config.get('model', {}).get('base_url')
+        self.circuit_breaker = get_circuit_breaker(
+            f"{base_url or 'openai'}:{self.config.get('model', {}).get('name', 'gpt-4o')}",
+            failure_threshold=resilience_config.get('failure_threshold', 5),
+            reset_timeout=resilience_config.get('reset_timeout', 30)
+        )
+        
         # Configurar o cliente OpenAI
-        self.client = openai.OpenAI(api_key=api_key)
+        self._client_options = {"api_key": api_key, "timeout": self.attempt_timeout, "max_retries": 0}
+        if base_url:
+            # Endpoint compatível com a OpenAI (por exemplo, o servidor simulado de stub_server.py)
+            self._client_options["base_url"] = base_url
+        self.client = openai.OpenAI(**self._client_options)
+    
+    def _call_with_retry(self, request: Callable[[float], Any]) -> Any:
+        """
+        Executa uma chamada ao provedor protegida pelo circuit breaker, com novas
+        tentativas (backoff exponencial com jitter) para erros transitórios.
+        
+        Cada tentativa tem um tempo limite próprio (`resilience.attempt_timeout`)
+        e o conjunto das tentativas não ultrapassa `resilience.total_timeout`.
+        
+        Args:
+            request (Callable[[float], Any]): Função que faz a chamada, recebendo o
+                tempo limite da tentativa em segundos
+        
+        Returns:
+            Any: Resultado da chamada
+        
+        Raises:
+            CircuitOpenError: Se o circuito estiver aberto (a chamada não é feita)
+        """
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError("serviço de LLM temporariamente indisponível")
+        
+        start = time.perf_counter()
+        delays = self.retry_policy.delays()
+        try:
+            while True:
+                remaining = self.total_timeout - (time.perf_counter() - start)
+                try:
+                    result = request(min(self.attempt_timeout, max(remaining, 0.1)))
+                except Exception as e:
+                    delay = next(delays, None) if self.retry_policy.is_retryable(e) else None
+                    elapsed = time.perf_counter() - start
+                    if delay is None or elapsed + delay >= self.total_timeout:
+                        self.circuit_breaker.record_failure(e, elapsed)
+                        raise
+                    self.circuit_breaker.record_retry()
+                    time.sleep(delay)
+                    continue
+                self.circuit_breaker.record_success(time.perf_counter() - start)
+                return result
+        except INTERRUPTIONS:
+            # Chamada interrompida (KeyboardInterrupt, por exemplo): libera a
+            # chamada de teste do circuito sem registrar uma falha
+            self.circuit_breaker.record_cancelled()
+            raise
+    
+    def get_health(self) -> Dict[str, Any]:
+        """
+        Retorna o estado do circuit breaker e os tempos das chamadas ao provedor,
+        para monitoramento.
+        
+        Returns:
+            Dict[str, Any]: Estado do circuito, contadores e última latência
+        """
+        return self.circuit_breaker.snapshot()
+    
+    def _record_usage(self, usage: Any, latency: float):
+        """
+        Registra em `last_usage` os tokens informados pelo provedor e a latência da chamada.
+        
+        Args:
+            usage: Objeto `usage` da resposta (pode ser None)
+            latency (float): Duração da chamada, em segundos
+        """
+        self.last_usage = self._usage_info(usage, latency)
+    
+    @staticmethod
+    def _usage_info(usage: Any, latency: float) -> Dict[str, Any]:
+        """
+        Converte o uso informado pelo provedor no formato de `last_usage`.
+        
+        Args:
+            usage: Objeto `usage` da resposta (pode ser None)
+            latency (float): Duração da chamada, em segundos
+        
+        Returns:
+            Dict[str, Any]: Tokens de entrada, de saída e atendidos pelo cache, e latência (ms)
+        """
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+            "cached_tokens": getattr(details, "cached_tokens", None) or (0 if usage is not None else None),
+            "latency_ms": latency * 1000
+        }
+    
+    def _setup_cache(self) -> Optional[ResponseCache]:
+        """
+        Configura o cache de respostas, se habilitado, e o invalida caso o
+        endpoint (`model.base_url`), o modelo ou o prompt de sistema tenham
+        mudado desde a última execução.
+        
+        Returns:
+            Optional[ResponseCache]: Cache configurado ou None se desabilitado
+        """
+        cache_config = self.config.get('cache', {})
+        if not cache_config.get('enabled', False):
+            return None
+        
+        db_config = self.config.get('database', {})
+        cache = ResponseCache(
+            db_config.get('path', 'prompt_agent.db'),
+            memory_entries=cache_config.get('memory_entries', 256),
+            max_entries=cache_config.get('max_entries', 10000),
+            ttl_seconds=cache_config.get('ttl_seconds', 7 * 24 * 3600),
+            **connection_options(db_config)
+        )
+        
+        model_config = self.config.get('model', {})
+        model_name = model_config.get('name', 'gpt-4o')
+        system_prompt = self.config.get('agent', {}).get('system_prompt', '')
+        # Respostas de outro endpoint (por exemplo, o servidor simulado) não são reaproveitadas
+        fingerprint = hashlib.sha256(
+            f"{model_config.get('base_url') or ''}\n{model_name}\n{system_prompt}".encode('utf-8')
+        ).hexdigest()
+        cache.invalidate_if_changed(fingerprint)
+        
+        return cache
+    
+    def _lookup_cache(self, model_name: str, messages: List[Dict[str, str]],
+                      temperature: float, max_tokens: int,
+                      use_cache: bool) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Consulta o cache de respostas para uma requisição preparada.
+        
+        Args:
+            model_name (str): Nome do modelo
+            messages (List[Dict[str, str]]): Mensagens da requisição
+            temperature (float): Temperatura da requisição
+            max_tokens (int): Número máximo de tokens da resposta
+            use_cache (bool): Se False, ignora o cache
+        
+        Returns:
+            Tuple[Optional[str], Optional[str]]: (chave para armazenar a resposta, resposta em cache);
+                                                 ambos None se o cache não for usado
+        """
+        if not self.response_cache or not use_cache:
+            return None, None
+        first = 1 if messages[0]["role"] == "system" else 0
+        system_prompt = messages[0]["content"] if first else ""
+        previous = messages[first:-1]
+        context = json.dumps(previous, ensure_ascii=False) if previous else ""
+        cache_key = ResponseCache.make_key(model_name, system_prompt, messages[-1]["content"],
+                                           temperature, max_tokens, context,
+                                           endpoint=self._client_options.get("base_url", ""))
+        return cache_key, self.response_cache.get(cache_key)
+    
+    def _prepare_request(self,
+                         prompt: str,
+                         system_prompt: Optional[str] = None,
+                         temperature: Optional[float] = None,
+                         max_tokens: Optional[int] = None,
+                         history: Optional[List[Dict[str, str]]] = None,
+                         summary: Optional[str] = None) -> Tuple[str, List[Dict[str, str]], float, int]:
+        """
+        Resolve os parâmetros da requisição e monta a lista de mensagens.
+        
+        A ordem das mensagens favorece o cache de prefixo do provedor: o prompt
+        de sistema (estável), o resumo da conversa (muda só quando mensagens
+        antigas saem do contexto), as mensagens anteriores (só são acrescentadas)
+        e, por último, a pergunta atual.
+        
+        Args:
+            prompt (str): Pergunta ou prompt do usuário
+            system_prompt (str, optional): Prompt de sistema para orientar o modelo
+            temperature (float, optional): Temperatura para controlar a aleatoriedade
+            max_tokens (int, optional): Número máximo de tokens na resposta
+            history (List[Dict[str, str]], optional): Mensagens anteriores da conversa
+                ("role" user/assistant e "content")
+            summary (str, optional): Resumo das mensagens que já saíram do contexto
+        
+        Returns:
+            Tuple[str, List[Dict[str, str]], float, int]: (modelo, mensagens, temperatura, max_tokens)
+        """
+        # Obter configurações do arquivo de configuração ou usar valores padrão
+        model_name = self.config.get('model', {}).get('name', 'gpt-4o')
+        _temperature = temperature or self.config.get('agent', {}).get('temperature', 0.7)
+        _max_tokens = max_tokens or self.config.get('agent', {}).get('max_tokens', 1000)
+        _system_prompt = system_prompt or self.config.get('agent', {}).get('system_prompt', '')
+        
+        # Preparar mensagens para o modelo
+        messages = []
+        
+        # Adicionar o prompt de sistema se fornecido
+        if _system_prompt:
+            messages.append({"role": "system", "content": _system_prompt})
+        
+        # Adicionar o resumo e as mensagens anteriores da conversa
+        if summary:
+            messages.append({"role": "system", "content": f"Resumo da conversa anterior:\n{summary}"})
+        if history:
+            messages.extend(history)
+        
+        # Adicionar a mensagem do usuário
+        messages.append({"role": "user", "content": prompt})
+        
+        return model_name, messages, _temperature, _max_tokens
     
     def get_completion(self, 
                        prompt: str, 
                        system_prompt: Optional[str] = None,
                        temperature: Optional[float] = None,
-                       max_tokens: Optional[int] = None) -> Tuple[str, bool]:
+                       max_tokens: Optional[int] = None,
+                       use_cache: bool = True,
+                       history: Optional[List[Dict[str, str]]] = None,
+                       summary: Optional[str] = None) -> Tuple[str, bool]:
         """
         Envia uma solicitação ao modelo LLM e obtém uma resposta.
         
+        Ao final, `last_usage` contém os tokens consumidos (incluindo os
+        atendidos pelo cache de prefixo do provedor) e a latência da chamada.
+        
         Args:
             prompt (str): Pergunta ou prompt do usuário
             system_prompt (str, optional): Prompt de sistema para orientar o modelo
             temperature (float, optional): Temperatura para controlar a aleatoriedade
             max_tokens (int, optional): Número máximo de tokens na resposta
-            
+            use_cache (bool): Se False, ignora o cache de respostas
+            history (List[Dict[str, str]], optional): Mensagens anteriores da conversa
+            summary (str, optional): Resumo das mensagens que já saíram do contexto
+        
         Returns:
             Tuple[str, bool]: (Resposta do modelo, indicador de sucesso)
         """
+        self.last_usage = {}
         try:
-            # Obter configurações do arquivo de configuração ou usar valores padrão
-            model_name = self.config.get('model', {}).get('name', 'gpt-4o')
-            _temperature = temperature or self.config.get('agent', {}).get('temperature', 0.7)
-            _max_tokens = max_tokens or self.config.get('agent', {}).get('max_tokens', 1000)
-            _system_prompt = system_prompt or self.config.get('agent', {}).get('system_prompt', '')
-            
-            # Preparar mensagens para o modelo
-            messages = []
-            
-            # Adicionar o prompt de sistema se fornecido
-            if _system_prompt:
-                messages.append({"role": "system", "content": _system_prompt})
+            model_name, messages, _temperature, _max_tokens = self._prepare_request(
+                prompt, system_prompt, temperature, max_tokens, history, summary
+            )
             
-            # Adicionar a mensagem do usuário
-            messages.append({"role": "user", "content": prompt})
+            # Consultar o cache de respostas antes de chamar o modelo
+            cache_key, cached = self._lookup_cache(model_name, messages, _temperature, _max_tokens, use_cache)
+            if cached is not None:
+                return cached, True
             
             # Enviar a solicitação ao modelo
-            response = self.client.chat.completions.create(
+            start = time.perf_counter()
+            response = self._call_with_retry(lambda timeout: self.client.chat.completions.create(
                 model=model_name,
                 messages=messages,
                 temperature=_temperature,
-                max_tokens=_max_tokens
-            )
+                max_tokens=_max_tokens,
+                timeout=timeout
+            ))
+            self._record_usage(getattr(response, "usage", None), time.perf_counter() - start)
             
             # Extrair a resposta do modelo
             answer = response.choices[0].message.content.strip()
             
-            return answer, True
+            if cache_key:
+                self.response_cache.set(cache_key, answer)
             
+            return answer, True
+        
         except Exception as e:
-            error_message = f"Desculpe, ocorreu um erro ao processar sua solicitação: {str(e)}"
+            error_message = f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
             return error_message, False
     
+    def stream_completion(self,
+                          prompt: str,
+                          system_prompt: Optional[str] = None,
+                          temperature: Optional[float] = None,
+                          max_tokens: Optional[int] = None,
+                          use_cache: bool = True,
+                          yield_errors: bool = True,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          summary: Optional[str] = None) -> Iterator[str]:
+        """
+        Envia uma solicitação ao modelo LLM e devolve a resposta em partes,
+        à medida que os tokens são gerados.
+        
+        Ao final da iteração, `last_stream_metrics` contém o tempo até o
+        primeiro token, o tempo total e o indicador de sucesso, e `last_usage`
+        os tokens consumidos.
+        
+        Args:
+            prompt (str): Pergunta ou prompt do usuário
+            system_prompt (str, optional): Prompt de sistema para orientar o modelo
+            temperature (float, optional): Temperatura para controlar a aleatoriedade
+            max_tokens (int, optional): Número máximo de tokens na resposta
+            use_cache (bool): Se False, ignora o cache de respostas
+            yield_errors (bool): Se False, a mensagem de erro não é devolvida no
+                stream (útil quando quem chama tem uma resposta alternativa)
+            history (List[Dict[str, str]], optional): Mensagens anteriores da conversa
+            summary (str, optional): Resumo das mensagens que já saíram do contexto
+        
+        Yields:
+            str: Trechos (deltas) da resposta do modelo
+        """
+        start = time.perf_counter()
+        metrics = {
+            "time_to_first_token": None,
+            "total_time": None,
+            "chunks": 0,
+            "success": False,
+            "cached": False
+        }
+        self.last_stream_metrics = metrics
+        self.last_usage = {}
+        
+        try:
+            model_name, messages, _temperature, _max_tokens = self._prepare_request(
+                prompt, system_prompt, temperature, max_tokens, history, summary
+            )
+            
+            # Uma resposta em cache é devolvida de uma só vez
+            cache_key, cached = self._lookup_cache(model_name, messages, _temperature, _max_tokens, use_cache)
+            if cached is not None:
+                metrics["time_to_first_token"] = time.perf_counter() - start
+                metrics["chunks"] = 1
+                metrics["success"] = True
+                metrics["cached"] = True
+                yield cached
+                return
+            
+            # Só a abertura do stream é repetida: trechos já entregues não podem ser refeitos
+            chunks = []
+            stream = self._call_with_retry(lambda timeout: self.client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=_temperature,
+                max_tokens=_max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=timeout
+            ))
+            
+            usage = None
+            try:
+                for chunk in stream:
+                    # O uso de tokens chega em um último trecho, sem `choices`
+                    if getattr(chunk, "usage", None) is not None:
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if metrics["time_to_first_token"] is None:
+                        metrics["time_to_first_token"] = time.perf_counter() - start
+                    metrics["chunks"] += 1
+                    chunks.append(delta)
+                    yield delta
+            finally:
+                # Fecha a conexão também quando quem consome o stream para antes do fim
+                stream.close()
+            
+            metrics["success"] = True
+            self._record_usage(usage, time.perf_counter() - start)
+            if cache_key:
+                self.response_cache.set(cache_key, "".join(chunks).strip())
+        
+        except Exception as e:
+            if yield_errors:
+                yield f"{ERROR_RESPONSE_PREFIX}: {str(e)}"
+        finally:
+            metrics["total_time"] = time.perf_counter() - start
+    
+    def summarize_conversation(self,
+                               previous_summary: str,
+                               turns: List[Dict[str, Any]],
+                               max_tokens: int) -> str:
+        """
+        Atualiza o resumo da conversa com as mensagens que saíram do contexto.
+        
+        Args:
+            previous_summary (str): Resumo acumulado até agora
+            turns (List[Dict[str, Any]]): Mensagens removidas do contexto ("role" e "content")
+            max_tokens (int): Tamanho máximo do resumo, em tokens
+        
+        Returns:
+            str: Novo resumo
+        """
+        model_name = self.config.get('model', {}).get('name', 'gpt-4o')
+        transcript = "\n".join(
+            f"{'Usuário' if turn['role'] == 'user' else 'Agente'}: {turn['content']}" for turn in turns
+        )
+        prompt = (
+            "Atualize o resumo de uma conversa entre um usuário e um agente sobre Engenharia de Prompt.\n"
+            f"Use no máximo {int(max_tokens * 0.75)} palavras, mantendo os temas, as dúvidas e as "
+            "informações do usuário relevantes para as próximas perguntas. Retorne apenas o resumo.\n\n"
+            f"Resumo atual:\n{previous_summary or '(vazio)'}\n\n"
+            f"Novas mensagens:\n{transcript}"
+        )
+        
+        response = self._call_with_retry(lambda timeout: self.client.chat.completions.create(
+            model=model_name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=max_tokens,
+            timeout=timeout
+        ))
+        return response.choices[0].message.content.strip()
+    
     def extract_insights(self, query: str, response: str) -> Dict[str, Any]:
         """
         Extrai insights da interação entre usuário e modelo.
@@ -104,55 +491,238 @@ class LLMService:
         Args:
             query (str): Pergunta do usuário
             response (str): Resposta do modelo
-            
+        
         Returns:
             Dict[str, Any]: Insights extraídos
         """
+        return self.extract_insights_batch([(query, response)])[0]
+    
+    def extract_insights_batch(self, interactions: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Extrai insights de várias interações, agrupando-as em poucas chamadas ao modelo.
+        
+        As interações são divididas em lotes limitados pelo orçamento de tokens
+        de entrada (`insights.batch_token_budget`). Cada lote é enviado em uma
+        única chamada que devolve um array JSON; se a resposta não puder ser
+        interpretada, o lote é dividido ao meio e reenviado.
+        
+        Args:
+            interactions (List[Tuple[str, str]]): Pares (pergunta do usuário, resposta do agente)
+        
+        Returns:
+            List[Dict[str, Any]]: Insights extraídos, na mesma ordem das interações
+        """
+        token_budget = self.config.get('insights', {}).get('batch_token_budget', 3000)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(interactions)
+        
+        for batch in self._plan_insight_batches(interactions, token_budget):
+            self._extract_insights_split(interactions, batch, results)
+        
+        return results
+    
+    def _plan_insight_batches(self, interactions: List[Tuple[str, str]], token_budget: int) -> List[List[int]]:
+        """
+        Agrupa os índices das interações em lotes que respeitam o orçamento de tokens.
+        
+        Args:
+            interactions (List[Tuple[str, str]]): Pares (pergunta, resposta)
+            token_budget (int): Número máximo estimado de tokens de entrada por lote
+        
+        Returns:
+            List[List[int]]: Lotes de índices das interações
+        """
+        model_name = self.config.get('model', {}).get('name')
+        batches = []
+        current: List[int] = []
+        used = count_tokens(INSIGHTS_BATCH_PREAMBLE, model_name)
+        preamble = used
+        
+        for i, (query, response) in enumerate(interactions):
+            cost = count_tokens(query, model_name) + count_tokens(response, model_name) + 20
+            if current and used + cost > token_budget:
+                batches.append(current)
+                current = []
+                used = preamble
+            current.append(i)
+            used += cost
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _extract_insights_split(self,
+                                interactions: List[Tuple[str, str]],
+                                batch: List[int],
+                                results: List[Optional[Dict[str, Any]]]):
+        """
+        Extrai os insights de um lote, dividindo-o e tentando novamente as
+        interações cujo resultado não pôde ser validado.
+        
+        Args:
+            interactions (List[Tuple[str, str]]): Pares (pergunta, resposta)
+            batch (List[int]): Índices das interações do lote
+            results (List[Optional[Dict[str, Any]]]): Lista de resultados, preenchida no lugar
+        """
         try:
-            # Preparar um prompt para extrair insights
-            insight_prompt = f"""
-            Analise a seguinte interação entre um usuário e um agente de IA sobre Engenharia de Prompt:
-            
-            Pergunta do usuário: "{query}"
-            
-            Resposta do agente: "{response}"
-            
-            Por favor, extraia e forneça os seguintes insights no formato JSON:
-            1. category: Categoria da pergunta (definição, procedimento, comparação, exemplificação, ou outro)
-            2. patterns: Lista de padrões identificados na pergunta
-            3. possible_improvements: Sugestões para melhorar a base de conhecimento
-            
-            Retorne apenas o JSON sem explicações adicionais.
-            """
-            
-            # Obter insights do modelo
-            model_name = self.config.get('model', {}).get('name', 'gpt-4o')
-            
-            response = self.client.chat.completions.create(
-                model=model_name,
-                messages=[{"role": "user", "content": insight_prompt}],
-                temperature=0.3,  # Baixa temperatura para respostas mais consistentes
-                max_tokens=500
-            )
-            
-            # Extrair e analisar o JSON da resposta
-            insights_text = response.choices[0].message.content.strip()
-            
-            # Tentar extrair o JSON se estiver embutido em blocos de código
-            if "```json" in insights_text:
-                json_str = insights_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in insights_text:
-                json_str = insights_text.split("```")[1].strip()
-            else:
-                json_str = insights_text
-            
-            insights = json.loads(json_str)
-            return insights
-            
+            parsed = self._request_insights_batch([interactions[i] for i in batch])
+            error = None
+        except CircuitOpenError:
+            # Provedor indisponível: as interações continuam pendentes para depois
+            raise
         except Exception as e:
+            parsed = {}
+            error = e
+        
+        for retry in self._apply_insights_batch(batch, parsed, error, results):
+            self._extract_insights_split(interactions, retry, results)
+    
+    def _apply_insights_batch(self,
+                              batch: List[int],
+                              parsed: Dict[int, Dict[str, Any]],
+                              error: Optional[Exception],
+                              results: List[Optional[Dict[str, Any]]]) -> List[List[int]]:
+        """
+        Registra os insights válidos de um lote e decide o que deve ser reenviado.
+        
+        Args:
+            batch (List[int]): Índices das interações do lote
+            parsed (Dict[int, Dict[str, Any]]): Insights válidos por posição no lote (a partir de 1)
+            error (Exception, optional): Erro da chamada, se houver
+            results (List[Optional[Dict[str, Any]]]): Lista de resultados, preenchida no lugar
+        
+        Returns:
+            List[List[int]]: Sub-lotes a reenviar ao modelo
+        """
+        missing = []
+        for position, i in enumerate(batch, 1):
+            if position in parsed:
+                results[i] = parsed[position]
+            else:
+                missing.append(i)
+        
+        if not missing:
+            return []
+        
+        if len(batch) == 1:
             # Retornar um insight padrão em caso de erro
-            return {
+            reason = error or "resposta inválida do modelo"
+            results[batch[0]] = {
                 "category": "unknown",
                 "patterns": ["erro_na_analise"],
-                "possible_improvements": [f"Melhorar a extração de insights: {str(e)}"]
-            } 
\ No newline at end of file
+                "possible_improvements": [f"Melhorar a extração de insights: {reason}"]
+            }
+            return []
+        
+        # Divide as interações sem resultado válido ao meio e tenta novamente
+        if len(missing) == len(batch):
+            middle = len(missing) // 2
+            return [missing[:middle], missing[middle:]]
+        return [missing]
+    
+    def _request_insights_batch(self, interactions: List[Tuple[str, str]]) -> Dict[int, Dict[str, Any]]:
+        """
+        Envia um lote de interações ao modelo e valida o array JSON retornado.
+        
+        Args:
+            interactions (List[Tuple[str, str]]): Pares (pergunta, resposta) do lote
+        
+        Returns:
+            Dict[int, Dict[str, Any]]: Insights válidos indexados pela posição (a partir de 1)
+        """
+        model_name = self.config.get('model', {}).get('name', 'gpt-4o')
+        
+        # Obter insights do modelo
+        prompt = self._build_insights_prompt(interactions)
+        response = self._call_with_retry(lambda timeout: self.client.chat.completions.create(
+            model=model_name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,  # Baixa temperatura para respostas mais consistentes
+            max_tokens=self._insights_max_tokens(len(interactions)),
+            timeout=timeout
+        ))
+        self.insight_stats["calls"] += 1
+        self.insight_stats["interactions"] += len(interactions)
+        
+        return self._parse_insights_reply(response.choices[0].message.content.strip(), len(interactions))
+    
+    def _build_insights_prompt(self, interactions: List[Tuple[str, str]]) -> str:
+        """
+        Monta o prompt de extração de insights de um lote de interações.
+        
+        Args:
+            interactions (List[Tuple[str, str]]): Pares (pergunta, resposta) do lote
+        
+        Returns:
+            str: Prompt com as instruções seguidas das interações numeradas
+        """
+        items = []
+        for position, (query, response) in enumerate(interactions, 1):
+            items.append(
+                f"Interação {position}:\n"
+                f"Pergunta do usuário: {json.dumps(query, ensure_ascii=False)}\n"
+                f"Resposta do agente: {json.dumps(response, ensure_ascii=False)}"
+            )
+        return INSIGHTS_BATCH_PREAMBLE + "\n\n" + "\n\n".join(items)
+    
+    def _insights_max_tokens(self, batch_size: int) -> int:
+        """
+        Calcula o limite de tokens de saída para um lote de insights.
+        
+        Args:
+            batch_size (int): Número de interações do lote
+        
+        Returns:
+            int: Valor de max_tokens da requisição
+        """
+        tokens_per_item = self.config.get('insights', {}).get('output_tokens_per_item', 200)
+        return 100 + tokens_per_item * batch_size
+    
+    def _parse_insights_reply(self, text: str, batch_size: int) -> Dict[int, Dict[str, Any]]:
+        """
+        Interpreta e valida o array JSON de insights retornado pelo modelo.
+        
+        Args:
+            text (str): Resposta do modelo
+            batch_size (int): Número de interações do lote
+        
+        Returns:
+            Dict[int, Dict[str, Any]]: Insights válidos indexados pela posição (a partir de 1)
+        """
+        data = json.loads(self._extract_json_block(text))
+        if isinstance(data, dict) and batch_size == 1:
+            data = [dict(data, index=1)]
+        if not isinstance(data, list):
+            raise ValueError("o modelo não retornou um array JSON")
+        
+        parsed = {}
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            position = item.get("index")
+            if not isinstance(position, int) or not 1 <= position <= batch_size:
+                continue
+            if not isinstance(item.get("category"), str):
+                continue
+            parsed[position] = {
+                "category": item["category"],
+                "patterns": [str(p) for p in item.get("patterns") or []],
+                "possible_improvements": [str(p) for p in item.get("possible_improvements") or []]
+            }
+        return parsed
+    
+    def _extract_json_block(self, text: str) -> str:
+        """
+        Extrai o JSON de um texto, removendo blocos de código se houver.
+        
+        Args:
+            text (str): Texto retornado pelo modelo
+        
+        Returns:
+            str: Trecho JSON
+        """
+        # Tentar extrair o JSON se estiver embutido em blocos de código
+        if "```json" in text:
+            return text.split("```json")[1].split("```")[0].strip()
+        elif "```" in text:
+            return text.split("```")[1].strip()
+        return text
@@ -1,11 +1,23 @@
+import asyncio
+import contextlib
 import json
+import queue
 import re
+import time
+import uuid
 import yaml
+from collections import deque
+from concurrent.futures import Future
 from datetime import datetime
-from database import Database
-from knowledge_base import KnowledgeBase
+from functools import partial
+from database import Database, INSIGHTS_PENDING, INSIGHTS_READY, UNANSWERED_PATTERN, connection_options
+from knowledge_base import DEFAULT_ADDED_PATH, DEFAULT_SNAPSHOT_PATH, get_knowledge_base
 from validator import Validator
-from llm_service import LLMService
+from async_llm_service import AsyncLLMService
+from insight_worker import get_insight_worker
+from semantic_cache import get_semantic_cache
+from context_manager import ConversationMemory
+from interaction_logger import get_interaction_logger
 
 class PromptAgent:
     """
@@ -13,34 +25,116 @@ class PromptAgent:
     de Engenharia de Prompt e boas práticas.
     """
     
-    def __init__(self, config_path="config.yaml", use_llm=True):
+    def __init__(self, config_path="config.yaml", use_llm=True, session_id=None, user_id=None):
         """
         Inicializa o agente com a base de conhecimento ou serviço LLM e conexão ao banco de dados.
         
         Args:
             config_path (str): Caminho para o arquivo de configuração
             use_llm (bool): Se True, usa o serviço LLM; se False, usa a base de conhecimento local
+            session_id (str, optional): Sessão a retomar (se None, inicia uma nova sessão)
+            user_id (str, optional): Usuário da sessão
         """
         # Variáveis para armazenar dados dinâmicos
-        self.conversation_context = []
+        self.session_id = session_id or uuid.uuid4().hex
+        self.user_id = user_id
+        # Os turnos de uma sessão retomada são lidos do banco apenas quando necessários
+        self._session_loaded = session_id is None
         self.user_info = {}
         self.last_query = None
         self.last_response = None
+        self.last_found = False
+        self._last_interaction = None
+        self.last_semantic_match = None
+        self.last_routing = None
+        self.last_speculation = None
+        self.semantic_cache = None
+        self.last_stream_metrics = {}
         self.use_llm = use_llm
         
         # Carrega a configuração
         self.config = self._load_config(config_path)
         
+        # Mensagens da conversa em memória, limitadas aos turnos mais recentes
+        session_config = self.config.get('session', {})
+        self.conversation_context = deque(maxlen=2 * session_config.get('max_context_turns', 50))
+        self.resume_turns = session_config.get('resume_turns', 20)
+        
         # Inicializa componentes
-        self.db = Database(self.config.get('database', {}).get('path', 'prompt_agent.db'))
+        db_config = self.config.get('database', {})
+        self.db = Database(
+            db_config.get('path', 'prompt_agent.db'),
+            compress_min_bytes=db_config.get('compress_min_bytes', 512),
+            **connection_options(db_config)
+        )
+        
+        # Gravação das interações em lotes, em segundo plano (opcional)
+        self.interaction_logger = None
+        write_behind_config = db_config.get('write_behind', {})
+        if write_behind_config.get('enabled', False):
+            self.interaction_logger = get_interaction_logger(
+                self.db,
+                max_queue_size=write_behind_config.get('queue_size', 1000),
+                batch_size=write_behind_config.get('batch_size', 50),
+                flush_interval_ms=write_behind_config.get('flush_interval_ms', 200)
+            )
         self.validator = Validator()
         
+        # A base de conhecimento local também é o fallback do modo LLM
+        kb_config = self.config.get('knowledge_base', {})
+        self.kb = get_knowledge_base(
+            sources=kb_config.get('sources'),
+            snapshot_path=kb_config.get('snapshot_path', DEFAULT_SNAPSHOT_PATH) or None,
+            added_path=kb_config.get('added_path', DEFAULT_ADDED_PATH) or None,
+            reload_interval=kb_config.get('reload_interval', 0)
+        )
+        
+        # Roteador do modo LLM: perguntas que a base local responde com confiança não chamam o LLM
+        router_config = self.config.get('router', {})
+        self.router_enabled = self.use_llm and router_config.get('enabled', True)
+        self.router_min_confidence = router_config.get('min_confidence', 0.8)
+        self.routing_stats = {"local": 0, "cache": 0, "llm": 0}
+        
+        # Modo especulativo: a base local e o LLM são consultados ao mesmo tempo
+        self.router_speculative = self.router_enabled and router_config.get('speculative', False)
+        self.speculation_stats = {"turns": 0, "kb_wins": 0, "cache_wins": 0, "llm_wins": 0, "cancelled": 0, "saved_ms": 0.0}
+        
+        # Contexto enviado ao modelo: mensagens recentes + resumo das antigas, limitado em tokens
+        context_config = self.config.get('context', {})
+        self.memory = ConversationMemory(
+            token_budget=context_config.get('token_budget', 2000),
+            summary_max_tokens=context_config.get('summary_max_tokens', 300),
+            summarizer=self._summarize_context if self.use_llm else None,
+            model=self.config.get('model', {}).get('name'),
+            evict_to=context_config.get('evict_to', 0.5)
+        )
+        
         # Inicializa base de conhecimento ou serviço LLM com base na configuração
         if self.use_llm:
-            self.llm_service = LLMService(config_path)
+            # O serviço assíncrono também expõe a API síncrona (get_completion, stream_completion...)
+            self.llm_service = AsyncLLMService(config_path)
+            
+            # Os insights do LLM são extraídos em segundo plano, fora do caminho da requisição.
+            # O worker é compartilhado pelos agentes do mesmo banco e usa o serviço do agente mais recente
+            insights_config = self.config.get('insights', {})
+            self.insight_worker = get_insight_worker(
+                self.db,
+                self.llm_service.extract_insights_batch,
+                max_queue_size=insights_config.get('queue_size', 100),
+                poll_interval=insights_config.get('poll_interval', 30),
+                max_batch_size=insights_config.get('max_batch_size', 20)
+            )
+            
+            # Cache semântico: reutiliza respostas de perguntas parecidas já respondidas
+            semantic_config = self.config.get('semantic_cache', {})
+            if semantic_config.get('enabled', False):
+                self.semantic_cache = get_semantic_cache(
+                    self.db,
+                    threshold=semantic_config.get('threshold', 0.85),
+                    min_words=semantic_config.get('min_words', 3)
+                )
             print("Usando serviço LLM para responder perguntas.")
         else:
-            self.kb = KnowledgeBase()
             print("Usando base de conhecimento local para responder perguntas.")
         
         # Prompt interno que guia o comportamento do agente
@@ -70,7 +164,7 @@ class PromptAgent:
         
         Args:
             config_path (str): Caminho para o arquivo de configuração
-            
+        
         Returns:
             dict: Configuração carregada
         """
@@ -88,13 +182,469 @@ class PromptAgent:
         
         Args:
             user_query (str): Pergunta do usuário
-            
+        
         Returns:
             tuple: (resposta, encontrada) onde resposta é a string com a resposta
                   e encontrada é um booleano indicando se a resposta foi encontrada
         """
+        summary, history = self._start_turn(user_query)
+        usage = None
+        
+        # Obtém a resposta da fonte apropriada (base local com confiança, cache semântico, LLM ou base local)
+        local = self._resolve_local(user_query)
+        if local is not None:
+            response, found, _ = local
+        else:
+            response, found, usage = self._complete(user_query, history, summary)
+            if not found:
+                response, found = self._fallback(user_query)
+        
+        self._finish_turn(user_query, response, found, usage)
+        
+        return response, found
+    
+    async def aget_response(self, user_query):
+        """
+        Versão assíncrona de `get_response`: a chamada ao LLM não bloqueia o
+        event loop, permitindo atender vários agentes (conversas) concorrentemente.
+        
+        Cada instância de PromptAgent representa uma conversa; chamadas
+        concorrentes devem usar agentes diferentes.
+        
+        Args:
+            user_query (str): Pergunta do usuário
+        
+        Returns:
+            tuple: (resposta, encontrada) onde resposta é a string com a resposta
+                  e encontrada é um booleano indicando se a resposta foi encontrada
+        """
+        summary, history = self._start_turn(user_query)
+        usage = None
+        
+        # Obtém a resposta da fonte apropriada (base local com confiança, cache semântico, LLM ou base local)
+        local = self._resolve_local(user_query)
+        if local is not None:
+            response, found, _ = local
+        else:
+            response, found, usage = await self._acomplete(user_query, history, summary)
+            if not found:
+                response, found = self._fallback(user_query)
+        
+        # A gravação no SQLite é feita fora do event loop
+        await asyncio.to_thread(self._finish_turn, user_query, response, found, usage)
+        
+        return response, found
+    
+    def stream_response(self, user_query):
+        """
+        Processa a pergunta do usuário e devolve a resposta em partes, à medida
+        que é gerada. A interação completa é armazenada ao final do streaming.
+        
+        Ao término da iteração, `last_found` indica se a resposta foi encontrada
+        e `last_stream_metrics` contém os tempos medidos (primeiro token e total).
+        
+        Args:
+            user_query (str): Pergunta do usuário
+        
+        Yields:
+            str: Trechos da resposta
+        """
+        summary, history = self._start_turn(user_query)
+        usage = None
+        
+        start = time.perf_counter()
+        local = self._resolve_local(user_query)
+        if local is not None:
+            # Resposta obtida sem o LLM: entregue de uma vez só
+            response, found, source = local
+            self.last_stream_metrics = self._local_stream_metrics(start, found, source)
+            yield response
+        else:
+            chunks = []
+            if self.router_speculative:
+                # Base local e LLM consultados ao mesmo tempo; os trechos do LLM
+                # só são entregues se a base local não tiver uma resposta confiável
+                metrics = {}
+                for delta in self._speculate(user_query, history, summary, metrics):
+                    chunks.append(delta)
+                    yield delta
+                
+                speculation = self.last_speculation
+                found = speculation["found"]
+                if speculation["winner"] == "llm":
+                    usage = metrics.pop("usage", None)
+                    self.last_stream_metrics = metrics
+                else:
+                    source = "routed" if speculation["winner"] == "kb" else "cached"
+                    self.last_stream_metrics = self._local_stream_metrics(start, True, source)
+                self.last_stream_metrics["speculation"] = speculation
+            else:
+                for delta in self.llm_service.stream_completion(
+                    user_query,
+                    system_prompt=self.internal_prompt,
+                    yield_errors=False,
+                    history=history,
+                    summary=summary
+                ):
+                    chunks.append(delta)
+                    yield delta
+                
+                self.last_stream_metrics = dict(self.llm_service.last_stream_metrics)
+                usage = self.llm_service.last_usage
+                found = self.last_stream_metrics.get("success", False)
+            response = "".join(chunks).strip()
+            
+            if not found:
+                response, found = self._fallback(user_query)
+                self.last_stream_metrics["fallback"] = True
+                yield ("\n\n" if chunks else "") + response
+        
+        self._finish_turn(user_query, response, found, usage)
+    
+    def _resolve_local(self, user_query):
+        """
+        Tenta responder sem chamar o LLM. No modo local, responde pela base de
+        conhecimento. No modo LLM sem especulação, consulta o roteador e depois
+        o cache semântico; com especulação, essas consultas são feitas junto com
+        a chamada ao LLM (`_speculate`).
+        
+        Args:
+            user_query (str): Pergunta do usuário
+        
+        Returns:
+            tuple: (resposta, encontrada, origem), com origem "routed", "cached"
+                ou "kb"; None se o LLM deve ser consultado
+        """
+        if not self.use_llm:
+            response, found = self.kb.get_response(user_query)
+            return response, found, "kb"
+        if self.router_speculative:
+            return None
+        
+        routed = self._route_locally(user_query)
+        if routed is not None:
+            return routed, True, "routed"
+        cached = self._lookup_semantic_cache(user_query)
+        if cached is not None:
+            return cached, True, "cached"
+        return None
+    
+    def _complete(self, user_query, history, summary):
+        """
+        Obtém a resposta do LLM (ou, com especulação, do primeiro entre a base
+        local, o cache semântico e o LLM).
+        
+        Args:
+            user_query (str): Pergunta do usuário
+            history (list): Mensagens anteriores da conversa
+            summary (str): Resumo das mensagens que já saíram do contexto
+        
+        Returns:
+            tuple: (resposta, encontrada, uso da chamada ao LLM)
+        """
+        if self.router_speculative:
+            metrics = {}
+            response = "".join(self._speculate(user_query, history, summary, metrics)).strip()
+            return response, self.last_speculation["found"], metrics.get("usage")
+        
+        response, found = self.llm_service.get_completion(
+            user_query,
+            system_prompt=self.internal_prompt,
+            history=history,
+            summary=summary
+        )
+        return response, found, self.llm_service.last_usage
+    
+    async def _acomplete(self, user_query, history, summary):
+        """
+        Versão assíncrona de `_complete`.
+        
+        Args:
+            user_query (str): Pergunta do usuário
+            history (list): Mensagens anteriores da conversa
+            summary (str): Resumo das mensagens que já saíram do contexto
+        
+        Returns:
+            tuple: (resposta, encontrada, uso da chamada ao LLM)
+        """
+        if self.router_speculative:
+            return await self._aspeculate(user_query, history, summary)
+        
+        response, found = await self.llm_service.aget_completion(
+            user_query,
+            system_prompt=self.internal_prompt,
+            history=history,
+            summary=summary
+        )
+        return response, found, self.llm_service.last_usage
+    
+    def _fallback(self, user_query):
+        """
+        Responde pela base de conhecimento local quando a chamada ao LLM falha.
+        
+        Args:
+            user_query (str): Pergunta do usuário
+        
+        Returns:
+            tuple: (resposta, encontrada)
+        """
+        print("Erro na chamada da API LLM. Usando base de conhecimento local como fallback.")
+        return self.kb.get_response(user_query)
+    
+    @staticmethod
+    def _local_stream_metrics(start, found, source):
+        """
+        Métricas de streaming de uma resposta entregue de uma vez só, sem o LLM.
+        
+        Args:
+            start (float): Início do processamento (`time.perf_counter()`)
+            found (bool): Se a resposta foi encontrada
+            source (str): Origem da resposta ("routed", "cached" ou "kb")
+        
+        Returns:
+            dict: Métricas no formato de `last_stream_metrics`
+        """
+        elapsed = time.perf_counter() - start
+        return {
+            "time_to_first_token": elapsed,
+            "total_time": elapsed,
+            "chunks": 1,
+            "success": found,
+            "routed": source == "routed",
+            "cached": source == "cached"
+        }
+    
+    def _route_locally(self, user_query):
+        """
+        Roteador do modo LLM: pontua a pergunta na base de conhecimento local
+        e, se a confiança do melhor resultado alcançar `router.min_confidence`,
+        responde com ele sem chamar o LLM. A decisão e as pontuações ficam em
+        `last_routing` e são gravadas nos insights da interação.
+        
+        Args:
+            user_query (str): Pergunta do usuário
+        
+        Returns:
+            str: Resposta da base local ou None se a pergunta deve seguir para o LLM
+        """
+        if not self.router_enabled:
+            return None
+        
+        start = time.perf_counter()
+        matches = self.kb.query(user_query, k=1)
+        best = matches[0] if matches else None
+        confidence = best["confidence"] if best else 0.0
+        route = "local" if best and confidence >= self.router_min_confidence else "llm"
+        self.last_routing = {
+            "route": route,
+            "confidence": round(confidence, 4),
+            "score": round(best["score"], 4) if best else 0.0,
+            "threshold": self.router_min_confidence,
+            "faq": best["question"] if best else None,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+        return best["answer"] if route == "local" else None
+    
+    def _speculate(self, user_query, history, summary, metrics):
+        """
+        Modo especulativo: inicia o streaming do LLM no event loop em segundo
+        plano do serviço e, ao mesmo tempo, consulta a base local
+        (`_route_locally`) e, se ela não tiver confiança, o cache semântico. Se
+        algum deles responder, a chamada ao LLM é cancelada (conexão, novas
+        tentativas e esperas incluídas, sem contar como falha no circuit
+        breaker) e a resposta local é devolvida; senão, os trechos do LLM são
+        devolvidos à medida que chegam. Ao final, `last_speculation` registra
+        o resultado.
+        
+        Args:
+            user_query (str): Pergunta do usuário
+            history (list): Mensagens recentes da conversa
+            summary (str): Resumo das mensagens antigas
+            metrics (dict): Recebe as métricas do stream do LLM e, em "usage", o uso da chamada
+        
+        Yields:
+            str: Trechos da resposta
+        """
+        start = time.perf_counter()
+        deltas = queue.Queue()
+        
+        async def consume():
+            try:
+                async for delta in self.llm_service.astream_completion(
+                    user_query,
+                    system_prompt=self.internal_prompt,
+                    yield_errors=False,
+                    history=history,
+                    summary=summary,
+                    metrics=metrics
+                ):
+                    deltas.put(delta)
+            finally:
+                deltas.put(None)
+        
+        llm_call = self.llm_service.run_in_background(consume())
+        try:
+            local = self._answer_locally(user_query)
+            local_ms = (time.perf_counter() - start) * 1000
+            if local is not None:
+                llm_call.cancel()
+                self._record_speculation(local_ms)
+                yield local
+                return
+            
+            for delta in iter(deltas.get, None):
+                yield delta
+            self._record_speculation(local_ms, (time.perf_counter() - start) * 1000, metrics.get("success", False))
+        finally:
+            # Quem consome a resposta pode parar antes do fim
+            llm_call.cancel()
+    
+    async def _aspeculate(self, user_query, history, summary):
+        """
+        Versão assíncrona de `_speculate`: a chamada ao LLM é iniciada como
+        tarefa e cancelada imediatamente se a base local (consultada em outra
+        thread) ou o cache semântico responderem.
+        
+        Args:
+            user_query (str): Pergunta do usuário
+            history (list): Mensagens recentes da conversa
+            summary (str): Resumo das mensagens antigas
+        
+        Returns:
+            tuple: (resposta, encontrada, uso da chamada ao LLM ou None)
+        """
+        start = time.perf_counter()
+        llm_task = asyncio.ensure_future(self.llm_service.aget_completion(
+            user_query,
+            system_prompt=self.internal_prompt,
+            history=history,
+            summary=summary
+        ))
+        local = await asyncio.to_thread(self._answer_locally, user_query)
+        local_ms = (time.perf_counter() - start) * 1000
+        if local is not None:
+            llm_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await llm_task
+            self._record_speculation(local_ms)
+            return local, True, None
+        
+        response, found = await llm_task
+        self._record_speculation(local_ms, (time.perf_counter() - start) * 1000, found)
+        return response, found, self.llm_service.last_usage
+    
+    def _answer_locally(self, user_query):
+        """
+        Busca uma resposta sem o LLM: a base local, se tiver confiança, ou o cache semântico.
+        
+        Args:
+            user_query (str): Pergunta do usuário
+        
+        Returns:
+            str: Resposta local ou None
+        """
+        response = self._route_locally(user_query)
+        return response if response is not None else self._lookup_semantic_cache(user_query)
+    
+    def _record_speculation(self, local_ms, llm_ms=None, found=True):
+        """
+        Registra o resultado de um turno especulativo em `last_speculation`,
+        nos insights da interação (junto ao roteamento) e em `speculation_stats`.
+        
+        Comparado à consulta em série (base local e depois o LLM), o turno em
+        que o LLM responde economiza o tempo da consulta local, feita enquanto
+        o LLM gerava a resposta; quando a resposta local vence, a chamada ao
+        LLM é cancelada e não há economia em relação à consulta em série.
+        
+        Args:
+            local_ms (float): Tempo da consulta local, em milissegundos
+            llm_ms (float, optional): Tempo até a resposta do LLM (None se ela foi cancelada)
+            found (bool): Se a resposta foi obtida
+        """
+        if llm_ms is None:
+            winner = "kb" if self.last_routing["route"] == "local" else "cache"
+        else:
+            winner = "llm"
+        saved_ms = min(local_ms, llm_ms) if llm_ms is not None else 0.0
+        self.last_speculation = {
+            "winner": winner,
+            "found": found,
+            "local_ms": round(local_ms, 3),
+            "llm_ms": round(llm_ms, 3) if llm_ms is not None else None,
+            "saved_ms": round(saved_ms, 3)
+        }
+        if self.last_routing is not None:
+            self.last_routing["speculation"] = self.last_speculation
+        
+        stats = self.speculation_stats
+        stats["turns"] += 1
+        stats[f"{winner}_wins"] += 1
+        stats["cancelled"] += llm_ms is None
+        stats["saved_ms"] += saved_ms
+    
+    def get_speculation_stats(self):
+        """
+        Resume os turnos do modo especulativo: com que frequência cada fonte
+        venceu e a latência economizada em relação à consulta em série.
+        
+        Returns:
+            dict: Contadores de `speculation_stats`, frações de vitória da
+                resposta local (base ou cache) e do LLM e economia média por turno (ms)
+        """
+        stats = dict(self.speculation_stats)
+        turns = stats["turns"] or 1
+        stats["local_win_rate"] = (stats["kb_wins"] + stats["cache_wins"]) / turns
+        stats["llm_win_rate"] = stats["llm_wins"] / turns
+        stats["avg_saved_ms"] = stats["saved_ms"] / turns
+        return stats
+    
+    def _lookup_semantic_cache(self, user_query):
+        """
+        Busca no cache semântico uma resposta já dada a uma pergunta similar.
+        
+        Args:
+            user_query (str): Pergunta do usuário
+        
+        Returns:
+            str: Resposta reutilizada ou None se não houver pergunta similar o suficiente
+        """
+        self.last_semantic_match = None
+        if not self.semantic_cache:
+            return None
+        
+        match = self.semantic_cache.lookup(user_query)
+        if match is None:
+            return None
+        
+        response, score, interaction_id = match
+        self.last_semantic_match = {"score": score, "interaction_id": interaction_id}
+        
+        # A resposta reutilizada tem rota própria nos insights, distinta das chamadas ao LLM
+        self.last_routing = dict(self.last_routing or {})
+        self.last_routing.update({
+            "route": "cache",
+            "semantic_score": round(score, 4),
+            "source_interaction": interaction_id
+        })
+        return response
+    
+    def _start_turn(self, user_query):
+        """
+        Registra a pergunta do usuário e prepara o contexto da conversa a ser
+        enviado ao modelo.
+        
+        Args:
+            user_query (str): Pergunta do usuário
+        
+        Returns:
+            tuple: (resumo das mensagens antigas, mensagens recentes no formato da API de chat)
+        """
         # Armazena a última consulta
         self.last_query = user_query
+        self.last_routing = None
+        self.last_speculation = None
+        self.last_semantic_match = None
+        self._resume_session()
         
         # Adiciona a consulta ao contexto da conversa
         self.conversation_context.append({
@@ -103,39 +653,23 @@ class PromptAgent:
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         })
         
-        # Obtém a resposta da fonte apropriada (LLM ou base de conhecimento)
-        if self.use_llm:
-            # Prepara o contexto da conversa para enviar ao modelo LLM (últimas 5 interações)
-            context_messages = []
-            for msg in self.conversation_context[-10:]:  # Usa as últimas 5 interações (máximo)
-                if msg["role"] == "user":
-                    context_messages.append(f"Usuário: {msg['content']}")
-                else:
-                    context_messages.append(f"Agente: {msg['content']}")
-            
-            # Enriquece o prompt com o contexto da conversa
-            context_text = "\n".join(context_messages[:-1]) if len(context_messages) > 1 else ""
-            enhanced_prompt = user_query
-            if context_text:
-                enhanced_prompt = f"Contexto da conversa anterior:\n{context_text}\n\nPergunta atual: {user_query}"
-            
-            # Obtém a resposta do serviço LLM
-            response, found = self.llm_service.get_completion(
-                enhanced_prompt, 
-                system_prompt=self.internal_prompt
-            )
-            
-            # Se houver erro na chamada da API, tenta usar a base de conhecimento local como fallback
-            if not found and hasattr(self, 'kb'):
-                print("Erro na chamada da API LLM. Usando base de conhecimento local como fallback.")
-                response, found = self.kb.get_response(user_query)
-                
-        else:
-            # Usa a base de conhecimento local
-            response, found = self.kb.get_response(user_query)
+        # Resumo e mensagens recentes que cabem no orçamento de tokens, enviados
+        # como mensagens separadas para manter estável o início da requisição
+        return self.memory.summary, self.memory.messages()
+    
+    def _finish_turn(self, user_query, response, found, usage=None):
+        """
+        Registra a resposta no contexto, extrai insights e armazena a interação.
         
+        Args:
+            user_query (str): Pergunta do usuário
+            response (str): Resposta fornecida
+            found (bool): Se a resposta foi encontrada
+            usage (dict, optional): Tokens e latência da chamada ao LLM
+        """
         # Armazena a resposta
         self.last_response = response
+        self.last_found = found
         
         # Adiciona a resposta ao contexto da conversa
         self.conversation_context.append({
@@ -143,14 +677,87 @@ class PromptAgent:
             "content": response,
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         })
+        self.memory.add_turn(user_query, response)
+        
+        routing = self.last_routing
+        if routing:
+            self.routing_stats[routing["route"]] += 1
+        if routing and routing["route"] in ("local", "cache"):
+            # Resposta da base local ou do cache semântico: insights por regras, sem chamada ao LLM
+            insights = self._extract_rule_insights(user_query, response, found)
+            insights["routing"] = routing
+            self._store_interaction(user_query, response, json.dumps(insights))
+        elif self.use_llm:
+            # Armazena a interação imediatamente; os insights são preenchidos pelo
+            # worker (o roteamento gravado agora é mantido)
+            stored = self._store_interaction(
+                user_query, response, json.dumps({"routing": routing}) if routing else None,
+                insights_status=INSIGHTS_PENDING, usage=usage
+            )
+            stored.add_done_callback(partial(self._submit_for_insights, user_query, response))
+        else:
+            # Identifica e armazena insights
+            insights = self._extract_insights(user_query, response, found)
+            
+            # Armazena a interação no banco de dados
+            self._store_interaction(user_query, response, json.dumps(insights))
+    
+    def _submit_for_insights(self, user_query, response, stored):
+        """
+        Envia ao worker de insights uma interação pendente, depois que ela é gravada.
         
-        # Identifica e armazena insights
-        insights = self._extract_insights(user_query, response, found)
+        Args:
+            user_query (str): Pergunta do usuário
+            response (str): Resposta fornecida
+            stored (Future): Gravação da interação, já concluída
+        """
+        if stored.exception() is not None:
+            # A gravação falhou: não há interação para extrair insights
+            return
+        self.insight_worker.submit(stored.result(), user_query, response)
+    
+    def _store_interaction(self, user_query, response, patterns_insights=None,
+                           insights_status=INSIGHTS_READY, usage=None):
+        """
+        Armazena a interação diretamente ou, com a gravação em segundo plano
+        ativada, coloca-a na fila do logger de interações.
         
-        # Armazena a interação no banco de dados
-        self.db.store_interaction(user_query, response, json.dumps(insights))
+        Args:
+            user_query (str): Pergunta do usuário
+            response (str): Resposta fornecida
+            patterns_insights (str, optional): Insights em JSON
+            insights_status (str, optional): Estado da extração de insights
+            usage (dict, optional): Tokens e latência da chamada ao LLM
         
-        return response, found
+        Returns:
+            Future: Future resolvido com o ID da interação após a gravação
+        """
+        if self.interaction_logger:
+            stored = self.interaction_logger.submit(
+                user_query, response, patterns_insights, insights_status, usage,
+                session_id=self.session_id, user_id=self.user_id
+            )
+        else:
+            stored = Future()
+            stored.set_result(self.db.store_interaction(
+                user_query, response, patterns_insights, insights_status=insights_status, usage=usage,
+                session_id=self.session_id, user_id=self.user_id
+            ))
+        self._last_interaction = stored
+        return stored
+    
+    @property
+    def last_interaction_id(self):
+        """
+        ID da última interação armazenada, aguardando a gravação se ela ainda
+        estiver na fila (None se não houver interação ou se a gravação falhou).
+        """
+        if self._last_interaction is None:
+            return None
+        try:
+            return self._last_interaction.result()
+        except Exception:
+            return None
     
     def _extract_insights(self, query, response, found):
         """
@@ -160,47 +767,87 @@ class PromptAgent:
             query (str): Pergunta do usuário
             response (str): Resposta fornecida
             found (bool): Se a resposta foi encontrada
-            
+        
         Returns:
             dict: Insights extraídos da interação
         """
         if self.use_llm:
             # Usa o LLM para extrair insights mais sofisticados
-            return self.llm_service.extract_insights(query, response)
+            return self._extract_insights_batch([(query, response)])[0]
         else:
             # Usa a abordagem baseada em regras para análise básica
-            insights = {
-                "category": "unknown",
-                "patterns": [],
-                "possible_improvements": []
-            }
-            
-            # Identifica a categoria da pergunta
-            if "o que é" in query.lower() or "definição" in query.lower():
-                insights["category"] = "definição"
-            elif "como" in query.lower() or "passos" in query.lower():
-                insights["category"] = "procedimento"
-            elif "diferença" in query.lower() or "versus" in query.lower() or " vs " in query.lower():
-                insights["category"] = "comparação"
-            elif "exemplo" in query.lower() or "demonstre" in query.lower():
-                insights["category"] = "exemplificação"
-            
-            # Identifica padrões na pergunta
-            if not found:
-                insights["patterns"].append("pergunta_sem_resposta")
-                
-                # Tenta identificar tópicos para expandir a base de conhecimento
-                topics = self._extract_topics(query)
-                if topics:
-                    insights["possible_improvements"].append(f"Adicionar informações sobre: {', '.join(topics)}")
-            
-            # Verifica se a pergunta é relacionada a técnicas específicas
-            techniques = ["zero-shot", "few-shot", "chain of thought", "role prompting", "delimitadores"]
-            for technique in techniques:
-                if technique in query.lower():
-                    insights["patterns"].append(f"interesse_em_{technique.replace(' ', '_')}")
+            return self._extract_rule_insights(query, response, found)
+    
+    def _extract_rule_insights(self, query, response, found):
+        """
+        Extrai insights da interação com regras simples, sem chamar o LLM.
+        
+        Args:
+            query (str): Pergunta do usuário
+            response (str): Resposta fornecida
+            found (bool): Se a resposta foi encontrada
+        
+        Returns:
+            dict: Insights extraídos da interação
+        """
+        insights = {
+            "category": "unknown",
+            "patterns": [],
+            "possible_improvements": []
+        }
+        
+        # Identifica a categoria da pergunta
+        if "o que é" in query.lower() or "definição" in query.lower():
+            insights["category"] = "definição"
+        elif "como" in query.lower() or "passos" in query.lower():
+            insights["category"] = "procedimento"
+        elif "diferença" in query.lower() or "versus" in query.lower() or " vs " in query.lower():
+            insights["category"] = "comparação"
+        elif "exemplo" in query.lower() or "demonstre" in query.lower():
+            insights["category"] = "exemplificação"
+        
+        # Identifica padrões na pergunta
+        if not found:
+            insights["patterns"].append(UNANSWERED_PATTERN)
             
-            return insights
+            # Tenta identificar tópicos para expandir a base de conhecimento
+            topics = self._extract_topics(query)
+            if topics:
+                insights["possible_improvements"].append(f"Adicionar informações sobre: {', '.join(topics)}")
+        
+        # Verifica se a pergunta é relacionada a técnicas específicas
+        techniques = ["zero-shot", "few-shot", "chain of thought", "role prompting", "delimitadores"]
+        for technique in techniques:
+            if technique in query.lower():
+                insights["patterns"].append(f"interesse_em_{technique.replace(' ', '_')}")
+        
+        return insights
+    
+    def _extract_insights_batch(self, interactions):
+        """
+        Extrai, com o LLM, os insights de várias interações em poucas chamadas.
+        
+        Args:
+            interactions (list): Lista de pares (pergunta, resposta)
+        
+        Returns:
+            list: Insights extraídos, na mesma ordem das interações
+        """
+        return self.llm_service.extract_insights_batch(interactions)
+    
+    def _summarize_context(self, previous_summary, turns, max_tokens):
+        """
+        Resume, com o LLM, as mensagens que saíram do contexto da conversa.
+        
+        Args:
+            previous_summary (str): Resumo acumulado até agora
+            turns (list): Mensagens removidas do contexto
+            max_tokens (int): Tamanho máximo do resumo, em tokens
+        
+        Returns:
+            str: Novo resumo
+        """
+        return self.llm_service.summarize_conversation(previous_summary, turns, max_tokens)
     
     def _extract_topics(self, text):
         """
@@ -208,7 +855,7 @@ class PromptAgent:
         
         Args:
             text (str): Texto para extração de tópicos
-            
+        
         Returns:
             list: Lista de tópicos identificados
         """
@@ -231,13 +878,61 @@ class PromptAgent:
         Returns:
             list: Lista com mensagens da conversa
         """
-        return self.conversation_context
+        self._resume_session()
+        return list(self.conversation_context)
+    
+    def get_session_history(self, limit=20, before_id=None):
+        """
+        Recupera do banco de dados uma página de turnos da sessão atual.
+        
+        Args:
+            limit (int): Número máximo de turnos
+            before_id (int, optional): Retorna apenas turnos com ID menor que este (página anterior)
+        
+        Returns:
+            list: Tuplas (id, pergunta, resposta, data/hora), dos turnos mais antigos aos mais recentes
+        """
+        return self.db.get_session_turns(self.session_id, limit=limit, before_id=before_id)
+    
+    def _resume_session(self):
+        """
+        Na primeira vez em que o contexto é necessário, carrega os últimos
+        turnos da sessão retomada (no máximo `resume_turns`) no histórico em
+        memória e no contexto enviado ao modelo.
+        """
+        if self._session_loaded:
+            return
+        self._session_loaded = True
+        
+        turns = self.db.get_session_turns(self.session_id, limit=self.resume_turns)
+        for _, question, response, timestamp in turns:
+            self.conversation_context.append({"role": "user", "content": question, "timestamp": timestamp})
+            self.conversation_context.append({"role": "agent", "content": response, "timestamp": timestamp})
+        self.memory.add_turns([(question, response) for _, question, response, _ in turns])
+    
+    def search_interactions(self, query, limit=10, offset=0):
+        """
+        Busca nas interações armazenadas, das mais relevantes às menos relevantes.
+        
+        Args:
+            query (str): Palavras a buscar
+            limit (int): Número máximo de resultados
+            offset (int): Número de resultados a pular (paginação)
+        
+        Returns:
+            list: Lista de dicionários com id, question, response, timestamp, snippet e score
+        """
+        return self.db.search_interactions(query, limit=limit, offset=offset)
     
     def clear_conversation(self):
         """
         Limpa o histórico da conversa atual.
         """
-        self.conversation_context = []
+        self.conversation_context.clear()
+        self.memory.clear()
+        # A conversa seguinte é registrada em uma nova sessão
+        self.session_id = uuid.uuid4().hex
+        self._session_loaded = True
     
     def get_structured_output(self):
         """
@@ -250,23 +945,20 @@ class PromptAgent:
             return {"status": "Nenhuma interação registrada"}
         
         # Busca as últimas N interações no banco de dados
-        interactions = self.db.get_all_interactions()
-        recent_interactions = interactions[:5] if interactions else []
+        recent_interactions = self.db.get_recent_interactions(limit=5)
         
         # Formata as interações para o output
         formatted_interactions = []
         for interaction in recent_interactions:
-            try:
-                insights = json.loads(interaction[4]) if interaction[4] else {}
-            except:
-                insights = {}
-                
+            insights, ready = self._parse_insights(interaction)
+            
             formatted_interactions.append({
                 "id": interaction[0],
                 "question": interaction[1],
                 "response": interaction[2],
                 "timestamp": interaction[3],
-                "insights": insights
+                "insights": insights,
+                "insights_ready": ready
             })
         
         return {
@@ -279,11 +971,81 @@ class PromptAgent:
             "conversation_length": len(self.conversation_context)
         }
     
+    def get_insights_report(self, days=7, limit=5):
+        """
+        Resume os insights do período a partir dos agregados do banco de dados.
+        
+        Args:
+            days (int): Número de dias, incluindo hoje
+            limit (int): Número máximo de itens em cada lista
+        
+        Returns:
+            dict: Categorias mais frequentes, padrões mais frequentes nas perguntas
+                sem resposta e sugestões de melhoria mais frequentes
+        """
+        return {
+            "days": days,
+            "top_categories": self.db.get_top_categories(days=days, limit=limit),
+            "unanswered_patterns": self.db.get_top_insight_items(
+                "pattern", days=days, limit=limit, unanswered_only=True
+            ),
+            "top_improvements": self.db.get_top_insight_items("improvement", days=days, limit=limit)
+        }
+    
+    def get_interaction_insights(self, interaction_id):
+        """
+        Obtém os insights de uma interação armazenada.
+        
+        Args:
+            interaction_id (int): ID da interação
+        
+        Returns:
+            tuple: (insights, prontos) onde prontos indica se a extração já terminou
+        """
+        interaction = self.db.get_interaction_by_id(interaction_id)
+        if not interaction:
+            return {}, False
+        return self._parse_insights(interaction)
+    
+    def _parse_insights(self, interaction):
+        """
+        Decodifica os insights de uma linha da tabela de interações.
+        
+        Args:
+            interaction (tuple): Linha da tabela de interações
+        
+        Returns:
+            tuple: (insights, prontos) onde prontos indica se a extração já terminou
+        """
+        if len(interaction) > 5 and interaction[5] == INSIGHTS_PENDING:
+            return {}, False
+        try:
+            insights = json.loads(interaction[4]) if interaction[4] else {}
+        except:
+            insights = {}
+        return insights, True
+    
+    def get_health(self):
+        """
+        Retorna o estado do circuit breaker do serviço LLM e os tempos das chamadas.
+        
+        Returns:
+            dict: Estado do circuito e contadores, ou vazio no modo de base de conhecimento local
+        """
+        if not hasattr(self, 'llm_service'):
+            return {}
+        return self.llm_service.get_health()
+    
     def close(self):
         """
         Fecha conexões e libera recursos.
         """
+        # Grava as interações que ainda estão na fila antes de fechar as conexões
+        if self.interaction_logger:
+            self.interaction_logger.flush()
         self.db.close()
+        if hasattr(self, 'llm_service') and self.llm_service.response_cache:
+            self.llm_service.response_cache.close()
 
 
 def main():
@@ -293,6 +1055,7 @@ def main():
     print("\n=== Agente de Engenharia de Prompt da Academia Lendária ===")
     print("Digite 'sair' para encerrar, 'histórico' para ver conversas anteriores,")
     print("'testar' para executar testes de validação, 'limpar' para reiniciar a conversa,")
+    print("'buscar <termos>' para pesquisar nas interações armazenadas")
     print("ou 'modo' para alternar entre LLM e base de conhecimento local.\n")
     
     # Por padrão, usa o LLM se a configuração estiver disponível
@@ -316,14 +1079,21 @@ def main():
             
             if user_input.lower() == 'sair':
                 break
-                
+            
             elif user_input.lower() == 'histórico':
                 history = agent.get_conversation_history()
                 print("\n=== Histórico da Conversa ===")
                 for msg in history:
                     role = "Você" if msg["role"] == "user" else "Agente"
                     print(f"{role} ({msg['timestamp']}): {msg['content']}")
-                    
+            
+            elif user_input.lower().startswith('buscar '):
+                results = agent.search_interactions(user_input[len('buscar '):])
+                print(f"\n=== Resultados da Busca ({len(results)}) ===")
+                for result in results:
+                    print(f"[{result['id']}] ({result['timestamp']}) {result['question']}")
+                    print(f"    {result['snippet']}")
+            
             elif user_input.lower() == 'testar':
                 print("\n=== Executando Testes de Validação ===")
                 results = agent.validator.run_all_tests(agent)
@@ -344,11 +1114,11 @@ def main():
                 agent.use_llm = not agent.use_llm
                 mode = "LLM" if agent.use_llm else "base de conhecimento local"
                 print(f"\nModo alterado para: {mode}")
-                        
+            
             elif user_input.lower() == 'limpar':
                 agent.clear_conversation()
                 print("Conversa reiniciada!")
-                
+            
             else:
                 response, found = agent.get_response(user_input)
                 print(f"\nAgente: {response}")
@@ -363,7 +1133,7 @@ def main():
                     insights = output.get("recent_interactions", [])[0].get("insights", {})
                     if insights and insights.get("category"):
                         print(f"\n[Insight: Sua pergunta foi classificada como '{insights.get('category')}']")
-                    
+    
     except KeyboardInterrupt:
         print("\nEncerrando o agente...")
     finally:
@@ -0,0 +1,224 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, Tuple, Type
+
+import openai
+
+# Erros transitórios do provedor que justificam uma nova tentativa
+RETRYABLE_ERRORS: Tuple[Type[BaseException], ...] = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+# Interrupções de uma chamada em andamento que não indicam falha do provedor
+INTERRUPTIONS: Tuple[Type[BaseException], ...] = (
+    KeyboardInterrupt,
+    SystemExit,
+    asyncio.CancelledError,
+)
+
+# Circuit breakers compartilhados por provedor/modelo (todas as sessões do processo)
+_breakers: Dict[str, "CircuitBreaker"] = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """
+    Erro lançado quando o circuit breaker está aberto e a chamada ao provedor
+    é recusada sem ser feita.
+    """
+
+
+class RetryPolicy:
+    """
+    Política de novas tentativas com backoff exponencial e jitter completo.
+    """
+    
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 4.0):
+        """
+        Args:
+            max_attempts (int): Número máximo de tentativas (incluindo a primeira)
+            base_delay (float): Espera base, em segundos, antes da segunda tentativa
+            max_delay (float): Espera máxima, em segundos, entre tentativas
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+    
+    def delays(self) -> Iterator[float]:
+        """
+        Gera as esperas antes de cada nova tentativa (jitter completo:
+        um valor aleatório entre zero e o backoff exponencial).
+        
+        Yields:
+            float: Espera, em segundos
+        """
+        for attempt in range(self.max_attempts - 1):
+            yield random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+    
+    @staticmethod
+    def is_retryable(error: BaseException) -> bool:
+        """
+        Indica se um erro é transitório e a chamada pode ser repetida.
+        
+        Args:
+            error (BaseException): Erro ocorrido
+        
+        Returns:
+            bool: True se uma nova tentativa faz sentido
+        """
+        return isinstance(error, RETRYABLE_ERRORS)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker para chamadas ao provedor de LLM.
+    
+    Abre após `failure_threshold` falhas consecutivas; enquanto aberto, as
+    chamadas são recusadas imediatamente. Depois de `reset_timeout` segundos
+    uma chamada de teste é permitida (meio-aberto): se ela funcionar o circuito
+    fecha, se falhar ele volta a abrir.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold (int): Falhas consecutivas que abrem o circuito
+            reset_timeout (float): Tempo, em segundos, até permitir uma chamada de teste
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "rejected": 0,
+            "retries": 0,
+            "cancelled": 0,
+            "times_opened": 0,
+            "last_latency": None,
+            "last_error": None,
+        }
+    
+    def allow_request(self) -> bool:
+        """
+        Indica se uma chamada pode ser feita agora.
+        
+        Returns:
+            bool: False se o circuito está aberto (ou já há uma chamada de teste em andamento)
+        """
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.stats["rejected"] += 1
+            return False
+    
+    def record_success(self, latency: float):
+        """
+        Registra uma chamada bem-sucedida.
+        
+        Args:
+            latency (float): Duração da chamada, em segundos
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["successes"] += 1
+            self.stats["last_latency"] = latency
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+            self._trial_in_flight = False
+    
+    def record_failure(self, error: BaseException, latency: float):
+        """
+        Registra uma chamada que falhou (após esgotar as tentativas).
+        
+        Args:
+            error (BaseException): Último erro ocorrido
+            latency (float): Duração total da chamada, em segundos
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["failures"] += 1
+            self.stats["last_latency"] = latency
+            self.stats["last_error"] = str(error)
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.stats["times_opened"] += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+    
+    def record_cancelled(self):
+        """
+        Registra uma chamada interrompida antes de terminar (por exemplo, uma
+        tarefa cancelada): a chamada de teste do estado meio-aberto é liberada
+        sem contar um sucesso nem uma falha.
+        """
+        with self._lock:
+            self.stats["cancelled"] += 1
+            self._trial_in_flight = False
+    
+    def record_retry(self):
+        """
+        Registra uma nova tentativa após um erro transitório.
+        """
+        with self._lock:
+            self.stats["retries"] += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Retorna o estado atual do circuito e as estatísticas, para monitoramento.
+        
+        Returns:
+            Dict[str, Any]: Estado, falhas consecutivas, tempo até nova tentativa e contadores
+        """
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            return dict(
+                self.stats,
+                state=self.state,
+                consecutive_failures=self.consecutive_failures,
+                retry_in=retry_in,
+            )
+
+
+def get_circuit_breaker(name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> CircuitBreaker:
+    """
+    Retorna o circuit breaker compartilhado com o nome informado, criando-o na primeira chamada.
+    
+    Args:
+        name (str): Identificador do provedor/modelo protegido
+        failure_threshold (int): Falhas consecutivas que abrem o circuito
+        reset_timeout (float): Tempo, em segundos, até permitir uma chamada de teste
+    
+    Returns:
+        CircuitBreaker: Circuit breaker compartilhado
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(failure_threshold, reset_timeout)
+            _breakers[name] = breaker
+        return breaker
@@ -0,0 +1,280 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from database import ConnectionManager
+
+# A remoção por TTL e tamanho no SQLite é feita a cada N escritas
+EVICTION_INTERVAL = 64
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Normaliza o texto de um prompt para uso na chave do cache
+    (minúsculas, espaços colapsados e sem pontuação nas pontas).
+    
+    Args:
+        text (str): Texto do prompt
+    
+    Returns:
+        str: Texto normalizado
+    """
+    return " ".join(text.split()).casefold().strip("?!.,;: ")
+
+
+class ResponseCache:
+    """
+    Cache de respostas do LLM por correspondência exata, em dois níveis:
+    um LRU em memória na frente de uma tabela no SQLite.
+    
+    A chave combina endpoint, modelo, prompt de sistema, mensagens anteriores
+    da conversa, prompt normalizado, temperatura e max_tokens. As entradas
+    expiram após `ttl_seconds` e a tabela é limitada a `max_entries` linhas
+    (as mais antigas são removidas).
+    """
+    
+    def __init__(self,
+                 db_path: str,
+                 memory_entries: int = 256,
+                 max_entries: int = 10000,
+                 ttl_seconds: float = 7 * 24 * 3600,
+                 **connection_options: Any):
+        """
+        Inicializa o cache e cria a tabela, caso não exista.
+        
+        Args:
+            db_path (str): Caminho para o banco de dados SQLite
+            memory_entries (int): Número máximo de entradas no LRU em memória
+            max_entries (int): Número máximo de entradas na tabela do SQLite
+            ttl_seconds (float): Tempo de vida de cada entrada, em segundos
+            **connection_options: Opções do ConnectionManager (busy_timeout_ms,
+                synchronous, cache_size_kb, mmap_size_mb), as mesmas do Database
+        """
+        self.db_path = db_path
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._writes = 0
+        self._connections = ConnectionManager(db_path, **connection_options)
+        self._create_tables()
+    
+    def _get_connection(self):
+        """
+        Retorna a conexão persistente da thread atual e um novo cursor.
+        
+        Returns:
+            tuple: (conexão, cursor)
+        """
+        return self._connections.cursor()
+    
+    def _create_tables(self):
+        """
+        Cria as tabelas do cache, caso não existam.
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS response_cache (
+                cache_key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_created_at ON response_cache (created_at)")
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS response_cache_meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+            ''')
+            conn.commit()
+        finally:
+            self._connections.release(conn, cursor)
+    
+    @staticmethod
+    def make_key(model: str,
+                 system_prompt: str,
+                 prompt: str,
+                 temperature: float,
+                 max_tokens: int,
+                 context: str = "",
+                 endpoint: str = "") -> str:
+        """
+        Calcula a chave do cache para uma requisição.
+        
+        Args:
+            model (str): Nome do modelo
+            system_prompt (str): Prompt de sistema
+            prompt (str): Prompt do usuário
+            temperature (float): Temperatura da requisição
+            max_tokens (int): Número máximo de tokens da resposta
+            context (str): Mensagens anteriores da conversa, serializadas
+            endpoint (str): URL base da API (vazio para o endpoint padrão da OpenAI)
+        
+        Returns:
+            str: Chave (hash SHA-256 em hexadecimal)
+        """
+        parts = [model, system_prompt or "", normalize_prompt(prompt), float(temperature), int(max_tokens)]
+        if context:
+            parts.append(context)
+        if endpoint:
+            parts.append({"endpoint": endpoint})
+        payload = json.dumps(parts, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Busca uma resposta no cache, primeiro em memória e depois no SQLite.
+        
+        Args:
+            key (str): Chave calculada com `make_key`
+        
+        Returns:
+            Optional[str]: Resposta armazenada ou None se não houver entrada válida
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return response
+                del self._memory[key]
+        
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute(
+                "SELECT response, created_at FROM response_cache WHERE cache_key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds)
+            )
+            row = cursor.fetchone()
+        finally:
+            self._connections.release(conn, cursor)
+        
+        with self._lock:
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._remember(key, row[0], row[1])
+        return row[0]
+    
+    def set(self, key: str, response: str):
+        """
+        Armazena uma resposta no cache e aplica a política de remoção por tamanho.
+        
+        Args:
+            key (str): Chave calculada com `make_key`
+            response (str): Resposta a armazenar
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            self._writes += 1
+            evict = self._writes % EVICTION_INTERVAL == 1
+        
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute(
+                "INSERT OR REPLACE INTO response_cache (cache_key, response, created_at) VALUES (?, ?, ?)",
+                (key, response, now)
+            )
+            if evict:
+                # Remove entradas expiradas e, se necessário, as mais antigas além do limite
+                cursor.execute("DELETE FROM response_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+                cursor.execute(
+                    """DELETE FROM response_cache WHERE cache_key IN (
+                           SELECT cache_key FROM response_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                       )""",
+                    (self.max_entries,)
+                )
+            conn.commit()
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def _remember(self, key: str, response: str, created_at: float):
+        """
+        Insere uma entrada no LRU em memória (o lock deve estar adquirido).
+        
+        Args:
+            key (str): Chave da entrada
+            response (str): Resposta armazenada
+            created_at (float): Momento de criação da entrada
+        """
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+    
+    def invalidate_if_changed(self, fingerprint: str) -> bool:
+        """
+        Limpa o cache se a configuração (endpoint, modelo, prompt de sistema)
+        mudou desde a última execução.
+        
+        Args:
+            fingerprint (str): Identificador da configuração atual
+        
+        Returns:
+            bool: True se o cache foi invalidado
+        """
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute("SELECT value FROM response_cache_meta WHERE name = 'config_fingerprint'")
+            row = cursor.fetchone()
+            if row and row[0] == fingerprint:
+                return False
+            
+            cursor.execute("DELETE FROM response_cache")
+            cursor.execute(
+                "INSERT OR REPLACE INTO response_cache_meta (name, value) VALUES ('config_fingerprint', ?)",
+                (fingerprint,)
+            )
+            conn.commit()
+        finally:
+            self._connections.release(conn, cursor)
+        
+        with self._lock:
+            self._memory.clear()
+        return row is not None
+    
+    def clear(self):
+        """
+        Remove todas as entradas do cache.
+        """
+        with self._lock:
+            self._memory.clear()
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute("DELETE FROM response_cache")
+            conn.commit()
+        finally:
+            self._connections.release(conn, cursor)
+    
+    def close(self):
+        """
+        Fecha as conexões com o banco de dados.
+        """
+        self._connections.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Retorna os contadores de acertos e falhas do cache.
+        
+        Returns:
+            Dict[str, Any]: Acertos em memória, acertos no SQLite, falhas e taxa de acerto
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        total = hits + stats["misses"]
+        stats["hit_rate"] = hits / total if total else 0.0
+        return stats
@@ -0,0 +1,776 @@
+import math
+import re
+import threading
+import unicodedata
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from index_store import Postings, Vocabulary
+
+# Palavras muito frequentes do português (já sem acentos), ignoradas na indexação e nas consultas
+STOPWORDS = frozenset("""
+a ao aos as ate com como da das de dela dele deles do dos e ela elas ele eles em entre era essa
+essas esse esses esta estas este estes eu foi ha isso isto ja la lhe lhes mais mas me meu meus
+minha minhas na nas no nos o os ou para pela pelas pelo pelos por qual quais quando que quem se
+sem ser seu seus sua suas sao tem um uma umas uns voce voces
+""".split())
+
+# Reduções de plural para o singular (o primeiro sufixo encontrado é substituído)
+PLURAL_SUFFIXES = (
+    ("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("ois", "ol"),
+    ("ns", "m"), ("res", "r"), ("zes", "z"), ("s", "")
+)
+
+# Sufixos derivacionais frequentes, removidos depois do plural
+DERIVATIONAL_SUFFIXES = ("amente", "mente", "acao", "icao", "cao", "idade", "ismo", "ista", "avel", "ivel")
+
+# Tamanho mínimo do radical: palavras curtas não são reduzidas
+MIN_STEM_LENGTH = 3
+
+# Acima deste número de candidatos, a similaridade exata da busca por
+# trigramas é calculada de uma vez com NumPy, e não candidato a candidato
+TRIGRAM_EXACT_CHECKS = 64
+
+# Número máximo de células (consultas x documentos) da matriz densa de
+# pontuações; lotes maiores de consultas são pontuados em partes
+DENSE_SCORES_LIMIT = 1 << 18
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza um texto para vetorização: minúsculas, sem acentos e apenas
+    letras, dígitos e espaços simples.
+    
+    Args:
+        text (str): Texto original
+    
+    Returns:
+        str: Texto normalizado
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+
+def stem(word: str) -> str:
+    """
+    Reduz uma palavra normalizada (sem acentos) a um radical aproximado:
+    plural para singular, sufixos derivacionais frequentes e vogal final
+    (gênero), o suficiente para "técnicas" e "técnico" coincidirem.
+    
+    Args:
+        word (str): Palavra normalizada
+    
+    Returns:
+        str: Radical da palavra
+    """
+    if len(word) <= MIN_STEM_LENGTH:
+        return word
+    for suffix, replacement in PLURAL_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            word = word[:-len(suffix)] + replacement
+            break
+    for suffix in DERIVATIONAL_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            word = word[:-len(suffix)]
+            break
+    if word[-1] in "aeo" and len(word) > MIN_STEM_LENGTH + 1:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Separa um texto normalizado em radicais, sem as stopwords.
+    
+    Args:
+        text (str): Texto original
+    
+    Returns:
+        List[str]: Radicais das palavras do texto, na ordem em que aparecem
+    """
+    return [stem(word) for word in normalize_text(text).split() if word not in STOPWORDS]
+
+
+class GrowableArray:
+    """
+    Array NumPy com capacidade dobrada a cada expansão (inserção amortizada O(1)).
+    """
+    
+    def __init__(self, dtype, capacity: int = 1024):
+        self._data = np.zeros(capacity, dtype=dtype)
+        self.size = 0
+    
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        needed = self.size + len(values)
+        if needed > len(self._data):
+            capacity = max(needed, 2 * len(self._data))
+            data = np.zeros(capacity, dtype=self._data.dtype)
+            data[:self.size] = self._data[:self.size]
+            self._data = data
+        self._data[self.size:needed] = values
+        self.size = needed
+    
+    def view(self) -> np.ndarray:
+        return self._data[:self.size]
+
+
+class BM25Index:
+    """
+    Índice de busca ranqueada com BM25, armazenado em arrays NumPy.
+    
+    Cada documento é uma linha identificada por uma chave externa (um inteiro
+    não negativo pequeno, como a posição do documento na coleção). As listas
+    invertidas (termo -> linhas e contribuição BM25 do termo na linha, já
+    normalizada pelo tamanho do documento) ficam em formato CSC em dois
+    segmentos: o principal, reconstruído a cada `merge_docs` documentos novos,
+    e o das linhas adicionadas desde então, pequeno e reconstruído sob demanda.
+    Documentos removidos ou substituídos são marcados como inativos e saem
+    das listas na próxima reconstrução. A pontuação de várias consultas é feita de
+    uma vez, somente sobre as entradas das listas dos termos consultados.
+    
+    O índice pode ser exportado em arrays (`arrays`) e recriado a partir deles
+    (`from_arrays`) sem processar os textos de novo; o vocabulário, os termos
+    das linhas e o segmento principal são usados diretamente, sem cópia.
+    """
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75, merge_docs: int = 256):
+        """
+        Inicializa um índice vazio.
+        
+        Args:
+            k1 (float): Saturação da frequência dos termos
+            b (float): Peso da normalização pelo tamanho do documento (0 a 1)
+            merge_docs (int): Número de documentos novos que dispara a reconstrução do segmento principal
+        """
+        self.k1 = k1
+        self.b = b
+        self.merge_docs = merge_docs
+        
+        self._vocabulary = Vocabulary()
+        self._df = GrowableArray(np.int32)
+        self._lengths = GrowableArray(np.float32)
+        self._alive = GrowableArray(np.bool_)
+        self._keys = GrowableArray(np.int64)
+        # Linha de cada chave: as recriadas de arrays em `_base_rows`, as adicionadas depois em `_rows`
+        self._base_rows = np.zeros(0, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+        self._row_terms = Postings(np.int32)
+        self._row_counts = Postings(np.float32)
+        self._total_length = 0.0
+        self._count = 0
+        
+        # Segmento principal: linhas [0, _merged_rows); segmento novo: o restante
+        self._merged_rows = 0
+        self._main = _empty_segment()
+        self._recent = _empty_segment()
+        self._recent_rows = 0
+        self._removed_rows = 0
+        self._lock = threading.RLock()
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def _row(self, key: int) -> Optional[int]:
+        """
+        Retorna a linha ativa de uma chave, ou None (o lock deve estar adquirido).
+        """
+        row = self._rows.get(key)
+        if row is None and 0 <= key < len(self._base_rows):
+            row = int(self._base_rows[key])
+            if row < 0 or not self._alive.view()[row]:
+                return None
+        return row
+    
+    def add(self, key: int, text: str, merge: bool = True):
+        """
+        Adiciona um documento ao índice (substitui o anterior com a mesma chave).
+        
+        Args:
+            key (int): Identificador associado ao documento
+            text (str): Texto a indexar
+            merge (bool): Se False, adia a reconstrução do segmento principal
+                para `flush` (carga em lote)
+        """
+        counts: Dict[str, int] = {}
+        for term in tokenize(text):
+            counts[term] = counts.get(term, 0) + 1
+        
+        with self._lock:
+            self.remove(key)
+            terms = []
+            for term in counts:
+                term_id = self._vocabulary.add(term)
+                if term_id == self._df.size:
+                    self._df.extend([0])
+                terms.append(term_id)
+            
+            self._df.view()[terms] += 1
+            length = sum(counts.values())
+            self._total_length += length
+            self._count += 1
+            
+            row = self._keys.size
+            self._rows[key] = row
+            self._keys.extend([key])
+            self._lengths.extend([length])
+            self._alive.extend([True])
+            self._row_terms.extend(row, terms)
+            self._row_counts.extend(row, counts.values())
+            
+            if merge and self._keys.size - self._merged_rows >= self.merge_docs:
+                self._merge()
+    
+    def remove(self, key: int) -> bool:
+        """
+        Remove um documento do índice.
+        
+        Args:
+            key (int): Identificador do documento
+        
+        Returns:
+            bool: True se o documento existia
+        """
+        with self._lock:
+            row = self._row(key)
+            if row is None:
+                return False
+            self._rows.pop(key, None)
+            self._alive.view()[row] = False
+            self._removed_rows += 1
+            self._count -= 1
+            self._df.view()[self._row_terms.get(row)] -= 1
+            self._total_length -= float(self._lengths.view()[row])
+            return True
+    
+    def flush(self):
+        """
+        Incorpora ao segmento principal todos os documentos adicionados.
+        """
+        with self._lock:
+            if self._merged_rows < self._keys.size:
+                self._merge()
+    
+    def _merge(self):
+        """
+        Reconstrói o segmento principal com todas as linhas (o lock deve estar adquirido).
+        """
+        self._main = self._build_segment(0, self._keys.size)
+        self._merged_rows = self._keys.size
+        self._recent = _empty_segment()
+        self._recent_rows = 0
+        self._removed_rows = 0
+    
+    def _build_segment(self, first: int, last: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Monta as listas invertidas das linhas [first, last) (o lock deve estar
+        adquirido). A contribuição de cada entrada usa o tamanho médio atual dos
+        documentos, que pouco muda até a próxima reconstrução.
+        
+        Returns:
+            tuple: (início da lista de cada termo, linhas, contribuições)
+        """
+        if last <= first:
+            return _empty_segment()
+        terms, sizes = self._row_terms.concat(first, last)
+        counts, _ = self._row_counts.concat(first, last)
+        rows = np.repeat(np.arange(first, last, dtype=np.int32), sizes)
+        alive = self._alive.view()[rows]
+        terms, counts, rows = terms[alive], counts[alive], rows[alive]
+        average_length = self._total_length / max(1, len(self)) or 1.0
+        norms = self.k1 * (1.0 - self.b + self.b * self._lengths.view()[rows] / average_length)
+        impacts = (counts * (self.k1 + 1.0) / (counts + norms)).astype(np.float32)
+        
+        order = np.argsort(terms, kind="stable")
+        col_ptr = np.zeros(len(self._vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(self._vocabulary)), out=col_ptr[1:])
+        return col_ptr, rows[order], impacts[order]
+    
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """
+        Exporta o índice em arrays, com nomes prefixados, para gravação em
+        snapshot (incorpora antes os documentos novos ao segmento principal).
+        
+        Args:
+            prefix (str): Prefixo dos nomes dos arrays
+        
+        Returns:
+            Dict[str, np.ndarray]: Arrays do índice
+        """
+        with self._lock:
+            self.flush()
+            keys = self._keys.view()
+            alive = self._alive.view()
+            key_rows = np.full(int(keys.max()) + 1 if len(keys) else 0, -1, dtype=np.int64)
+            key_rows[keys[alive]] = np.flatnonzero(alive)
+            col_ptr, rows, impacts = self._main
+            arrays = {
+                f"{prefix}.params": np.asarray([self.k1, self.b, self._total_length], dtype=np.float64),
+                f"{prefix}.df": self._df.view(),
+                f"{prefix}.lengths": self._lengths.view(),
+                f"{prefix}.alive": alive,
+                f"{prefix}.keys": keys,
+                f"{prefix}.key_rows": key_rows,
+                f"{prefix}.main.col_ptr": col_ptr,
+                f"{prefix}.main.rows": rows,
+                f"{prefix}.main.impacts": impacts
+            }
+            arrays.update(self._vocabulary.arrays(f"{prefix}.vocabulary"))
+            arrays.update(self._row_terms.arrays(f"{prefix}.row_terms"))
+            arrays.update(self._row_counts.arrays(f"{prefix}.row_counts"))
+            return arrays
+    
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], prefix: str, merge_docs: int = 256) -> "BM25Index":
+        """
+        Recria um índice exportado por `arrays` (vazio se os arrays não estiverem lá).
+        Os arrays alterados por novos documentos (frequências, tamanhos,
+        linhas ativas) são copiados; os demais são usados como estão.
+        
+        Args:
+            arrays (Mapping[str, np.ndarray]): Arrays do snapshot
+            prefix (str): Prefixo dos nomes dos arrays
+            merge_docs (int): Número de documentos novos que dispara a reconstrução do segmento principal
+        
+        Returns:
+            BM25Index: Índice recriado
+        """
+        if f"{prefix}.params" not in arrays:
+            return cls(merge_docs=merge_docs)
+        k1, b, total_length = arrays[f"{prefix}.params"].tolist()
+        index = cls(k1, b, merge_docs)
+        index._vocabulary = Vocabulary.from_arrays(arrays, f"{prefix}.vocabulary")
+        index._df.extend(arrays[f"{prefix}.df"])
+        index._lengths.extend(arrays[f"{prefix}.lengths"])
+        index._alive.extend(arrays[f"{prefix}.alive"])
+        index._keys.extend(arrays[f"{prefix}.keys"])
+        index._base_rows = arrays[f"{prefix}.key_rows"]
+        index._row_terms = Postings.from_arrays(arrays, f"{prefix}.row_terms", np.int32)
+        index._row_counts = Postings.from_arrays(arrays, f"{prefix}.row_counts", np.float32)
+        index._total_length = total_length
+        index._count = int(index._alive.view().sum())
+        index._merged_rows = index._keys.size
+        index._removed_rows = index._keys.size - index._count
+        index._main = (arrays[f"{prefix}.main.col_ptr"], arrays[f"{prefix}.main.rows"], arrays[f"{prefix}.main.impacts"])
+        return index
+    
+    def _idf(self, df: np.ndarray) -> np.ndarray:
+        """
+        Calcula o IDF do BM25 (variante sempre positiva) para as frequências de documento informadas.
+        """
+        return np.log(1.0 + (len(self) - df + 0.5) / (df + 0.5))
+    
+    def score_into(self, texts: Sequence[str], scores: np.ndarray, weight: float = 1.0):
+        """
+        Soma as pontuações BM25 de várias consultas, calculadas de uma vez,
+        a uma matriz densa (consultas x chaves).
+        
+        Args:
+            texts (Sequence[str]): Textos das consultas
+            scores (np.ndarray): Matriz contígua com uma linha por consulta e uma
+                coluna por chave (`scores[i, chave]` recebe a pontuação)
+            weight (float): Peso das pontuações deste índice
+        """
+        query_ids, query_terms, query_counts = [], [], []
+        with self._lock:
+            for i, text in enumerate(texts):
+                counts: Dict[int, int] = {}
+                for term in tokenize(text):
+                    term_id = self._vocabulary.get(term)
+                    if term_id is not None:
+                        counts[term_id] = counts.get(term_id, 0) + 1
+                query_ids.extend([i] * len(counts))
+                query_terms.extend(counts)
+                query_counts.extend(counts.values())
+            if not query_terms:
+                return
+            
+            if self._recent_rows != self._keys.size - self._merged_rows:
+                self._recent = self._build_segment(self._merged_rows, self._keys.size)
+                self._recent_rows = self._keys.size - self._merged_rows
+            
+            query_ids = np.asarray(query_ids, dtype=np.int64)
+            query_terms = np.asarray(query_terms, dtype=np.int64)
+            query_weights = np.asarray(query_counts, dtype=np.float32) * self._idf(self._df.view()[query_terms])
+            
+            # Entradas das listas invertidas dos termos consultados, nos dois segmentos
+            gathered = [_gather(segment, query_ids, query_terms, query_weights) for segment in (self._main, self._recent)]
+            owners = np.concatenate([entries[0] for entries in gathered])
+            rows = np.concatenate([entries[1] for entries in gathered])
+            entry_scores = np.concatenate([entries[2] for entries in gathered])
+            
+            # Linhas removidas depois da construção dos segmentos
+            if self._removed_rows:
+                alive = self._alive.view()[rows]
+                owners, rows, entry_scores = owners[alive], rows[alive], entry_scores[alive]
+            cells = owners * scores.shape[1] + self._keys.view()[rows]
+        
+        flat = scores.reshape(-1)
+        flat += np.bincount(cells, weights=entry_scores * weight, minlength=flat.size)
+    
+    def search_many(self, texts: Sequence[str], k: int = 5) -> List[List[Tuple[int, float]]]:
+        """
+        Busca os documentos de maior pontuação para várias consultas de uma vez.
+        
+        Args:
+            texts (Sequence[str]): Textos das consultas
+            k (int): Número máximo de resultados por consulta
+        
+        Returns:
+            List[List[Tuple[int, float]]]: Para cada consulta, pares (chave, pontuação BM25)
+                                           da maior para a menor pontuação
+        """
+        with self._lock:
+            n_keys = int(self._keys.view().max()) + 1 if self._keys.size else 0
+        return search_fields([(self, 1.0)], texts, n_keys, k)
+    
+    def search(self, text: str, k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Busca os documentos de maior pontuação para uma consulta.
+        
+        Args:
+            text (str): Texto da consulta
+            k (int): Número máximo de resultados
+        
+        Returns:
+            List[Tuple[int, float]]: Pares (chave, pontuação BM25), da maior para a menor
+        """
+        return self.search_many([text], k)[0]
+    
+    def similarities(self, text: str, keys: Sequence[int]) -> List[float]:
+        """
+        Mede a sobreposição entre os termos de uma consulta e os de cada
+        documento, ponderada pelo IDF (coeficiente de Ochiai): 1 quando os dois
+        têm os mesmos termos e menor quanto mais termos de um faltarem no outro.
+        Termos da consulta fora do vocabulário contam com o IDF máximo.
+        
+        Args:
+            text (str): Texto da consulta
+            keys (Sequence[int]): Identificadores dos documentos
+        
+        Returns:
+            List[float]: Similaridade (0 a 1) com cada documento
+        """
+        terms = set(tokenize(text))
+        with self._lock:
+            known = {term_id for term_id in map(self._vocabulary.get, terms) if term_id is not None}
+            rows = [self._row(key) for key in keys]
+            row_terms = [self._row_terms.get(row).tolist() if row is not None else [] for row in rows]
+            needed = sorted(known.union(*row_terms))
+            idf = dict(zip(needed, self._idf(self._df.view()[needed]).tolist()))
+            max_idf = math.log(1.0 + (len(self) + 0.5) / 0.5)
+        
+        query_weight = sum(idf[term] for term in known) + max_idf * (len(terms) - len(known))
+        results = []
+        for terms_of_row in row_terms:
+            row_weight = sum(idf[term] for term in terms_of_row)
+            shared_weight = sum(idf[term] for term in terms_of_row if term in known)
+            if query_weight <= 0 or row_weight <= 0:
+                results.append(0.0)
+            else:
+                results.append(shared_weight / math.sqrt(query_weight * row_weight))
+        return results
+
+
+class TrigramIndex:
+    """
+    Índice de similaridade aproximada de textos curtos, tolerante a acentos,
+    flexões e erros de digitação: cada texto é reduzido aos radicais das suas
+    palavras (incluindo as stopwords, que distinguem "o que é um prompt" de
+    "prompt o") e comparado pelo coeficiente de Dice entre os conjuntos de
+    trigramas de caracteres.
+    
+    Para uma similaridade mínima t, um texto com n trigramas só alcança t com
+    outro que compartilhe pelo menos t·n/(2 - t) deles; por isso a busca conta
+    (com NumPy) apenas as ocorrências dos trigramas mais raros da consulta que
+    bastam para garantir isso, descarta os candidatos cujo limite superior de
+    similaridade não alcança t e calcula a similaridade exata dos demais: um a
+    um, do maior para o menor limite, se forem poucos, ou contando também os
+    trigramas restantes, de uma vez.
+    
+    Cada chave é indexada uma única vez; textos removidos ficam nas listas
+    invertidas, com tamanho zero, e são descartados na busca (ou voltam com
+    `restore`).
+    """
+    
+    def __init__(self):
+        """
+        Inicializa um índice vazio.
+        """
+        self._grams = Vocabulary()
+        self._postings = Postings(np.int32)
+        self._key_grams = Postings(np.int32)
+        self._sizes = GrowableArray(np.int32)
+        self._alive = GrowableArray(np.bool_)
+        self._count = 0
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def add(self, key: int, text: str):
+        """
+        Adiciona um texto ao índice.
+        
+        Args:
+            key (int): Identificador do texto (inteiro não negativo pequeno, ainda não usado no índice)
+            text (str): Texto a indexar
+        
+        Raises:
+            ValueError: Se a chave já foi usada
+        """
+        if key < self._alive.size and (self._alive.view()[key] or self._key_grams.size(key)):
+            raise ValueError(f"Chave já indexada: {key}")
+        gram_ids = sorted(self._grams.add(gram) for gram in trigrams(text))
+        for gram_id in gram_ids:
+            self._postings.append(gram_id, key)
+        self._key_grams.extend(key, gram_ids)
+        if key >= self._sizes.size:
+            self._sizes.extend(np.zeros(key + 1 - self._sizes.size))
+            self._alive.extend(np.zeros(key + 1 - self._alive.size))
+        self._sizes.view()[key] = len(gram_ids)
+        self._alive.view()[key] = True
+        self._count += 1
+    
+    def remove(self, key: int) -> bool:
+        """
+        Remove um texto do índice.
+        
+        Args:
+            key (int): Identificador do texto
+        
+        Returns:
+            bool: True se o texto existia
+        """
+        if key >= self._alive.size or not self._alive.view()[key]:
+            return False
+        self._alive.view()[key] = False
+        self._sizes.view()[key] = 0
+        self._count -= 1
+        return True
+    
+    def restore(self, key: int) -> bool:
+        """
+        Restaura um texto removido, com os trigramas indexados originalmente.
+        
+        Args:
+            key (int): Identificador do texto
+        
+        Returns:
+            bool: True se o texto estava removido
+        """
+        if key >= self._alive.size or self._alive.view()[key]:
+            return False
+        self._alive.view()[key] = True
+        self._sizes.view()[key] = self._key_grams.size(key)
+        self._count += 1
+        return True
+    
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """
+        Exporta o índice em arrays, com nomes prefixados, para gravação em snapshot.
+        """
+        arrays = {f"{prefix}.sizes": self._sizes.view(), f"{prefix}.alive": self._alive.view()}
+        arrays.update(self._grams.arrays(f"{prefix}.grams"))
+        arrays.update(self._postings.arrays(f"{prefix}.postings"))
+        arrays.update(self._key_grams.arrays(f"{prefix}.key_grams"))
+        return arrays
+    
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], prefix: str) -> "TrigramIndex":
+        """
+        Recria um índice exportado por `arrays` (vazio se os arrays não estiverem lá).
+        """
+        index = cls()
+        if f"{prefix}.sizes" not in arrays:
+            return index
+        index._grams = Vocabulary.from_arrays(arrays, f"{prefix}.grams")
+        index._postings = Postings.from_arrays(arrays, f"{prefix}.postings", np.int32)
+        index._key_grams = Postings.from_arrays(arrays, f"{prefix}.key_grams", np.int32)
+        index._sizes.extend(arrays[f"{prefix}.sizes"])
+        index._alive.extend(arrays[f"{prefix}.alive"])
+        index._count = int(index._alive.view().sum())
+        return index
+    
+    def search(self, text: str, min_similarity: float, k: int = 1) -> List[Tuple[int, float]]:
+        """
+        Busca os textos indexados com similaridade mínima em relação à consulta.
+        
+        Args:
+            text (str): Texto da consulta
+            min_similarity (float): Similaridade mínima (0 a 1, exclusive o 0)
+            k (int): Número máximo de resultados
+        
+        Returns:
+            List[Tuple[int, float]]: Pares (chave, similaridade), da maior para a
+                                     menor similaridade e, no empate, da menor chave
+        """
+        grams = trigrams(text)
+        if not grams:
+            return []
+        
+        # Trigramas fora do vocabulário não aparecem em nenhum texto
+        gram_ids = [self._grams.get(gram) for gram in grams]
+        required = max(1, math.ceil(min_similarity * len(grams) / (2.0 - min_similarity) - 1e-9))
+        rarest = sorted(gram_ids, key=lambda gram_id: self._postings.size(gram_id) if gram_id is not None else 0)
+        selected = [gram_id for gram_id in rarest[:len(grams) - required + 1] if gram_id is not None]
+        selected_set = set(selected)
+        if not selected:
+            return []
+        
+        # Ocorrências dos trigramas selecionados; os demais podem somar no máximo `others`
+        partial = np.bincount(np.concatenate([self._postings.get(gram_id) for gram_id in selected]))
+        others = len(grams) - len(selected)
+        candidates = np.flatnonzero(partial)
+        sizes = self._sizes.view()[candidates]
+        upper = 2.0 * np.minimum(partial[candidates] + others, sizes) / (len(grams) + sizes)
+        viable = (upper >= min_similarity) & (sizes > 0)
+        candidates, upper = candidates[viable], upper[viable]
+        
+        known = [gram_id for gram_id in gram_ids if gram_id is not None]
+        if len(candidates) > TRIGRAM_EXACT_CHECKS:
+            remaining = [self._postings.get(gram_id) for gram_id in known if gram_id not in selected_set]
+            overlap = partial[candidates]
+            if remaining:
+                overlap = overlap + np.bincount(np.concatenate(remaining), minlength=self._sizes.size)[candidates]
+            similarity = 2.0 * overlap / (len(grams) + self._sizes.view()[candidates])
+            matched = similarity >= min_similarity
+            candidates, similarity = candidates[matched], similarity[matched]
+            best = np.lexsort((candidates, -similarity))[:k]
+            return list(zip(candidates[best].tolist(), similarity[best].tolist()))
+        
+        query_grams = set(known)
+        results = []
+        for i in np.argsort(-upper, kind="stable").tolist():
+            if len(results) >= k and upper[i] < results[-1][1]:
+                break
+            key = int(candidates[i])
+            key_grams = self._key_grams.get(key).tolist()
+            similarity = 2.0 * len(query_grams.intersection(key_grams)) / (len(grams) + len(key_grams))
+            if similarity >= min_similarity:
+                results.append((key, similarity))
+                results.sort(key=lambda item: (-item[1], item[0]))
+                del results[k:]
+        return results
+    
+    def similarity(self, text: str, key: int) -> float:
+        """
+        Calcula a similaridade entre a consulta e um texto indexado.
+        
+        Args:
+            text (str): Texto da consulta
+            key (int): Identificador do texto indexado
+        
+        Returns:
+            float: Similaridade (0 a 1; 0 se o texto foi removido ou não existe)
+        """
+        grams = trigrams(text)
+        if not grams or key >= self._alive.size or not self._alive.view()[key]:
+            return 0.0
+        gram_ids = {self._grams.get(gram) for gram in grams}
+        key_grams = self._key_grams.get(key).tolist()
+        return 2.0 * len(gram_ids.intersection(key_grams)) / (len(grams) + len(key_grams))
+
+
+def trigrams(text: str) -> frozenset:
+    """
+    Retorna os trigramas de caracteres dos radicais de todas as palavras de
+    um texto, inclusive as stopwords (com espaços nas bordas, para que o
+    início e o fim das palavras contem).
+    
+    Args:
+        text (str): Texto original
+    
+    Returns:
+        frozenset: Trigramas do texto (vazio se não houver palavras)
+    """
+    words = [stem(word) for word in normalize_text(text).split()]
+    if not words:
+        return frozenset()
+    padded = f" {' '.join(words)} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def top_k(query_ids: np.ndarray, keys: np.ndarray, scores: np.ndarray,
+          n_queries: int, k: int) -> List[List[Tuple[int, float]]]:
+    """
+    Seleciona os k pares de maior pontuação de cada consulta.
+    
+    Args:
+        query_ids (np.ndarray): Índice da consulta de cada par, em ordem crescente
+        keys (np.ndarray): Chave do documento de cada par
+        scores (np.ndarray): Pontuação de cada par
+        n_queries (int): Número de consultas
+        k (int): Número máximo de resultados por consulta
+    
+    Returns:
+        List[List[Tuple[int, float]]]: Para cada consulta, pares (chave, pontuação)
+                                       da maior para a menor pontuação
+    """
+    bounds = np.searchsorted(query_ids, np.arange(n_queries + 1))
+    results = []
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        group = scores[start:end]
+        if len(group) > k:
+            best = np.argpartition(group, -k)[-k:]
+        else:
+            best = np.arange(len(group))
+        best = best[np.argsort(-group[best], kind="stable")] + start
+        results.append(list(zip(keys[best].tolist(), scores[best].tolist())))
+    return results
+
+
+def search_fields(fields: Sequence[Tuple[BM25Index, float]], texts: Sequence[str],
+                  n_keys: int, k: int = 5) -> List[List[Tuple[int, float]]]:
+    """
+    Busca os documentos de maior pontuação combinando índices de campos
+    diferentes dos mesmos documentos (mesmas chaves), com pesos. As consultas
+    são pontuadas em lotes que cabem em DENSE_SCORES_LIMIT células.
+    
+    Args:
+        fields (Sequence[tuple]): Pares (índice, peso)
+        texts (Sequence[str]): Textos das consultas
+        n_keys (int): Maior chave dos índices mais um
+        k (int): Número máximo de resultados por consulta
+    
+    Returns:
+        List[List[Tuple[int, float]]]: Para cada consulta, pares (chave, pontuação)
+                                       da maior para a menor pontuação
+    """
+    if not n_keys:
+        return [[] for _ in texts]
+    batch_size = max(1, DENSE_SCORES_LIMIT // n_keys)
+    results = []
+    for first in range(0, len(texts), batch_size):
+        batch = texts[first:first + batch_size]
+        scores = np.zeros((len(batch), n_keys))
+        for index, weight in fields:
+            index.score_into(batch, scores, weight)
+        flat = scores.reshape(-1)
+        cells = np.flatnonzero(flat)
+        results.extend(top_k(cells // n_keys, cells % n_keys, flat[cells], len(batch), k))
+    return results
+
+
+def _gather(segment: Tuple[np.ndarray, np.ndarray, np.ndarray], query_ids: np.ndarray,
+            query_terms: np.ndarray, query_weights: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Reúne, sem laços em Python, as entradas das listas invertidas de um
+    segmento para os pares (consulta, termo) informados.
+    
+    Returns:
+        tuple: Arrays (consulta, linha, pontuação) de cada entrada
+    """
+    col_ptr, rows, impacts = segment
+    indexed = query_terms < len(col_ptr) - 1
+    starts = np.where(indexed, col_ptr[np.minimum(query_terms, len(col_ptr) - 1)], 0)
+    ends = np.where(indexed, col_ptr[np.minimum(query_terms + 1, len(col_ptr) - 1)], 0)
+    sizes = ends - starts
+    total = int(sizes.sum())
+    offsets = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(total)
+    return np.repeat(query_ids, sizes), rows[offsets], impacts[offsets] * np.repeat(query_weights, sizes)
+
+
+def _empty_segment() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
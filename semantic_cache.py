@@ -0,0 +1,453 @@
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from database import Database
+from knowledge_base import FALLBACK_RESPONSE
+from llm_service import ERROR_RESPONSE_PREFIX
+from retrieval import GrowableArray, normalize_text
+
+# Caches compartilhados por banco de dados (várias sessões do Streamlit no mesmo processo)
+_caches: Dict[str, "SemanticCache"] = {}
+_caches_lock = threading.Lock()
+
+
+class SemanticIndex:
+    """
+    Índice vetorial local de textos curtos baseado em TF-IDF de n-gramas de
+    caracteres, armazenado em arrays NumPy.
+    
+    Os vetores das linhas ficam em formato CSR (linhas -> n-gramas). As linhas
+    novas são incorporadas em blocos a um índice invertido (n-grama -> linhas);
+    as poucas linhas ainda não incorporadas ficam em listas invertidas em Python. A busca
+    pontua apenas as linhas que compartilham os n-gramas mais raros da
+    consulta e reordena os melhores candidatos pela similaridade de cosseno
+    exata com os pesos IDF atuais.
+    """
+    
+    def __init__(self,
+                 ngram_sizes: Tuple[int, ...] = (3, 4),
+                 stop_ratio: float = 0.2,
+                 rerank_size: int = 8,
+                 max_postings: int = 20000,
+                 merge_rows: int = 256):
+        """
+        Inicializa um índice vazio.
+        
+        Args:
+            ngram_sizes (tuple): Tamanhos dos n-gramas de caracteres
+            stop_ratio (float): N-gramas presentes em mais que esta fração das
+                linhas não geram candidatos (mas contam na similaridade final)
+            rerank_size (int): Número de candidatos reordenados com a similaridade exata
+            max_postings (int): Número máximo de entradas do índice invertido
+                percorridas por consulta (os n-gramas mais raros têm prioridade)
+            merge_rows (int): Número de linhas novas que dispara a incorporação ao índice invertido
+        """
+        self.ngram_sizes = ngram_sizes
+        self.stop_ratio = stop_ratio
+        self.rerank_size = rerank_size
+        self.max_postings = max_postings
+        self.merge_rows = merge_rows
+        
+        self._vocabulary: Dict[str, int] = {}
+        self._df = GrowableArray(np.int32)
+        self._keys = GrowableArray(np.int64)
+        self._features = GrowableArray(np.int32)
+        self._weights = GrowableArray(np.float32)
+        self._row_ptr = GrowableArray(np.int64)
+        self._row_ptr.extend([0])
+        
+        # Índice invertido das linhas [0, _merged_rows) e n-gramas [0, _merged_features)
+        self._merged_rows = 0
+        self._merged_features = 0
+        self._col_ptr = np.zeros(1, dtype=np.int64)
+        self._col_rows = np.zeros(0, dtype=np.int32)
+        self._col_weights = np.zeros(0, dtype=np.float32)
+        # Listas invertidas (em Python) das linhas ainda não incorporadas
+        self._delta_postings: Dict[int, List[Tuple[int, float]]] = {}
+        self._lock = threading.RLock()
+    
+    def __len__(self) -> int:
+        return self._keys.size
+    
+    def _ngrams(self, text: str) -> Dict[str, int]:
+        """
+        Conta os n-gramas de caracteres de um texto normalizado.
+        
+        Args:
+            text (str): Texto normalizado
+        
+        Returns:
+            Dict[str, int]: Frequência de cada n-grama
+        """
+        padded = f" {text} "
+        counts: Dict[str, int] = {}
+        for n in self.ngram_sizes:
+            for i in range(len(padded) - n + 1):
+                gram = padded[i:i + n]
+                counts[gram] = counts.get(gram, 0) + 1
+        return counts
+    
+    def _idf(self, df: np.ndarray) -> np.ndarray:
+        """
+        Calcula o IDF suavizado para as frequências de documento informadas.
+        """
+        return np.log((1.0 + len(self)) / (1.0 + df)) + 1.0
+    
+    def add(self, key: int, text: str, merge: bool = True):
+        """
+        Adiciona um texto ao índice.
+        
+        Args:
+            key (int): Identificador associado ao texto (ex.: ID da interação)
+            text (str): Texto a indexar
+            merge (bool): Se False, adia a incorporação ao índice invertido; a
+                linha só aparece nas buscas após `flush` (carga em lote)
+        """
+        counts = self._ngrams(normalize_text(text))
+        if not counts:
+            return
+        
+        with self._lock:
+            features = []
+            for gram in counts:
+                feature = self._vocabulary.get(gram)
+                if feature is None:
+                    feature = len(self._vocabulary)
+                    self._vocabulary[gram] = feature
+                    self._df.extend([0])
+                features.append(feature)
+            
+            features = np.asarray(features, dtype=np.int32)
+            weights = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+            self._df.view()[features] += 1
+            
+            if merge:
+                row = len(self)
+                for feature, weight in zip(features.tolist(), weights.tolist()):
+                    self._delta_postings.setdefault(feature, []).append((row, weight))
+            
+            self._features.extend(features)
+            self._weights.extend(weights)
+            self._row_ptr.extend([self._features.size])
+            self._keys.extend([key])
+            
+            if merge and len(self) - self._merged_rows >= self.merge_rows:
+                self._merge()
+    
+    def flush(self):
+        """
+        Incorpora ao índice invertido todas as linhas pendentes.
+        """
+        with self._lock:
+            if self._merged_rows < len(self):
+                self._merge()
+    
+    def _merge(self):
+        """
+        Incorpora ao índice invertido as linhas adicionadas desde a última
+        reconstrução (o lock deve estar adquirido). As listas existentes são
+        apenas deslocadas; somente as entradas novas são ordenadas.
+        """
+        rows = len(self)
+        n_features = len(self._vocabulary)
+        row_ptr = self._row_ptr.view()
+        first = row_ptr[self._merged_rows]
+        
+        new_features = self._features.view()[first:]
+        new_rows = np.repeat(
+            np.arange(self._merged_rows, rows, dtype=np.int32), np.diff(row_ptr[self._merged_rows:])
+        )
+        new_weights = self._weights.view()[first:]
+        order = np.argsort(new_features, kind="stable")
+        new_features, new_rows, new_weights = new_features[order], new_rows[order], new_weights[order]
+        
+        old_counts = np.zeros(n_features, dtype=np.int64)
+        old_counts[:self._merged_features] = np.diff(self._col_ptr)
+        new_counts = np.bincount(new_features, minlength=n_features)
+        col_ptr = np.zeros(n_features + 1, dtype=np.int64)
+        np.cumsum(old_counts + new_counts, out=col_ptr[1:])
+        
+        total = int(col_ptr[-1])
+        col_rows = np.empty(total, dtype=np.int32)
+        col_weights = np.empty(total, dtype=np.float32)
+        
+        # Entradas antigas: mantêm a posição relativa dentro de cada lista
+        old_features = np.repeat(np.arange(self._merged_features), old_counts[:self._merged_features])
+        old_positions = np.arange(len(self._col_rows)) - self._col_ptr[old_features] + col_ptr[old_features]
+        col_rows[old_positions] = self._col_rows
+        col_weights[old_positions] = self._col_weights
+        
+        # Entradas novas: vão para o fim de cada lista (IDs de linha crescentes)
+        new_starts = np.zeros(n_features + 1, dtype=np.int64)
+        np.cumsum(new_counts, out=new_starts[1:])
+        new_positions = (np.arange(len(new_features)) - new_starts[new_features]
+                         + col_ptr[new_features] + old_counts[new_features])
+        col_rows[new_positions] = new_rows
+        col_weights[new_positions] = new_weights
+        
+        self._col_ptr, self._col_rows, self._col_weights = col_ptr, col_rows, col_weights
+        self._delta_postings = {}
+        self._merged_rows = rows
+        self._merged_features = n_features
+    
+    def search(self, text: str, k: int = 1) -> List[Tuple[int, float]]:
+        """
+        Busca os textos indexados mais similares.
+        
+        Args:
+            text (str): Texto da consulta
+            k (int): Número máximo de resultados
+        
+        Returns:
+            List[Tuple[int, float]]: Pares (identificador, similaridade de cosseno),
+                                     do mais ao menos similar
+        """
+        counts = self._ngrams(normalize_text(text))
+        if not counts:
+            return []
+        
+        with self._lock:
+            rows = len(self)
+            if rows == 0:
+                return []
+            df = self._df.view()
+            
+            # Pesos da consulta (n-gramas desconhecidos contam apenas na norma)
+            known, known_weights, unknown_norm = [], [], 0.0
+            max_idf = math.log(1.0 + rows) + 1.0
+            for gram, count in counts.items():
+                weight = 1.0 + math.log(count)
+                feature = self._vocabulary.get(gram)
+                if feature is None:
+                    unknown_norm += (weight * max_idf) ** 2
+                else:
+                    known.append(feature)
+                    known_weights.append(weight)
+            if not known:
+                return []
+            
+            query_features = np.asarray(known, dtype=np.int32)
+            query_idf = self._idf(df[query_features])
+            query_weights = np.asarray(known_weights, dtype=np.float32) * query_idf
+            query_norm = math.sqrt(float(np.dot(query_weights, query_weights)) + unknown_norm)
+            
+            candidates = self._candidates(query_features, query_weights * query_idf, df, rows)
+            if len(candidates) == 0:
+                return []
+            
+            # Reordena os candidatos com o cosseno exato (inclui n-gramas frequentes)
+            order = np.argsort(query_features)
+            sorted_features = query_features[order]
+            sorted_weights = query_weights[order]
+            row_ptr = self._row_ptr.view()
+            features = self._features.view()
+            weights = self._weights.view()
+            keys = self._keys.view()
+            
+            results = []
+            for row in candidates:
+                start, end = row_ptr[row], row_ptr[row + 1]
+                row_features = features[start:end]
+                row_weights = weights[start:end] * self._idf(df[row_features])
+                positions = np.searchsorted(sorted_features, row_features)
+                positions[positions >= len(sorted_features)] = 0
+                shared = sorted_features[positions] == row_features
+                dot = float(np.dot(row_weights[shared], sorted_weights[positions[shared]]))
+                row_norm = math.sqrt(float(np.dot(row_weights, row_weights)))
+                if dot > 0 and row_norm > 0:
+                    results.append((int(keys[row]), dot / (query_norm * row_norm)))
+        
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:k]
+    
+    def _candidates(self, query_features: np.ndarray, query_scale: np.ndarray,
+                    df: np.ndarray, rows: int) -> np.ndarray:
+        """
+        Seleciona as linhas candidatas pela sobreposição de n-gramas pouco
+        frequentes com a consulta (o lock deve estar adquirido).
+        
+        Args:
+            query_features (np.ndarray): N-gramas conhecidos da consulta
+            query_scale (np.ndarray): Peso da consulta multiplicado pelo IDF de cada n-grama
+            df (np.ndarray): Frequência de documento de cada n-grama
+            rows (int): Número de linhas indexadas
+        
+        Returns:
+            np.ndarray: Índices das linhas candidatas
+        """
+        query_df = df[query_features]
+        selective = query_df <= max(1, self.stop_ratio * rows)
+        
+        # Percorre as listas invertidas dos n-gramas mais raros primeiro, até o
+        # limite de entradas por consulta (as linhas ainda não incorporadas ao
+        # índice invertido estão nas listas em Python)
+        row_lists, weight_lists = [], []
+        delta_rows, delta_weights = [], []
+        visited = 0
+        for i in np.argsort(query_df).tolist():
+            if not selective[i]:
+                break
+            feature = int(query_features[i])
+            scale = float(query_scale[i])
+            if feature < self._merged_features:
+                start, end = self._col_ptr[feature], self._col_ptr[feature + 1]
+            else:
+                start = end = 0
+            delta = self._delta_postings.get(feature, ())
+            size = (end - start) + len(delta)
+            if visited and visited + size > self.max_postings:
+                break
+            visited += size
+            if end > start:
+                row_lists.append(self._col_rows[start:end])
+                weight_lists.append(self._col_weights[start:end] * scale)
+            for row, weight in delta:
+                delta_rows.append(row)
+                delta_weights.append(weight * scale)
+        if delta_rows:
+            row_lists.append(np.asarray(delta_rows, dtype=np.int32))
+            weight_lists.append(np.asarray(delta_weights, dtype=np.float32))
+        
+        if not row_lists:
+            return np.zeros(0, dtype=np.int64)
+        candidate_rows = np.concatenate(row_lists)
+        scores = np.bincount(candidate_rows, weights=np.concatenate(weight_lists), minlength=rows)
+        
+        # Seleciona as linhas de maior pontuação sem percorrer todas as linhas do índice
+        entry_scores = scores[candidate_rows]
+        limit = self.rerank_size * 16
+        if len(entry_scores) > limit:
+            top = np.argpartition(entry_scores, -limit)[-limit:]
+            candidate_rows = candidate_rows[top]
+        hits = np.unique(candidate_rows)
+        hits = hits[scores[hits] > 0]
+        if len(hits) > self.rerank_size:
+            hits = hits[np.argpartition(scores[hits], -self.rerank_size)[-self.rerank_size:]]
+        return hits
+
+
+class SemanticCache:
+    """
+    Cache semântico de respostas: encontra perguntas anteriores parecidas com
+    a atual e devolve a resposta armazenada em `interactions`, evitando uma
+    chamada ao LLM para paráfrases de perguntas já respondidas.
+    """
+    
+    def __init__(self, db: Database, threshold: float = 0.85, min_words: int = 3):
+        """
+        Inicializa o cache e indexa as interações já armazenadas.
+        
+        Args:
+            db (Database): Banco de dados com as interações
+            threshold (float): Similaridade mínima (0 a 1) para reutilizar uma resposta
+            min_words (int): Número mínimo de palavras da pergunta para usar o cache
+        """
+        self.db = db
+        self.threshold = threshold
+        self.min_words = min_words
+        self.index = SemanticIndex()
+        self.stats = {"hits": 0, "misses": 0}
+        self._seen_questions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        """
+        Indexa as interações existentes no banco de dados, em páginas.
+        """
+        after_id = 0
+        while True:
+            rows = self.db.get_interactions_page(after_id, 5000)
+            if not rows:
+                break
+            for interaction_id, question, response in rows:
+                self.add(interaction_id, question, response, merge=False)
+            after_id = rows[-1][0]
+        self.index.flush()
+    
+    def attach(self, db: Database):
+        """
+        Passa a indexar as novas interações armazenadas por uma instância de Database.
+        
+        Args:
+            db (Database): Banco de dados a acompanhar
+        """
+        db.add_listener(self.add)
+    
+    def _is_cacheable(self, question: str, response: str) -> bool:
+        """
+        Indica se uma interação pode ser reutilizada como resposta.
+        """
+        if len(question.split()) < self.min_words:
+            return False
+        return not (response.startswith(ERROR_RESPONSE_PREFIX) or response == FALLBACK_RESPONSE)
+    
+    def add(self, interaction_id: int, question: str, response: str, merge: bool = True):
+        """
+        Indexa uma interação (perguntas repetidas são indexadas uma só vez).
+        
+        Args:
+            interaction_id (int): ID da interação
+            question (str): Pergunta do usuário
+            response (str): Resposta fornecida
+            merge (bool): Se False, adia a incorporação ao índice invertido
+        """
+        if not self._is_cacheable(question, response):
+            return
+        normalized = normalize_text(question)
+        with self._lock:
+            if normalized in self._seen_questions:
+                return
+            self._seen_questions[normalized] = interaction_id
+        self.index.add(interaction_id, question, merge)
+    
+    def lookup(self, question: str) -> Optional[Tuple[str, float, int]]:
+        """
+        Busca uma resposta armazenada para uma pergunta similar.
+        
+        Args:
+            question (str): Pergunta do usuário
+        
+        Returns:
+            Optional[Tuple[str, float, int]]: (resposta, similaridade, ID da interação)
+                                              ou None se nenhuma for similar o suficiente
+        """
+        if len(question.split()) >= self.min_words:
+            matches = self.index.search(question, k=1)
+            if matches and matches[0][1] >= self.threshold:
+                interaction_id, score = matches[0]
+                interaction = self.db.get_interaction_by_id(interaction_id)
+                if interaction:
+                    self.stats["hits"] += 1
+                    return interaction[2], score, interaction_id
+        self.stats["misses"] += 1
+        return None
+
+
+def get_semantic_cache(db: Database, threshold: float = 0.85, min_words: int = 3) -> SemanticCache:
+    """
+    Retorna o cache semântico compartilhado para o banco de dados, criando-o
+    na primeira chamada, e passa a acompanhar as inserções da instância informada.
+    
+    Args:
+        db (Database): Banco de dados com as interações
+        threshold (float): Similaridade mínima (0 a 1) para reutilizar uma resposta
+        min_words (int): Número mínimo de palavras da pergunta para usar o cache
+    
+    Returns:
+        SemanticCache: Cache semântico
+    """
+    key = os.path.abspath(db.db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = SemanticCache(db, threshold, min_words)
+            _caches[key] = cache
+        cache.threshold = threshold
+        cache.min_words = min_words
+        cache.attach(db)
+        return cache
@@ -11,6 +11,7 @@ setup(
         "openai>=1.0.0",  # SDK oficial da OpenAI para interagir com os modelos
         "pyyaml>=6.0",    # Para leitura de arquivos de configuração YAML
         "python-dotenv>=1.0.0",  # Para gerenciar variáveis de ambiente (opcional)
-        "streamlit>=1.30.0"  # Para a interface web interativa
+        "streamlit>=1.30.0",  # Para a interface web interativa
+        "numpy>=1.22.0"  # Para o cache semântico e a busca ranqueada na base de conhecimento
     ],
 ) 
\ No newline at end of file
@@ -0,0 +1,481 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+# Configurações padrão do servidor simulado (seção `stub_server` do config.yaml)
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "host": "127.0.0.1",
+    "port": 8000,
+    "latency_distribution": "lognormal",  # fixed, uniform, normal ou lognormal
+    "latency_ms": 400,          # Tempo até o primeiro token (mediana ou média)
+    "latency_jitter_ms": 150,   # Dispersão do tempo até o primeiro token
+    "tokens_per_second": 60,    # Velocidade de geração da resposta
+    "answer_words": 80,         # Tamanho das respostas geradas
+    "error_rate": 0.0,          # Fração de respostas 500
+    "rate_limit_rate": 0.0,     # Fração de respostas 429
+    "timeout_rate": 0.0,        # Fração de requisições que ficam sem resposta
+    "hang_seconds": 120,        # Duração das requisições sem resposta
+    "stream_error_rate": 0.0,   # Fração de streams interrompidos no meio
+    "cache_min_tokens": 1024,   # Prefixo mínimo atendido pelo cache de prefixo simulado
+    "insights_replies": None,   # Respostas prontas, em ordem, aos prompts de insights (depois, as geradas)
+    "seed": 0,
+}
+
+# Vocabulário das respostas determinísticas
+VOCABULARY = (
+    "prompt modelo contexto instrução exemplo resposta técnica formato tarefa usuário "
+    "clareza objetivo restrição papel etapa raciocínio saída entrada avaliação iteração "
+    "delimitador especificidade tom público dados critério qualidade teste ajuste padrão"
+).split()
+
+# Trechos que identificam os prompts internos do agente
+INSIGHTS_MARKER = "Analise as interações abaixo"
+INTERACTION_PATTERN = re.compile(r"^Interação (\d+):", re.MULTILINE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estima o número de tokens de um texto (aproximadamente 4 caracteres por token).
+    
+    Args:
+        text (str): Texto a estimar
+    
+    Returns:
+        int: Número estimado de tokens
+    """
+    return len(text) // 4 + 1
+
+
+class StubLLMServer:
+    """
+    Servidor HTTP local compatível com a API de chat completions da OpenAI,
+    para testes de carga e medições de latência sem acesso à rede.
+    
+    As respostas são determinísticas (dependem apenas das mensagens), o tempo
+    até o primeiro token segue uma distribuição configurável, os tokens são
+    gerados a uma taxa fixa e erros (500, 429, timeouts e streams interrompidos)
+    podem ser injetados com probabilidades configuráveis. O campo `usage` simula
+    o cache de prefixo do provedor: os tokens de um prefixo de mensagens já visto
+    são informados em `prompt_tokens_details.cached_tokens`.
+    """
+    
+    def __init__(self, **settings: Any):
+        """
+        Args:
+            **settings: Configurações que substituem `DEFAULT_SETTINGS`
+        """
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update({name: value for name, value in settings.items() if value is not None})
+        self._random = random.Random(self.settings["seed"])
+        self._lock = threading.Lock()
+        self._prefixes: "OrderedDict[str, int]" = OrderedDict()
+        self.stats = {"requests": 0, "streams": 0, "errors": 0, "rate_limited": 0, "timeouts": 0,
+                      "stream_errors": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def base_url(self) -> str:
+        """
+        URL base a ser usada como `base_url` do cliente OpenAI.
+        
+        Returns:
+            str: URL base (terminando em /v1)
+        """
+        host, port = self._httpd.server_address[:2] if self._httpd else (self.settings["host"], self.settings["port"])
+        return f"http://{host}:{port}/v1"
+    
+    def start(self) -> "StubLLMServer":
+        """
+        Inicia o servidor em uma thread em segundo plano.
+        
+        Returns:
+            StubLLMServer: O próprio servidor
+        """
+        self._httpd = ThreadingHTTPServer((self.settings["host"], self.settings["port"]), _StubHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stub-llm-server", daemon=True)
+        self._thread.start()
+        return self
+    
+    def serve_forever(self):
+        """
+        Executa o servidor na thread atual até ser interrompido.
+        """
+        self._httpd = ThreadingHTTPServer((self.settings["host"], self.settings["port"]), _StubHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+    
+    def stop(self):
+        """
+        Encerra o servidor.
+        """
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+    
+    def sample_latency(self) -> float:
+        """
+        Sorteia o tempo até o primeiro token segundo a distribuição configurada.
+        
+        Returns:
+            float: Tempo, em segundos
+        """
+        distribution = self.settings["latency_distribution"]
+        mean = self.settings["latency_ms"]
+        jitter = self.settings["latency_jitter_ms"]
+        with self._lock:
+            if distribution == "uniform":
+                value = self._random.uniform(mean - jitter, mean + jitter)
+            elif distribution == "normal":
+                value = self._random.gauss(mean, jitter)
+            elif distribution == "lognormal" and mean > 0:
+                value = self._random.lognormvariate(math.log(mean), jitter / mean)
+            else:
+                value = mean
+        return max(0.0, value) / 1000
+    
+    def sample_fault(self, stream: bool) -> Optional[str]:
+        """
+        Sorteia a falha a injetar em uma requisição, se houver.
+        
+        Args:
+            stream (bool): Se a requisição é de streaming
+        
+        Returns:
+            Optional[str]: "error", "rate_limit", "timeout", "stream_error" ou None
+        """
+        with self._lock:
+            roll = self._random.random()
+        for fault, rate in (("error", self.settings["error_rate"]),
+                            ("rate_limit", self.settings["rate_limit_rate"]),
+                            ("timeout", self.settings["timeout_rate"]),
+                            ("stream_error", self.settings["stream_error_rate"] if stream else 0.0)):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+    
+    def generate_answer(self, messages: List[Dict[str, Any]], max_tokens: Optional[int]) -> str:
+        """
+        Gera uma resposta determinística a partir das mensagens.
+        
+        Args:
+            messages (List[Dict[str, Any]]): Mensagens da requisição
+            max_tokens (int, optional): Limite de tokens da resposta
+        
+        Returns:
+            str: Texto da resposta
+        """
+        last = str(messages[-1].get("content", "")) if messages else ""
+        
+        # Prompts de extração de insights recebem um array JSON válido
+        if INSIGHTS_MARKER in last:
+            with self._lock:
+                replies = self.settings["insights_replies"]
+                if replies:
+                    return replies.pop(0)
+            count = len(INTERACTION_PATTERN.findall(last)) or 1
+            return json.dumps([
+                {"index": i, "category": "definição", "patterns": ["simulado"], "possible_improvements": []}
+                for i in range(1, count + 1)
+            ], ensure_ascii=False)
+        
+        digest = hashlib.sha256(json.dumps(messages, sort_keys=True, ensure_ascii=False).encode("utf-8")).digest()
+        rng = random.Random(digest)
+        words = self.settings["answer_words"]
+        if max_tokens:
+            words = max(1, min(words, int(max_tokens * 0.75)))
+        body = " ".join(rng.choice(VOCABULARY) for _ in range(words))
+        return f"Resposta simulada para \"{last[:60]}\": {body}."
+    
+    def compute_usage(self, messages: List[Dict[str, Any]], completion_tokens: int) -> Dict[str, Any]:
+        """
+        Calcula o uso de tokens da requisição, simulando o cache de prefixo:
+        o maior prefixo de mensagens já visto conta como tokens em cache
+        (a partir de `cache_min_tokens`, em blocos de 128 tokens).
+        
+        Args:
+            messages (List[Dict[str, Any]]): Mensagens da requisição
+            completion_tokens (int): Tokens da resposta
+        
+        Returns:
+            Dict[str, Any]: Campo `usage` da resposta
+        """
+        prefix_hash = hashlib.sha256()
+        prompt_tokens = 0
+        cached_tokens = 0
+        boundaries: List[Tuple[str, int]] = []
+        for message in messages:
+            prefix_hash.update(json.dumps(message, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+            prompt_tokens += estimate_tokens(str(message.get("content", ""))) + 4
+            boundaries.append((prefix_hash.hexdigest(), prompt_tokens))
+        
+        with self._lock:
+            for digest, tokens in boundaries:
+                if digest in self._prefixes:
+                    self._prefixes.move_to_end(digest)
+                    cached_tokens = tokens
+                else:
+                    self._prefixes[digest] = tokens
+            while len(self._prefixes) > 100000:
+                self._prefixes.popitem(last=False)
+        
+        if cached_tokens < self.settings["cache_min_tokens"]:
+            cached_tokens = 0
+        else:
+            cached_tokens -= cached_tokens % 128
+        
+        with self._lock:
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["cached_tokens"] += cached_tokens
+            self.stats["completion_tokens"] += completion_tokens
+        
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}
+        }
+    
+    def count(self, name: str):
+        """
+        Incrementa um contador das estatísticas.
+        
+        Args:
+            name (str): Nome do contador
+        """
+        with self._lock:
+            self.stats[name] += 1
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+    Trata as requisições HTTP do servidor simulado.
+    """
+    
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, format: str, *args: Any):
+        """
+        Silencia o log de cada requisição.
+        """
+    
+    @property
+    def stub(self) -> StubLLMServer:
+        """
+        Servidor simulado ao qual este handler pertence.
+        """
+        return self.server.stub
+    
+    def do_GET(self):
+        """
+        Lista os modelos (GET /v1/models) ou devolve as estatísticas (GET /stats).
+        """
+        if self.path.rstrip("/") == "/stats":
+            with self.stub._lock:
+                self._send_json(200, dict(self.stub.stats))
+        elif self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "local"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+    
+    def do_POST(self):
+        """
+        Atende POST /v1/chat/completions, com ou sem streaming.
+        """
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid JSON", "type": "invalid_request_error"}})
+            return
+        
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        
+        stub = self.stub
+        stream = bool(request.get("stream"))
+        stub.count("requests")
+        if stream:
+            stub.count("streams")
+        
+        fault = stub.sample_fault(stream)
+        time.sleep(stub.sample_latency())
+        if fault == "error":
+            stub.count("errors")
+            self._send_json(500, {"error": {"message": "erro simulado", "type": "server_error"}})
+            return
+        if fault == "rate_limit":
+            stub.count("rate_limited")
+            self._send_json(429, {"error": {"message": "limite simulado", "type": "rate_limit_error"}},
+                            {"Retry-After": "1"})
+            return
+        if fault == "timeout":
+            stub.count("timeouts")
+            time.sleep(stub.settings["hang_seconds"])
+            self.close_connection = True
+            return
+        
+        messages = request.get("messages") or []
+        model = request.get("model", "stub")
+        answer = stub.generate_answer(messages, request.get("max_tokens"))
+        words = answer.split(" ")
+        usage = stub.compute_usage(messages, len(words))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        
+        if not stream:
+            time.sleep(len(words) / stub.settings["tokens_per_second"])
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": answer},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            })
+            return
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra: Any) -> Dict[str, Any]:
+            return dict({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }, **extra)
+        
+        interval = 1.0 / stub.settings["tokens_per_second"]
+        abort_at = len(words) // 2 if fault == "stream_error" else None
+        self._send_event(chunk({"role": "assistant", "content": ""}))
+        for position, word in enumerate(words):
+            if position == abort_at:
+                # Encerra a conexão sem o trecho final, como uma queda no meio do stream
+                stub.count("stream_errors")
+                self.close_connection = True
+                return
+            time.sleep(interval)
+            self._send_event(chunk({"content": word if position == 0 else " " + word}))
+        self._send_event(chunk({}, "stop"))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._send_event(dict(chunk({}), choices=[], usage=usage))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+    
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        """
+        Envia uma resposta JSON completa.
+        
+        Args:
+            status (int): Código HTTP
+            payload (Dict[str, Any]): Corpo da resposta
+            headers (Dict[str, str], optional): Cabeçalhos adicionais
+        """
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_event(self, payload: Dict[str, Any]):
+        """
+        Envia um evento SSE (server-sent events) do stream.
+        
+        Args:
+            payload (Dict[str, Any]): Trecho da resposta
+        """
+        self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+    
+    def _write_chunk(self, data: bytes):
+        """
+        Escreve um bloco na codificação HTTP chunked (bloco vazio encerra a resposta).
+        
+        Args:
+            data (bytes): Dados do bloco
+        """
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def load_settings(config_path: str) -> Dict[str, Any]:
+    """
+    Carrega a seção `stub_server` do arquivo de configuração, se existir.
+    
+    Args:
+        config_path (str): Caminho para o arquivo de configuração YAML
+    
+    Returns:
+        Dict[str, Any]: Configurações do servidor simulado
+    """
+    try:
+        with open(config_path, 'r', encoding='utf-8') as file:
+            config = yaml.safe_load(file) or {}
+    except OSError:
+        return {}
+    return config.get('stub_server') or {}
+
+
+def main():
+    """
+    Inicia o servidor simulado pela linha de comando.
+    """
+    parser = argparse.ArgumentParser(description="Servidor local compatível com a API de chat completions da OpenAI.")
+    parser.add_argument("--config", default="config.yaml", help="Arquivo de configuração (seção stub_server)")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "normal", "lognormal"], default=None)
+    parser.add_argument("--latency-ms", type=float, default=None, help="Tempo até o primeiro token (ms)")
+    parser.add_argument("--latency-jitter-ms", type=float, default=None, help="Dispersão do tempo até o primeiro token (ms)")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Velocidade de geração")
+    parser.add_argument("--answer-words", type=int, default=None, help="Tamanho das respostas, em palavras")
+    parser.add_argument("--error-rate", type=float, default=None, help="Fração de respostas 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=None, help="Fração de respostas 429")
+    parser.add_argument("--timeout-rate", type=float, default=None, help="Fração de requisições sem resposta")
+    parser.add_argument("--stream-error-rate", type=float, default=None, help="Fração de streams interrompidos")
+    parser.add_argument("--seed", type=int, default=None, help="Semente do gerador de latências e falhas")
+    args = parser.parse_args()
+    
+    settings = load_settings(args.config)
+    settings.update({name: value for name, value in vars(args).items() if name != "config" and value is not None})
+    server = StubLLMServer(**settings)
+    print(f"Servidor simulado em {server.base_url} (use como model.base_url no config.yaml)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nEncerrando o servidor simulado...")
+
+
+if __name__ == "__main__":
+    main()
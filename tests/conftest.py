@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stub_server import StubLLMServer  # noqa: E402
+
+
+@pytest.fixture
+def stub_server():
+    """
+    Servidor simulado da API da OpenAI, rápido e determinístico.
+    """
+    server = StubLLMServer(port=0, latency_ms=20, latency_jitter_ms=0, latency_distribution="fixed",
+                           tokens_per_second=5000, answer_words=20, seed=1).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_config(tmp_path, stub_server):
+    """
+    Cria um config.yaml baseado no do projeto, apontando para o servidor
+    simulado e para um banco de dados temporário.
+    
+    Returns:
+        Callable: Função (**seções) -> caminho do arquivo; cada seção informada
+            é mesclada à seção correspondente da configuração
+    """
+    def make(**sections):
+        with open(os.path.join(ROOT, "config.yaml"), encoding="utf-8") as file:
+            config = yaml.safe_load(file)
+        config["api_key"] = {"key": "test"}
+        config["model"]["base_url"] = stub_server.base_url
+        config["database"]["path"] = str(tmp_path / "agent.db")
+        config["knowledge_base"] = {
+            "sources": [os.path.join(ROOT, "knowledge", "faqs.yaml")],
+            "snapshot_path": "",
+            "added_path": "",
+            "reload_interval": 0
+        }
+        config["insights"]["poll_interval"] = 0.2
+        for name, values in sections.items():
+            config.setdefault(name, {}).update(values)
+        path = tmp_path / "config.yaml"
+        with open(path, "w", encoding="utf-8") as file:
+            yaml.safe_dump(config, file, allow_unicode=True)
+        return str(path)
+    
+    return make
+
+
+@pytest.fixture
+def wait_until():
+    """
+    Espera até que uma condição seja verdadeira (trabalho em segundo plano).
+    
+    Returns:
+        Callable: Função (condição, timeout) -> bool
+    """
+    def wait(condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return True
+            time.sleep(0.02)
+        return condition()
+    
+    return wait
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import pytest
+
+import async_llm_service
+from async_llm_service import AsyncLLMService
+from llm_service import ERROR_RESPONSE_PREFIX
+
+PROMPTS = [f"O que é a técnica número {i}?" for i in range(6)]
+
+
+@pytest.fixture
+def make_service(make_config):
+    def make(max_concurrency=None, **resilience):
+        config = make_config(cache={"enabled": False}, resilience=dict({"max_attempts": 1}, **resilience))
+        return AsyncLLMService(config, max_concurrency=max_concurrency)
+    
+    return make
+
+
+def gather_timed(service, prompts):
+    start = time.perf_counter()
+    results = asyncio.run(service.agather_completions(prompts))
+    return results, time.perf_counter() - start
+
+
+def test_semaphore_bounds_concurrent_requests(make_service, stub_server):
+    stub_server.settings["latency_ms"] = 200
+    results, elapsed = gather_timed(make_service(max_concurrency=2), PROMPTS)
+    assert all(ok for _, ok in results)
+    # As respostas voltam na ordem dos prompts
+    assert [answer.split('"')[1] for answer, _ in results] == PROMPTS
+    # Seis chamadas, duas por vez: três rodadas de 200 ms
+    assert elapsed >= 0.6
+    
+    _, elapsed = gather_timed(make_service(max_concurrency=6), PROMPTS)
+    assert elapsed < 0.5
+    assert stub_server.stats["requests"] == 12
+
+
+def test_each_event_loop_gets_its_own_semaphore_and_client(make_service, stub_server):
+    service = make_service(max_concurrency=2)
+    first = asyncio.run(service.aget_completion(PROMPTS[0]))
+    loops = []
+    
+    async def ask():
+        loops.append(asyncio.get_running_loop())
+        return await service.aget_completion(PROMPTS[1])
+    
+    # O semáforo e as conexões do primeiro event loop, já encerrado, não são reutilizados
+    second = asyncio.run(ask())
+    assert first[1] and second[1]
+    assert [resources[0] for resources in service._loop_resources.values()] == loops
+    
+    # O event loop em segundo plano continua aberto: os seus recursos são mantidos ao lado dos seguintes
+    assert service.run_in_background(service.aget_completion(PROMPTS[2])).result(5)[1]
+    assert asyncio.run(ask())[1]
+    assert [resources[0] for resources in service._loop_resources.values()] == [
+        async_llm_service._background_loop, loops[1]
+    ]
+
+
+def test_attempts_are_cut_by_the_attempt_timeout(make_service, stub_server):
+    stub_server.settings["latency_ms"] = 1000
+    service = make_service(max_attempts=2, attempt_timeout=0.1, base_delay=0.01)
+    start = time.perf_counter()
+    answer, ok = asyncio.run(service.aget_completion(PROMPTS[0]))
+    assert not ok and answer == f"{ERROR_RESPONSE_PREFIX}: tempo limite excedido"
+    assert time.perf_counter() - start < 0.8
+    assert stub_server.stats["requests"] == 2
+    assert service.circuit_breaker.snapshot()["failures"] == 1
+
+
+def test_call_timeout_limits_all_attempts(make_service, stub_server):
+    stub_server.settings["latency_ms"] = 1000
+    service = make_service(max_attempts=5, base_delay=0.01)
+    start = time.perf_counter()
+    answer, ok = asyncio.run(service.aget_completion(PROMPTS[0], timeout=0.3))
+    assert not ok and answer.endswith("tempo limite excedido")
+    assert time.perf_counter() - start < 0.8
+    
+    async def stream():
+        return [chunk async for chunk in service.astream_completion(PROMPTS[1], timeout=0.2)]
+    
+    chunks = asyncio.run(stream())
+    assert chunks == [f"{ERROR_RESPONSE_PREFIX}: tempo limite excedido"]
+    assert not service.last_stream_metrics["success"] and service.last_stream_metrics["total_time"] < 0.8
@@ -0,0 +1,101 @@
+import sqlite3
+import threading
+
+import pytest
+
+from database import ConnectionManager, Database, register_functions
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = ConnectionManager(str(tmp_path / "agent.db"), busy_timeout_ms=1500, synchronous="NORMAL")
+    yield manager
+    manager.close()
+
+
+def in_thread(function):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def is_open(conn):
+    try:
+        conn.execute("SELECT 1")
+    except sqlite3.ProgrammingError:
+        return False
+    return True
+
+
+def test_each_thread_reuses_its_own_connection(manager):
+    conn = manager.connection()
+    assert manager.connection() is conn and manager.cursor()[0] is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert conn.execute("PRAGMA synchronous").fetchone() == (1,)
+    assert conn.execute("PRAGMA busy_timeout").fetchone() == (1500,)
+    
+    other = in_thread(manager.connection)
+    assert other is not conn
+    # A conexão da thread encerrada é fechada quando outra thread abre a sua
+    third = in_thread(manager.connection)
+    assert not is_open(other) and is_open(third) and is_open(conn)
+    assert len(manager._connections) == 2
+
+
+def test_closed_connections_are_reopened(manager):
+    conn = manager.connection()
+    other = threading.Event()
+    done = threading.Event()
+    
+    def hold():
+        manager.connection()
+        other.set()
+        done.wait(2)
+    
+    thread = threading.Thread(target=hold)
+    thread.start()
+    try:
+        other.wait(2)
+        manager.close()
+        assert not is_open(conn) and manager._connections == {}
+    finally:
+        done.set()
+        thread.join()
+    
+    reopened = manager.connection()
+    assert reopened is not conn and reopened.execute("SELECT 1").fetchone() == (1,)
+
+
+def test_release_rolls_back_unfinished_transactions(manager):
+    conn, cursor = manager.cursor()
+    cursor.execute("CREATE TABLE items (value TEXT)")
+    cursor.execute("INSERT INTO items VALUES ('confirmado')")
+    conn.commit()
+    cursor.execute("INSERT INTO items VALUES ('pendente')")
+    manager.release(conn, cursor)
+    assert not conn.in_transaction
+    assert conn.execute("SELECT value FROM items").fetchall() == [("confirmado",)]
+
+
+def test_readers_are_not_blocked_by_a_writer(tmp_path):
+    db = Database(str(tmp_path / "agent.db"))
+    try:
+        first = db.store_interaction("pergunta", "resposta")
+        # Outra conexão mantém uma transação de escrita aberta
+        writer = sqlite3.connect(db.db_path)
+        register_functions(writer)
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute("DELETE FROM interactions")
+        try:
+            assert [row[0] for row in in_thread(db.get_all_interactions)] == [first]
+        finally:
+            writer.rollback()
+            writer.close()
+        
+        # Após close(), o banco continua utilizável: as conexões são reabertas
+        db.close()
+        assert db.get_interaction_by_id(first)[1] == "pergunta"
+    finally:
+        db.close()
@@ -0,0 +1,79 @@
+import threading
+
+from context_manager import ConversationMemory, count_tokens, local_summary
+
+
+def long_turns(count, words=60):
+    return [(f"pergunta {index}", "resposta " * words) for index in range(count)]
+
+
+def test_context_stays_within_the_token_budget():
+    memory = ConversationMemory(token_budget=400, summary_max_tokens=100)
+    for question, answer in long_turns(20):
+        memory.add_turn(question, answer)
+        assert memory.context_tokens() <= 400
+    assert memory.stats["evicted_messages"] > 0
+    oldest = memory.messages()[0]
+    assert oldest["role"] == "user"
+    assert memory.messages()[-1] == {"role": "assistant", "content": "resposta " * 60}
+    # A última pergunta removida está no resumo
+    kept = int(oldest["content"].split()[-1])
+    assert memory.summary.endswith(f"pergunta {kept - 1}")
+
+
+def test_local_summary_keeps_the_most_recent_questions():
+    turns = [{"role": "user", "content": f"pergunta {index}"} for index in range(200)]
+    summary = local_summary("", turns, max_tokens=50)
+    assert count_tokens(summary) <= 50
+    assert summary.endswith("pergunta 199")
+
+
+def test_summarizer_runs_in_the_background():
+    release = threading.Event()
+    calls = []
+    
+    def summarizer(previous, turns, max_tokens):
+        release.wait(5)
+        calls.append(len(turns))
+        return "resumo do modelo"
+    
+    memory = ConversationMemory(token_budget=400, summary_max_tokens=100, summarizer=summarizer)
+    for question, answer in long_turns(5):
+        memory.add_turn(question, answer)
+    
+    # A remoção não espera o `summarizer`: o resumo local cobre as mensagens removidas
+    assert memory.stats["summaries"] >= 1
+    assert "pergunta 0" in memory.summary
+    assert not memory.wait_for_summary(0.05)
+    
+    release.set()
+    assert memory.wait_for_summary(5)
+    assert memory.summary == "resumo do modelo"
+    assert len(calls) == memory.stats["summaries"]
+
+
+def test_clear_discards_pending_summaries():
+    release = threading.Event()
+    
+    def summarizer(previous, turns, max_tokens):
+        release.wait(5)
+        return "resumo antigo"
+    
+    memory = ConversationMemory(token_budget=400, summary_max_tokens=100, summarizer=summarizer)
+    for question, answer in long_turns(5):
+        memory.add_turn(question, answer)
+    memory.clear()
+    release.set()
+    assert memory.wait_for_summary(5)
+    assert memory.summary == "" and memory.messages() == []
+
+
+def test_failed_summarizer_keeps_the_local_summary():
+    def summarizer(previous, turns, max_tokens):
+        raise RuntimeError("LLM indisponível")
+    
+    memory = ConversationMemory(token_budget=400, summary_max_tokens=100, summarizer=summarizer)
+    for question, answer in long_turns(5):
+        memory.add_turn(question, answer)
+    assert memory.wait_for_summary(5)
+    assert "pergunta 0" in memory.summary
@@ -0,0 +1,183 @@
+import json
+
+import pytest
+
+from database import INSIGHTS_PENDING, INTERACTIONS_VIEW, UNANSWERED_PATTERN, Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "agent.db"))
+    yield database
+    database.close()
+
+
+def store(db, count, **fields):
+    return db.store_interactions_many([
+        dict({"user_question": f"pergunta {index}", "agent_response": f"resposta {index}"}, **fields)
+        for index in range(count)
+    ])
+
+
+def test_recent_interactions_are_paginated_by_key(db):
+    ids = store(db, 12)
+    page = db.get_recent_interactions(limit=5)
+    assert [row[0] for row in page] == ids[::-1][:5]
+    assert page[0][1:3] == ("pergunta 11", "resposta 11")
+    
+    seen = []
+    before_id = None
+    while True:
+        page = db.get_recent_interactions(limit=5, before_id=before_id)
+        if not page:
+            break
+        seen.extend(row[0] for row in page)
+        before_id = page[-1][0]
+    assert seen == ids[::-1]
+
+
+def test_recent_interactions_read_only_the_requested_rows(db):
+    store(db, 3)
+    conn, cursor = db._get_connection()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN SELECT id FROM {INTERACTIONS_VIEW} WHERE id < 3 ORDER BY id DESC LIMIT 5")
+        plan = " ".join(row[-1] for row in cursor.fetchall())
+    finally:
+        db._connections.release(conn, cursor)
+    assert "USING INTEGER PRIMARY KEY" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_session_turns_are_returned_oldest_first(db):
+    store(db, 3, session_id="a")
+    store(db, 2, session_id="b")
+    ids = store(db, 3, session_id="a")
+    turns = db.get_session_turns("a", limit=4)
+    assert [turn[1] for turn in turns] == ["pergunta 2", "pergunta 0", "pergunta 1", "pergunta 2"]
+    assert turns[-1][0] == ids[-1]
+    older = db.get_session_turns("a", limit=4, before_id=turns[0][0])
+    assert [turn[1] for turn in older] == ["pergunta 0", "pergunta 1"]
+
+
+def execute(db, sql, params=()):
+    conn, cursor = db._get_connection()
+    try:
+        cursor.execute(sql, params)
+        conn.commit()
+    finally:
+        db._connections.release(conn, cursor)
+
+
+def test_search_ranks_questions_first_and_ignores_accents(db):
+    assert db.fts_enabled
+    db.store_interaction("Como usar exemplos no prompt?", "Inclua demonstrações da função desejada.")
+    best = db.store_interaction("O que é uma função de avaliação?", "Uma métrica para comparar respostas.")
+    results = db.search_interactions("funcao")
+    assert [result["id"] for result in results][0] == best
+    assert len(results) == 2
+    assert "**função**" in results[0]["snippet"]
+
+
+def test_search_matches_prefix_of_the_last_word_and_escapes_operators(db):
+    db.store_interaction("O que são embeddings?", "Vetores que representam textos.")
+    assert len(db.search_interactions("embed")) == 1
+    assert db.search_interactions("embed vetores") == []
+    # Operadores e aspas são tratados como texto, sem erro de sintaxe do FTS5
+    assert len(db.search_interactions('"são" (embed*')) == 1
+    assert db.search_interactions("são AND NOT embed") == []
+    assert db.search_interactions("?!") == []
+
+
+def test_search_index_follows_updates_and_deletes(db):
+    first = db.store_interaction("Pergunta sobre tokens", "Resposta sobre contexto")
+    second = db.store_interaction("Pergunta sobre tokens", "Resposta sobre contexto")
+    execute(db, "UPDATE interactions SET user_question = 'Pergunta sobre temperatura' WHERE id = ?", (first,))
+    assert [result["id"] for result in db.search_interactions("tokens")] == [second]
+    assert [result["id"] for result in db.search_interactions("temperatura")] == [first]
+    
+    # A resposta fica na tabela `responses`: trocar a referência reindexa o texto
+    conn, cursor = db._get_connection()
+    try:
+        response_id = db._store_response(cursor, "Resposta sobre amostragem")
+        cursor.execute("UPDATE interactions SET response_id = ? WHERE id = ?", (response_id, second))
+        conn.commit()
+    finally:
+        db._connections.release(conn, cursor)
+    assert [result["id"] for result in db.search_interactions("amostragem")] == [second]
+    assert [result["id"] for result in db.search_interactions("contexto")] == [first]
+    
+    execute(db, "DELETE FROM interactions WHERE id = ?", (first,))
+    assert db.search_interactions("temperatura") == []
+    assert [row[0] for row in db.get_interactions_by_pattern("sobre amostragem")] == [second]
+
+
+def test_existing_interactions_are_indexed_on_upgrade(tmp_path):
+    path = str(tmp_path / "agent.db")
+    db = Database(path)
+    interaction_id = db.store_interaction("O que é chain of thought?", "Raciocínio passo a passo.")
+    for trigger in ("interactions_fts_insert", "interactions_fts_delete", "interactions_fts_update"):
+        execute(db, f"DROP TRIGGER {trigger}")
+    execute(db, "DROP TABLE interactions_fts")
+    db.close()
+    
+    db = Database(path)
+    assert [result["id"] for result in db.search_interactions("passo")] == [interaction_id]
+    db.close()
+
+
+def insights(category, patterns=(), improvements=()):
+    return json.dumps({"category": category, "patterns": list(patterns),
+                       "possible_improvements": list(improvements)})
+
+
+def test_rollups_follow_inserts_updates_and_deletes(db):
+    assert db.insights_rollups_enabled
+    first = db.store_interaction("p1", "r1", insights("definição", ["conceito"], ["exemplos"]))
+    db.store_interaction("p2", "r2", insights("definição", ["conceito", UNANSWERED_PATTERN]))
+    third = db.store_interaction("p3", "r3", insights("técnica", ["few-shot"]))
+    assert db.get_top_categories() == [
+        {"category": "definição", "count": 2, "unanswered": 1},
+        {"category": "técnica", "count": 1, "unanswered": 0}
+    ]
+    assert db.get_top_insight_items("pattern")[0] == {"value": "conceito", "count": 2, "unanswered": 1}
+    assert db.get_top_insight_items("improvement") == [{"value": "exemplos", "count": 1, "unanswered": 0}]
+    assert db.get_top_insight_items("pattern", unanswered_only=True) == [
+        {"value": "conceito", "count": 2, "unanswered": 1}
+    ]
+    
+    execute(db, "UPDATE interactions SET patterns_insights = ? WHERE id = ?",
+            (insights("técnica", ["few-shot"]), first))
+    execute(db, "DELETE FROM interactions WHERE id = ?", (third,))
+    assert db.get_top_categories() == [
+        {"category": "definição", "count": 1, "unanswered": 1},
+        {"category": "técnica", "count": 1, "unanswered": 0}
+    ]
+    assert db.get_top_insight_items("improvement") == []
+    assert [row[0] for row in db.get_interactions_by_category("técnica")] == [first]
+
+
+def test_extracted_insights_keep_fields_stored_while_pending(db):
+    interaction_id = db.store_interaction("p", "r", json.dumps({"routing": {"route": "llm"}}),
+                                          insights_status=INSIGHTS_PENDING)
+    assert db.get_top_categories() == []
+    db.update_insights_many([(interaction_id, insights("técnica", ["few-shot"]))])
+    stored = json.loads(db.get_interaction_by_id(interaction_id)[4])
+    assert stored["routing"] == {"route": "llm"} and stored["category"] == "técnica"
+    assert db.get_top_categories() == [{"category": "técnica", "count": 1, "unanswered": 0}]
+
+
+def test_rollups_are_built_for_existing_interactions(tmp_path):
+    path = str(tmp_path / "agent.db")
+    db = Database(path)
+    db.store_interaction("p1", "r1", insights("definição", ["conceito"]))
+    db.store_interaction("p2", "r2", "texto livre, não é JSON")
+    for statement in ("DROP TRIGGER interactions_insights_insert", "DROP TRIGGER interactions_insights_update",
+                      "DROP TRIGGER interactions_insights_delete", "DROP TABLE insight_items",
+                      "DROP TABLE insight_category_daily", "DROP TABLE insight_item_daily"):
+        execute(db, statement)
+    db.close()
+    
+    db = Database(path)
+    assert db.get_top_categories(days=None) == [{"category": "definição", "count": 1, "unanswered": 0}]
+    assert db.get_top_insight_items("pattern", days=None) == [{"value": "conceito", "count": 1, "unanswered": 0}]
+    db.close()
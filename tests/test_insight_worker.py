@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from database import INSIGHTS_PENDING, INSIGHTS_READY, Database
+from insight_worker import InsightWorker, backfill_insights
+from prompt_agent import PromptAgent
+
+OPEN_QUESTION = "Como escolher entre dois modelos de linguagem para um chatbot jurídico?"
+
+
+def test_shared_worker_follows_the_latest_agent(make_config, stub_server, wait_until):
+    first = PromptAgent(make_config(cache={"enabled": False}, semantic_cache={"enabled": False}))
+    first.close()
+    second = PromptAgent(make_config(cache={"enabled": False}, semantic_cache={"enabled": False},
+                                     insights={"poll_interval": 1, "max_batch_size": 3, "queue_size": 7}))
+    try:
+        worker = second.insight_worker
+        assert worker is first.insight_worker
+        assert worker.db is second.db
+        assert worker.extractor.__self__ is second.llm_service
+        assert (worker.poll_interval, worker.max_batch_size, worker.queue.maxsize) == (1, 3, 7)
+        
+        second.get_response(OPEN_QUESTION)
+        interaction_id = second.last_interaction_id
+        assert wait_until(lambda: second.get_interaction_insights(interaction_id)[1])
+        assert second.llm_service.insight_stats["calls"] >= 1
+        assert first.llm_service.insight_stats["calls"] == 0
+    finally:
+        second.close()
+
+
+def categorize(interactions):
+    return [{"category": "teste", "patterns": [question]} for question, _ in interactions]
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "insights.db"))
+    yield database
+    database.close()
+
+
+def test_pending_interactions_are_recovered_after_a_restart(db, wait_until):
+    ids = [db.store_interaction(f"pergunta {i}", "resposta", json.dumps({"routing": None}),
+                                insights_status=INSIGHTS_PENDING) for i in range(5)]
+    ready = db.store_interaction("pronta", "resposta", json.dumps({"category": "definição"}))
+    
+    worker = InsightWorker(db, categorize, max_queue_size=2, poll_interval=0.05, max_batch_size=2, batch_wait=0)
+    worker.start()
+    try:
+        # Só duas cabem na fila ao iniciar; as demais são buscadas no banco depois
+        assert wait_until(lambda: not db.get_pending_insights())
+    finally:
+        worker.stop(1)
+    for i, interaction_id in enumerate(ids):
+        row = db.get_interaction_by_id(interaction_id)
+        assert row[5] == INSIGHTS_READY
+        assert json.loads(row[4]) == {"routing": None, "category": "teste", "patterns": [f"pergunta {i}"]}
+    assert json.loads(db.get_interaction_by_id(ready)[4]) == {"category": "definição"}
+
+
+def test_failed_batches_stay_pending(db, wait_until):
+    interaction_id = db.store_interaction("pergunta", "resposta", insights_status=INSIGHTS_PENDING)
+    calls = []
+    
+    def failing(interactions):
+        calls.append(len(interactions))
+        raise RuntimeError("falha")
+    
+    worker = InsightWorker(db, failing, poll_interval=0.05, batch_wait=0)
+    worker.start()
+    try:
+        # Recuperada de novo a cada busca no banco
+        assert wait_until(lambda: len(calls) >= 2)
+    finally:
+        worker.stop(1)
+    assert db.get_interaction_by_id(interaction_id)[5] == INSIGHTS_PENDING
+
+
+def test_backfill_fills_pending_and_missing_insights(db):
+    missing = [db.store_interaction(f"antiga {i}", "resposta") for i in range(3)]
+    pending = db.store_interaction("pendente", "resposta", insights_status=INSIGHTS_PENDING)
+    done = db.store_interaction("pronta", "resposta", json.dumps({"category": "definição"}))
+    batches = []
+    
+    def extractor(interactions):
+        batches.append(len(interactions))
+        return categorize(interactions)
+    
+    assert backfill_insights(db, extractor, batch_size=2, limit=3) == 3
+    assert batches == [2, 1]
+    assert backfill_insights(db, extractor, batch_size=2) == 1
+    assert backfill_insights(db, extractor) == 0
+    for interaction_id in missing + [pending]:
+        row = db.get_interaction_by_id(interaction_id)
+        assert row[5] == INSIGHTS_READY and json.loads(row[4])["category"] == "teste"
+    assert json.loads(db.get_interaction_by_id(done)[4]) == {"category": "definição"}
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from context_manager import count_tokens
+from llm_service import INSIGHTS_BATCH_PREAMBLE, LLMService
+from resilience import CircuitOpenError
+
+INTERACTIONS = [(f"O que é a técnica {i}?", f"A técnica {i} é um padrão de prompt.") for i in range(1, 5)]
+
+
+def reply(*positions, category="definição"):
+    return json.dumps([{"index": position, "category": category, "patterns": ["roteiro"],
+                        "possible_improvements": []} for position in positions], ensure_ascii=False)
+
+
+@pytest.fixture
+def make_service(make_config):
+    def make(**insights):
+        return LLMService(make_config(cache={"enabled": False}, insights=insights,
+                                      resilience={"max_attempts": 1}))
+    
+    return make
+
+
+def test_one_call_per_batch(make_service, stub_server):
+    service = make_service()
+    results = service.extract_insights_batch(INTERACTIONS)
+    assert [result["category"] for result in results] == ["definição"] * 4
+    assert service.insight_stats == {"calls": 1, "interactions": 4}
+    assert stub_server.stats["requests"] == 1
+
+
+def test_token_budget_limits_each_batch(make_service, stub_server):
+    service = make_service(batch_token_budget=0)
+    assert service._plan_insight_batches(INTERACTIONS, 0) == [[0], [1], [2], [3]]
+    assert service._plan_insight_batches(INTERACTIONS, 10 ** 6) == [[0, 1, 2, 3]]
+    results = service.extract_insights_batch(INTERACTIONS)
+    assert all(result["category"] == "definição" for result in results)
+    assert service.insight_stats == {"calls": 4, "interactions": 4}
+    
+    # O orçamento é medido com o mesmo contador de tokens do contexto da conversa
+    model = service.config["model"]["name"]
+    costs = [count_tokens(query, model) + count_tokens(response, model) + 20 for query, response in INTERACTIONS]
+    budget = count_tokens(INSIGHTS_BATCH_PREAMBLE, model) + costs[0] + costs[1]
+    assert service._plan_insight_batches(INTERACTIONS, budget) == [[0, 1], [2, 3]]
+    assert service._plan_insight_batches(INTERACTIONS, budget - 1) == [[0], [1], [2], [3]]
+
+
+def test_invalid_reply_splits_the_batch(make_service, stub_server):
+    stub_server.settings["insights_replies"] = ["não é JSON", "```json\n" + reply(1, 2) + "\n```"]
+    service = make_service()
+    results = service.extract_insights_batch(INTERACTIONS)
+    # Lote de 4 inválido: reenviado em duas metades (a primeira, em bloco de código)
+    assert [result["patterns"] for result in results] == [["roteiro"], ["roteiro"], ["simulado"], ["simulado"]]
+    assert service.insight_stats == {"calls": 3, "interactions": 8}
+
+
+def test_partial_reply_resends_only_the_missing_items(make_service, stub_server):
+    partial = json.loads(reply(1, 3))
+    partial[1]["category"] = None
+    partial += ["texto solto", {"index": 9, "category": "definição"}]
+    stub_server.settings["insights_replies"] = [json.dumps(partial)]
+    service = make_service()
+    results = service.extract_insights_batch(INTERACTIONS)
+    assert [result["patterns"] for result in results] == [["roteiro"], ["simulado"], ["simulado"], ["simulado"]]
+    assert service.insight_stats == {"calls": 2, "interactions": 7}
+
+
+def test_single_item_gets_a_default_after_failing(make_service, stub_server):
+    stub_server.settings["insights_replies"] = ["[]", "{}", "[1, 2]"]
+    service = make_service()
+    first, second = service.extract_insights_batch(INTERACTIONS[:2])
+    for result in (first, second):
+        assert result["category"] == "unknown" and result["patterns"] == ["erro_na_analise"]
+    assert service.insight_stats["calls"] == 3
+    
+    # Um objeto isolado é aceito quando o lote tem uma só interação
+    stub_server.settings["insights_replies"] = [json.dumps({"category": "comparação", "patterns": ["a"]})]
+    assert service.extract_insights("Qual a diferença entre A e B?", "Nenhuma.") == {
+        "category": "comparação", "patterns": ["a"], "possible_improvements": []
+    }
+
+
+def test_provider_errors_fall_back_to_defaults(make_service, stub_server):
+    stub_server.settings["error_rate"] = 1.0
+    service = make_service()
+    results = service.extract_insights_batch(INTERACTIONS[:2])
+    assert [result["patterns"] for result in results] == [["erro_na_analise"]] * 2
+    assert "Melhorar a extração de insights" in results[0]["possible_improvements"][0]
+    assert stub_server.stats["errors"] == 3
+
+
+def test_open_circuit_propagates(make_service, stub_server):
+    service = make_service()
+    for _ in range(service.circuit_breaker.failure_threshold):
+        service.circuit_breaker.record_failure(RuntimeError("falha"), 0.1)
+    with pytest.raises(CircuitOpenError):
+        service.extract_insights_batch(INTERACTIONS)
+    assert stub_server.stats["requests"] == 0
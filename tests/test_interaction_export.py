@@ -0,0 +1,202 @@
+import gzip
+import json
+import os
+import sqlite3
+
+import pytest
+
+from database import INSIGHTS_PENDING, INTERACTION_FIELDS, Database
+from interaction_export import archive_interactions, export_incremental, export_interactions, pyarrow
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "agent.db"))
+    yield database
+    database.close()
+
+
+def insights(category, patterns=()):
+    return json.dumps({"category": category, "patterns": list(patterns), "possible_improvements": []})
+
+
+def store_months(db):
+    """
+    Interações de janeiro e fevereiro de 2024 e de hoje.
+    """
+    return db.store_interactions_many([
+        {"user_question": "pergunta de janeiro", "agent_response": "resposta " * 100,
+         "timestamp": "2024-01-15 10:00:00", "patterns_insights": insights("definição", ["conceito"])},
+        {"user_question": "outra de janeiro", "agent_response": "curta",
+         "timestamp": "2024-01-20 10:00:00", "patterns_insights": insights("técnica", ["few-shot"])},
+        {"user_question": "pergunta de fevereiro", "agent_response": "resposta de fevereiro",
+         "timestamp": "2024-02-03 10:00:00", "patterns_insights": insights("definição", ["conceito"])},
+        {"user_question": "pergunta de hoje", "agent_response": "resposta de hoje",
+         "patterns_insights": insights("definição", ["conceito"])},
+    ])
+
+
+def execute(db, sql, params=()):
+    conn, cursor = db._get_connection()
+    try:
+        cursor.execute(sql, params)
+        conn.commit()
+    finally:
+        db._connections.release(conn, cursor)
+
+
+def test_archival_keeps_the_insight_rollups(db, tmp_path):
+    store_months(db)
+    categories = db.get_top_categories(days=None)
+    patterns = db.get_top_insight_items("pattern", days=None)
+    assert categories[0] == {"category": "definição", "count": 3, "unanswered": 0}
+    
+    assert archive_interactions(db, "2024-03-01", str(tmp_path / "archive")) == {"2024-01": 2, "2024-02": 1}
+    assert [row[1] for row in db.get_all_interactions()] == ["pergunta de hoje"]
+    assert db.get_top_categories(days=None) == categories
+    assert db.get_top_insight_items("pattern", days=None) == patterns
+    
+    # Fora do arquivamento, remover uma interação continua descontando dos agregados
+    execute(db, "DELETE FROM interactions")
+    assert db.get_top_categories(days=None) == [
+        {"category": "definição", "count": 2, "unanswered": 0},
+        {"category": "técnica", "count": 1, "unanswered": 0}
+    ]
+    assert db.get_top_insight_items("pattern", days=None)[0]["value"] == "conceito"
+    assert db.get_top_insight_items("pattern", days=None)[0]["count"] == 2
+
+
+OLD_ITEMS_DELETE = """CREATE TRIGGER insight_items_delete AFTER DELETE ON insight_items BEGIN
+    UPDATE insight_item_daily SET count = count - 1, unanswered = unanswered - old.unanswered
+    WHERE day = old.day AND kind = old.kind AND value = old.value;
+END"""
+OLD_INTERACTIONS_DELETE = """CREATE TRIGGER interactions_insights_delete AFTER DELETE ON interactions BEGIN
+    DELETE FROM insight_items WHERE interaction_id = old.id;
+    UPDATE insight_category_daily SET count = count - 1
+    WHERE day = date(old.timestamp) AND category = old.category;
+END"""
+
+
+def test_old_triggers_are_replaced_on_upgrade(tmp_path):
+    path = str(tmp_path / "agent.db")
+    db = Database(path)
+    store_months(db)
+    # Banco de uma versão anterior: triggers que sempre descontam e sem a tabela que os suspende
+    for statement in ("DROP TRIGGER interactions_insights_delete", "DROP TRIGGER insight_items_delete",
+                      "DROP TABLE insight_rollup_hold", OLD_ITEMS_DELETE, OLD_INTERACTIONS_DELETE):
+        execute(db, statement)
+    db.close()
+    
+    db = Database(path)
+    try:
+        archive_interactions(db, "2024-03-01", str(tmp_path / "archive"), vacuum=False)
+        assert db.get_top_categories(days=None)[0] == {"category": "definição", "count": 3, "unanswered": 0}
+        assert db.get_top_insight_items("pattern", days=None)[0] == {"value": "conceito", "count": 3, "unanswered": 0}
+        with sqlite3.connect(path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM insight_rollup_hold").fetchone() == (0,)
+    finally:
+        db.close()
+
+
+def read_jsonl(path):
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_export_streams_complete_rows_to_gzip(db, tmp_path):
+    ids = store_months(db)
+    path = str(tmp_path / "out" / "interactions.jsonl.gz")
+    result = export_interactions(db, path, batch_size=3)
+    assert result == {"path": path, "rows": 4, "first_id": ids[0], "last_id": ids[-1]}
+    rows = read_jsonl(path)
+    assert [row["id"] for row in rows] == ids
+    assert set(rows[0]) == set(INTERACTION_FIELDS)
+    # Respostas longas, guardadas comprimidas, são exportadas como texto
+    assert rows[0]["agent_response"] == "resposta " * 100
+    
+    partial = export_interactions(db, path, after_id=ids[0], until_id=ids[-1])
+    assert (partial["rows"], partial["first_id"], partial["last_id"]) == (2, ids[1], ids[2])
+    assert not os.path.exists(path + ".tmp")
+    
+    with pytest.raises(ValueError, match="csv"):
+        export_interactions(db, path, fmt="csv")
+
+
+@pytest.mark.skipif(pyarrow is not None, reason="pyarrow instalado")
+def test_parquet_without_pyarrow_leaves_no_file(db, tmp_path):
+    store_months(db)
+    path = str(tmp_path / "interactions.parquet")
+    with pytest.raises(RuntimeError, match="pyarrow"):
+        export_interactions(db, path, fmt="parquet")
+    assert not os.path.exists(path) and not os.path.exists(path + ".tmp")
+
+
+def test_parquet_export(db, tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    ids = store_months(db)
+    path = str(tmp_path / "interactions.parquet")
+    assert export_interactions(db, path, fmt="parquet", batch_size=2)["rows"] == 4
+    table = parquet.read_table(path)
+    assert table.column_names == list(INTERACTION_FIELDS)
+    assert table.column("id").to_pylist() == ids
+    assert table.column("agent_response").to_pylist()[0] == "resposta " * 100
+
+
+def test_incremental_export_stops_at_the_first_pending_insight(db, tmp_path):
+    output = str(tmp_path / "exports")
+    first = db.store_interaction("pronta", "resposta", insights("definição"))
+    pending = db.store_interaction("pendente", "resposta", insights_status=INSIGHTS_PENDING)
+    after = db.store_interaction("depois", "resposta", insights("técnica"))
+    
+    result = export_incremental(db, output)
+    assert (result["rows"], result["first_id"], result["last_id"]) == (1, first, first)
+    assert os.path.basename(result["path"]) == f"interactions_{first:09d}-{first:09d}.jsonl.gz"
+    assert export_incremental(db, output) == {"path": None, "rows": 0, "first_id": None, "last_id": None}
+    
+    db.update_insights(pending, insights("procedimento"))
+    result = export_incremental(db, output)
+    assert [row["id"] for row in read_jsonl(result["path"])] == [pending, after]
+    with open(os.path.join(output, "export_state.json"), encoding="utf-8") as file:
+        assert json.load(file)["last_id"] == after
+    assert sorted(os.listdir(output)) == [
+        "export_state.json",
+        f"interactions_{first:09d}-{first:09d}.jsonl.gz",
+        f"interactions_{pending:09d}-{after:09d}.jsonl.gz"
+    ]
+
+
+def test_archival_moves_months_and_compacts_the_database(db, tmp_path):
+    ids = store_months(db)
+    archive_dir = str(tmp_path / "archive")
+    assert archive_interactions(db, "2024-03-01", archive_dir) == {"2024-01": 2, "2024-02": 1}
+    assert sorted(os.listdir(archive_dir)) == ["interactions_2024-01.db", "interactions_2024-02.db"]
+    
+    with sqlite3.connect(os.path.join(archive_dir, "interactions_2024-01.db")) as conn:
+        rows = conn.execute("SELECT id, user_question, agent_response FROM interactions ORDER BY id").fetchall()
+    assert rows == [(ids[0], "pergunta de janeiro", "resposta " * 100), (ids[1], "outra de janeiro", "curta")]
+    
+    # Respostas que não são mais referenciadas são removidas
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM responses").fetchone() == (1,)
+    assert db.search_interactions("janeiro") == []
+    
+    # Repetir o arquivamento não duplica nada
+    assert archive_interactions(db, "2024-03-01", archive_dir) == {}
+    db.store_interactions_many([{"user_question": "tardia", "agent_response": "resposta",
+                                 "timestamp": "2024-01-30 10:00:00"}])
+    assert archive_interactions(db, "2024-03-01", archive_dir, vacuum=False) == {"2024-01": 1}
+    with sqlite3.connect(os.path.join(archive_dir, "interactions_2024-01.db")) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM interactions").fetchone() == (3,)
+
+
+def test_vacuum_returns_the_archived_space(db, tmp_path):
+    db.store_interactions_many([
+        {"user_question": f"pergunta {i}", "agent_response": os.urandom(1000).hex(), "timestamp": "2024-01-10 10:00:00"}
+        for i in range(300)
+    ])
+    execute(db, "PRAGMA wal_checkpoint(TRUNCATE)")
+    size = os.path.getsize(db.db_path)
+    
+    archive_interactions(db, "2024-03-01", str(tmp_path / "archive"))
+    assert os.path.getsize(db.db_path) < size / 4
+    assert os.path.getsize(db.db_path + "-wal") == 0
@@ -0,0 +1,133 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from database import Database
+from interaction_logger import InteractionLogger
+from prompt_agent import PromptAgent
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "logger.db"), busy_timeout_ms=2000)
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def make_logger(db):
+    loggers = []
+    
+    def make(**options):
+        logger = InteractionLogger(db, **options)
+        logger.start()
+        loggers.append(logger)
+        return logger
+    
+    yield make
+    for logger in loggers:
+        logger.close()
+
+
+def test_full_batches_are_written_together(make_logger, db):
+    logger = make_logger(batch_size=3, flush_interval_ms=10000)
+    futures = [logger.submit(f"pergunta {i}", f"resposta {i}") for i in range(6)]
+    ids = [future.result(timeout=2) for future in futures]
+    assert ids == sorted(ids)
+    for i, interaction_id in enumerate(ids):
+        assert db.get_interaction_by_id(interaction_id)[1:3] == (f"pergunta {i}", f"resposta {i}")
+    assert (logger.stats["batches"], logger.stats["written"], logger.stats["queued"]) == (2, 6, 6)
+
+
+def test_incomplete_batches_are_written_after_the_interval(make_logger):
+    logger = make_logger(batch_size=50, flush_interval_ms=50)
+    start = time.monotonic()
+    futures = [logger.submit("pergunta", "resposta") for _ in range(2)]
+    assert all(future.result(timeout=2) for future in futures)
+    assert time.monotonic() - start < 1
+    assert logger.stats["batches"] == 1
+
+
+def test_full_queue_falls_back_to_a_direct_write(make_logger, db, wait_until):
+    logger = make_logger(max_queue_size=1, batch_size=1, flush_interval_ms=0, block_timeout=0.05)
+    # Outra conexão segura o lock de escrita: a thread do logger fica parada na gravação
+    other = sqlite3.connect(db.db_path, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, other.rollback).start()
+    try:
+        first = logger.submit("primeira", "resposta")
+        assert wait_until(lambda: logger.queue.qsize() == 0)
+        second = logger.submit("segunda", "resposta")
+        third = logger.submit("terceira", "resposta")
+        ids = [future.result(timeout=5) for future in (first, second, third)]
+    finally:
+        other.close()
+    assert logger.stats["blocked"] == 1 and logger.stats["direct_writes"] == 1
+    assert [db.get_interaction_by_id(interaction_id)[1] for interaction_id in ids] == ["primeira", "segunda", "terceira"]
+
+
+def test_close_writes_the_queued_interactions(make_logger, db):
+    logger = make_logger(batch_size=50, flush_interval_ms=10000)
+    futures = [logger.submit(f"pergunta {i}", "resposta") for i in range(5)]
+    start = time.monotonic()
+    logger.close()
+    assert time.monotonic() - start < 2
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert len(db.get_all_interactions()) == 5
+    
+    # Sem a thread, a gravação é direta
+    late = logger.submit("depois", "resposta")
+    assert late.done() and db.get_interaction_by_id(late.result())[1] == "depois"
+    assert logger.stats["direct_writes"] == 1
+
+
+def test_concurrent_submits_and_close_never_leave_futures_unresolved(make_logger, db):
+    logger = make_logger(batch_size=10, flush_interval_ms=5)
+    futures = []
+    lock = threading.Lock()
+    
+    def produce():
+        for i in range(50):
+            future = logger.submit(f"pergunta {i}", "resposta")
+            with lock:
+                futures.append(future)
+    
+    threads = [threading.Thread(target=produce) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.01)
+    logger.close()
+    for thread in threads:
+        thread.join()
+    assert all(future.result(timeout=5) for future in futures)
+    assert len(db.get_all_interactions()) == 400
+    
+    # Interações deixadas na fila após o sinal de encerramento falham em vez de ficar pendentes
+    leftover = Future()
+    logger.queue.put_nowait(({"user_question": "perdida"}, leftover))
+    logger.close()
+    assert isinstance(leftover.exception(timeout=0), RuntimeError)
+    assert logger.queue.unfinished_tasks == 0
+
+
+def test_shared_logger_follows_the_latest_agent(make_config, stub_server):
+    write_behind = {"enabled": True, "queue_size": 10, "batch_size": 5, "flush_interval_ms": 50}
+    first = PromptAgent(make_config(database={"write_behind": write_behind}), use_llm=False)
+    first.get_response("O que é um prompt?")
+    assert first.last_interaction_id is not None
+    first.close()
+    
+    write_behind = dict(write_behind, queue_size=7, batch_size=3, flush_interval_ms=20)
+    second = PromptAgent(make_config(database={"write_behind": write_behind}), use_llm=False)
+    try:
+        logger = second.interaction_logger
+        assert logger is first.interaction_logger
+        assert logger.db is second.db
+        assert (logger.queue.maxsize, logger.batch_size, logger.flush_interval) == (7, 3, 0.02)
+        second.get_response("O que é few-shot prompting?")
+        assert second.db.get_interaction_by_id(second.last_interaction_id)[1] == "O que é few-shot prompting?"
+    finally:
+        second.close()
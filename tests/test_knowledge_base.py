@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from knowledge_base import FALLBACK_RESPONSE, KnowledgeBase, load_faqs, normalize_question
+
+FAQS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge", "faqs.yaml")
+
+
+@pytest.fixture(scope="module")
+def faqs():
+    return load_faqs([FAQS_PATH])
+
+
+@pytest.fixture
+def kb(faqs):
+    return KnowledgeBase.from_faqs(faqs)
+
+
+def linear_lookup(faqs, question):
+    """
+    Busca original: percorre as FAQs em ordem (trecho da pergunta e depois
+    70% das palavras-chave em comum).
+    """
+    question = normalize_question(question)
+    for key, answer in faqs.items():
+        if key in question or question in key:
+            return answer
+    for key, answer in faqs.items():
+        key_words = set(key.split())
+        if len(key_words.intersection(question.split())) >= 0.7 * len(key_words):
+            return answer
+    return None
+
+
+def sample_questions(faqs):
+    questions = []
+    for key in faqs:
+        words = key.split()
+        questions += [
+            key,
+            key.upper() + "?",
+            f"me explique {key} por favor",
+            " ".join(words[1:]),
+            " ".join(words[:-1]),
+            key[2:-2],
+            " ".join(reversed(words)),
+        ]
+    return questions + ["prompt", "o", "modelo", "como usar exemplos em um prompt de sistema"]
+
+
+def test_index_matches_the_linear_scan(kb, faqs):
+    for question in sample_questions(faqs):
+        expected = linear_lookup(faqs, question)
+        if expected is not None:
+            assert kb.get_response(question) == (expected, True), question
+
+
+def test_unknown_question_returns_the_fallback(kb):
+    assert kb.get_response("qual a capital da mongólia") == (FALLBACK_RESPONSE, False)
+
+
+def test_added_faqs_are_found_and_replace_answers(kb, faqs):
+    kb.add_faq("O que é RAG?", "Geração aumentada por recuperação.")
+    assert kb.get_response("me explique o que é rag") == ("Geração aumentada por recuperação.", True)
+    first = next(iter(faqs))
+    kb.add_faq(first, "Nova resposta.")
+    assert kb.get_response(first) == ("Nova resposta.", True)
+    assert kb.get_all_faqs()[first] == "Nova resposta."
+    assert len(kb.get_all_faqs()) == len(faqs) + 1
+
+
+def test_query_ranks_faqs_by_relevance(kb):
+    results = kb.query("Quais técnicas de engenharia de prompt existem?", k=3)
+    assert results[0]["question"] == "quais são as técnicas de engenharia de prompt"
+    assert [result["score"] for result in results] == sorted((result["score"] for result in results), reverse=True)
+    assert all(0 <= result["confidence"] <= 1 for result in results)
+    assert kb.query("receita de bolo de cenoura") == []
+    
+    questions = ["o que é few-shot prompting", "como avaliar um prompt", "delimitadores"]
+    assert kb.query_many(questions, k=2) == [kb.query(question, k=2) for question in questions]
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("quais sao as tecnicas de engenharia de prompts", "quais são as técnicas de engenharia de prompt"),
+    ("o que sao delimitadores em prompt", "o que são delimitadores em prompts"),
+    ("oque é enjenharia de prompt", "o que é engenharia de prompt"),
+])
+def test_fuzzy_matching_ignores_accents_inflections_and_typos(kb, faqs, question, expected):
+    assert kb.get_response(question) == (faqs[expected], True)
+
+
+@pytest.mark.parametrize("question", ["prompt o", "prompts as como", "engenharia prompts", "técnicas bolo cenoura"])
+def test_fuzzy_matching_rejects_short_or_unrelated_questions(kb, question):
+    assert kb.get_response(question) == (FALLBACK_RESPONSE, False)
+
+
+def test_fuzzy_only_matches_have_lower_confidence(kb):
+    direct = kb.query("quais são as técnicas de engenharia de prompt", k=1)[0]
+    fuzzy = kb.query("oque é enjenharia de prompt", k=1)
+    assert direct["confidence"] == pytest.approx(1.0)
+    assert all(result["confidence"] < 0.5 for result in fuzzy)
@@ -0,0 +1,165 @@
+import json
+import os
+
+import pytest
+import yaml
+
+from knowledge_base import KnowledgeBase, read_faq_file
+
+
+def write_yaml(path, faqs):
+    with open(path, "w", encoding="utf-8") as file:
+        yaml.safe_dump([{"question": question, "answer": answer} for question, answer in faqs.items()],
+                       file, allow_unicode=True)
+
+
+def write_jsonl(path, faqs):
+    with open(path, "w", encoding="utf-8") as file:
+        for question, answer in faqs.items():
+            file.write(json.dumps({"question": question, "answer": answer}, ensure_ascii=False) + "\n")
+
+
+@pytest.fixture
+def files(tmp_path):
+    yaml_path, jsonl_path = str(tmp_path / "faqs.yaml"), str(tmp_path / "extra.jsonl")
+    write_yaml(yaml_path, {
+        "O que é um prompt?": "Uma instrução.",
+        "O que é few-shot prompting?": "Exemplos no prompt.",
+        "O que é chain-of-thought?": "Raciocínio passo a passo.",
+    })
+    write_jsonl(jsonl_path, {
+        "O que é temperatura?": "Controla a aleatoriedade.",
+        "O que é chain-of-thought?": "Cadeia de pensamento.",
+    })
+    return {
+        "sources": [yaml_path, jsonl_path],
+        "snapshot_path": str(tmp_path / "faqs.snapshot"),
+        "added_path": str(tmp_path / "added.jsonl"),
+    }
+
+
+def test_sources_are_merged_in_order(files):
+    kb = KnowledgeBase(**files)
+    assert list(kb.get_all_faqs()) == ["o que é um prompt", "o que é few-shot prompting",
+                                       "o que é chain-of-thought", "o que é temperatura"]
+    # A última fonte que contém a pergunta define a resposta
+    assert kb.get_response("o que é chain-of-thought") == ("Cadeia de pensamento.", True)
+
+
+def test_invalid_items_are_reported(tmp_path):
+    path = tmp_path / "faqs.jsonl"
+    path.write_text('{"question": "sem resposta"}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="faqs.jsonl:1"):
+        read_faq_file(str(path))
+    (tmp_path / "faqs.txt").write_text("o que é um prompt: uma instrução", encoding="utf-8")
+    with pytest.raises(ValueError, match="não suportado"):
+        read_faq_file(str(tmp_path / "faqs.txt"))
+
+
+def test_snapshot_is_reused_until_a_source_changes(files):
+    built = KnowledgeBase(**files)
+    assert built.load_stats["source"] == "build" and os.path.exists(files["snapshot_path"])
+    
+    loaded = KnowledgeBase(**files)
+    assert loaded.load_stats["source"] == "snapshot"
+    assert loaded.get_all_faqs() == built.get_all_faqs()
+    for question in ("o que é few-shot prompting", "chain of thought passo", "o que é temperatura?"):
+        assert loaded.get_response(question) == built.get_response(question)
+        assert loaded.query(question) == built.query(question)
+    
+    # Mesma data de modificação alterada sem mudar o conteúdo: o snapshot continua válido
+    os.utime(files["sources"][0], ns=(0, 0))
+    assert KnowledgeBase(**files).load_stats["source"] == "snapshot"
+    
+    write_jsonl(files["sources"][1], {"O que é top-p?": "Amostragem por núcleo."})
+    rebuilt = KnowledgeBase(**files)
+    assert rebuilt.load_stats["source"] == "build"
+    assert rebuilt.get_response("o que é top-p") == ("Amostragem por núcleo.", True)
+    assert rebuilt.get_response("o que é chain-of-thought") == ("Raciocínio passo a passo.", True)
+
+
+def test_corrupt_snapshot_is_rebuilt(files):
+    KnowledgeBase(**files)
+    with open(files["snapshot_path"], "r+b") as file:
+        file.truncate(64)
+    kb = KnowledgeBase(**files)
+    assert kb.load_stats["source"] == "build"
+    assert kb.get_response("o que é um prompt") == ("Uma instrução.", True)
+
+
+def test_added_faqs_are_reapplied_over_the_snapshot(files):
+    kb = KnowledgeBase(**files)
+    kb.add_faq("O que é RAG?", "Geração aumentada por recuperação.")
+    kb.add_faq("O que é um prompt?", "Uma instrução para o modelo.")
+    
+    reopened = KnowledgeBase(**files)
+    assert reopened.load_stats["source"] == "snapshot"
+    assert reopened.get_response("o que é rag") == ("Geração aumentada por recuperação.", True)
+    assert reopened.get_response("o que é um prompt") == ("Uma instrução para o modelo.", True)
+
+
+def test_reload_applies_only_the_differences(files):
+    kb = KnowledgeBase(**files)
+    first = kb.reload()
+    assert (first["added"], first["changed"], first["removed"]) == (0, 0, 0)
+    assert kb.reload() is None
+    
+    write_yaml(files["sources"][0], {
+        "O que é um prompt?": "Uma instrução dada ao modelo.",
+        "O que é chain-of-thought?": "Raciocínio passo a passo.",
+        "O que é role prompting?": "Atribuir um papel ao modelo.",
+    })
+    stats = kb.reload()
+    assert (stats["added"], stats["changed"], stats["removed"]) == (1, 1, 1)
+    assert stats["faqs"] == 4 and stats["tombstones"] == 1
+    assert kb.get_response("o que é um prompt") == ("Uma instrução dada ao modelo.", True)
+    assert kb.get_response("o que é role prompting") == ("Atribuir um papel ao modelo.", True)
+    assert kb.get_response("o que é few-shot prompting")[0] != "Exemplos no prompt."
+    assert all(result["question"] != "o que é few-shot prompting" for result in kb.query("few-shot prompting"))
+    # A pergunta ainda está na fonte seguinte: só a resposta muda
+    assert kb.get_response("o que é chain-of-thought") == ("Cadeia de pensamento.", True)
+    
+    write_jsonl(files["sources"][1], {"O que é temperatura?": "Controla a aleatoriedade."})
+    stats = kb.reload()
+    assert (stats["added"], stats["changed"], stats["removed"]) == (0, 1, 0)
+    assert kb.get_response("o que é chain-of-thought") == ("Raciocínio passo a passo.", True)
+
+
+def test_reload_reads_faqs_appended_by_other_processes(files):
+    kb = KnowledgeBase(**files)
+    other = KnowledgeBase(**files)
+    kb.reload()
+    other.add_faq("O que é RAG?", "Geração aumentada por recuperação.")
+    stats = kb.reload()
+    assert stats["added"] == 1
+    assert kb.get_response("o que é rag") == ("Geração aumentada por recuperação.", True)
+    
+    # Arquivo reescrito (menor): relido do início, e as inclusões que saíram dele são desfeitas
+    with open(files["added_path"], "w", encoding="utf-8") as file:
+        file.write(json.dumps({"question": "O que é top-p?", "answer": "Amostragem."}) + "\n")
+    stats = kb.reload()
+    assert (stats["added"], stats["removed"]) == (1, 1)
+    assert kb.get_response("o que é rag")[0] != "Geração aumentada por recuperação."
+    assert kb.get_response("o que é top-p") == ("Amostragem.", True)
+
+
+def test_invalid_source_keeps_the_current_index(files):
+    kb = KnowledgeBase(**files)
+    kb.reload()
+    with open(files["sources"][1], "a", encoding="utf-8") as file:
+        file.write("{não é JSON\n")
+    with pytest.raises(ValueError):
+        kb.reload()
+    assert kb.get_response("o que é temperatura") == ("Controla a aleatoriedade.", True)
+
+
+def test_watcher_reloads_changed_sources(files, wait_until):
+    kb = KnowledgeBase(**files)
+    kb.start_watching(interval=0.05)
+    try:
+        write_jsonl(files["sources"][1], {"O que é top-k?": "Amostragem entre os k tokens mais prováveis."})
+        answer = "Amostragem entre os k tokens mais prováveis."
+        assert wait_until(lambda: kb.get_response("o que é top-k") == (answer, True))
+    finally:
+        kb.stop_watching()
+    assert kb.reload_stats["reloads"] >= 1
@@ -0,0 +1,106 @@
+import time
+
+import openai
+
+from llm_service import ERROR_RESPONSE_PREFIX, LLMService
+from prompt_agent import PromptAgent
+from resilience import CircuitBreaker, RetryPolicy
+
+
+def test_retry_delays_are_bounded():
+    policy = RetryPolicy(max_attempts=4, base_delay=0.5, max_delay=1.0)
+    delays = list(policy.delays())
+    assert len(delays) == 3
+    assert all(0 <= delay <= limit for delay, limit in zip(delays, (0.5, 1.0, 1.0)))
+    assert list(RetryPolicy(max_attempts=0).delays()) == []
+
+
+def test_only_transient_errors_are_retried():
+    assert RetryPolicy.is_retryable(openai.APITimeoutError(request=None))
+    assert RetryPolicy.is_retryable(openai.APIConnectionError(request=None))
+    assert not RetryPolicy.is_retryable(ValueError("resposta inválida"))
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure(RuntimeError("falha"), 0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure(RuntimeError("falha"), 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure(RuntimeError("falha"), 0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    snapshot = breaker.snapshot()
+    assert snapshot["rejected"] == 1 and snapshot["times_opened"] == 1
+    assert 0 < snapshot["retry_in"] <= 60
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure(RuntimeError("falha"), 0.1)
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+    
+    # A chamada de teste falhou: o circuito volta a abrir
+    breaker.record_failure(RuntimeError("falha"), 0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+def fast_failing_config(make_config):
+    return make_config(
+        resilience={"max_attempts": 2, "base_delay": 0.01, "max_delay": 0.02,
+                    "failure_threshold": 2, "reset_timeout": 60},
+        router={"enabled": False},
+        cache={"enabled": False},
+        semantic_cache={"enabled": False}
+    )
+
+
+def test_transient_errors_are_retried_then_open_the_circuit(make_config, stub_server):
+    stub_server.settings["error_rate"] = 1.0
+    service = LLMService(fast_failing_config(make_config))
+    
+    response, ok = service.get_completion("O que é um prompt?")
+    assert not ok and response.startswith(ERROR_RESPONSE_PREFIX)
+    assert stub_server.stats["requests"] == 2
+    health = service.get_health()
+    assert health["retries"] == 1 and health["failures"] == 1 and health["state"] == "closed"
+    
+    service.get_completion("O que é um prompt?")
+    assert service.get_health()["state"] == "open"
+    
+    # Com o circuito aberto a chamada é recusada sem chegar ao provedor
+    requests = stub_server.stats["requests"]
+    response, ok = service.get_completion("O que é um prompt?")
+    assert not ok and "indisponível" in response
+    assert stub_server.stats["requests"] == requests
+
+
+def test_agent_falls_back_to_the_knowledge_base(make_config, stub_server):
+    stub_server.settings["error_rate"] = 1.0
+    agent = PromptAgent(fast_failing_config(make_config))
+    response, found = agent.get_response("O que é um prompt?")
+    assert found
+    assert response == agent.kb.get_response("O que é um prompt?")[0]
+    assert not response.startswith(ERROR_RESPONSE_PREFIX)
+    agent.close()
+
+
+def test_attempts_respect_the_timeouts(make_config, stub_server):
+    stub_server.settings["latency_ms"] = 2000
+    config = make_config(resilience={"attempt_timeout": 0.2, "total_timeout": 0.5, "max_attempts": 5,
+                                     "base_delay": 0.01, "max_delay": 0.02},
+                         cache={"enabled": False})
+    service = LLMService(config)
+    start = time.perf_counter()
+    response, ok = service.get_completion("O que é um prompt?")
+    assert not ok
+    assert time.perf_counter() - start < 1.5
+    assert service.get_health()["failures"] == 1
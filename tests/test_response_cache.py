@@ -0,0 +1,114 @@
+import time
+
+from llm_service import LLMService
+from response_cache import ResponseCache, normalize_prompt
+
+
+def make_cache(tmp_path, **options):
+    return ResponseCache(str(tmp_path / "cache.db"), **options)
+
+
+def test_normalize_prompt_ignores_case_spacing_and_punctuation():
+    assert normalize_prompt("  O que é   Prompt? ") == normalize_prompt("o que é prompt")
+
+
+def test_key_depends_on_request_parameters():
+    key = ResponseCache.make_key("gpt-4o-mini", "sys", "Pergunta?", 0.7, 100)
+    assert key == ResponseCache.make_key("gpt-4o-mini", "sys", "pergunta", 0.7, 100)
+    assert key != ResponseCache.make_key("gpt-4o", "sys", "pergunta", 0.7, 100)
+    assert key != ResponseCache.make_key("gpt-4o-mini", "outro", "pergunta", 0.7, 100)
+    assert key != ResponseCache.make_key("gpt-4o-mini", "sys", "pergunta", 0.2, 100)
+    assert key != ResponseCache.make_key("gpt-4o-mini", "sys", "pergunta", 0.7, 50)
+    assert key != ResponseCache.make_key("gpt-4o-mini", "sys", "pergunta", 0.7, 100, context="[...]")
+
+
+def test_memory_then_disk_hits(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("k", "resposta")
+    assert cache.get("k") == "resposta"
+    assert cache.stats["memory_hits"] == 1
+    cache.close()
+    
+    reopened = make_cache(tmp_path)
+    assert reopened.get("k") == "resposta"
+    assert reopened.get("k") == "resposta"
+    assert reopened.get("outra") is None
+    assert reopened.get_stats() == {"memory_hits": 1, "disk_hits": 1, "misses": 1,
+                                    "memory_entries": 1, "hit_rate": 2 / 3}
+    reopened.close()
+
+
+def test_lru_keeps_most_recent_entries(tmp_path):
+    cache = make_cache(tmp_path, memory_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert list(cache._memory) == ["a", "c"]
+    # A entrada removida da memória continua no SQLite
+    assert cache.get("b") == "2"
+    assert cache.stats["disk_hits"] == 1
+    cache.close()
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    cache = make_cache(tmp_path, ttl_seconds=0.05)
+    cache.set("k", "resposta")
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert cache.stats["misses"] == 1
+    cache.close()
+
+
+def test_table_is_limited_to_max_entries(tmp_path):
+    cache = make_cache(tmp_path, memory_entries=1, max_entries=2)
+    for index in range(3):
+        cache.set(f"k{index}", str(index))
+        time.sleep(0.01)
+    # A remoção roda na primeira escrita de cada intervalo
+    cache._writes = 0
+    cache.set("k3", "3")
+    conn, cursor = cache._get_connection()
+    cursor.execute("SELECT cache_key FROM response_cache ORDER BY created_at")
+    assert [row[0] for row in cursor.fetchall()] == ["k2", "k3"]
+    cache._connections.release(conn, cursor)
+    cache.close()
+
+
+def test_invalidate_if_changed(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.invalidate_if_changed("v1") is False
+    cache.set("k", "resposta")
+    assert cache.invalidate_if_changed("v1") is False
+    assert cache.get("k") == "resposta"
+    assert cache.invalidate_if_changed("v2") is True
+    assert cache.get("k") is None
+    cache.close()
+
+
+def test_connection_options_are_applied(tmp_path):
+    cache = make_cache(tmp_path, busy_timeout_ms=1234, cache_size_kb=2048)
+    conn = cache._connections.connection()
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+    assert conn.execute("PRAGMA cache_size").fetchone()[0] == -2048
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    cache.close()
+
+
+def test_llm_service_answers_repeated_prompt_from_cache(make_config, stub_server):
+    service = LLMService(make_config(database={"cache_size_kb": 4096}))
+    assert service.response_cache._connections.cache_size_kb == 4096
+    
+    first, ok = service.get_completion("O que é few-shot prompting?")
+    assert ok
+    requests = stub_server.stats["requests"]
+    second, ok = service.get_completion("o que é few-shot prompting")
+    assert ok and second == first
+    assert stub_server.stats["requests"] == requests
+    
+    chunks = list(service.stream_completion("O que é few-shot prompting?"))
+    assert "".join(chunks) == first
+    assert service.last_stream_metrics["cached"] is True
+    
+    service.get_completion("O que é few-shot prompting?", use_cache=False)
+    assert stub_server.stats["requests"] == requests + 1
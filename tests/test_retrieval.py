@@ -0,0 +1,91 @@
+import math
+
+import pytest
+
+from retrieval import BM25Index, normalize_text, stem, tokenize
+
+DOCUMENTS = [
+    "Few-shot prompting usa exemplos no prompt",
+    "Chain-of-thought pede o raciocínio passo a passo",
+    "Delimitadores separam as seções do prompt",
+    "Exemplos de saída ajudam o modelo a seguir o formato",
+    "Temperatura controla a aleatoriedade das respostas do modelo",
+]
+
+
+def reference_scores(documents, query, k1=1.2, b=0.75):
+    """
+    BM25 calculado diretamente das definições, para comparação.
+    """
+    docs = [tokenize(text) for text in documents]
+    average = sum(map(len, docs)) / len(docs)
+    scores = {}
+    for key, terms in enumerate(docs):
+        score = 0.0
+        for term in tokenize(query):
+            df = sum(term in doc for doc in docs)
+            tf = terms.count(term)
+            if tf:
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(terms) / average))
+        if score:
+            scores[key] = score
+    return scores
+
+
+def build(documents, **options):
+    index = BM25Index(**options)
+    for key, text in enumerate(documents):
+        index.add(key, text)
+    return index
+
+
+def test_normalization_and_stemming():
+    assert normalize_text("  Técnicas de PROMPT, já!") == "tecnicas de prompt ja"
+    assert stem("tecnicas") == stem("tecnico")
+    assert tokenize("Os exemplos do prompt") == [stem("exemplos"), stem("prompt")]
+
+
+@pytest.mark.parametrize("merge_docs", [1, 2, 256])
+def test_scores_match_the_bm25_formula(merge_docs):
+    index = build(DOCUMENTS, merge_docs=merge_docs)
+    index.flush()
+    for query in ("exemplos de prompt", "modelo", "raciocínio passo a passo", "receita de bolo"):
+        expected = reference_scores(DOCUMENTS, query)
+        results = index.search(query, k=len(DOCUMENTS))
+        assert [key for key, _ in results] == sorted(expected, key=lambda key: (-expected[key], key))
+        for key, score in results:
+            assert score == pytest.approx(expected[key], rel=1e-5)
+
+
+def test_removed_and_replaced_documents():
+    index = build(DOCUMENTS, merge_docs=2)
+    assert index.remove(0) and not index.remove(0)
+    assert 0 not in [key for key, _ in index.search("few-shot exemplos", k=5)]
+    index.add(3, "Few-shot prompting com exemplos")
+    assert len(index) == 4
+    assert index.search("few-shot", k=1)[0][0] == 3
+    assert index.search("formato de saída", k=5) == []
+
+
+def test_arrays_roundtrip():
+    index = build(DOCUMENTS)
+    index.remove(1)
+    restored = BM25Index.from_arrays(index.arrays("q"), "q")
+    for query in ("exemplos de prompt", "raciocínio", "modelo"):
+        assert restored.search(query) == index.search(query)
+    restored.add(5, "Raciocínio explícito")
+    assert restored.search("raciocínio", k=1)[0][0] == 5
+
+
+def test_search_many_matches_single_searches():
+    index = build(DOCUMENTS)
+    queries = ["exemplos", "modelo respostas", "nada a ver", "prompt"]
+    assert index.search_many(queries, k=3) == [index.search(query, k=3) for query in queries]
+
+
+def test_similarity_is_one_for_the_same_terms():
+    index = build(DOCUMENTS)
+    similarities = index.similarities("Delimitadores separam seções do prompt", [2, 0, 4])
+    assert similarities[0] == pytest.approx(1.0)
+    assert 0 < similarities[1] < 1 and similarities[2] == 0.0
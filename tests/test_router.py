@@ -0,0 +1,79 @@
+import pytest
+
+from prompt_agent import PromptAgent
+
+KB_QUESTION = "O que é few-shot prompting?"
+OPEN_QUESTION = "Como escolher entre dois modelos de linguagem para um chatbot jurídico?"
+
+
+@pytest.fixture
+def make_agent(make_config):
+    agents = []
+    
+    def make(use_llm=True, **router):
+        config = make_config(router=router, cache={"enabled": False}, semantic_cache={"enabled": False})
+        agent = PromptAgent(config, use_llm=use_llm)
+        agents.append(agent)
+        return agent
+    
+    yield make
+    for agent in agents:
+        agent.close()
+
+
+def test_confident_questions_skip_the_llm(make_agent, stub_server):
+    agent = make_agent()
+    response, found = agent.get_response(KB_QUESTION)
+    assert found and response == agent.kb.get_response(KB_QUESTION)[0]
+    assert stub_server.stats["requests"] == 0
+    routing = agent.last_routing
+    assert routing["route"] == "local" and routing["faq"] == "o que é few-shot prompting"
+    assert routing["confidence"] >= routing["threshold"] == 0.8
+    
+    insights, ready = agent.get_interaction_insights(agent.last_interaction_id)
+    assert ready and insights["routing"]["route"] == "local"
+    assert agent.routing_stats == {"local": 1, "cache": 0, "llm": 0}
+
+
+def test_other_questions_go_to_the_llm_with_the_routing_recorded(make_agent, stub_server, wait_until):
+    agent = make_agent()
+    response, found = agent.get_response(OPEN_QUESTION)
+    assert found and response.startswith("Resposta simulada")
+    assert agent.last_routing["route"] == "llm"
+    assert agent.last_routing["confidence"] < 0.8
+    
+    # Os insights extraídos em segundo plano mantêm o roteamento gravado com a interação
+    interaction_id = agent.last_interaction_id
+    assert wait_until(lambda: agent.get_interaction_insights(interaction_id)[1])
+    insights, _ = agent.get_interaction_insights(interaction_id)
+    assert insights["routing"]["route"] == "llm" and "category" in insights
+
+
+def test_fuzzy_only_matches_are_not_answered_locally(make_agent, stub_server):
+    agent = make_agent()
+    agent.get_response("oque é enjenharia de prompt")
+    assert agent.last_routing["route"] == "llm"
+    assert stub_server.stats["requests"] >= 1
+
+
+def test_threshold_and_switch(make_agent, stub_server):
+    strict = make_agent(min_confidence=1.01)
+    strict.get_response(KB_QUESTION)
+    assert strict.last_routing["route"] == "llm"
+    
+    disabled = make_agent(enabled=False)
+    disabled.get_response(KB_QUESTION)
+    assert disabled.last_routing is None
+    assert disabled.routing_stats == {"local": 0, "cache": 0, "llm": 0}
+    
+    local_only = make_agent(use_llm=False)
+    assert local_only.get_response(KB_QUESTION)[1]
+    assert local_only.last_routing is None
+
+
+def test_routed_stream_is_delivered_at_once(make_agent, stub_server):
+    agent = make_agent()
+    chunks = list(agent.stream_response(KB_QUESTION))
+    assert chunks == [agent.kb.get_response(KB_QUESTION)[0]]
+    assert agent.last_stream_metrics["routed"] is True
+    assert stub_server.stats["requests"] == 0
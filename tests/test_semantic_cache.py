@@ -0,0 +1,43 @@
+from prompt_agent import PromptAgent
+from semantic_cache import SemanticIndex
+
+
+def test_index_finds_near_duplicates():
+    index = SemanticIndex()
+    index.add(1, "O que é few-shot prompting?")
+    index.add(2, "Como escrever um bom prompt de sistema?")
+    index.flush()
+    key, score = index.search("o que e few shot prompting", k=1)[0]
+    assert key == 1 and score > 0.85
+    assert all(score < 0.5 for _, score in index.search("receita de bolo de cenoura", k=1))
+
+
+def test_near_duplicate_question_is_answered_from_cache(make_config, stub_server, wait_until):
+    agent = PromptAgent(make_config(router={"enabled": False}, cache={"enabled": False}))
+    first, found = agent.get_response("Quais são as vantagens do few-shot prompting?")
+    assert found and agent.last_routing is None
+    first_id = agent.last_interaction_id
+    # Espera o worker extrair os insights da primeira interação (também chama o LLM)
+    assert wait_until(lambda: agent.get_interaction_insights(first_id)[1])
+    
+    requests = stub_server.stats["requests"]
+    second, found = agent.get_response("Quais são as vantagens do few-shot prompting")
+    assert found and second == first
+    assert stub_server.stats["requests"] == requests
+    assert agent.last_routing["route"] == "cache"
+    assert agent.last_routing["source_interaction"] == first_id
+    assert agent.last_routing["semantic_score"] >= 0.85
+    assert agent.routing_stats == {"local": 0, "cache": 1, "llm": 0}
+    
+    insights, ready = agent.get_interaction_insights(agent.last_interaction_id)
+    assert ready
+    assert insights["routing"]["route"] == "cache"
+    agent.close()
+
+
+def test_short_questions_skip_the_cache(make_config):
+    agent = PromptAgent(make_config(router={"enabled": False}, cache={"enabled": False}))
+    agent.get_response("few-shot prompting")
+    agent.get_response("few-shot prompting")
+    assert agent.routing_stats["cache"] == 0
+    agent.close()
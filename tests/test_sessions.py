@@ -0,0 +1,80 @@
+import pytest
+
+from prompt_agent import PromptAgent
+
+QUESTIONS = ["O que é um prompt?", "O que é few-shot prompting?", "O que é chain of thought?"]
+
+
+@pytest.fixture
+def make_agent(make_config):
+    agents = []
+    
+    def make(use_llm=False, resume_turns=20, **options):
+        config = make_config(session={"resume_turns": resume_turns}, cache={"enabled": False},
+                             semantic_cache={"enabled": False})
+        agent = PromptAgent(config, use_llm=use_llm, **options)
+        agents.append(agent)
+        return agent
+    
+    yield make
+    for agent in agents:
+        agent.close()
+
+
+def answer_all(agent, questions):
+    return [agent.get_response(question)[0] for question in questions]
+
+
+def test_resumed_session_restores_the_context(make_agent):
+    first = make_agent(session_id="sessao-x", user_id="ana")
+    answers = answer_all(first, QUESTIONS[:2])
+    make_agent(session_id="outra").get_response(QUESTIONS[2])
+    first.close()
+    
+    resumed = make_agent(session_id="sessao-x", user_id="ana")
+    # Os turnos só são lidos do banco quando o contexto é necessário
+    assert resumed.memory.messages() == []
+    history = resumed.get_conversation_history()
+    assert [(message["role"], message["content"]) for message in history] == [
+        ("user", QUESTIONS[0]), ("agent", answers[0]), ("user", QUESTIONS[1]), ("agent", answers[1])
+    ]
+    assert resumed.memory.messages() == [
+        {"role": "user", "content": QUESTIONS[0]}, {"role": "assistant", "content": answers[0]},
+        {"role": "user", "content": QUESTIONS[1]}, {"role": "assistant", "content": answers[1]}
+    ]
+    
+    # O turno seguinte é gravado na mesma sessão, depois dos restaurados
+    resumed.get_response(QUESTIONS[2])
+    assert [turn[1] for turn in resumed.get_session_history()] == QUESTIONS
+    assert len(resumed.memory.messages()) == 6
+
+
+def test_only_the_last_turns_are_resumed(make_agent):
+    answers = answer_all(make_agent(session_id="sessao-y"), QUESTIONS)
+    resumed = make_agent(session_id="sessao-y", resume_turns=1)
+    resumed.get_response("O que são delimitadores?")
+    assert resumed.memory.messages()[:2] == [
+        {"role": "user", "content": QUESTIONS[2]}, {"role": "assistant", "content": answers[2]}
+    ]
+    assert len(resumed.get_conversation_history()) == 4
+
+
+def test_resumed_context_is_sent_to_the_llm(make_agent, stub_server):
+    question = "Como escolher entre dois modelos de linguagem para um chatbot jurídico?"
+    make_agent(session_id="sessao-z").get_response(QUESTIONS[0])
+    resumed = make_agent(use_llm=True, session_id="sessao-z")
+    resumed.get_response(question)
+    fresh = make_agent(use_llm=True)
+    fresh.get_response(question)
+    # A requisição da sessão retomada leva também o turno restaurado
+    assert resumed.memory.messages()[0] == {"role": "user", "content": QUESTIONS[0]}
+    assert resumed.llm_service.last_usage["prompt_tokens"] > fresh.llm_service.last_usage["prompt_tokens"]
+
+
+def test_new_and_cleared_conversations_start_empty(make_agent):
+    agent = make_agent(session_id="sessao-w")
+    agent.get_response(QUESTIONS[0])
+    agent.clear_conversation()
+    assert agent.session_id != "sessao-w"
+    assert agent.get_conversation_history() == [] and agent.memory.messages() == []
+    assert make_agent().get_conversation_history() == []
@@ -0,0 +1,147 @@
+import asyncio
+import time
+
+import pytest
+
+import async_llm_service
+from async_llm_service import AsyncLLMService
+from prompt_agent import PromptAgent
+from resilience import CircuitBreaker
+
+KB_QUESTION = "O que é few-shot prompting?"
+OPEN_QUESTION = "Como escolher entre dois modelos de linguagem para um chatbot jurídico?"
+
+
+@pytest.fixture
+def make_agent(make_config):
+    agents = []
+    
+    def make(use_llm=True, resilience=None):
+        config = make_config(router={"speculative": True}, cache={"enabled": False},
+                             semantic_cache={"enabled": False}, resilience=resilience or {})
+        agent = PromptAgent(config, use_llm=use_llm)
+        agents.append(agent)
+        return agent
+    
+    yield make
+    for agent in agents:
+        agent.close()
+
+
+def background_tasks():
+    """
+    Número de tarefas ainda em andamento no event loop em segundo plano do serviço.
+    """
+    async def count():
+        return len(asyncio.all_tasks() - {asyncio.current_task()})
+    
+    loop = async_llm_service._background_loop
+    return asyncio.run_coroutine_threadsafe(count(), loop).result(1) if loop else 0
+
+
+def test_local_answer_cancels_the_llm_call(make_agent, stub_server, wait_until):
+    stub_server.settings["latency_ms"] = 2000
+    agent = make_agent()
+    breaker = agent.llm_service.circuit_breaker
+    
+    start = time.perf_counter()
+    response, found = agent.get_response(KB_QUESTION)
+    assert time.perf_counter() - start < 1.0
+    assert found and response == agent.kb.get_response(KB_QUESTION)[0]
+    assert agent.last_speculation["winner"] == "kb" and agent.last_speculation["llm_ms"] is None
+    assert agent.last_routing["speculation"] == agent.last_speculation
+    
+    # A chamada é interrompida bem antes de o servidor responder, sem sucesso nem falha no circuito
+    assert wait_until(lambda: background_tasks() == 0, timeout=1.0)
+    snapshot = breaker.snapshot()
+    assert snapshot["successes"] == snapshot["failures"] == 0
+    assert agent.get_speculation_stats()["cancelled"] == 1
+    insights, ready = agent.get_interaction_insights(agent.last_interaction_id)
+    assert ready and insights["routing"]["speculation"]["winner"] == "kb"
+
+
+def test_llm_answer_is_used_when_the_knowledge_base_is_not_confident(make_agent, stub_server):
+    agent = make_agent()
+    response, found = agent.get_response(OPEN_QUESTION)
+    assert found and response.startswith("Resposta simulada")
+    assert agent.last_speculation["winner"] == "llm" and agent.last_speculation["llm_ms"] > 0
+    stored = agent.db.get_interaction_by_id(agent.last_interaction_id)
+    assert stored[6] > 0 and stored[7] > 0
+    
+    chunks = list(agent.stream_response(OPEN_QUESTION + " E para um chatbot médico?"))
+    assert len(chunks) > 1
+    assert agent.last_stream_metrics["success"] is True
+    assert agent.last_stream_metrics["speculation"]["winner"] == "llm"
+    assert agent.get_speculation_stats()["llm_wins"] == 2
+
+
+def test_stopping_the_stream_cancels_the_llm_call(make_agent, stub_server, wait_until):
+    stub_server.settings["tokens_per_second"] = 10
+    agent = make_agent()
+    stream = agent.stream_response(OPEN_QUESTION)
+    next(stream)
+    stream.close()
+    assert wait_until(lambda: background_tasks() == 0, timeout=1.0)
+
+
+def test_cancelled_trial_call_frees_the_half_open_circuit(make_agent, stub_server, wait_until):
+    stub_server.settings["latency_ms"] = 2000
+    agent = make_agent(resilience={"failure_threshold": 1, "reset_timeout": 0.05})
+    breaker = agent.llm_service.circuit_breaker
+    breaker.record_failure(RuntimeError("falha"), 0.1)
+    time.sleep(0.06)
+    
+    assert agent.get_response(KB_QUESTION)[1]
+    assert wait_until(lambda: background_tasks() == 0, timeout=1.0)
+    # A chamada de teste continua disponível para a próxima requisição
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_cancelled_calls_release_the_trial_slot(make_config, stub_server):
+    stub_server.settings["latency_ms"] = 2000
+    service = AsyncLLMService(make_config(cache={"enabled": False},
+                                          resilience={"failure_threshold": 1, "reset_timeout": 0.05}))
+    breaker = service.circuit_breaker
+    
+    def interrupted(timeout):
+        raise KeyboardInterrupt
+    
+    breaker.record_failure(RuntimeError("falha"), 0.1)
+    time.sleep(0.06)
+    with pytest.raises(KeyboardInterrupt):
+        service._call_with_retry(interrupted)
+    assert breaker.snapshot()["cancelled"] == 1 and not breaker._trial_in_flight
+    
+    async def cancel_after_start():
+        task = asyncio.ensure_future(service.aget_completion("O que é um prompt?"))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    
+    asyncio.run(cancel_after_start())
+    snapshot = breaker.snapshot()
+    assert snapshot["cancelled"] == 2 and snapshot["failures"] == 1
+    assert breaker.allow_request()
+
+
+def test_async_speculation(make_agent, stub_server):
+    agent = make_agent()
+    
+    async def ask():
+        return await agent.aget_response(KB_QUESTION), await agent.aget_response(OPEN_QUESTION)
+    
+    (local, found_local), (remote, found_remote) = asyncio.run(ask())
+    assert found_local and local == agent.kb.get_response(KB_QUESTION)[0]
+    assert found_remote and remote.startswith("Resposta simulada")
+    stats = agent.get_speculation_stats()
+    assert (stats["kb_wins"], stats["llm_wins"], stats["cancelled"]) == (1, 1, 1)
+    assert agent.llm_service.get_health()["successes"] >= 1
+
+
+def test_local_mode_does_not_speculate(make_agent, stub_server):
+    agent = make_agent(use_llm=False)
+    assert agent.get_response(OPEN_QUESTION)[1] is False
+    assert agent.last_speculation is None
+    assert stub_server.stats["requests"] == 0
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from llm_service import ERROR_RESPONSE_PREFIX, LLMService
+from prompt_agent import PromptAgent
+
+QUESTION = "Como escolher entre dois modelos de linguagem para um chatbot jurídico?"
+
+
+@pytest.fixture
+def make_service(make_config):
+    def make(**cache):
+        return LLMService(make_config(cache=dict({"enabled": False}, **cache), resilience={"max_attempts": 1}))
+    
+    return make
+
+
+def test_stream_metrics_count_the_delivered_chunks(make_service, stub_server):
+    service = make_service()
+    chunks = list(service.stream_completion(QUESTION))
+    metrics = service.last_stream_metrics
+    assert len(chunks) > 1 and metrics["chunks"] == len(chunks)
+    assert metrics["success"] and not metrics["cached"]
+    # O primeiro trecho chega depois da latência do provedor e antes do fim do stream
+    assert 0.02 <= metrics["time_to_first_token"] < metrics["total_time"]
+    assert service.last_usage["completion_tokens"] > 0
+    assert "".join(chunks).strip() == service.get_completion(QUESTION)[0]
+
+
+def test_cached_stream_is_a_single_chunk(make_service, stub_server):
+    service = make_service(enabled=True)
+    first = "".join(service.stream_completion(QUESTION)).strip()
+    assert list(service.stream_completion(QUESTION)) == [first]
+    metrics = service.last_stream_metrics
+    assert metrics["cached"] and metrics["success"] and metrics["chunks"] == 1
+    assert metrics["time_to_first_token"] <= metrics["total_time"]
+    assert stub_server.stats["streams"] == 1
+
+
+def test_interrupted_stream_is_reported(make_service, stub_server):
+    stub_server.settings["stream_error_rate"] = 1.0
+    service = make_service()
+    chunks = list(service.stream_completion(QUESTION))
+    metrics = service.last_stream_metrics
+    assert chunks[-1].startswith(ERROR_RESPONSE_PREFIX)
+    assert not metrics["success"] and metrics["chunks"] == len(chunks) - 1 > 0
+    
+    # Sem `yield_errors`, o erro só aparece nas métricas
+    stub_server.settings["stream_error_rate"] = 0.0
+    stub_server.settings["error_rate"] = 1.0
+    assert list(service.stream_completion(QUESTION, yield_errors=False)) == []
+    assert not service.last_stream_metrics["success"] and service.last_stream_metrics["chunks"] == 0
+    assert service.last_stream_metrics["total_time"] is not None
+
+
+def test_agent_stream_falls_back_to_the_knowledge_base(make_config, stub_server):
+    config = make_config(cache={"enabled": False}, semantic_cache={"enabled": False},
+                         resilience={"max_attempts": 1})
+    agent = PromptAgent(config, use_llm=True)
+    try:
+        chunks = list(agent.stream_response(QUESTION))
+        assert len(chunks) > 1 and agent.last_stream_metrics["chunks"] == len(chunks)
+        assert agent.last_stream_metrics["success"] and "fallback" not in agent.last_stream_metrics
+        
+        stub_server.settings["error_rate"] = 1.0
+        chunks = list(agent.stream_response(QUESTION))
+        assert chunks == [agent.kb.get_response(QUESTION)[0]]
+        assert agent.last_stream_metrics["fallback"] and not agent.last_stream_metrics["success"]
+    finally:
+        agent.close()
+
+
+def test_entry_points_share_the_fallback(make_config, stub_server):
+    stub_server.settings["error_rate"] = 1.0
+    config = make_config(cache={"enabled": False}, semantic_cache={"enabled": False},
+                         resilience={"max_attempts": 1})
+    agent = PromptAgent(config, use_llm=True)
+    try:
+        expected = agent.kb.get_response(QUESTION)
+        assert agent.get_response(QUESTION) == expected
+        assert asyncio.run(agent.aget_response(QUESTION)) == expected
+        assert "".join(agent.stream_response(QUESTION)) == expected[0] and agent.last_found == expected[1]
+        assert [row[2] for row in agent.get_session_history()] == [expected[0]] * 3
+    finally:
+        agent.close()
@@ -0,0 +1,56 @@
+import yaml
+
+from llm_service import ERROR_RESPONSE_PREFIX, LLMService
+from response_cache import ResponseCache
+from stub_server import StubLLMServer
+
+
+def test_stub_answers_are_deterministic(make_config, stub_server):
+    service = LLMService(make_config(cache={"enabled": False}))
+    first, ok = service.get_completion("O que é um prompt?")
+    assert ok and first.startswith('Resposta simulada para "O que é um prompt?"')
+    assert service.get_completion("O que é um prompt?")[0] == first
+    assert service.last_usage["prompt_tokens"] > 0 and service.last_usage["completion_tokens"] > 0
+    
+    chunks = list(service.stream_completion("O que é um prompt?"))
+    assert len(chunks) > 1 and "".join(chunks).strip() == first
+    assert stub_server.stats == dict(stub_server.stats, requests=3, streams=1, errors=0)
+
+
+def test_stub_injects_faults(make_config, stub_server):
+    stub_server.settings["rate_limit_rate"] = 1.0
+    service = LLMService(make_config(cache={"enabled": False}, resilience={"max_attempts": 1}))
+    response, ok = service.get_completion("O que é um prompt?")
+    assert not ok and response.startswith(ERROR_RESPONSE_PREFIX)
+    assert stub_server.stats["rate_limited"] == 1
+
+
+def test_endpoint_is_part_of_the_cache_key():
+    key = ResponseCache.make_key("gpt-4o-mini", "sys", "pergunta", 0.7, 100)
+    assert key == ResponseCache.make_key("gpt-4o-mini", "sys", "pergunta", 0.7, 100, endpoint="")
+    assert key != ResponseCache.make_key("gpt-4o-mini", "sys", "pergunta", 0.7, 100,
+                                         endpoint="http://127.0.0.1:8000/v1")
+
+
+def test_cached_answers_do_not_leak_across_endpoints(make_config, stub_server):
+    config_path = make_config()
+    stub_answer, _ = LLMService(config_path).get_completion("O que é um prompt?")
+    
+    # Outro endpoint com o mesmo banco de dados (respostas de tamanho diferente)
+    other = StubLLMServer(port=0, latency_ms=20, latency_jitter_ms=0, latency_distribution="fixed",
+                          tokens_per_second=5000, answer_words=5, seed=1).start()
+    try:
+        with open(config_path, encoding="utf-8") as file:
+            config = yaml.safe_load(file)
+        config["model"]["base_url"] = other.base_url
+        with open(config_path, "w", encoding="utf-8") as file:
+            yaml.safe_dump(config, file, allow_unicode=True)
+        
+        service = LLMService(config_path)
+        answer, ok = service.get_completion("O que é um prompt?")
+        assert ok and answer != stub_answer
+        assert other.stats["requests"] == 1
+        # A troca de endpoint invalidou as entradas gravadas pelo anterior
+        assert service.response_cache.get_stats()["disk_hits"] == 0
+    finally:
+        other.stop()
@@ -0,0 +1,71 @@
+import pytest
+
+from llm_service import LLMService
+from prompt_agent import PromptAgent
+
+QUESTIONS = [
+    "Como escolher entre dois modelos de linguagem para um chatbot jurídico?",
+    "E como avaliar as respostas desse chatbot antes de publicá-lo?",
+    "Quais métricas acompanhar depois da publicação?"
+]
+
+
+@pytest.fixture
+def config(make_config):
+    return make_config(cache={"enabled": False}, semantic_cache={"enabled": False}, router={"enabled": False})
+
+
+@pytest.fixture
+def agent(config):
+    agent = PromptAgent(config, use_llm=True)
+    yield agent
+    agent.close()
+
+
+def test_messages_keep_the_stable_parts_first(make_config):
+    service = LLMService(make_config())
+    history = [{"role": "user", "content": "pergunta"}, {"role": "assistant", "content": "resposta"}]
+    _, messages, _, _ = service._prepare_request("atual", "sistema", None, None, history, "resumo")
+    assert messages == [
+        {"role": "system", "content": "sistema"},
+        {"role": "system", "content": "Resumo da conversa anterior:\nresumo"},
+        *history,
+        {"role": "user", "content": "atual"}
+    ]
+    _, messages, temperature, max_tokens = service._prepare_request("atual")
+    assert [message["role"] for message in messages] == ["system", "user"]
+    assert (temperature, max_tokens) == (service.config["agent"]["temperature"], service.config["agent"]["max_tokens"])
+
+
+def test_each_turn_extends_the_previous_request(agent, stub_server):
+    stub_server.settings["cache_min_tokens"] = 128
+    usages = []
+    for question in QUESTIONS:
+        agent.get_response(question)
+        usages.append(dict(agent.llm_service.last_usage))
+    
+    # A primeira requisição não encontra prefixo em cache. Cada uma das seguintes
+    # começa com todas as mensagens da anterior, na mesma posição, e só acrescenta
+    # a resposta e a nova pergunta: a requisição anterior inteira está em cache
+    assert usages[0]["cached_tokens"] == 0
+    for previous, usage in zip(usages, usages[1:]):
+        assert previous["prompt_tokens"] < usage["prompt_tokens"]
+        assert usage["cached_tokens"] == previous["prompt_tokens"] - previous["prompt_tokens"] % 128 > 0
+    assert all(usage["completion_tokens"] > 0 and usage["latency_ms"] > 0 for usage in usages)
+    assert stub_server.stats["cached_tokens"] == sum(usage["cached_tokens"] for usage in usages)
+
+
+def test_usage_is_stored_with_the_interaction(agent, config, stub_server):
+    agent.get_response(QUESTIONS[0])
+    usage = agent.llm_service.last_usage
+    row = agent.db.get_interaction_by_id(agent.last_interaction_id)
+    assert row[6:10] == (usage["prompt_tokens"], usage["completion_tokens"], usage["cached_tokens"],
+                         pytest.approx(usage["latency_ms"]))
+    
+    # Respostas da base local não têm uso de tokens
+    local = PromptAgent(config, use_llm=False)
+    try:
+        local.get_response(QUESTIONS[0])
+        assert local.db.get_interaction_by_id(local.last_interaction_id)[6:10] == (None, None, None, None)
+    finally:
+        local.close()